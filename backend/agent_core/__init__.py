@@ -0,0 +1,6 @@
+"""Shared runtime helpers for the voice-agent backends in this folder.
+
+The top-level scripts (``websocket.py``, ``full-agentic-integration.py`` ...)
+are run directly from ``backend/``, so they import these modules as
+``agent_core.<module>``.
+"""
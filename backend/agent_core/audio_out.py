@@ -0,0 +1,195 @@
+"""
+Reply audio encoding, negotiated per connection and adapted to its throughput.
+
+TTS returns 16-bit PCM WAV, which costs 128 kbit/s at 8 kHz. On a 2G/3G
+link that is seconds of download before a farmer hears anything. A client
+that can play Opus says so when it connects, for example
+``/ws/{client_id}?codecs=opus,wav&sample_rate=16000&kbps=64``:
+
+* ``codecs``: the formats it can play, in order of preference;
+* ``sample_rate``: the highest rate worth sending (TTS is asked for that
+  rate, so nothing has to be resampled);
+* ``kbps``: an optional first guess at its downlink (navigator.connection).
+
+Each connection gets an ``AudioProfile`` with a ladder of qualities. Before
+every reply it picks the best rung whose bitrate fits in ``HEADROOM`` of
+the measured throughput, an EWMA of per-reply samples:
+
+* a client that acknowledges replies (a text frame
+  ``{"type": "audio_ack", "reply_id": ...}`` sent when the reply arrives or
+  starts playing) is timed from send to ack: the whole transfer plus one
+  round trip;
+* otherwise the time a reply takes to drain into the socket is used, but
+  only for payloads well over the transport's write buffer
+  (``WRITE_BUFFER_BYTES``, the 64 KiB high-water mark), and only the bytes
+  beyond it count: the first 64 KiB are "sent" before any of them has
+  crossed the link.
+
+Neither estimate has been checked against real 2G/3G links yet.
+
+Transcoding runs in the media worker pool (pydub + ffmpeg/libopus). If the
+transcoder is missing or fails, the reply stays WAV. Clients that negotiate
+nothing get the old 8 kHz WAV.
+"""
+import base64
+import functools
+import io
+import logging
+import shutil
+import time
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+
+class Quality(NamedTuple):
+    name: str
+    codec: str        # "opus" (in Ogg) or "wav"
+    sample_rate: int
+    bitrate: int      # bits per second on the wire (before base64)
+
+    @property
+    def mime(self) -> str:
+        return "audio/ogg; codecs=opus" if self.codec == "opus" else "audio/wav"
+
+    def describe(self) -> dict:
+        return {"codec": self.codec, "mime": self.mime, "sample_rate": self.sample_rate, "bitrate": self.bitrate}
+
+
+# Best first; WAV bitrates are what 16-bit mono PCM costs
+LADDERS = {
+    "opus": (
+        Quality("opus-32k", "opus", 24000, 32000),
+        Quality("opus-24k", "opus", 16000, 24000),
+        Quality("opus-16k", "opus", 16000, 16000),
+        Quality("opus-12k", "opus", 8000, 12000),
+        Quality("opus-8k", "opus", 8000, 8000),
+    ),
+    "wav": (
+        Quality("wav-16k", "wav", 16000, 256000),
+        Quality("wav-8k", "wav", 8000, 128000),
+    ),
+}
+DEFAULT_QUALITY = LADDERS["wav"][-1]  # what every reply used to be
+HEADROOM = 0.5          # share of the measured throughput one reply may use
+EWMA_ALPHA = 0.3
+WRITE_BUFFER_BYTES = 64 * 1024  # transport high-water mark: a send returns once the rest fits under it
+MIN_SAMPLE_BYTES = 4 * WRITE_BUFFER_BYTES  # drain timings of smaller sends are mostly buffering
+MIN_ACK_BYTES = 16 * 1024  # below this an acked sample is mostly the round trip
+
+_chosen = {
+    quality.name: REGISTRY.counter("reply_audio_total", "Replies by audio quality", quality=quality.name)
+    for ladder in LADDERS.values() for quality in ladder
+}
+_reply_bytes = REGISTRY.histogram("reply_audio_bytes", "Reply audio size on the wire (before base64)")
+
+
+@functools.lru_cache(maxsize=None)
+def transcoder_available() -> bool:
+    try:
+        import pydub  # noqa: F401
+    except ImportError:
+        return False
+    return shutil.which("ffmpeg") is not None
+
+
+# --- Worker task (module level so MediaPool workers can import it) ---
+def transcode_base64(data: bytes, codec: str, sample_rate: int, bitrate: int) -> bytes:
+    """Base64 WAV in, base64 ``codec`` out, mono at ``sample_rate``."""
+    from pydub import AudioSegment
+
+    audio = AudioSegment.from_file(io.BytesIO(base64.b64decode(data)), format="wav")
+    audio = audio.set_channels(1).set_frame_rate(sample_rate)
+    output = io.BytesIO()
+    if codec == "opus":
+        audio.export(output, format="ogg", codec="libopus", bitrate=f"{bitrate // 1000}k",
+                     parameters=["-application", "voip"])
+    else:
+        audio.export(output, format="wav")
+    return base64.b64encode(output.getvalue())
+
+
+class AudioProfile:
+    """One connection's quality ladder and throughput estimate."""
+
+    def __init__(self, ladder: Iterable[Quality] = (DEFAULT_QUALITY,), kbps: Optional[float] = None):
+        self.ladder: List[Quality] = list(ladder)
+        self.throughput: Optional[float] = kbps * 1000 if kbps else None  # bits per second
+        self.acks = False  # the client acknowledges replies; drain timings are then ignored
+        self._pending: Optional[Tuple[str, int, float]] = None  # reply id, bytes, sent at
+
+    def sent(self, reply_id: str, nbytes: int):
+        """A reply the client may acknowledge; only the latest one is waited for."""
+        self._pending = (reply_id, nbytes, time.perf_counter())
+
+    def acked(self, reply_id: str) -> bool:
+        """Feeds the send-to-ack time of the reply; False for an unknown or stale id."""
+        if self._pending is None or self._pending[0] != reply_id:
+            return False
+        _, nbytes, sent_at = self._pending
+        self._pending = None
+        self.acks = True
+        if nbytes >= MIN_ACK_BYTES:
+            self._update(nbytes * 8 / max(time.perf_counter() - sent_at, 1e-3))
+        return True
+
+    def observe(self, nbytes: int, seconds: float):
+        """Feeds the time one reply took to drain into the socket, for clients that don't ack."""
+        if self.acks or nbytes < MIN_SAMPLE_BYTES or seconds <= 0:
+            return
+        self._update((nbytes - WRITE_BUFFER_BYTES) * 8 / seconds)
+
+    def _update(self, sample: float):
+        self.throughput = sample if self.throughput is None else (
+            EWMA_ALPHA * sample + (1 - EWMA_ALPHA) * self.throughput)
+
+    def choose(self) -> Quality:
+        """Best rung that fits the throughput; the middle rung until there is a measurement."""
+        if self.throughput is None:
+            quality = self.ladder[len(self.ladder) // 2]
+        else:
+            budget = self.throughput * HEADROOM
+            quality = next((q for q in self.ladder if q.bitrate <= budget), self.ladder[-1])
+        _chosen[quality.name].inc()
+        return quality
+
+
+def negotiate(codecs: Optional[str] = None, sample_rate: Optional[int] = None,
+              kbps: Optional[float] = None) -> AudioProfile:
+    """
+    Profile for the client's offer. The first offered codec we can produce
+    wins; rungs above ``sample_rate`` are dropped. No offer (or nothing we
+    can produce) keeps the old 8 kHz WAV.
+    """
+    for codec in (c.strip().lower() for c in (codecs or "").split(",") if c.strip()):
+        if codec not in LADDERS or (codec != "wav" and not transcoder_available()):
+            continue
+        ladder = [q for q in LADDERS[codec] if not sample_rate or q.sample_rate <= sample_rate]
+        if ladder:
+            return AudioProfile(ladder, kbps)
+    if codecs and "opus" in codecs and not transcoder_available():
+        logger.warning("Client offered Opus but pydub/ffmpeg are not available, replying with WAV")
+    return AudioProfile((DEFAULT_QUALITY,), kbps)
+
+
+async def encode_reply(media, audio_base64: str, quality: Quality) -> Tuple[str, Quality]:
+    """
+    TTS output (base64 WAV at ``quality.sample_rate``) in ``quality``'s codec,
+    transcoded in the media pool. Returns the audio and the quality actually
+    used, which is WAV at the TTS rate if transcoding is unavailable or fails.
+    """
+    if quality.codec != "wav":
+        try:
+            if not transcoder_available():
+                raise RuntimeError("pydub/ffmpeg not available")
+            encoded = await media.run(transcode_base64, audio_base64.encode("ascii"),
+                                      quality.codec, quality.sample_rate, quality.bitrate)
+            audio_base64 = encoded.decode("ascii")
+        except Exception as e:
+            logger.warning("Transcoding reply audio to %s failed, sending WAV: %s", quality.name, e)
+            quality = Quality(f"wav-{quality.sample_rate // 1000}k", "wav", quality.sample_rate,
+                              quality.sample_rate * 16)
+    _reply_bytes.observe(len(audio_base64) * 3 // 4)
+    return audio_base64, quality
@@ -0,0 +1,133 @@
+"""
+Cross-session micro-batching of TTS calls.
+
+Sarvam's TTS request takes a list of ``inputs`` but every session sent one
+text per HTTP call, so a burst of sessions reaching their next question
+together cost a burst of requests against the provider's rate limit. The
+batcher groups calls with the same (language, model, sample rate) and
+sends up to ``AGENT_BATCH_MAX_SIZE`` texts as one request. The audios are
+handed back to the waiting callers in order.
+
+* A call with no request of its key in flight is sent at once, so a quiet
+  server adds no wait.
+* Calls arriving while one is in flight collect into a batch, which goes
+  when it is full, when the request in flight returns, or when its oldest
+  call has waited ``AGENT_BATCH_MAX_WAIT``, whichever comes first.
+* Callers that were cancelled while waiting are dropped before sending.
+* If the request fails, every caller in it gets the error.
+
+The batcher sits right above the raw provider, under hedging, deadlines,
+the limiter and single-flight, so each caller still has its own deadline
+and identical texts are still coalesced before they reach a batch. Only
+providers with ``synthesize_batch`` (Sarvam, synthetic) are wrapped. Keep
+the batch size within the provider's per-request input limit.
+
+    AGENT_BATCH=tts | off              kinds to batch (only tts supports it)
+    AGENT_BATCH_MAX_SIZE=8             texts per request
+    AGENT_BATCH_MAX_WAIT=0.02          seconds a call may wait behind a request in flight
+"""
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, Hashable, List, Tuple
+
+from .metrics import REGISTRY
+from .providers import ProviderError
+
+DEFAULT_KINDS = "tts"
+DEFAULT_MAX_SIZE = 8
+DEFAULT_MAX_WAIT = 0.02
+
+
+class MicroBatcher:
+    """Groups concurrent ``submit(key, item)`` calls into ``send(key, items)`` calls."""
+
+    def __init__(self, name: str, send: Callable[[Hashable, List], Awaitable[List]],
+                 max_size: int = DEFAULT_MAX_SIZE, max_wait: float = DEFAULT_MAX_WAIT):
+        self.send = send
+        self.max_size = max(1, max_size)
+        self.max_wait = max_wait
+        self._pending: Dict[Tuple[int, Hashable], List[Tuple[object, asyncio.Future]]] = {}
+        self._timers: Dict[Tuple[int, Hashable], asyncio.TimerHandle] = {}
+        self._sending: Dict[Tuple[int, Hashable], int] = {}  # requests in flight per slot
+
+        labels = {"provider": name}
+        REGISTRY.gauge("provider_batch_pending", "Calls waiting for a batch",
+                       lambda: sum(len(p) for p in self._pending.values()), **labels)
+        self.batches = REGISTRY.counter("provider_batches_total", "Batched requests sent", **labels)
+        self.sizes = REGISTRY.histogram("provider_batch_size", "Calls per batched request", **labels)
+
+    async def submit(self, key: Hashable, item):
+        loop = asyncio.get_running_loop()
+        # Futures are bound to their loop; keep loops apart like SingleFlight does
+        slot = (id(loop), key)
+        future = loop.create_future()
+        pending = self._pending.setdefault(slot, [])
+        pending.append((item, future))
+        if len(pending) >= self.max_size or not self._sending.get(slot):
+            self._flush(slot)
+        elif slot not in self._timers:
+            self._timers[slot] = loop.call_later(self.max_wait, self._flush, slot)
+        return await future
+
+    def _flush(self, slot):
+        timer = self._timers.pop(slot, None)
+        if timer is not None:
+            timer.cancel()
+        calls = [(item, future) for item, future in self._pending.pop(slot, []) if not future.done()]
+        if calls:
+            self._sending[slot] = self._sending.get(slot, 0) + 1
+            asyncio.ensure_future(self._send(slot, calls))
+
+    async def _send(self, slot, calls: List[Tuple[object, asyncio.Future]]):
+        self.batches.inc()
+        self.sizes.observe(len(calls))
+        try:
+            results = await self.send(slot[1], [item for item, _ in calls])
+            if len(results) != len(calls):
+                raise ProviderError(f"Batched call returned {len(results)} results for {len(calls)} inputs")
+        except Exception as e:
+            for _, future in calls:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future), result in zip(calls, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._sending[slot] -= 1
+            if not self._sending[slot]:
+                del self._sending[slot]
+            if slot in self._pending:
+                self._flush(slot)  # the calls that queued behind this request need not wait out the window
+
+
+class BatchingTTS:
+    """Sends concurrent ``synthesize`` calls through the inner provider's ``synthesize_batch``."""
+
+    def __init__(self, inner, max_size: int = DEFAULT_MAX_SIZE, max_wait: float = DEFAULT_MAX_WAIT):
+        self.inner = inner
+        self.name = f"batched({getattr(inner, 'name', type(inner).__name__)})"
+        self.model = getattr(inner, "tts_model", None)
+        self.batcher = MicroBatcher("tts", self._send, max_size, max_wait)
+
+    async def _send(self, key, texts: List[str]) -> List[str]:
+        _model, language_code, sample_rate = key
+        return await self.inner.synthesize_batch(texts, language_code, sample_rate)
+
+    async def synthesize(self, text, language_code="en-IN", sample_rate=8000):
+        return await self.batcher.submit((self.model, language_code, sample_rate), text)
+
+
+def batching_enabled(kind: str) -> bool:
+    setting = os.getenv("AGENT_BATCH", DEFAULT_KINDS).lower()
+    if setting in ("on", "1", "true", "all"):
+        return True
+    return kind in [k.strip() for k in setting.split(",")]
+
+
+def batch(kind: str, provider):
+    """Wraps a TTS ``provider`` that supports ``synthesize_batch`` if AGENT_BATCH enables it."""
+    if kind != "tts" or not batching_enabled(kind) or not hasattr(provider, "synthesize_batch"):
+        return provider
+    return BatchingTTS(provider, int(os.getenv("AGENT_BATCH_MAX_SIZE", DEFAULT_MAX_SIZE)),
+                       float(os.getenv("AGENT_BATCH_MAX_WAIT", DEFAULT_MAX_WAIT)))
@@ -0,0 +1,291 @@
+"""
+Bulk listing: dictate many products in one session.
+
+Instead of running the whole product questionnaire (and one summary LLM
+call) per crop, the farmer lists products in a few utterances ("tomatoes
+50 kg at 30 per kg, onions 2 quintals at Rs 25/kg; 300 coconuts"). Each
+utterance costs at most one extraction LLM call that returns every product
+it mentions as a row; rows are normalized and validated by the product form
+(see ``agent_core.normalize``). When the farmer says "done", all listing
+summaries are written by a single batched LLM call with per-item results;
+items the reply does not cover are summarized one by one as a fallback.
+
+The result is one prefilled product URL per row plus a bulk payload::
+
+    {"count": 2, "complete": 1, "items": [{"index": 1, "data": {...}, "url": "...",
+                                            "summary": "...", "missing": []}, ...]}
+
+Rows keep whatever fields were dictated; ``missing`` lists the rest so the
+prefilled URL can be completed in the app.
+"""
+import json
+import logging
+import re
+from typing import Dict, List, Optional
+
+from . import normalize
+from .forms import FORM_PROFILES, Form, load_forms
+from .products import phonetic_key
+from .providers import normalize_messages
+from .slots import extraction_mode, llm_failure_tolerated, parse_local
+
+logger = logging.getLogger(__name__)
+
+BULK_INTENT = "bulk"
+BULK_PROMPT_MARKER = "bulk listing extractor"
+BATCH_SUMMARY_MARKER = "batch listing writer"
+SUMMARY_ERROR = "[Error generating summary]"
+
+_FINISH = re.compile(r"^\s*(?:done|finish(?:ed)?|submit|that'?s all|no more|nothing else|stop)\s*[.!]*\s*$", re.I)
+# A comma between digits is a thousands separator ("1,200 kg", "1,20,000"), not a new item
+_SEPARATORS = re.compile(r"\s*(?:[;\n]|(?<!\d),|,(?!\d)|\band\b|\balso\b|\bthen\b|\bnext\b|\bplus\b)\s*", re.I)
+_WORD = re.compile(r"[^\W\d_][^\s\d.,/₹:;!?()\"]*")  # Indic vowel signs are not \w
+_FILLER = frozenset(
+    "i im i'm we all have has got want wanna to sell selling list listing add adding also and then of at for the "
+    "a an my our some about around approx approximately price priced rupees rs per each is are it its "
+    "many multiple several products product items item crops crop bulk these those following like with".split()
+)
+
+
+def is_finish(utterance: Optional[str]) -> bool:
+    return bool(utterance and _FINISH.match(utterance))
+
+
+def _name(text: str) -> str:
+    """Product name left after removing numbers, units and filler words."""
+    words = [w for w in _WORD.findall(text) if w.lower() not in _FILLER and not normalize.parse_unit(w)]
+    return " ".join(words).title()
+
+
+def split_items(utterance: str) -> List[str]:
+    """
+    One chunk per product. Pieces without a name ("2 quintals", "Rs 25/kg")
+    belong to the product before them.
+    """
+    items: List[str] = []
+    for piece in _SEPARATORS.split(normalize.clean(utterance)):
+        if not piece.strip():
+            continue
+        if items and not _name(piece):
+            items[-1] = f"{items[-1]} {piece}"
+        elif _name(piece):
+            items.append(piece)
+    return items
+
+
+def local_rows(form: Form, utterance: str) -> List[Dict[str, str]]:
+    """Rows from the local parser only: name from the words, numbers from ``agent_core.slots``."""
+    rows = []
+    name_field = form.by_slot.get("product_name")
+    for chunk in split_items(utterance):
+        slots = parse_local(chunk)
+        text = chunk
+        for found in (normalize.find_price(text), normalize.find_quantity(text)):
+            if found:
+                start, end = found[-1]
+                text = text[:start] + " " * (end - start) + text[end:]
+        if "quantity" not in slots:
+            # "300 coconuts": a number left over after the price is the quantity
+            left = normalize.numbers(text)
+            if left:
+                slots["quantity"] = str(normalize.tidy(left[0]))
+        slots["product_name"] = _name(text)
+        rows.append({form.by_slot[slot].key: value for slot, value in slots.items() if slot in form.by_slot})
+        if name_field is not None and not rows[-1].get(name_field.key):
+            rows.pop()
+    return rows
+
+
+def extraction_messages(form: Form, utterance: str) -> list:
+    lines = "\n".join(f"- {f.key}: {f.question}" for f in form.fields)
+    prompt = (
+        f"You are a {BULK_PROMPT_MARKER} for an agricultural marketplace.\n"
+        f"The farmer is listing several products at once. For every product mentioned, extract:\n{lines}\n"
+        "Return ONLY a JSON array with one object per product, mapping field names to string values. "
+        "Omit fields the message does not mention. Return [] if no product is mentioned."
+    )
+    return [("system", prompt), ("human", utterance)]
+
+
+def parse_rows(form: Form, content: Optional[str]) -> Optional[List[Dict[str, str]]]:
+    """Rows from the LLM reply, or None if it is not a JSON array."""
+    match = re.search(r"\[.*\]", content or "", re.S)
+    if not match:
+        return None
+    try:
+        raw = json.loads(match.group(0))
+    except ValueError:
+        return None
+    if not isinstance(raw, list):
+        return None
+    return [
+        {key: str(value).strip() for key, value in row.items()
+         if key in form.by_key and value is not None and str(value).strip()}
+        for row in raw if isinstance(row, dict)
+    ]
+
+
+def _plan(form: Form, utterance: Optional[str]):
+    """(local rows, whether to call the LLM)."""
+    if not utterance or not utterance.strip():
+        return [], False
+    return local_rows(form, utterance), extraction_mode() not in ("off", "0", "false", "local")
+
+
+def _validated(form: Form, rows: List[Dict[str, str]]) -> List[dict]:
+    result = []
+    for values in rows:
+        row: dict = {}
+        values = {f.key: values[f.key] for f in form.fields if f.key in values}
+        form.fill(row, values, 0, form.empty_url)  # validators type or drop each value
+        if row:
+            result.append(row)
+    return result
+
+
+def _local_wins(form: Form, key: str, value: str, llm_row: dict) -> bool:
+    """A parsed value is kept when the LLM gave none for its field or the same one once validated."""
+    field = form.by_key[key]
+    if field.validator is None:
+        return False
+    if key not in llm_row:
+        return True
+    parsed, llm_value = field.validate(value)[0], field.validate(llm_row[key])[0]
+    return parsed is not None and parsed == llm_value
+
+
+def _choose(form: Form, local: List[dict], llm_rows: Optional[List[dict]]) -> List[dict]:
+    # The LLM splits and names products better; the parser's numbers fill what the LLM left out and
+    # its normalized phrase is kept where both agree. Rows are paired in order when both found as many
+    # products, otherwise by product name.
+    if not llm_rows:
+        return local
+    if len(llm_rows) == len(local):
+        pairs = zip(llm_rows, local)
+    else:
+        name_key = form.by_slot["product_name"].key if "product_name" in form.by_slot else None
+        by_name = {phonetic_key(row[name_key]): row for row in local if name_key and row.get(name_key)}
+        pairs = [(llm_row, by_name.get(phonetic_key(llm_row.get(name_key) or ""), {})) for llm_row in llm_rows]
+    return [
+        {**llm_row, **{key: value for key, value in row.items() if _local_wins(form, key, value, llm_row)}}
+        for llm_row, row in pairs
+    ]
+
+
+def extract_rows(form: Form, utterance: Optional[str], llm) -> List[dict]:
+    """Validated product rows mentioned in ``utterance`` (at most one sync LLM call)."""
+    local, call = _plan(form, utterance)
+    llm_rows = None
+    if call:
+        with llm_failure_tolerated("Bulk extraction LLM call"):
+            llm_rows = parse_rows(form, llm.invoke(extraction_messages(form, utterance)).content)
+    return _validated(form, _choose(form, local, llm_rows))
+
+
+async def aextract_rows(form: Form, utterance: Optional[str], llm) -> List[dict]:
+    """Async variant of ``extract_rows``."""
+    local, call = _plan(form, utterance)
+    llm_rows = None
+    if call:
+        with llm_failure_tolerated("Bulk extraction LLM call"):
+            llm_rows = parse_rows(form, (await llm.ainvoke(extraction_messages(form, utterance))).content)
+    return _validated(form, _choose(form, local, llm_rows))
+
+
+def summary_messages(form: Form, rows: List[dict]) -> list:
+    items = "\n".join(f"{i}. {json.dumps(row, ensure_ascii=False)}" for i, row in enumerate(rows, 1))
+    prompt = (
+        f"You are a {BATCH_SUMMARY_MARKER}. {form.summary_instruction}\n"
+        "Do this separately for every numbered product below. Return ONLY a JSON array of "
+        "objects {\"index\": <number>, \"summary\": <text>}, one per product."
+    )
+    return [("system", prompt), ("human", items)]
+
+
+def parse_summaries(content: Optional[str], count: int) -> List[Optional[str]]:
+    """Summary per row (None where the reply has none)."""
+    summaries: List[Optional[str]] = [None] * count
+    match = re.search(r"\[.*\]", content or "", re.S)
+    try:
+        raw = json.loads(match.group(0)) if match else []
+    except ValueError:
+        raw = []
+    for entry in raw if isinstance(raw, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            index = int(entry.get("index")) - 1
+        except (TypeError, ValueError):
+            continue
+        text = str(entry.get("summary") or "").strip()
+        if 0 <= index < count and text:
+            summaries[index] = text
+    return summaries
+
+
+def summarize_rows(form: Form, rows: List[dict], llm) -> List[str]:
+    """One batched LLM call for every row; rows it misses get their own call."""
+    summaries: List[Optional[str]] = [None] * len(rows)
+    if rows:
+        with llm_failure_tolerated("Batched summary LLM call"):
+            summaries = parse_summaries(llm.invoke(summary_messages(form, rows)).content, len(rows))
+    for i in _unsummarized(summaries):
+        with llm_failure_tolerated(f"Summary for bulk item {i + 1}"):
+            summaries[i] = llm.invoke(form.summary_prompt(rows[i])).content.strip()
+    return summaries
+
+
+async def asummarize_rows(form: Form, rows: List[dict], llm) -> List[str]:
+    """Async variant of ``summarize_rows``."""
+    summaries: List[Optional[str]] = [None] * len(rows)
+    if rows:
+        with llm_failure_tolerated("Batched summary LLM call"):
+            summaries = parse_summaries((await llm.ainvoke(summary_messages(form, rows))).content, len(rows))
+    for i in _unsummarized(summaries):
+        with llm_failure_tolerated(f"Summary for bulk item {i + 1}"):
+            summaries[i] = (await llm.ainvoke(form.summary_prompt(rows[i]))).content.strip()
+    return summaries
+
+
+def _unsummarized(summaries: List[Optional[str]]) -> List[int]:
+    """Indexes the batched reply did not cover, each set to ``SUMMARY_ERROR`` until its own call succeeds."""
+    missing = [i for i, summary in enumerate(summaries) if summary is None]
+    for i in missing:
+        summaries[i] = SUMMARY_ERROR
+    return missing
+
+
+def bulk_result(form: Form, rows: List[dict], summaries: Optional[List[str]] = None) -> dict:
+    """The bulk payload: one prefilled URL (and summary) per row."""
+    items = []
+    for i, row in enumerate(rows):
+        items.append({
+            "index": i + 1,
+            "data": row,
+            "url": form.url(row),
+            "summary": summaries[i] if summaries else None,
+            "missing": [f.key for f in form.fields if f.key not in row],
+        })
+    return {"count": len(items), "complete": sum(1 for item in items if not item["missing"]), "items": items}
+
+
+def synthetic_bulk(messages) -> Optional[str]:
+    """
+    Stand-in replies for the fakes/stubs: rows from the local parser for
+    extraction prompts, a JSON summary array for batched summaries. None for
+    any other prompt.
+    """
+    pairs = normalize_messages(messages)
+    system = " ".join(content for role, content in pairs if role == "system")
+    user = " ".join(content for role, content in pairs if role != "system")
+    if BULK_PROMPT_MARKER in system:
+        keys = re.findall(r"^- (\w+): ", system, re.M)
+        forms = (load_forms(profile).get("product") for profile in FORM_PROFILES)
+        form = next((f for f in forms if [field.key for field in f.fields] == keys), None)
+        return json.dumps(local_rows(form, user) if form else [], ensure_ascii=False)
+    if BATCH_SUMMARY_MARKER in system:
+        return json.dumps([
+            {"index": int(index), "summary": "Fresh, farm-picked produce grown with care. Order today."}
+            for index in re.findall(r"^(\d+)\. ", user, re.M)
+        ])
+    return None
@@ -0,0 +1,114 @@
+"""
+Per-turn deadlines for provider calls.
+
+A backend opens a turn with ``turn_deadline()`` (or ``start_turn()``) when a
+user message arrives. The deadline lives in a ContextVar, so it follows the
+turn through awaits, tasks and ``asyncio.to_thread``. Every provider call then gets a budget:
+its share of the turn SLO, clipped to whatever is left of the turn.
+
+    AGENT_TURN_SLO=12                 seconds for a whole turn
+    AGENT_STAGE_BUDGET_<KIND>=0.3     fraction of the SLO one call may use
+
+Outside a turn (scripts, background jobs) calls still get their stage share
+of the default SLO, so a hung request can never pin a thread forever.
+"""
+import asyncio
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from .providers import ProviderTimeout
+
+DEFAULT_TURN_SLO = 12.0
+# One call's share of the turn. Translate and LLM run up to twice per turn.
+DEFAULT_STAGE_BUDGETS = {"stt": 0.3, "translate": 0.1, "llm": 0.35, "tts": 0.25}
+MIN_BUDGET = 0.05
+
+_turn: contextvars.ContextVar = contextvars.ContextVar("agent_turn_deadline", default=None)
+
+
+class DeadlineExceeded(ProviderTimeout):
+    """The turn ran out of time before (or while) calling a provider."""
+
+
+def turn_slo() -> float:
+    return float(os.getenv("AGENT_TURN_SLO", DEFAULT_TURN_SLO))
+
+
+def stage_share(kind: str) -> float:
+    return float(os.getenv(f"AGENT_STAGE_BUDGET_{kind.upper()}", DEFAULT_STAGE_BUDGETS.get(kind, 0.25)))
+
+
+def start_turn(slo: Optional[float] = None) -> contextvars.Token:
+    """
+    Sets the turn deadline for the current context. Request handlers that run
+    in their own task (FastAPI endpoints) can call this and never reset it.
+    """
+    slo = turn_slo() if slo is None else slo
+    return _turn.set((time.monotonic() + slo, slo))
+
+
+@contextmanager
+def turn_deadline(slo: Optional[float] = None):
+    """Starts a turn: provider calls made inside share a deadline ``slo`` seconds away."""
+    token = start_turn(slo)
+    try:
+        yield
+    finally:
+        _turn.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current turn, or None outside a turn."""
+    turn = _turn.get()
+    if turn is None:
+        return None
+    return turn[0] - time.monotonic()
+
+
+def budget(kind: str) -> float:
+    """Timeout for one ``kind`` call right now. Raises DeadlineExceeded if the turn is spent."""
+    turn = _turn.get()
+    if turn is None:
+        return stage_share(kind) * turn_slo()
+    deadline, slo = turn
+    left = deadline - time.monotonic()
+    if left < MIN_BUDGET:
+        raise DeadlineExceeded(f"Turn deadline exceeded before {kind} call")
+    return min(left, stage_share(kind) * slo)
+
+
+class DeadlineProvider:
+    """Bounds every async call of the wrapped provider by its stage budget."""
+
+    def __init__(self, kind: str, inner):
+        self.kind = kind
+        self.inner = inner
+        self.name = getattr(inner, "name", type(inner).__name__)
+
+    async def _call(self, method: str, *args):
+        timeout = budget(self.kind)
+        try:
+            return await asyncio.wait_for(getattr(self.inner, method)(*args), timeout)
+        except asyncio.TimeoutError as e:
+            if isinstance(e, ProviderTimeout):
+                raise
+            raise DeadlineExceeded(f"{self.kind} call exceeded its {timeout:.2f}s budget") from None
+
+    def invoke(self, messages):
+        # Synchronous callers cannot be interrupted; the live clients carry their own timeouts
+        return self.inner.invoke(messages)
+
+    async def ainvoke(self, messages):
+        return await self._call("ainvoke", messages)
+
+    async def transcribe(self, audio_bytes, filename="audio.wav", prompt=""):
+        return await self._call("transcribe", audio_bytes, filename, prompt)
+
+    async def translate(self, text, source_language_code, target_language_code):
+        return await self._call("translate", text, source_language_code, target_language_code)
+
+    async def synthesize(self, text, language_code="en-IN", sample_rate=8000):
+        return await self._call("synthesize", text, language_code, sample_rate)
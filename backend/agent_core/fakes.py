@@ -0,0 +1,337 @@
+"""
+Offline provider backends for performance testing.
+
+* Synthetic backends answer deterministically (seeded RNG) after a delay drawn
+  from a ``FaultProfile``: latency distribution, jitter, error / timeout
+  injection and an optional throughput cap.
+* ``RecordingProvider`` wraps any provider and appends every call and result
+  to a JSONL file; ``ReplayProvider`` serves those results back offline.
+"""
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import wave
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .latency import LatencyModel
+from .providers import (
+    LLMProvider, LLMResult, ProviderError, ProviderTimeout, STTProvider,
+    TTSProvider, TranslateProvider, normalize_messages,
+)
+from .bulk import synthetic_bulk
+from .slots import synthetic_extraction
+
+logger = logging.getLogger(__name__)
+
+
+class _TokenBucket:
+    """Thread-safe rate limiter; ``reserve`` returns how long the caller must wait."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1.0
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class FaultProfile:
+    """How a synthetic provider misbehaves: delay, jitter, errors, timeouts, rate cap."""
+
+    def __init__(self, latency="const:0", jitter: float = 0.0, error_rate: float = 0.0,
+                 timeout_rate: float = 0.0, timeout_after: float = 30.0, max_rps: Optional[float] = None):
+        self.latency = LatencyModel.parse(latency)
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_after = timeout_after
+        self.bucket = _TokenBucket(max_rps) if max_rps else None
+
+    @classmethod
+    def from_env(cls, kind: str, default_latency: Optional[str] = None) -> "FaultProfile":
+        def get(name, default=None):
+            return os.getenv(f"AGENT_FAKE_{name}_{kind.upper()}", os.getenv(f"AGENT_FAKE_{name}", default))
+
+        max_rps = get("MAX_RPS")
+        return cls(
+            latency=get("LATENCY", default_latency or "const:0"),
+            jitter=float(get("JITTER", "0")),
+            error_rate=float(get("ERROR_RATE", "0")),
+            timeout_rate=float(get("TIMEOUT_RATE", "0")),
+            timeout_after=float(get("TIMEOUT_AFTER", "30")),
+            max_rps=float(max_rps) if max_rps else None,
+        )
+
+    def _plan(self, rng: random.Random) -> Tuple[float, Optional[ProviderError]]:
+        wait = self.bucket.reserve() if self.bucket else 0.0
+        roll = rng.random()
+        if roll < self.timeout_rate:
+            return wait + self.timeout_after, ProviderTimeout("injected timeout")
+        delay = self.latency.sample(rng) + (rng.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if roll < self.timeout_rate + self.error_rate:
+            return wait + max(0.0, delay), ProviderError("injected error")
+        return wait + max(0.0, delay), None
+
+    async def apply(self, rng: random.Random):
+        delay, error = self._plan(rng)
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+
+    def apply_sync(self, rng: random.Random):
+        delay, error = self._plan(rng)
+        time.sleep(delay)
+        if error:
+            raise error
+
+
+# --- Deterministic response generators ---
+def default_llm_responder(messages) -> str:
+    """Plausible answers for the prompts the backends send."""
+    pairs = normalize_messages(messages)
+    system = " ".join(content for role, content in pairs if role == "system").lower()
+    user = " ".join(content for role, content in pairs if role != "system").lower()
+    if "intent classifier" in system:
+        return "post" if re.search(r"\b(post|advertis|caption)", user) else "product"
+    extracted = synthetic_extraction(pairs) or synthetic_bulk(pairs)
+    if extracted is not None:
+        return extracted
+    return "Fresh, farm-picked produce grown with care. Order today for doorstep delivery."
+
+
+def silent_wav_base64(text: str, sample_rate: int = 8000, seconds_per_char: float = 0.06) -> str:
+    """Silent WAV whose duration scales with text length, like real TTS output."""
+    n_samples = max(1, int(sample_rate * seconds_per_char * len(text)))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(b"\x00\x00" * n_samples)
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+class SyntheticLLM(LLMProvider):
+    name = "synthetic-llm"
+
+    def __init__(self, profile: FaultProfile, seed: int = 0, responder: Callable = default_llm_responder):
+        self.profile = profile
+        self.rng = random.Random(seed)
+        self.responder = responder
+
+    def invoke(self, messages):
+        self.profile.apply_sync(self.rng)
+        return LLMResult(self.responder(messages))
+
+    async def ainvoke(self, messages):
+        await self.profile.apply(self.rng)
+        return LLMResult(self.responder(messages))
+
+
+class SyntheticSTT(STTProvider):
+    """Returns the transcript registered for an audio payload, else a fixed one."""
+
+    name = "synthetic-stt"
+
+    def __init__(self, profile: FaultProfile, seed: int = 0, language_code: str = "en-IN"):
+        self.profile = profile
+        self.rng = random.Random(seed)
+        self.language_code = language_code
+        self.transcripts: Dict[str, Tuple[str, str]] = {}
+
+    def register(self, audio_bytes: bytes, transcript: str, language_code: str = "en-IN"):
+        self.transcripts[hashlib.sha256(audio_bytes).hexdigest()] = (transcript, language_code)
+
+    async def transcribe(self, audio_bytes: bytes, filename: str = "audio.wav", prompt: str = ""):
+        await self.profile.apply(self.rng)
+        return self.transcripts.get(
+            hashlib.sha256(audio_bytes).hexdigest(),
+            (f"Dummy transcription in {self.language_code} ({len(audio_bytes)} bytes)", self.language_code),
+        )
+
+
+class SyntheticTranslate(TranslateProvider):
+    name = "synthetic-translate"
+
+    def __init__(self, profile: FaultProfile, seed: int = 0):
+        self.profile = profile
+        self.rng = random.Random(seed)
+
+    async def translate(self, text: str, source_language_code: str, target_language_code: str) -> str:
+        if source_language_code == target_language_code:
+            return text
+        await self.profile.apply(self.rng)
+        return f"Translated '{text}' to {target_language_code}"
+
+
+class SyntheticTTS(TTSProvider):
+    name = "synthetic-tts"
+
+    def __init__(self, profile: FaultProfile, seed: int = 0):
+        self.profile = profile
+        self.rng = random.Random(seed)
+
+    async def synthesize(self, text: str, language_code: str = "en-IN", sample_rate: int = 8000) -> str:
+        await self.profile.apply(self.rng)
+        return silent_wav_base64(text, sample_rate)
+
+    async def synthesize_batch(self, texts: List[str], language_code: str = "en-IN",
+                               sample_rate: int = 8000) -> List[str]:
+        """One simulated request (one latency sample, one rate-limit slot) for all texts."""
+        await self.profile.apply(self.rng)
+        return [silent_wav_base64(text, sample_rate) for text in texts]
+
+
+SYNTHETIC_BACKENDS = {
+    "llm": SyntheticLLM,
+    "stt": SyntheticSTT,
+    "translate": SyntheticTranslate,
+    "tts": SyntheticTTS,
+}
+
+
+# --- Record / replay ---
+def _call_key(kind: str, args: tuple) -> str:
+    if kind == "stt":
+        args = (args[0],) + tuple(args[2:])  # upload filenames carry timestamps; ignore them
+    canonical = []
+    for arg in args:
+        if isinstance(arg, (bytes, bytearray)):
+            canonical.append({"sha256": hashlib.sha256(arg).hexdigest()})
+        elif kind == "llm" and not isinstance(arg, (int, float)):
+            canonical.append(normalize_messages(arg))
+        else:
+            canonical.append(arg)
+    raw = json.dumps([kind, canonical], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _to_record(kind: str, result):
+    return result.content if kind == "llm" else result
+
+
+def _from_record(kind: str, value):
+    if kind == "llm":
+        return LLMResult(value)
+    if kind == "stt":
+        return tuple(value)
+    return value
+
+
+class RecordingProvider:
+    """Wraps a provider and appends ``{key, kind, result, latency}`` per call to a JSONL file."""
+
+    def __init__(self, kind: str, inner, path: str):
+        self.kind = kind
+        self.inner = inner
+        self.path = path
+        self.name = f"recording({getattr(inner, 'name', type(inner).__name__)})"
+        self._lock = threading.Lock()
+
+    def _write(self, args: tuple, result, started: float):
+        record = {
+            "key": _call_key(self.kind, args),
+            "kind": self.kind,
+            "result": _to_record(self.kind, result),
+            "latency": round(time.monotonic() - started, 6),
+        }
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    async def _acall(self, method: str, *args):
+        started = time.monotonic()
+        result = await getattr(self.inner, method)(*args)
+        self._write(args, result, started)
+        return result
+
+    def invoke(self, messages):
+        started = time.monotonic()
+        result = self.inner.invoke(messages)
+        self._write((messages,), result, started)
+        return result
+
+    async def ainvoke(self, messages):
+        return await self._acall("ainvoke", messages)
+
+    async def transcribe(self, audio_bytes, filename="audio.wav", prompt=""):
+        return await self._acall("transcribe", audio_bytes, filename, prompt)
+
+    async def translate(self, text, source_language_code, target_language_code):
+        return await self._acall("translate", text, source_language_code, target_language_code)
+
+    async def synthesize(self, text, language_code="en-IN", sample_rate=8000):
+        return await self._acall("synthesize", text, language_code, sample_rate)
+
+
+class ReplayProvider:
+    """
+    Serves results recorded by RecordingProvider. By default each call waits
+    for the latency that was recorded; a non-zero FaultProfile latency replaces it.
+    """
+
+    def __init__(self, kind: str, path: str, profile: Optional[FaultProfile] = None, seed: int = 0):
+        self.kind = kind
+        self.profile = profile
+        self.rng = random.Random(seed)
+        self.name = f"replay({os.path.basename(path)})"
+        self.calls: Dict[str, list] = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record["kind"] == kind:
+                    self.calls.setdefault(record["key"], []).append(record)
+        self._cursor: Dict[str, int] = {}
+
+    def _next(self, args: tuple) -> Tuple[dict, bool]:
+        key = _call_key(self.kind, args)
+        records = self.calls.get(key)
+        if not records:
+            raise ProviderError(f"No recorded {self.kind} call matches this request")
+        index = self._cursor.get(key, 0)
+        self._cursor[key] = index + 1
+        use_profile = self.profile is not None and self.profile.latency.params != (0.0,)
+        return records[index % len(records)], use_profile
+
+    async def _areplay(self, *args):
+        record, use_profile = self._next(args)
+        if use_profile:
+            await self.profile.apply(self.rng)
+        else:
+            await asyncio.sleep(record["latency"])
+        return _from_record(self.kind, record["result"])
+
+    def invoke(self, messages):
+        record, use_profile = self._next((messages,))
+        if use_profile:
+            self.profile.apply_sync(self.rng)
+        else:
+            time.sleep(record["latency"])
+        return _from_record(self.kind, record["result"])
+
+    async def ainvoke(self, messages):
+        return await self._areplay(messages)
+
+    async def transcribe(self, audio_bytes, filename="audio.wav", prompt=""):
+        return await self._areplay(audio_bytes, filename, prompt)
+
+    async def translate(self, text, source_language_code, target_language_code):
+        return await self._areplay(text, source_language_code, target_language_code)
+
+    async def synthesize(self, text, language_code="en-IN", sample_rate=8000):
+        return await self._areplay(text, language_code, sample_rate)
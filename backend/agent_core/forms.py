@@ -0,0 +1,305 @@
+"""
+Declarative form definitions shared by every backend.
+
+The product/post questionnaires used to be copy-pasted into each script
+together with ``generate_url`` and the field scan in ``run_form_step``. They
+are now declared once in ``FORM_PROFILES`` and compiled at import time into
+``Form`` objects:
+
+* every field gets a bit; the answered fields of a session are an int mask,
+  and a table indexed by that mask gives the next field to ask in O(1);
+* URL query keys are quoted once at compile time;
+* the progress URL is extended with one ``&key=value`` per answer instead of
+  being rebuilt from the whole answer dict every turn.
+
+Each profile also holds the questions and the summary prompt of its forms.
+A field spec is ``(key, question[, slot role[, base unit]])``; the slot role
+tells ``agent_core.slots`` which field a free-form utterance fills, and a
+role with a validator in ``agent_core.normalize`` (price, quantity, unit) is
+parsed when saved. A rejected answer is not saved and the step carries the
+``error``. Two profiles exist: "example" (the demo URLs used by the
+websocket/HTTP/Flask/graph backends) and "app" (the in-app ``/app/add/...``
+routes used by single-function.py). ``PAGE_INTENTS`` maps frontend pages to
+the intent of the form they add with.
+"""
+import json
+import urllib.parse
+from typing import Dict, List, Optional, Tuple
+
+from .normalize import VALIDATORS
+
+DEFAULT_INTENT = "product"
+
+# Frontend pages (path prefixes) the assistant can be opened from -> the form they add with
+PAGE_INTENTS = {
+    "/app/add/product": "product",
+    "/app/add/post": "post",
+    "/farmer/add/product": "product",
+    "/farmer/add/post": "post",
+}
+
+FORM_PROFILES = {
+    "example": {
+        "product": {
+            "base_url": "https://example.com/post-product",
+            "summary": "You are a marketplace assistant. Using the details below, "
+                       "write a short, compelling product listing (max 60 words).",
+            "fields": [
+                ("ProductName",               "What is the product name?", "product_name"),
+                ("Category",                  "Which category does it belong to?", "category"),
+                ("Description_about_the_crop", "Briefly describe the crop.", "description"),
+                ("Price_per_kg",              "Price per kg (numbers only).", "price", "kg"),
+                ("Total_quantity_produced",   "Total quantity produced, in kg (numbers only).", "quantity", "kg"),
+            ],
+        },
+        "post": {
+            "base_url": "https://example.com/post-existing-product",
+            "summary": "You are a social‑media assistant. Combine the details below "
+                       "into a catchy post caption (max 40 words).",
+            "fields": [
+                ("ExistingProduct",   "Which existing product do you want to post?", "product_ref"),
+                ("Caption",           "What caption would you like to use?"),
+                ("AdditionalMessage", "Any additional message? (or 'none')"),
+            ],
+        },
+    },
+    "app": {
+        "product": {
+            "base_url": "/app/add/product",
+            "summary": "You are a marketplace assistant. Using the details below, "
+                       "write a short, compelling product listing (max 60 words).",
+            "fields": [
+                ("name",        "What is the product name?", "product_name"),
+                ("category",    "Which category does it belong to?", "category"),
+                ("description", "Briefly describe the crop.", "description"),
+                ("price",       "Price per kg (numbers only).", "price", "kg"),
+                ("quantity",    "Total quantity produced, in kg (numbers only).", "quantity", "kg"),
+                ("unit",        "units in", "unit", "kg"),
+            ],
+        },
+        "post": {
+            "base_url": "/app/add/post",
+            "summary": "You are a social‑media assistant. Combine the details below "
+                       "into a catchy post caption (max 40 words).",
+            "fields": [
+                ("productId", "Which existing product do you want to post?", "product_ref"),
+                ("content",   "What caption would you like to use?"),
+            ],
+        },
+    },
+}
+
+
+def _has_value(value) -> bool:
+    return value is not None and str(value).strip() != ""
+
+
+class Field:
+    __slots__ = ("key", "question", "index", "bit", "url_key", "slot", "unit", "validator")
+
+    def __init__(self, key: str, question: str, index: int, slot: Optional[str] = None, unit: Optional[str] = None):
+        self.key = key
+        self.question = question
+        self.slot = slot
+        self.unit = unit
+        self.validator = VALIDATORS.get(slot)
+        self.index = index
+        self.bit = 1 << index
+        self.url_key = urllib.parse.quote_plus(key.replace("_", "-"))
+
+    def __repr__(self) -> str:
+        return f"Field({self.key!r})"
+
+    def validate(self, value):
+        """(typed value, None) or (None, error message); fields without a validator pass through."""
+        if self.validator is None:
+            return value, None
+        return self.validator(str(value), self.unit)
+
+
+class FormStep:
+    """
+    Outcome of one form turn: the next field to ask (None when done), the
+    progress URL and, if the answer to that field was rejected, why.
+    """
+
+    __slots__ = ("field", "url", "mask", "saved_keys", "error")
+
+    def __init__(self, field: Optional[Field], url: str, mask: int, saved_keys: Tuple[str, ...] = (),
+                 error: Optional[str] = None):
+        self.field = field
+        self.url = url
+        self.mask = mask
+        self.saved_keys = saved_keys
+        self.error = error
+
+    @property
+    def done(self) -> bool:
+        return self.field is None
+
+    @property
+    def key(self) -> Optional[str]:
+        return self.field.key if self.field else None
+
+    @property
+    def question(self) -> Optional[str]:
+        return self.field.question if self.field else None
+
+    @property
+    def prompt(self) -> Optional[str]:
+        """The question, prefixed with the validation error when it is being asked again."""
+        if self.field is None:
+            return None
+        return f"{self.error} {self.field.question}" if self.error else self.field.question
+
+
+class Form:
+    """One compiled questionnaire (e.g. "product")."""
+
+    def __init__(self, intent: str, base_url: str, fields: List[tuple], summary: str):
+        self.intent = intent
+        self.base_url = base_url
+        self.summary_instruction = summary
+        self.fields = tuple(Field(spec[0], spec[1], i, *spec[2:]) for i, spec in enumerate(fields))
+        self.by_key: Dict[str, Field] = {f.key: f for f in self.fields}
+        self.by_slot: Dict[str, Field] = {f.slot: f for f in self.fields if f.slot}
+        self.full_mask = (1 << len(self.fields)) - 1
+        self.empty_url = base_url if base_url.endswith("?") else base_url + "?"
+        # next_field[mask] = first field whose bit is not set in mask (None once complete)
+        self._next: List[Optional[Field]] = [
+            next((f for f in self.fields if not mask & f.bit), None) for mask in range(self.full_mask + 1)
+        ]
+
+    @property
+    def pairs(self) -> List[Tuple[str, str]]:
+        """The legacy ``[(key, question), ...]`` list."""
+        return [(f.key, f.question) for f in self.fields]
+
+    def first_field(self) -> Field:
+        return self.fields[0]
+
+    def mask_of(self, data: dict) -> int:
+        mask = 0
+        for key in data:
+            field = self.by_key.get(key)
+            if field is not None:
+                mask |= field.bit
+        return mask
+
+    def next_field(self, mask: int) -> Optional[Field]:
+        return self._next[mask & self.full_mask]
+
+    def url(self, data: dict) -> str:
+        """Full URL for ``data`` (query params in answer order, blank values skipped)."""
+        params = "&".join(
+            f"{self.by_key[k].url_key if k in self.by_key else urllib.parse.quote_plus(k.replace('_', '-'))}="
+            f"{urllib.parse.quote_plus(str(v))}"
+            for k, v in data.items() if _has_value(v)
+        )
+        return self.empty_url + params
+
+    def extend_url(self, url: str, field: Field, value) -> str:
+        if not _has_value(value):
+            return url
+        separator = "" if url.endswith("?") else "&"
+        return f"{url}{separator}{field.url_key}={urllib.parse.quote_plus(str(value))}"
+
+    def advance(self, data: dict, answer_key: Optional[str] = None, answer: Optional[str] = None,
+                mask: Optional[int] = None, url: Optional[str] = None) -> FormStep:
+        """
+        Saves ``answer`` under ``answer_key`` (if given) into ``data`` and
+        returns the next step. ``mask``/``url`` are the values from the
+        previous step; without them they are derived from ``data`` once.
+        """
+        values = {answer_key: answer} if answer_key is not None and answer is not None else {}
+        return self.fill(data, values, mask, url)
+
+    def fill(self, data: dict, values: Dict[str, str], mask: Optional[int] = None,
+             url: Optional[str] = None) -> FormStep:
+        """
+        Like ``advance`` but saves any number of ``{key: value}`` answers at
+        once. Values failing their field's validator are dropped.
+        """
+        if mask is None or url is None:
+            mask, url = self.mask_of(data), self.url(data)
+        rebuild = False
+        saved = []
+        errors = {}
+        for key, value in values.items():
+            value = value.strip() if isinstance(value, str) else value
+            field = self.by_key.get(key)
+            if field is not None and field.validator is not None:
+                value, error = field.validate(value)
+                if error:
+                    errors[key] = error
+                    continue
+            saved.append(key)
+            if field is None or key in data:
+                rebuild = True  # order/contents of earlier params changed
+            elif not rebuild:
+                url = self.extend_url(url, field, value)
+            data[key] = value
+            if field is not None:
+                mask |= field.bit
+        if rebuild:
+            url = self.url(data)
+        field = self.next_field(mask)
+        return FormStep(field, url, mask, tuple(saved), errors.get(field.key) if field else None)
+
+    def summary_prompt(self, data: dict) -> str:
+        return f"{self.summary_instruction}\nDetails: {json.dumps(data, ensure_ascii=False)}"
+
+
+class FormRegistry:
+    """All forms of one profile, keyed by intent."""
+
+    def __init__(self, profile: str, specs: dict):
+        self.profile = profile
+        self.forms: Dict[str, Form] = {
+            intent: Form(intent, spec["base_url"], spec["fields"], spec["summary"]) for intent, spec in specs.items()
+        }
+
+    @property
+    def intents(self) -> Tuple[str, ...]:
+        return tuple(self.forms)
+
+    def get(self, intent: Optional[str]) -> Form:
+        return self.forms.get(intent or DEFAULT_INTENT) or self.forms[DEFAULT_INTENT]
+
+    def parse_intent(self, reply: Optional[str], extra: Tuple[str, ...] = ()) -> Tuple[str, bool]:
+        """
+        (intent, recognized) from a classifier reply; unknown replies fall back
+        to "product". ``extra`` are intents without a form of their own (e.g. "bulk").
+        """
+        intent = reply.strip().lower().split()[0] if reply and reply.strip() else ""
+        if intent in self.forms or intent in extra:
+            return intent, True
+        return DEFAULT_INTENT, False
+
+    def intent_for_page(self, page: Optional[str]) -> Optional[str]:
+        """
+        The intent of a page-context hint: a frontend path or URL from
+        ``PAGE_INTENTS`` ("/farmer/add/post", "https://host/app/add/product?x=1")
+        or an intent name ("post"). None when the page is not one form's.
+        """
+        if not page or not page.strip():
+            return None
+        hint = page.strip().lower()
+        if hint in self.forms:
+            return hint
+        path = urllib.parse.urlsplit(hint).path.rstrip("/")
+        for prefix, intent in PAGE_INTENTS.items():
+            if (path == prefix or path.startswith(prefix + "/")) and intent in self.forms:
+                return intent
+        return None
+
+
+_registries: Dict[str, FormRegistry] = {}
+
+
+def load_forms(profile: str = "example") -> FormRegistry:
+    """Compiled registry for ``profile``; compiled once per process."""
+    registry = _registries.get(profile)
+    if registry is None:
+        registry = _registries[profile] = FormRegistry(profile, FORM_PROFILES[profile])
+    return registry
@@ -0,0 +1,180 @@
+"""
+Hedged provider calls.
+
+If a call has not finished after the observed p95 latency, a second identical
+request is sent and whichever finishes first wins; the loser is cancelled.
+Only the slowest ~5% of calls are hedged, so the extra load is small, and a
+token bucket caps hedges at a fixed fraction of calls so a provider-wide
+slowdown cannot double our traffic.
+
+    AGENT_HEDGE=stt,tts | on | off      kinds to hedge (default off)
+    AGENT_HEDGE_QUANTILE=95             latency quantile used as hedge delay
+    AGENT_HEDGE_MAX_RATE=0.1            max hedges per call
+    AGENT_HEDGE_MIN_SAMPLES=20          calls observed before hedging starts
+
+STT, translation and TTS are idempotent reads; hedging the LLM doubles token
+spend on slow calls and is left to the operator. Calls made inside
+``speculative()`` (prefetching) are never hedged and take no hedge tokens:
+the budget is kept for replies someone is waiting for.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+from . import deadline
+from .metrics import REGISTRY
+
+
+_speculative: contextvars.ContextVar = contextvars.ContextVar("agent_speculative", default=False)
+
+
+@contextmanager
+def speculative():
+    """Calls made inside are work nobody waits for yet: they are not hedged."""
+    token = _speculative.set(True)
+    try:
+        yield
+    finally:
+        _speculative.reset(token)
+
+
+class HedgePolicy:
+    """Tracks recent latencies and decides when (and whether) to hedge."""
+
+    def __init__(self, name: str, quantile: float = 95.0, max_rate: float = 0.1,
+                 min_samples: int = 20, window: int = 512, burst: float = 5.0):
+        self.quantile = quantile
+        self.max_rate = max_rate
+        self.min_samples = min_samples
+        self.burst = burst
+        self.samples = deque(maxlen=window)
+        self.tokens = burst
+        self.delay: Optional[float] = None
+        self._since_refresh = 0
+        self._lock = threading.Lock()
+
+        labels = {"provider": name}
+        REGISTRY.gauge("provider_hedge_delay_seconds", "Current hedge delay", lambda: self.delay or 0.0, **labels)
+        self.hedged = REGISTRY.counter("provider_hedged_total", "Calls that sent a hedge request", **labels)
+        self.hedge_wins = REGISTRY.counter("provider_hedge_wins_total", "Calls won by the hedge request", **labels)
+        self.throttled = REGISTRY.counter("provider_hedge_throttled_total", "Hedges skipped by the rate cap", **labels)
+
+    @classmethod
+    def from_env(cls, kind: str) -> "HedgePolicy":
+        def get(name: str, default: float) -> float:
+            return float(os.getenv(f"AGENT_HEDGE_{name}", default))
+
+        return cls(kind, quantile=get("QUANTILE", 95), max_rate=get("MAX_RATE", 0.1),
+                   min_samples=int(get("MIN_SAMPLES", 20)))
+
+    def observe(self, latency: float):
+        with self._lock:
+            self.samples.append(latency)
+            self._since_refresh += 1
+            if len(self.samples) >= self.min_samples and (self.delay is None or self._since_refresh >= 32):
+                ordered = sorted(self.samples)
+                self.delay = ordered[min(len(ordered) - 1, int(self.quantile / 100.0 * len(ordered)))]
+                self._since_refresh = 0
+
+    def on_call(self) -> Optional[float]:
+        """Registers a call; returns the hedge delay, or None while still warming up."""
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + self.max_rate)
+            return self.delay
+
+    def try_hedge(self) -> bool:
+        with self._lock:
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return True
+        self.throttled.inc()
+        return False
+
+
+class HedgedProvider:
+    """Sends a backup request for calls that run past the policy's hedge delay."""
+
+    def __init__(self, kind: str, inner, policy: HedgePolicy):
+        self.kind = kind
+        self.inner = inner
+        self.policy = policy
+        self.name = f"hedged({getattr(inner, 'name', type(inner).__name__)})"
+
+    def _attempt(self, method: str, args: tuple) -> asyncio.Future:
+        started = time.monotonic()
+        task = asyncio.ensure_future(getattr(self.inner, method)(*args))
+
+        def done(t: asyncio.Future):
+            if not t.cancelled() and t.exception() is None:
+                self.policy.observe(time.monotonic() - started)
+
+        task.add_done_callback(done)
+        return task
+
+    async def _call(self, method: str, *args):
+        if _speculative.get():
+            return await getattr(self.inner, method)(*args)
+        delay = self.policy.on_call()
+        primary = self._attempt(method, args)
+        tasks = [primary]
+        try:
+            if delay is None:
+                return await primary
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            left = deadline.remaining()
+            if done or (left is not None and left <= delay) or not self.policy.try_hedge():
+                return await primary
+            self.policy.hedged.inc()
+            tasks.append(self._attempt(method, args))
+            return await self._first_success(tasks)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _first_success(self, tasks: list):
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is tasks[1]:
+                        self.policy.hedge_wins.inc()
+                    return task.result()
+                error = task.exception()
+        raise error
+
+    def invoke(self, messages):
+        return self.inner.invoke(messages)
+
+    async def ainvoke(self, messages):
+        return await self._call("ainvoke", messages)
+
+    async def transcribe(self, audio_bytes, filename="audio.wav", prompt=""):
+        return await self._call("transcribe", audio_bytes, filename, prompt)
+
+    async def translate(self, text, source_language_code, target_language_code):
+        return await self._call("translate", text, source_language_code, target_language_code)
+
+    async def synthesize(self, text, language_code="en-IN", sample_rate=8000):
+        return await self._call("synthesize", text, language_code, sample_rate)
+
+
+def hedging_enabled(kind: str) -> bool:
+    setting = os.getenv("AGENT_HEDGE", "off").lower()
+    if setting in ("on", "1", "true", "all"):
+        return True
+    return kind in [k.strip() for k in setting.split(",")]
+
+
+def hedge(kind: str, provider):
+    """Wraps ``provider`` in a HedgedProvider if AGENT_HEDGE enables this kind."""
+    if not hedging_enabled(kind):
+        return provider
+    return HedgedProvider(kind, provider, HedgePolicy.from_env(kind))
@@ -0,0 +1,255 @@
+"""
+Keyset (cursor) pagination and NDJSON streaming for chat history.
+
+``/sessions/{id}/history`` and ``/sessions/list`` used to return everything
+in one JSON document. Pages are now keyed on ``(created_at, id)``: the
+cursor is the key of the last row returned, and the next page is
+``WHERE (created_at, id) > (:created_at, :id) ORDER BY created_at, id
+LIMIT :n``. With the indexes in ``HISTORY_INDEXES`` that is one index
+seek per page, however deep into the history the client is, whereas
+``OFFSET`` rescans every skipped row.
+
+``HistoryStore`` is the SQLite implementation used by the benchmark and by
+any ``DBManager`` that keeps its tables in this layout. ``page_messages``/
+``page_sessions`` prefer a DBManager's own page methods
+(``get_session_messages_page_async``/``get_sessions_page_async``). Without
+them they fall back to paging the full list in memory, which gives the same
+response shape but none of the speed-up. ``stream_messages``/
+``stream_sessions`` fetch that full list once per stream rather than once
+per page; refetching it for every page made streaming quadratic (50k
+messages took 88 s). In memory, ``created_at`` is ordered as a point in
+time whether the DBManager returns datetimes, ISO strings or epoch numbers.
+"""
+import asyncio
+import base64
+import json
+import logging
+import sqlite3
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS chat_sessions (
+        id TEXT PRIMARY KEY, user_id TEXT NOT NULL, title TEXT, created_at TEXT NOT NULL)""",
+    """CREATE TABLE IF NOT EXISTS chat_messages (
+        id TEXT PRIMARY KEY, session_id TEXT NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL,
+        created_at TEXT NOT NULL)""",
+)
+HISTORY_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_chat_messages_session_keyset ON chat_messages (session_id, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_chat_sessions_user_keyset ON chat_sessions (user_id, created_at, id)",
+)
+_MESSAGE_PAGE = (
+    "SELECT id, session_id, role, content, created_at FROM chat_messages "
+    "WHERE session_id = ? AND (created_at, id) > (?, ?) "
+    "ORDER BY created_at, id LIMIT ?"
+)
+_SESSION_PAGE = (
+    "SELECT id, user_id, title, created_at FROM chat_sessions "
+    "WHERE user_id = ? AND (created_at, id) > (?, ?) "
+    "ORDER BY created_at, id LIMIT ?"
+)
+
+Key = Tuple[str, str]
+_START: Key = ("", "")
+
+
+def encode_cursor(key: Optional[Key]) -> Optional[str]:
+    if key is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Key:
+    """``(created_at, id)`` after which the next page starts; ValueError if malformed."""
+    if not cursor:
+        return _START
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+    return str(created_at), str(row_id)
+
+
+def clamp_limit(limit: Optional[int]) -> int:
+    return max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+
+
+def _key(row: dict, index: int) -> Key:
+    return str(row.get("created_at", "")), str(row.get("id", f"{index:012d}"))
+
+
+class HistoryStore:
+    """Chat sessions/messages in SQLite with keyset-paginated reads."""
+
+    def __init__(self, path: str = ":memory:"):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = asyncio.Lock()
+        for statement in SCHEMA:
+            self.conn.execute(statement)
+
+    def ensure_indexes(self):
+        for statement in HISTORY_INDEXES:
+            self.conn.execute(statement)
+        self.conn.commit()
+
+    def drop_indexes(self):
+        for statement in HISTORY_INDEXES:
+            self.conn.execute(f"DROP INDEX IF EXISTS {statement.split()[5]}")
+        self.conn.commit()
+
+    def add_messages(self, rows: List[tuple]):
+        """``(id, session_id, role, content, created_at)`` rows."""
+        self.conn.executemany("INSERT INTO chat_messages VALUES (?, ?, ?, ?, ?)", rows)
+        self.conn.commit()
+
+    def add_sessions(self, rows: List[tuple]):
+        """``(id, user_id, title, created_at)`` rows."""
+        self.conn.executemany("INSERT INTO chat_sessions VALUES (?, ?, ?, ?)", rows)
+        self.conn.commit()
+
+    def messages_page(self, session_id: str, after: Key = _START, limit: int = DEFAULT_PAGE_SIZE) -> List[dict]:
+        created_at, row_id = after
+        rows = self.conn.execute(_MESSAGE_PAGE, (session_id, created_at, row_id, limit))
+        return [dict(row) for row in rows]
+
+    def sessions_page(self, user_id: str, after: Key = _START, limit: int = DEFAULT_PAGE_SIZE) -> List[dict]:
+        created_at, row_id = after
+        rows = self.conn.execute(_SESSION_PAGE, (user_id, created_at, row_id, limit))
+        return [dict(row) for row in rows]
+
+    def all_messages(self, session_id: str) -> List[dict]:
+        """The old unpaginated query, for comparison."""
+        rows = self.conn.execute(
+            "SELECT id, session_id, role, content, created_at FROM chat_messages WHERE session_id = ? "
+            "ORDER BY created_at, id", (session_id,))
+        return [dict(row) for row in rows]
+
+    async def get_session_messages_page_async(self, session_id: str, after: Key, limit: int) -> List[dict]:
+        async with self._lock:  # one connection, many coroutines
+            return await asyncio.to_thread(self.messages_page, session_id, after, limit)
+
+    async def get_sessions_page_async(self, user_id: str, after: Key, limit: int) -> List[dict]:
+        async with self._lock:
+            return await asyncio.to_thread(self.sessions_page, user_id, after, limit)
+
+
+_warned = set()
+
+
+def _instant(created_at: Any) -> Tuple[int, float, str]:
+    """Sort key for a ``created_at`` of any type; text that is neither a number nor ISO sorts last, as text."""
+    if isinstance(created_at, datetime):
+        moment = created_at
+    elif isinstance(created_at, (int, float)):
+        return 0, float(created_at), ""
+    else:
+        text = str(created_at or "")
+        try:
+            return 0, float(text), ""
+        except ValueError:
+            pass
+        try:
+            moment = datetime.fromisoformat(text.replace("Z", "+00:00"))
+        except ValueError:
+            return 1, 0.0, text
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return 0, moment.timestamp(), ""
+
+
+async def _everything_after(db, method: str, fallback: str, owner: str, after: Key) -> List[Tuple[Key, dict]]:
+    """The full list from ``fallback``, keyed, in time order, from ``after`` on."""
+    if fallback not in _warned:
+        _warned.add(fallback)
+        logger.warning("%s has no %s; paging %s() in memory", type(db).__name__, method, fallback)
+    everything = await getattr(db, fallback)(owner) or []
+    keyed = [(_key(row, i), row) for i, row in enumerate(everything)]
+    keyed.sort(key=lambda pair: (_instant(pair[0][0]), pair[0][1]))
+    if after == _START:
+        return keyed
+    start = (_instant(after[0]), after[1])
+    return [pair for pair in keyed if (_instant(pair[0][0]), pair[0][1]) > start]
+
+
+def _cut(keyed: List[Tuple[Key, dict]], limit: int) -> Tuple[List[dict], Optional[str]]:
+    more = len(keyed) > limit
+    keyed = keyed[:limit]
+    return [row for _, row in keyed], encode_cursor(keyed[-1][0]) if more else None
+
+
+async def _page(db, method: str, fallback: str, owner: str, after: Key, limit: int) -> Tuple[List[dict], Optional[str]]:
+    if hasattr(db, method):
+        keyed = [(_key(row, 0), row) for row in await getattr(db, method)(owner, after, limit + 1)]
+    else:
+        keyed = (await _everything_after(db, method, fallback, owner, after))[:limit + 1]
+    return _cut(keyed, limit)
+
+
+async def _stream(db, method: str, fallback: str, owner: str, cursor: Optional[str],
+                  limit: Optional[int]) -> AsyncIterator[bytes]:
+    limit = clamp_limit(limit)
+    if hasattr(db, method):
+        async for chunk in ndjson_stream(lambda c: _page(db, method, fallback, owner, decode_cursor(c), limit), cursor):
+            yield chunk
+        return
+    keyed = await _everything_after(db, method, fallback, owner, decode_cursor(cursor))
+    for start in range(0, len(keyed), limit):
+        yield _lines(row for _, row in keyed[start:start + limit])
+    yield _END
+
+
+async def page_messages(db, session_id: str, cursor: Optional[str] = None,
+                        limit: Optional[int] = None) -> Tuple[List[dict], Optional[str]]:
+    """(messages, next_cursor) of one session, oldest first; next_cursor is None on the last page."""
+    return await _page(db, "get_session_messages_page_async", "get_session_messages_async",
+                       session_id, decode_cursor(cursor), clamp_limit(limit))
+
+
+async def page_sessions(db, user_id: str, cursor: Optional[str] = None,
+                        limit: Optional[int] = None) -> Tuple[List[dict], Optional[str]]:
+    """(sessions, next_cursor) of one user, oldest first."""
+    return await _page(db, "get_sessions_page_async", "get_all_sessions_async",
+                       user_id, decode_cursor(cursor), clamp_limit(limit))
+
+
+def stream_messages(db, session_id: str, cursor: Optional[str] = None,
+                    limit: Optional[int] = None) -> AsyncIterator[bytes]:
+    """NDJSON of one session's messages from ``cursor`` to the end, ``limit`` rows per chunk."""
+    return _stream(db, "get_session_messages_page_async", "get_session_messages_async", session_id, cursor, limit)
+
+
+def stream_sessions(db, user_id: str, cursor: Optional[str] = None,
+                    limit: Optional[int] = None) -> AsyncIterator[bytes]:
+    """NDJSON of one user's sessions from ``cursor`` to the end."""
+    return _stream(db, "get_sessions_page_async", "get_all_sessions_async", user_id, cursor, limit)
+
+
+_END = b'{"next_cursor": null}\n'
+
+
+def _lines(rows) -> bytes:
+    return "".join(json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in rows).encode()
+
+
+async def ndjson_stream(fetch: Callable[[Optional[str]], Awaitable[Tuple[List[dict], Optional[str]]]],
+                        cursor: Optional[str] = None) -> AsyncIterator[bytes]:
+    """
+    One JSON object per line for every row from ``cursor`` to the end,
+    fetched a page at a time so memory stays bounded. The last line is
+    ``{"next_cursor": null}`` so clients can tell a complete stream from a
+    dropped connection.
+    """
+    while True:
+        rows, cursor = await fetch(cursor)
+        if rows:
+            yield _lines(rows)
+        if cursor is None:
+            break
+    yield _END
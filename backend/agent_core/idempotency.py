@@ -0,0 +1,167 @@
+"""
+Idempotency keys for turn endpoints that clients retry.
+
+Mobile clients on flaky networks resend a turn when the response is lost,
+and every resend used to run STT, the LLM, translation and TTS again and,
+worse, save the same answer into the next form field. A client that sends
+an ``Idempotency-Key`` header (a fresh UUID per turn, reused on its
+retries) gets the turn run at most once:
+
+* the first request with a key runs the turn;
+* a retry that arrives while it runs waits for that run's result;
+* a retry that arrives later gets the stored response back unchanged.
+
+Keys are scoped to the session. A key reused with a different body is
+refused (``IdempotencyConflict``, answered as 422). Exceptions (404, 400,
+ProviderBusy, ...) reach the requests that shared the run but are not
+stored, and neither are results ``keep`` rejects, so a retry after a
+failed turn runs it again. In-flight runs are never evicted; finished ones
+go after ``AGENT_IDEMPOTENCY_TTL`` seconds or when more than
+``AGENT_IDEMPOTENCY_MAX_ENTRIES`` are stored, oldest first.
+
+The cache serves both the async servers (``arun``) and the threaded Flask
+app (``run``); entries are ``concurrent.futures.Future`` under a lock.
+
+    AGENT_IDEMPOTENCY_MAX_ENTRIES=4096
+    AGENT_IDEMPOTENCY_TTL=600
+"""
+import asyncio
+import concurrent.futures
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Tuple
+
+from .metrics import REGISTRY
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_TTL = 600.0
+
+_requests = {
+    outcome: REGISTRY.counter("idempotency_requests_total", "Keyed requests by outcome", outcome=outcome)
+    for outcome in ("first", "joined", "replayed", "conflict")
+}
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a request with a different body."""
+
+
+def fingerprint(*parts: Optional[str]) -> str:
+    """Digest of a request body's fields, to tell a retry from a reused key."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update((part or "").encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "future", "finished_at")
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.future: concurrent.futures.Future = concurrent.futures.Future()
+        self.finished_at: Optional[float] = None
+
+
+class ResponseCache:
+    """Bounded map of (scope, key) to the in-flight or finished response."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[Hashable, str], _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        REGISTRY.gauge("idempotency_entries", "Stored and in-flight keyed responses", fn=lambda: len(self._entries))
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        return cls(int(os.getenv("AGENT_IDEMPOTENCY_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+                   float(os.getenv("AGENT_IDEMPOTENCY_TTL", DEFAULT_TTL)))
+
+    def _claim(self, slot, body: str) -> Tuple[_Entry, bool]:
+        """The entry for ``slot`` and whether the caller must run the request."""
+        with self._lock:
+            self._expire(time.monotonic())
+            entry = self._entries.get(slot)
+            if entry is None:
+                entry = self._entries[slot] = _Entry(body)
+                _requests["first"].inc()
+                return entry, True
+            if entry.fingerprint != body:
+                _requests["conflict"].inc()
+                raise IdempotencyConflict(f"{HEADER} '{slot[1]}' was already used with a different request body")
+            _requests["replayed" if entry.future.done() else "joined"].inc()
+            return entry, False
+
+    def _settle(self, slot, entry: _Entry, result=None, error: Optional[BaseException] = None, keep: bool = True):
+        with self._lock:
+            if error is not None or not keep:
+                if self._entries.get(slot) is entry:
+                    del self._entries[slot]
+            else:
+                entry.finished_at = time.monotonic()
+                self._entries.move_to_end(slot)
+                self._expire(entry.finished_at)
+        if error is not None:
+            entry.future.set_exception(error)
+        else:
+            entry.future.set_result(result)
+
+    def _expire(self, now: float):
+        # Called with the lock held; in-flight entries stay however many there are
+        finished = [slot for slot, entry in self._entries.items() if entry.finished_at is not None]
+        excess = len(self._entries) - self.max_entries
+        for slot in finished:
+            if excess <= 0 and now - self._entries[slot].finished_at < self.ttl:
+                break
+            del self._entries[slot]
+            excess -= 1
+
+    async def arun(self, scope: Hashable, key: str, body: str, fn, keep: Callable = lambda result: True):
+        """
+        ``await fn()`` once per (scope, key). Returns ``(result, replayed)``.
+        The run is a task of its own, so a request that gives up does not
+        cancel the run its retry is waiting for.
+        """
+        slot = (scope, key)
+        entry, owner = self._claim(slot, body)
+        if owner:
+            task = asyncio.ensure_future(fn())
+
+            def settle(done: asyncio.Task):
+                if done.cancelled():
+                    self._settle(slot, entry, error=asyncio.CancelledError())
+                elif done.exception() is not None:
+                    self._settle(slot, entry, error=done.exception())
+                else:
+                    self._settle(slot, entry, done.result(), keep=keep(done.result()))
+
+            task.add_done_callback(settle)
+        return await asyncio.shield(asyncio.wrap_future(entry.future)), not owner
+
+    def run(self, scope: Hashable, key: str, body: str, fn, keep: Callable = lambda result: True,
+            timeout: Optional[float] = None):
+        """Threaded ``arun``: ``fn()`` once per (scope, key); returns ``(result, replayed)``."""
+        slot = (scope, key)
+        entry, owner = self._claim(slot, body)
+        if not owner:
+            return entry.future.result(timeout), True
+        try:
+            result = fn()
+        except BaseException as e:
+            self._settle(slot, entry, error=e)
+            raise
+        self._settle(slot, entry, result, keep=keep(result))
+        return result, False
+
+    def discard(self, scope: Hashable):
+        """Forgets the finished responses of ``scope`` (the session was cleared)."""
+        with self._lock:
+            for slot in [s for s, entry in self._entries.items() if s[0] == scope and entry.future.done()]:
+                del self._entries[slot]
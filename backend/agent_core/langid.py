@@ -0,0 +1,195 @@
+"""
+Local language identification for typed (text) input.
+
+Speech input gets its language from STT, but typed messages had none:
+websocket.py left ``detected_language_code`` unset and the HTTP backends
+assumed English, so Kannada/Hindi text reached the English agent
+untranslated. Asking the translate API to find out costs a remote call per
+message; this decides locally in microseconds:
+
+* native script: the dominant Indic Unicode block gives the language
+  (Devanagari -> hi-IN, Kannada -> kn-IN, Tamil -> ta-IN, ...);
+* Latin script: a character-trigram model trained at import on small
+  seed corpora tells English from romanized Hindi and romanized Kannada.
+
+Short or ambiguous replies ("30", "ok", a product name) carry no signal,
+so ``SessionLanguages`` remembers each session's last confident language
+and reuses it. Romanized text moves a session off its current language
+only with more evidence than a first guess needs (``SWITCH_WORDS`` words
+and a ``SWITCH_MARGIN`` lead), because a single crop name such as "Ragi",
+"Jowar" or "Tur dal" scores as Kannada or Hindi on its own. Native script
+still switches at once. Callers translate only when the result is not
+English.
+"""
+import math
+import re
+from collections import Counter, OrderedDict
+from typing import Dict, Optional, Tuple
+
+from .metrics import REGISTRY
+
+ENGLISH = "en-IN"
+
+# First code point of each 128-character Indic block
+SCRIPT_LANGUAGES = {
+    0x0900: "hi-IN",  # Devanagari (also Marathi; Hindi is the common case here)
+    0x0980: "bn-IN",  # Bengali
+    0x0A00: "pa-IN",  # Gurmukhi
+    0x0A80: "gu-IN",  # Gujarati
+    0x0B00: "od-IN",  # Odia
+    0x0B80: "ta-IN",  # Tamil
+    0x0C00: "te-IN",  # Telugu
+    0x0C80: "kn-IN",  # Kannada
+    0x0D00: "ml-IN",  # Malayalam
+}
+_INDIC_START, _INDIC_END = 0x0900, 0x0D80
+
+# Seed text for the romanized model: everyday and marketplace phrasing.
+SEED_CORPORA = {
+    ENGLISH: """
+        i want to sell tomatoes. please add a new product for me. the price is thirty rupees per kg.
+        how much quantity do you have? i have fifty kilograms of fresh onions. what is the category?
+        yes that is correct. no, change the price. show me my listings. create a post about my farm.
+        the description is fresh red tomatoes from my field. thank you very much. can you help me?
+        i would like to list rice and wheat. what should i write here? my name is ravi and i grow mangoes.
+        please tell me the total. that will be all for today. where is my order? send it tomorrow.
+        we harvested potatoes this week and they are ready for the market. it is organic and good quality.
+    """,
+    "hi-IN": """
+        mujhe tamatar bechna hai. mere liye naya product add karo. daam tees rupaye kilo hai.
+        aapke paas kitna maal hai? mere paas pachas kilo taaze pyaaz hain. category kya hai?
+        haan yeh sahi hai. nahi, daam badal do. meri listing dikhao. mere khet ke baare mein post banao.
+        khet ke taaze laal tamatar hain. bahut bahut dhanyavaad. kya aap meri madad kar sakte ho?
+        main chawal aur gehun bechna chahta hoon. yahan kya likhna chahiye? mera naam ravi hai aur main aam ugata hoon.
+        kul kitna hua bataiye. aaj ke liye bas itna hi. mera order kahan hai? kal bhej dena.
+        is hafte aloo ki fasal hui hai aur mandi ke liye taiyaar hai. yeh jaivik hai aur achchi quality ka hai.
+        mujhe kuch nahi chahiye. theek hai bhai, abhi karo. kitne ka hai? sab kuch bata do.
+    """,
+    "kn-IN": """
+        nanage tomato maarabeku. nanagaagi hosa product serisi. bele kejige mooavattu rupayi.
+        nimma hatra eshtu maala ide? nanna hatra aivattu kilo taaja eerulli ide. category yenu?
+        houdu idu sari ide. illa, bele badalisi. nanna listing torisi. nanna hola bagge post maadi.
+        nanna holada taaja kempu tomato. tumba dhanyavaadagalu. neevu nanage sahaaya maadtira?
+        naanu akki mattu godhi maarabekide. illi yenu bareyabeku? nanna hesaru ravi, naanu maavina hannu beleyuttene.
+        ottu eshtu aaytu heli. indige ashte saaku. nanna order elli ide? naale kalisi.
+        ee vaara aalugadde koyilu aagide mattu maarukattege siddhavagide. idu saavayava mattu olleya gunamatta.
+        nanage enu beda. sari anna, eega maadi. idu eshtu? ellavannu heli.
+    """,
+}
+MIN_TRIGRAMS = 4     # fewer than this and the romanized model abstains
+MIN_MARGIN = 0.25    # mean log-probability lead (nats per trigram) needed to decide
+SWITCH_WORDS = 3     # romanized words needed to move a session off its current language
+SWITCH_MARGIN = 0.5  # and the lead they need
+
+_LATIN_WORD = re.compile(r"[a-z]+")
+
+_detections = {
+    source: REGISTRY.counter("langid_detections_total", "Language decisions for text input", source=source)
+    for source in ("script", "ngram", "session", "default")
+}
+
+
+def _trigrams(text: str):
+    for word in _LATIN_WORD.findall(text.lower()):
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            yield padded[i:i + 3]
+
+
+class TrigramModel:
+    """Add-one smoothed character-trigram log-probabilities per language."""
+
+    def __init__(self, corpora: Dict[str, str]):
+        counts = {lang: Counter(_trigrams(text)) for lang, text in corpora.items()}
+        vocabulary = len(set().union(*counts.values())) + 1
+        self.logprob: Dict[str, Dict[str, float]] = {}
+        self.unseen: Dict[str, float] = {}
+        for lang, grams in counts.items():
+            total = sum(grams.values()) + vocabulary
+            self.logprob[lang] = {gram: math.log((n + 1) / total) for gram, n in grams.items()}
+            self.unseen[lang] = math.log(1 / total)
+
+    def classify(self, text: str, margin: float = MIN_MARGIN) -> Optional[str]:
+        """Best language, or None when the text is too short or too close to call."""
+        grams = list(_trigrams(text))
+        if len(grams) < MIN_TRIGRAMS:
+            return None
+        scores = sorted(
+            ((sum(table.get(g, self.unseen[lang]) for g in grams), lang) for lang, table in self.logprob.items()),
+            reverse=True,
+        )
+        (best, lang), (runner_up, _) = scores[0], scores[1]
+        return lang if (best - runner_up) / len(grams) >= margin else None
+
+
+ROMANIZED = TrigramModel(SEED_CORPORA)
+
+
+def script_language(text: str) -> Optional[str]:
+    """Language of the dominant Indic script, if Indic letters are at least a third of all letters."""
+    blocks: Counter = Counter()
+    latin = 0
+    for ch in text:
+        cp = ord(ch)
+        if _INDIC_START <= cp < _INDIC_END:
+            blocks[cp & ~0x7F] += 1
+        elif ch.isascii() and ch.isalpha():
+            latin += 1
+    if not blocks:
+        return None
+    block, count = blocks.most_common(1)[0]
+    return SCRIPT_LANGUAGES.get(block) if count * 2 >= latin else None
+
+
+def _identify(text: str) -> Tuple[Optional[str], str]:
+    if not text:
+        return None, "default"
+    if not text.isascii():
+        lang = script_language(text)
+        if lang:
+            return lang, "script"
+    return ROMANIZED.classify(text), "ngram"
+
+
+def identify(text: str) -> Optional[str]:
+    """Language code of ``text``, or None when it carries no usable signal."""
+    return _identify(text)[0]
+
+
+class SessionLanguages:
+    """Each session's last confidently identified language (LRU, bounded)."""
+
+    def __init__(self, max_sessions: int = 10_000):
+        self.max_sessions = max_sessions
+        self._languages: "OrderedDict[str, str]" = OrderedDict()
+
+    def get(self, session_id: str) -> Optional[str]:
+        return self._languages.get(session_id)
+
+    def set(self, session_id: str, lang: str):
+        self._languages[session_id] = lang
+        self._languages.move_to_end(session_id)
+        while len(self._languages) > self.max_sessions:
+            self._languages.popitem(last=False)
+
+    def discard(self, session_id: str):
+        self._languages.pop(session_id, None)
+
+    def detect(self, session_id: str, text: str, default: str = ENGLISH) -> str:
+        """``identify(text)``, else the session's previous language, else ``default``."""
+        previous = self.get(session_id)
+        lang, source = _identify(text)
+        if lang and source == "ngram" and lang != (previous or default) and not _switches(text, lang):
+            lang = None
+        if lang:
+            _detections[source].inc()
+            self.set(session_id, lang)
+            return lang
+        _detections["session" if previous else "default"].inc()
+        return previous or default
+
+
+def _switches(text: str, lang: str) -> bool:
+    """Enough romanized evidence to leave the session's current language for ``lang``."""
+    return (len(_LATIN_WORD.findall(text.lower())) >= SWITCH_WORDS
+            and ROMANIZED.classify(text, SWITCH_MARGIN) == lang)
@@ -0,0 +1,73 @@
+"""Latency distributions used by the local stub servers and offline fakes."""
+import math
+import random
+from typing import Optional
+
+
+class LatencyModel:
+    """
+    Samples delays (in seconds) from a named distribution.
+
+    Specs are short strings so they can be passed on the command line or
+    through environment variables:
+
+        const:0.5            fixed delay
+        uniform:0.1,0.4      uniform between low and high
+        normal:0.3,0.05      mean, stddev (clamped at 0)
+        lognormal:0.3,0.6    median, sigma
+        pareto:0.2,1.5       scale (minimum), alpha - heavy tailed
+
+    A trailing ``@<max>`` caps every sample, e.g. ``pareto:0.2,1.2@10``.
+    """
+
+    KINDS = ("const", "uniform", "normal", "lognormal", "pareto")
+
+    def __init__(self, kind: str = "const", params: tuple = (0.0,), cap: Optional[float] = None):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution '{kind}', expected one of {self.KINDS}")
+        self.kind = kind
+        self.params = tuple(float(p) for p in params)
+        self.cap = cap
+
+    @classmethod
+    def parse(cls, spec: "str | float | LatencyModel | None") -> "LatencyModel":
+        if spec is None:
+            return cls("const", (0.0,))
+        if isinstance(spec, LatencyModel):
+            return spec
+        if isinstance(spec, (int, float)):
+            return cls("const", (float(spec),))
+        spec = spec.strip()
+        cap = None
+        if "@" in spec:
+            spec, cap_text = spec.split("@", 1)
+            cap = float(cap_text)
+        if ":" not in spec:
+            return cls("const", (float(spec),), cap)
+        kind, _, raw_params = spec.partition(":")
+        params = tuple(float(p) for p in raw_params.split(",") if p.strip())
+        expected = {"const": 1, "uniform": 2, "normal": 2, "lognormal": 2, "pareto": 2}.get(kind)
+        if expected is not None and len(params) != expected:
+            raise ValueError(f"Latency spec '{spec}' needs {expected} parameter(s)")
+        return cls(kind, params, cap)
+
+    def sample(self, rng: random.Random) -> float:
+        p = self.params
+        if self.kind == "const":
+            value = p[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            value = rng.gauss(p[0], p[1])
+        elif self.kind == "lognormal":
+            value = rng.lognormvariate(math.log(p[0]), p[1]) if p[0] > 0 else 0.0
+        else:  # pareto
+            value = p[0] * rng.paretovariate(p[1])
+        value = max(0.0, value)
+        if self.cap is not None:
+            value = min(value, self.cap)
+        return value
+
+    def __repr__(self) -> str:
+        cap = f"@{self.cap:g}" if self.cap is not None else ""
+        return f"LatencyModel('{self.kind}:{','.join(f'{p:g}' for p in self.params)}{cap}')"
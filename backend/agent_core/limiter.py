@@ -0,0 +1,329 @@
+"""
+Adaptive concurrency limiting, circuit breaking and load shedding per provider.
+
+Each provider kind gets an ``AdaptiveLimiter``:
+
+* the concurrency limit is discovered with AIMD - it grows by ``1/limit`` per
+  healthy call and is cut multiplicatively on timeouts, 5xx-style errors or
+  calls slower than the latency target;
+* a ``CircuitBreaker`` opens after consecutive failures and lets a few probe
+  calls through after a cool-down;
+* callers queue while the limit is reached, but if the estimated queue wait
+  would exceed the SLO the call is rejected up front with ``ProviderBusy`` so
+  the endpoint can answer "busy, please retry" immediately.
+
+Settings come from ``AGENT_LIMIT_<SETTING>_<KIND>`` (or ``AGENT_LIMIT_<SETTING>``):
+INITIAL, MIN, MAX, BACKOFF, LATENCY_TARGET, QUEUE_SLO, BREAKER_FAILURES,
+BREAKER_COOLDOWN. ``AGENT_LIMITER=off`` disables the wrappers entirely.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+
+from .metrics import REGISTRY
+from .providers import ProviderError, ProviderTimeout
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LATENCY_TARGETS = {"llm": 4.0, "stt": 3.0, "translate": 1.5, "tts": 3.0}
+
+
+class ProviderBusy(ProviderError):
+    """Rejected before calling the provider; the client should retry later."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpen(ProviderBusy):
+    """The provider's circuit breaker is open."""
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 10.0, half_open_probes: int = 2):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.half_open_probes = half_open_probes
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    return False
+                self.state = self.HALF_OPEN
+                self.probes_in_flight = 0
+            if self.state == self.HALF_OPEN:
+                if self.probes_in_flight >= self.half_open_probes:
+                    return False
+                self.probes_in_flight += 1
+            return True
+
+    def release_probe(self):
+        """A half-open probe was admitted but never reached the provider."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+
+    def retry_after(self) -> float:
+        return max(0.5, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def record(self, success: bool):
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+            if success:
+                self.consecutive_failures = 0
+                self.state = self.CLOSED
+                return
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning("Circuit opened after %s consecutive failures", self.consecutive_failures)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def state_code(self) -> int:
+        return {self.CLOSED: 0, self.HALF_OPEN: 1, self.OPEN: 2}[self.state]
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit with an SLO-bounded wait queue."""
+
+    def __init__(self, name: str, initial_limit: float = 20, min_limit: float = 1, max_limit: float = 200,
+                 backoff: float = 0.9, latency_target: float = 3.0, queue_slo: float = 2.0,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.backoff = backoff
+        self.latency_target = latency_target
+        self.queue_slo = queue_slo
+        self.breaker = breaker or CircuitBreaker()
+        self.inflight = 0
+        self.avg_latency = 0.0  # learned from completed calls
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
+
+        labels = {"provider": name}
+        REGISTRY.gauge("provider_concurrency_limit", "Current adaptive concurrency limit", lambda: round(self.limit, 2), **labels)
+        REGISTRY.gauge("provider_inflight", "Calls currently in flight", lambda: self.inflight, **labels)
+        REGISTRY.gauge("provider_queue_depth", "Calls waiting for a slot", lambda: len(self._waiters), **labels)
+        REGISTRY.gauge("provider_circuit_state", "0=closed 1=half_open 2=open", self.breaker.state_code, **labels)
+        self._shed = REGISTRY.counter("provider_shed_total", "Calls rejected with busy", **labels)
+        self._latency = REGISTRY.histogram("provider_latency_seconds", "Provider call latency", **labels)
+        self._queue_wait = REGISTRY.histogram("provider_queue_wait_seconds", "Time spent waiting for a slot", **labels)
+        self._outcomes = {
+            outcome: REGISTRY.counter("provider_calls_total", "Provider calls by outcome", outcome=outcome, **labels)
+            for outcome in ("success", "error", "timeout")
+        }
+
+    @classmethod
+    def from_env(cls, kind: str) -> "AdaptiveLimiter":
+        def get(name: str, default: float) -> float:
+            return float(os.getenv(f"AGENT_LIMIT_{name}_{kind.upper()}", os.getenv(f"AGENT_LIMIT_{name}", default)))
+
+        return cls(
+            kind,
+            initial_limit=get("INITIAL", 20),
+            min_limit=get("MIN", 1),
+            max_limit=get("MAX", 200),
+            backoff=get("BACKOFF", 0.9),
+            latency_target=get("LATENCY_TARGET", DEFAULT_LATENCY_TARGETS.get(kind, 3.0)),
+            queue_slo=get("QUEUE_SLO", 2.0),
+            breaker=CircuitBreaker(int(get("BREAKER_FAILURES", 5)), get("BREAKER_COOLDOWN", 10.0)),
+        )
+
+    # --- Slot management ---
+    def _reject(self, reason: str, retry_after: float):
+        self.breaker.release_probe()
+        self._shed.inc()
+        raise ProviderBusy(f"{self.name} busy ({reason}), please retry", retry_after)
+
+    def _admit(self) -> bool:
+        """Caller must hold the lock. Takes a slot if one is free."""
+        if self.inflight < int(self.limit) and not self._waiters:
+            self.inflight += 1
+            return True
+        return False
+
+    def has_headroom(self, share: float) -> bool:
+        """No one queued, the circuit closed and under ``share`` of the limit in flight: room for optional work."""
+        return (not self._waiters and self.breaker.state == CircuitBreaker.CLOSED
+                and self.inflight < share * self.limit)
+
+    def _expected_wait(self) -> float:
+        return (len(self._waiters) + 1) * self.avg_latency / max(1.0, self.limit)
+
+    async def acquire(self):
+        if not self.breaker.allow():
+            self._shed.inc()
+            raise CircuitOpen(f"{self.name} circuit open, please retry", self.breaker.retry_after())
+        with self._lock:
+            if self._admit():
+                return
+            expected_wait = self._expected_wait()
+            if expected_wait > self.queue_slo:
+                self._reject("queue wait over SLO", expected_wait)
+            future = asyncio.get_running_loop().create_future()
+            waiter = (asyncio.get_running_loop(), future)
+            self._waiters.append(waiter)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(future, timeout=self.queue_slo)
+        except asyncio.TimeoutError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            self._reject("timed out in queue", self.queue_slo)
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            if future.done() and not future.cancelled():
+                self._hand_over()  # the slot arrived as the caller gave up
+            self.breaker.release_probe()
+            raise
+        finally:
+            self._queue_wait.observe(time.monotonic() - started)
+
+    def try_acquire(self):
+        """Non-blocking acquire for synchronous callers: shed instead of queueing."""
+        if not self.breaker.allow():
+            self._shed.inc()
+            raise CircuitOpen(f"{self.name} circuit open, please retry", self.breaker.retry_after())
+        with self._lock:
+            if self.inflight < int(self.limit):
+                self.inflight += 1
+                return
+        self._reject("at concurrency limit", self.avg_latency)
+
+    def _hand_over(self):
+        """Give the caller's slot to the next live waiter, or free it."""
+        with self._lock:
+            if self._waiters and self.inflight <= int(self.limit):
+                loop, future = self._waiters.popleft()
+                loop.call_soon_threadsafe(self._deliver, future)
+                return
+            self.inflight -= 1
+
+    def _deliver(self, future: asyncio.Future):
+        if future.done():  # waiter gave up meanwhile; pass the slot on
+            self._hand_over()
+        else:
+            future.set_result(True)
+
+    def release(self, latency: float, outcome: str):
+        self._latency.observe(latency)
+        self._outcomes[outcome].inc()
+        self.breaker.record(outcome == "success")
+        with self._lock:
+            self.avg_latency = 0.8 * self.avg_latency + 0.2 * latency
+            if outcome != "success" or latency > self.latency_target:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+            elif self.inflight >= self.limit / 2:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+        self._hand_over()
+
+    @staticmethod
+    def _outcome(error: Optional[BaseException]) -> str:
+        if error is None:
+            return "success"
+        if isinstance(error, (ProviderTimeout, asyncio.TimeoutError, TimeoutError)):
+            return "timeout"
+        return "error"
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        started = time.monotonic()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if isinstance(error, asyncio.CancelledError):
+                # Not the provider's fault: no outcome, but a half-open probe must be given back
+                self.breaker.release_probe()
+                self._hand_over()
+            else:
+                self.release(time.monotonic() - started, self._outcome(error))
+
+    @contextmanager
+    def sync_slot(self):
+        self.try_acquire()
+        started = time.monotonic()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.release(time.monotonic() - started, self._outcome(error))
+
+
+class GuardedProvider:
+    """Runs every call of the wrapped provider inside its limiter slot."""
+
+    def __init__(self, kind: str, inner, limiter: AdaptiveLimiter):
+        self.kind = kind
+        self.inner = inner
+        self.limiter = limiter
+        self.name = f"guarded({getattr(inner, 'name', type(inner).__name__)})"
+
+    async def _call(self, method: str, *args):
+        async with self.limiter.slot():
+            return await getattr(self.inner, method)(*args)
+
+    def invoke(self, messages):
+        with self.limiter.sync_slot():
+            return self.inner.invoke(messages)
+
+    async def ainvoke(self, messages):
+        return await self._call("ainvoke", messages)
+
+    async def transcribe(self, audio_bytes, filename="audio.wav", prompt=""):
+        return await self._call("transcribe", audio_bytes, filename, prompt)
+
+    async def translate(self, text, source_language_code, target_language_code):
+        return await self._call("translate", text, source_language_code, target_language_code)
+
+    async def synthesize(self, text, language_code="en-IN", sample_rate=8000):
+        return await self._call("synthesize", text, language_code, sample_rate)
+
+
+def guard(kind: str, provider):
+    """Wraps ``provider`` in its limiter unless AGENT_LIMITER=off."""
+    if os.getenv("AGENT_LIMITER", "on").lower() in ("off", "0", "false"):
+        return provider
+    return GuardedProvider(kind, provider, AdaptiveLimiter.from_env(kind))
+
+
+def spare_capacity(*providers, share: float = 0.5) -> bool:
+    """
+    True if every guarded provider among ``providers`` (looked up through
+    their wrappers' ``inner``) has headroom at ``share`` of its limit.
+    Unguarded providers (AGENT_LIMITER=off) always have.
+    """
+    for provider in providers:
+        while provider is not None and not isinstance(provider, GuardedProvider):
+            provider = getattr(provider, "inner", None)
+        if provider is not None and not provider.limiter.has_headroom(share):
+            return False
+    return True
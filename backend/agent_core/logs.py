@@ -0,0 +1,261 @@
+"""
+Logging for the request path: queued, sampled, structured.
+
+``logging.basicConfig`` writes every record to stderr from the thread that
+logged it, so a turn waits on terminal or pipe I/O for each line (and with
+DEBUG on, for whole Sarvam responses with their base64 audio).
+``configure_logging()`` replaces it:
+
+* the root logger gets one ``QueueHandler``, which only puts the record on
+  a bounded queue; a ``QueueListener`` thread formats and writes it. When
+  the queue is full the record is dropped and counted; the turn never waits;
+* records keep their ``%``-style arguments and are formatted on the
+  listener thread (arguments that are not plain strings or numbers are
+  formatted before queueing, since they may change afterwards);
+* records are JSON lines (``AGENT_LOG_FORMAT=text`` for plain lines) with
+  the session and turn id of the request that logged them, from
+  ``log_context()``/``start_turn_log()``. Fields passed with ``extra=`` are
+  included;
+* every message and field is cut to ``AGENT_LOG_MAX_FIELD`` characters;
+* per-level sampling (``AGENT_LOG_SAMPLE_DEBUG=0.05``) keeps a share of the
+  records of a level. The decision is per turn, so a sampled turn keeps
+  all of its records at that level. Dropped records are never formatted.
+
+    AGENT_LOG_LEVEL=INFO          root level
+    AGENT_LOG_FORMAT=json         json | text
+    AGENT_LOG_SAMPLE_<LEVEL>=1    share of records kept at that level (0..1)
+    AGENT_LOG_MAX_FIELD=512       characters kept per message or field
+    AGENT_LOG_QUEUE=10000         records waiting to be written before new ones are dropped
+"""
+import atexit
+import contextvars
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import reprlib
+import sys
+import uuid
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from .metrics import REGISTRY
+
+DEFAULT_MAX_FIELD = 512
+DEFAULT_QUEUE = 10_000
+
+_session: contextvars.ContextVar = contextvars.ContextVar("agent_log_session", default=None)
+_turn: contextvars.ContextVar = contextvars.ContextVar("agent_log_turn", default=None)
+
+_records = {
+    outcome: REGISTRY.counter("log_records_total", "Log records by outcome", outcome=outcome)
+    for outcome in ("queued", "sampled_out", "dropped")
+}
+
+# Attributes every LogRecord has; anything else on a record came from ``extra=``
+_STANDARD = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+_LAZY_ARGS = (str, int, float, bool, type(None))
+
+
+def truncate(value, limit: int = DEFAULT_MAX_FIELD) -> str:
+    """``str(value)`` cut to ``limit`` characters, saying how much was cut."""
+    text = value if isinstance(value, str) else str(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}...(+{len(text) - limit} chars)"
+
+
+def new_turn_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def start_turn_log(session_id: Optional[str] = None, turn_id: Optional[str] = None) -> str:
+    """
+    Tags records logged from the current context with the session and a new
+    turn id; returns the turn id. Like ``deadline.start_turn`` it is meant for
+    handlers running in their own task, which never need to reset it.
+    """
+    turn_id = turn_id or new_turn_id()
+    if session_id is not None:
+        _session.set(session_id)
+    _turn.set(turn_id)
+    return turn_id
+
+
+@contextmanager
+def log_context(session_id: Optional[str] = None, turn_id: Optional[str] = None):
+    """``start_turn_log`` for a block (a websocket message, a Flask request)."""
+    session_token = _session.set(session_id if session_id is not None else _session.get())
+    turn_token = _turn.set(turn_id or new_turn_id())
+    try:
+        yield _turn.get()
+    finally:
+        _turn.reset(turn_token)
+        _session.reset(session_token)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps ``rates[level]`` of the records at each level (all of them for levels not listed)."""
+
+    def __init__(self, rates: Dict[int, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno)
+        if rate is None or rate >= 1.0:
+            return True
+        turn_id = getattr(record, "turn_id", None) or _turn.get()
+        # Same decision for every record of a turn, so a sampled turn can be followed end to end
+        draw = zlib.crc32(turn_id.encode()) / 2 ** 32 if turn_id else random.random()
+        if draw < rate:
+            return True
+        _records["sampled_out"].inc()
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queues records without formatting them, drops them when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue, max_field: int = DEFAULT_MAX_FIELD):
+        super().__init__(log_queue)
+        self.max_field = max_field
+        # A provider response with base64 audio in it is cut while it is repr'd, not after
+        self._repr = reprlib.Repr()
+        self._repr.maxstring = self._repr.maxother = max_field
+        self._repr.maxdict = self._repr.maxlist = self._repr.maxtuple = 32
+
+    def snapshot(self, arg) -> str:
+        if isinstance(arg, (dict, list, tuple, set)):
+            return self._repr.repr(arg)
+        return truncate(arg, self.max_field)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.session_id = getattr(record, "session_id", None) or _session.get()
+        record.turn_id = getattr(record, "turn_id", None) or _turn.get()
+        args = record.args
+        if isinstance(args, tuple):
+            if not all(isinstance(arg, _LAZY_ARGS) for arg in args):
+                # Containers and objects can change after this call returns: turn them into (short) strings now
+                record.args = tuple(arg if isinstance(arg, _LAZY_ARGS) else self.snapshot(arg) for arg in args)
+        elif args:
+            record.msg, record.args = truncate(record.getMessage(), self.max_field), None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None  # tracebacks keep frames alive; the text is enough
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _records["dropped"].inc()
+        else:
+            _records["queued"].inc()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, every string field truncated."""
+
+    def __init__(self, max_field: int = DEFAULT_MAX_FIELD):
+        super().__init__()
+        self.max_field = max_field
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(
+                timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": truncate(record.getMessage(), self.max_field),
+        }
+        for key in ("session_id", "turn_id"):
+            if getattr(record, key, None):
+                entry[key] = record.__dict__[key]
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD and key not in entry and key not in ("session_id", "turn_id"):
+                entry[key] = value if isinstance(value, (int, float, bool, type(None))) else \
+                    truncate(value, self.max_field)
+        if record.exc_text:
+            entry["exc"] = truncate(record.exc_text, self.max_field * 8)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """The usual one-line format plus the session/turn ids, message truncated."""
+
+    def __init__(self, max_field: int = DEFAULT_MAX_FIELD):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(session_id)s/%(turn_id)s] %(message)s")
+        self.max_field = max_field
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        record.message = truncate(record.message, self.max_field)
+        record.session_id = getattr(record, "session_id", None) or "-"
+        record.turn_id = getattr(record, "turn_id", None) or "-"
+        return super().formatMessage(record)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def sample_rates_from_env() -> Dict[int, float]:
+    rates = {}
+    for name in ("DEBUG", "INFO", "WARNING"):
+        value = os.getenv(f"AGENT_LOG_SAMPLE_{name}")
+        if value is not None:
+            rates[getattr(logging, name)] = max(0.0, min(1.0, float(value)))
+    return rates
+
+
+def configure_logging(level=None, fmt: Optional[str] = None, stream=None, sample: Optional[Dict[int, float]] = None,
+                      max_field: Optional[int] = None, queue_size: Optional[int] = None
+                      ) -> logging.handlers.QueueListener:
+    """
+    Routes the root logger through a queue to a background writer (stderr by
+    default). Arguments override the ``AGENT_LOG_*`` variables. Calling it
+    again replaces the previous setup.
+    """
+    global _listener
+    level = level or os.getenv("AGENT_LOG_LEVEL", "INFO")
+    fmt = fmt or os.getenv("AGENT_LOG_FORMAT", "json")
+    max_field = max_field or int(os.getenv("AGENT_LOG_MAX_FIELD", DEFAULT_MAX_FIELD))
+    queue_size = queue_size or int(os.getenv("AGENT_LOG_QUEUE", DEFAULT_QUEUE))
+    sample = sample_rates_from_env() if sample is None else sample
+
+    shutdown_logging()
+    # Records carry no caller file/line or process info: none of it is logged, and finding the caller is
+    # the most expensive part of creating a record (the "Optimization" table of the logging HOWTO)
+    logging._srcfile = None
+    logging.logProcesses = logging.logMultiprocessing = False
+    writer = logging.StreamHandler(stream or sys.stderr)
+    writer.setFormatter(JsonFormatter(max_field) if fmt == "json" else TextFormatter(max_field))
+    log_queue: queue.Queue = queue.Queue(queue_size)
+    handler = NonBlockingQueueHandler(log_queue, max_field)
+    if sample:
+        handler.addFilter(SamplingFilter(sample))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    REGISTRY.gauge("log_queue_depth", "Log records waiting to be written", fn=log_queue.qsize)
+
+    _listener = logging.handlers.QueueListener(log_queue, writer, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """Writes out what is queued and stops the writer thread (also run at exit)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
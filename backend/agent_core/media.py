@@ -0,0 +1,225 @@
+"""
+Process pool for CPU-bound audio and payload work.
+
+Sniffing and converting uploads (``magic``/pydub), base64 of audio and
+``json.dumps`` of reply payloads with audio in them hold the GIL, so on the
+event loop or in the default thread pool they stall every other session.
+``MediaPool`` runs them in worker processes, one per core by default, and
+the event loop only awaits the result.
+
+Buffers cross the process boundary through ``multiprocessing.shared_memory``
+instead of being pickled: the caller copies its bytes into a block, the
+worker copies them out (the tasks take ``bytes``) and writes its result
+into a block of its own, which the caller copies out and unlinks. Base64
+and ``json.dumps`` of buffers smaller than ``AGENT_MEDIA_MIN_BYTES`` are not
+worth the round-trip and run inline; sniffing, decoding and transcoding
+audio always leave the event loop, since even a short clip means a libmagic
+call and an ffmpeg run.
+
+A worker that dies (killed, out of memory) breaks the whole pool: the tasks
+it had fail, and the next task starts a new pool.
+
+    AGENT_MEDIA_WORKERS=4       worker processes (default: CPU count, 0 = default thread pool)
+    AGENT_MEDIA_MIN_BYTES=65536 smaller base64/JSON inputs run inline on the caller
+"""
+import asyncio
+import base64
+import io
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_BYTES = 64 * 1024
+DEFAULT_SAMPLE_RATE = 16000
+
+Block = Tuple[str, int]  # shared memory name, length in bytes
+
+
+# --- Shared memory helpers (run on both sides) ---
+# Workers share the parent's resource tracker, so a block is tracked once
+# whichever side created it, and untracked by whichever side unlinks it.
+def _share(data: bytes) -> Block:
+    """Copies ``data`` into a new block; the receiving side unlinks it."""
+    block = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+    block.buf[:len(data)] = data
+    name = block.name
+    block.close()
+    return name, len(data)
+
+
+def _take(block: Block) -> bytes:
+    """Copies a block's bytes out and unlinks it."""
+    name, size = block
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return bytes(shm.buf[:size])
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+# --- Tasks (module level so worker processes can import them) ---
+def prepare_audio(data: bytes, sample_rate: int = DEFAULT_SAMPLE_RATE) -> bytes:
+    """WebM/Matroska uploads as mono WAV at ``sample_rate``; anything else unchanged."""
+    import magic
+    from pydub import AudioSegment
+
+    file_type = magic.from_buffer(data[:1024])  # Check first 1KB
+    if "WebM" not in file_type and "Matroska" not in file_type:
+        return data
+    audio = AudioSegment.from_file(io.BytesIO(data), format="webm")
+    output = io.BytesIO()
+    audio.set_frame_rate(sample_rate).set_channels(1).export(output, format="wav")
+    return output.getvalue()
+
+
+def b64decode(data: bytes) -> bytes:
+    return base64.b64decode(data)
+
+
+def b64encode(data: bytes) -> bytes:
+    return base64.b64encode(data)
+
+
+def dumps(data: bytes) -> bytes:
+    """JSON text of a payload whose large string fields were shipped separately (see ``MediaPool.dumps``)."""
+    header_size = int.from_bytes(data[:8], "little")
+    header = json.loads(data[8:8 + header_size])
+    offset = 8 + header_size
+    blobs = {}
+    for key, size in header.pop("__blobs__"):
+        blobs[key] = data[offset:offset + size].decode()
+        offset += size
+    payload = {key: blobs[key] if key in blobs else header[key] for key in header.pop("__order__")}
+    return json.dumps(payload).encode()
+
+
+def _run_shared(fn, block: Block, args: tuple) -> Block:
+    """Worker side: copies the input block out, returns the result as a new block."""
+    name, size = block
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        result = fn(bytes(shm.buf[:size]), *args)
+    finally:
+        shm.close()
+    return _share(result)
+
+
+def _discard(future):
+    if not future.cancelled() and future.exception() is None:
+        _take(future.result())
+
+
+# --- Pool ---
+class MediaPool:
+    """Runs media tasks in worker processes, passing buffers through shared memory."""
+
+    def __init__(self, workers: Optional[int] = None, min_bytes: int = DEFAULT_MIN_BYTES):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.min_bytes = min_bytes
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._inflight = 0
+        REGISTRY.gauge("media_tasks_inflight", "Media tasks queued or running in the pool", fn=lambda: self._inflight)
+        self._seconds = REGISTRY.histogram("media_task_seconds", "Media task time including the IPC round-trip")
+
+    @classmethod
+    def from_env(cls) -> "MediaPool":
+        workers = os.getenv("AGENT_MEDIA_WORKERS")
+        return cls(int(workers) if workers else None, int(os.getenv("AGENT_MEDIA_MIN_BYTES", DEFAULT_MIN_BYTES)))
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Created on first use; spawn so workers never inherit the event loop or provider threads
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            logger.info("Media pool started with %s worker process(es)", self.workers)
+        return self._executor
+
+    def _replace(self, broken: ProcessPoolExecutor):
+        """Drops a pool whose worker died, so the next task starts a new one."""
+        if self._executor is broken:
+            logger.error("Media pool broken (a worker process died); starting a new one")
+            self._executor = None
+            broken.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, *task):
+        pool = self._pool()
+        try:
+            return pool, pool.submit(*task)
+        except BrokenProcessPool:  # broke before this task was queued, so it is safe to run on a new pool
+            self._replace(pool)
+            pool = self._pool()
+            return pool, pool.submit(*task)
+
+    async def run(self, fn, data: bytes, *args) -> bytes:
+        """``fn(data, *args)`` in a worker, or in a thread with no workers; never on the event loop."""
+        if self.workers <= 0:
+            return await asyncio.to_thread(fn, data, *args)
+        started = time.perf_counter()
+        self._inflight += 1
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+        shm.buf[:len(data)] = data
+        try:
+            pool, future = self._submit(_run_shared, fn, (shm.name, len(data)), args)
+            return _take(await asyncio.wrap_future(future))
+        except BrokenProcessPool:
+            self._replace(pool)
+            raise
+        except asyncio.CancelledError:
+            future.add_done_callback(_discard)  # the worker may still hand back a block
+            raise
+        finally:
+            self._inflight -= 1
+            shm.close()
+            shm.unlink()
+            self._seconds.observe(time.perf_counter() - started)
+
+    async def _run_sized(self, fn, data: bytes, *args) -> bytes:
+        """``run``, except that inputs under ``min_bytes`` run inline: for cheap, size-bound tasks only."""
+        if len(data) < self.min_bytes:
+            return fn(data, *args)
+        return await self.run(fn, data, *args)
+
+    async def prepare_audio(self, data: bytes, sample_rate: int = DEFAULT_SAMPLE_RATE) -> bytes:
+        return await self.run(prepare_audio, data, sample_rate)
+
+    async def b64decode(self, text: str) -> bytes:
+        """binascii.Error (a ValueError) on malformed input, like base64.b64decode."""
+        return await self._run_sized(b64decode, text.encode("ascii") if isinstance(text, str) else text)
+
+    async def b64encode(self, data: bytes) -> str:
+        return (await self._run_sized(b64encode, data)).decode("ascii")
+
+    async def dumps(self, payload: dict) -> str:
+        """
+        ``json.dumps(payload)``. Large top-level string
+        values (audio_base64) travel as raw bytes after a small JSON header
+        rather than being pickled with the rest of the payload.
+        """
+        small, blobs, parts = {}, [], []
+        for key, value in payload.items():
+            if isinstance(value, str) and len(value) >= self.min_bytes:
+                encoded = value.encode()
+                blobs.append((key, len(encoded)))
+                parts.append(encoded)
+            else:
+                small[key] = value
+        if not blobs:
+            return json.dumps(payload)
+        header = json.dumps({**small, "__blobs__": blobs, "__order__": list(payload)}).encode()
+        data = b"".join([len(header).to_bytes(8, "little"), header, *parts])
+        return (await self._run_sized(dumps, data)).decode()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
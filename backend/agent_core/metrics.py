@@ -0,0 +1,140 @@
+"""
+In-process metrics registry (counters, gauges, histograms).
+
+Backends expose it on ``GET /metrics`` as JSON, or in the Prometheus text
+format with ``?format=prometheus``.
+"""
+import threading
+from collections import deque
+from typing import Callable, Dict, Optional, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def read(self) -> float:
+        return self.value
+
+
+class Gauge:
+    """Either set explicitly or backed by a callable evaluated at read time."""
+
+    def __init__(self, fn: Optional[Callable[[], float]] = None):
+        self.value = 0.0
+        self.fn = fn
+
+    def set(self, value: float):
+        self.value = value
+
+    def read(self) -> float:
+        return float(self.fn()) if self.fn else self.value
+
+
+class Histogram:
+    """Count/sum plus a ring buffer of recent samples for percentiles."""
+
+    def __init__(self, window: int = 2048):
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            self.recent.append(value)
+
+    def percentile(self, q: float) -> float:
+        with self._lock:
+            ordered = sorted(self.recent)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(q / 100.0 * len(ordered)))]
+
+    def read(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": round(self.percentile(50), 6),
+            "p95": round(self.percentile(95), 6),
+            "p99": round(self.percentile(99), 6),
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Dict[LabelKey, object]] = {}
+        self._types: Dict[str, str] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind: str, name: str, help_text: str, labels: Dict[str, str], factory):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._metrics.setdefault(name, {})
+            self._types.setdefault(name, kind)
+            self._help.setdefault(name, help_text)
+            if key not in series:
+                series[key] = factory()
+            return series[key]
+
+    def counter(self, name: str, help_text: str = "", **labels) -> Counter:
+        return self._get("counter", name, help_text, labels, Counter)
+
+    def gauge(self, name: str, help_text: str = "", fn: Optional[Callable[[], float]] = None, **labels) -> Gauge:
+        gauge = self._get("gauge", name, help_text, labels, lambda: Gauge(fn))
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def histogram(self, name: str, help_text: str = "", **labels) -> Histogram:
+        return self._get("histogram", name, help_text, labels, Histogram)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            items = [(name, list(series.items())) for name, series in self._metrics.items()]
+        return {
+            name: [{"labels": dict(key), "value": metric.read()} for key, metric in series]
+            for name, series in items
+        }
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for name, series in self.snapshot().items():
+            kind = self._types[name]
+            lines.append(f"# HELP {name} {self._help.get(name, '')}")
+            lines.append(f"# TYPE {name} {'summary' if kind == 'histogram' else kind}")
+            for entry in series:
+                labels = entry["labels"]
+                value = entry["value"]
+                if kind == "histogram":
+                    for q in ("p50", "p95", "p99"):
+                        quantile = {"p50": "0.5", "p95": "0.95", "p99": "0.99"}[q]
+                        lines.append(f"{name}{_format_labels(dict(labels, quantile=quantile))} {value[q]}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {value['sum']}")
+                else:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,279 @@
+"""
+Deterministic normalization and validation for numeric and unit answers.
+
+Runs locally in microseconds, so a bad answer ("thirty", "", "a lot") can be
+re-asked in the same turn instead of after another voice round-trip. Handles:
+
+* native-script digits (Sarvam translates with ``numerals_format: native``):
+  Devanagari, Kannada, Tamil, Telugu, Bengali, Gujarati, Gurmukhi, Malayalam, Odia;
+* Indian number formats: "1,20,000", "1.5 lakh", "2 crore", "50k", simple
+  English number words ("thirty five", "two hundred", "3 hundred") and
+  fractions ("one and a half", "half", "1 1/2");
+* units (kg, gram, quintal, tonne, piece, dozen, bunch, litre) with
+  conversion between weights and between pieces and dozens;
+* currency phrases: "₹30", "Rs. 30", "30 rupees per kg", "30/kg",
+  "12 per 100 g", "रुपये", "ರೂಪಾಯಿ".
+
+Validators return ``(typed_value, None)`` or ``(None, error_message)``. A
+field with a base unit only takes answers in units that convert to it:
+"10 dozen" or "50 bags" for a quantity in kg, or a price per dozen for a
+price per kg, is re-asked rather than stored as a number of kg.
+"""
+import re
+from typing import Callable, Dict, Optional, Tuple
+
+# --- Digits ---
+_NATIVE_ZEROS = (0x0966, 0x0CE6, 0x0BE6, 0x0C66, 0x09E6, 0x0AE6, 0x0A66, 0x0D66, 0x0B66)
+_DIGIT_TABLE = {zero + i: str(i) for zero in _NATIVE_ZEROS for i in range(10)}
+
+
+def normalize_digits(text: str) -> str:
+    """Native-script digits -> ASCII digits."""
+    return text.translate(_DIGIT_TABLE)
+
+
+# --- Number words and multipliers ---
+_SMALL = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8,
+    "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14, "fifteen": 15,
+    "sixteen": 16, "seventeen": 17, "eighteen": 18, "nineteen": 19, "twenty": 20, "thirty": 30,
+    "forty": 40, "fifty": 50, "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90,
+}
+_SCALES = {
+    "hundred": 100, "thousand": 1_000, "k": 1_000, "lakh": 100_000, "lakhs": 100_000, "lac": 100_000,
+    "lacs": 100_000, "million": 1_000_000, "crore": 10_000_000, "crores": 10_000_000, "cr": 10_000_000,
+}
+_WORD = r"(?:" + "|".join(sorted(_SMALL, key=len, reverse=True)) + r"|hundred|thousand)"
+# "two hundred and fifty", "thirty-five"; a trailing "and" is not part of the number
+_WORD_RUN = re.compile(r"\b" + _WORD + r"(?:[\s-]+(?:and[\s-]+)?" + _WORD + r")*\b", re.I)
+
+
+def _words_value(words: str, current: float = 0) -> float:
+    total = 0
+    for word in re.split(r"[\s-]+", words.lower()):
+        if word in _SMALL:
+            current += _SMALL[word]
+        elif word == "hundred":
+            current = max(current, 1) * 100
+        elif word == "thousand":
+            total += max(current, 1) * 1000
+            current = 0
+    return total + current
+
+
+# "3 hundred", "2 thousand five hundred": digits followed by a scale word and maybe more words
+_DIGIT_SCALE_RUN = re.compile(
+    r"(?<![\d.,])(\d+(?:\.\d+)?)[\s-]+((?:hundred|thousand)\b(?:[\s-]+(?:and[\s-]+)?" + _WORD + r"\b)*)", re.I)
+_FRACTIONS = {"half": 0.5, "quarter": 0.25}
+_AND_FRACTION = re.compile(r"(\d+(?:\.\d+)?)\s+and\s+(?:a\s+)?(half|quarter)\b", re.I)  # "1 and a half"
+_BARE_FRACTION = re.compile(r"\b(?:a\s+)?(half|quarter)(?:\s+(?:a|an)\b)?", re.I)       # "half a kg"
+_SLASH_FRACTION = re.compile(r"(?<![\d.,/])(?:(\d+)\s+)?(\d+)/(\d+)(?![\d/])")         # "1 1/2", "3/4"
+
+
+def _number_text(value: float) -> str:
+    return str(int(value)) if value == int(value) else str(value)
+
+
+def _slash_fraction(match) -> str:
+    whole, numerator, denominator = match.groups()
+    if int(denominator) == 0:
+        return match.group(0)
+    return _number_text(int(whole or 0) + int(numerator) / int(denominator))
+
+
+def words_to_digits(text: str) -> str:
+    """"thirty five rupees" -> "35 rupees", "3 hundred" -> "300", "one and a half" -> "1.5"."""
+    text = _DIGIT_SCALE_RUN.sub(
+        lambda match: _number_text(_words_value(match.group(2), float(match.group(1)))), text)
+    text = _WORD_RUN.sub(lambda match: str(_words_value(match.group(0))), text)
+    text = _AND_FRACTION.sub(
+        lambda match: _number_text(float(match.group(1)) + _FRACTIONS[match.group(2).lower()]), text)
+    text = _BARE_FRACTION.sub(lambda match: _number_text(_FRACTIONS[match.group(1).lower()]), text)
+    return _SLASH_FRACTION.sub(_slash_fraction, text)
+
+
+_NUMBER = r"(\d+(?:,\d+)*(?:\.\d+)?|\.\d+)"
+_SCALE = r"(?:\s*(" + "|".join(sorted(_SCALES, key=len, reverse=True)) + r")(?![A-Za-z]))?"
+_NUMBER_RE = re.compile(_NUMBER + _SCALE, re.I)
+
+
+def _to_number(digits: str, scale: Optional[str]) -> float:
+    value = float(digits.replace(",", ""))
+    if scale:
+        value *= _SCALES[scale.lower()]
+    return value
+
+
+def clean(text: str) -> str:
+    """Digits and number words normalized; what the parsers below expect."""
+    return words_to_digits(normalize_digits(text))
+
+
+def numbers(text: str) -> list:
+    """Every number in already-cleaned ``text``, scales applied."""
+    return [_to_number(digits, scale) for digits, scale in _NUMBER_RE.findall(text)]
+
+
+def parse_number(text: str) -> Optional[float]:
+    """First number in ``text`` (after digit/word normalization), scales applied."""
+    match = _NUMBER_RE.search(clean(text))
+    return _to_number(match.group(1), match.group(2)) if match else None
+
+
+def tidy(value: float):
+    """30.0 -> 30, 12.345678 -> 12.35: what gets stored in product_data."""
+    value = round(value, 2)
+    return int(value) if value == int(value) else value
+
+
+# --- Units ---
+UNIT_ALIASES = {
+    "kg": "kg", "kgs": "kg", "kilo": "kg", "kilos": "kg", "kilogram": "kg", "kilograms": "kg",
+    "किलो": "kg", "किलोग्राम": "kg", "ಕೆಜಿ": "kg", "ಕಿಲೋ": "kg",
+    "g": "gram", "gm": "gram", "gms": "gram", "gram": "gram", "grams": "gram", "ग्राम": "gram",
+    "quintal": "quintal", "quintals": "quintal", "qtl": "quintal", "क्विंटल": "quintal", "ಕ್ವಿಂಟಾಲ್": "quintal",
+    "tonne": "tonne", "tonnes": "tonne", "ton": "tonne", "tons": "tonne", "टन": "tonne",
+    "piece": "piece", "pieces": "piece", "pcs": "piece", "pc": "piece", "nos": "piece",
+    "dozen": "dozen", "dozens": "dozen", "दर्जन": "dozen",
+    "bunch": "bunch", "bunches": "bunch", "गुच्छा": "bunch",
+    "litre": "litre", "litres": "litre", "liter": "litre", "liters": "litre", "l": "litre", "लीटर": "litre",
+}
+UNITS = tuple(sorted(set(UNIT_ALIASES.values())))
+_TO_KG = {"gram": 0.001, "kg": 1.0, "quintal": 100.0, "tonne": 1000.0}
+_TO_PIECES = {"piece": 1.0, "dozen": 12.0}
+_UNIT = r"(?<![A-Za-z])(" + "|".join(re.escape(u) for u in sorted(UNIT_ALIASES, key=len, reverse=True)) + r")(?![A-Za-z])"
+_UNIT_RE = re.compile(_UNIT, re.I)
+
+
+def parse_unit(text: str) -> Optional[str]:
+    match = _UNIT_RE.search(text.strip())
+    return UNIT_ALIASES[match.group(1).lower()] if match else None
+
+
+def convert(amount: float, unit: str, target: str) -> Optional[float]:
+    """``amount`` of ``unit`` expressed in ``target``; None if the units are incompatible."""
+    if unit == target:
+        return amount
+    for table in (_TO_KG, _TO_PIECES):
+        if unit in table and target in table:
+            return amount * table[unit] / table[target]
+    return None
+
+
+# --- Prices and quantities inside free text ---
+_CURRENCY = r"(?:₹|(?<![A-Za-z])(?:rs\.?|inr|rupees?|rupaye|रुपये|रुपए|रुपया|रु\.?|ರೂಪಾಯಿ|ರೂ\.?))"
+_PER = r"(?:/|per|a|an|each|प्रति|ಪ್ರತಿ)"
+_PER_COUNT = r"(?:(\d+(?:\.\d+)?)\s*)?"  # "per 100 g"
+_PRICE_PATTERNS = (
+    re.compile(_CURRENCY + r"\s*" + _NUMBER + _SCALE + r"(?:\s*" + _PER + r"\s*" + _PER_COUNT + _UNIT + r")?", re.I),
+    re.compile(_NUMBER + _SCALE + r"\s*" + _CURRENCY + r"(?:\s*" + _PER + r"\s*" + _PER_COUNT + _UNIT + r")?", re.I),
+    re.compile(r"(?:\bat\s+)?" + _NUMBER + _SCALE + r"\s*(?:/|per)\s*" + _PER_COUNT + _UNIT, re.I),
+)
+# "per bag", "/box": a price per something that is not a known unit
+_PER_OTHER_RE = re.compile(r"(?:/|\bper\b|\beach\b)\s*(?:\d+(?:\.\d+)?\s*)?([^\W\d_]+)", re.I)
+# "50 bags": a number followed by a word; the word is an unknown unit unless it is one of these
+_NUMBER_WORD_RE = re.compile(_NUMBER + _SCALE + r"\s*([^\W\d_]+)", re.I)
+_NOT_UNITS = frozenset(
+    "of and or to at in for per rupees rupee rs inr total only approx approximately about around is are was "
+    "this that it each".split()
+)
+_QUANTITY_RE = re.compile(r"(?<![/\w.,])" + _NUMBER + _SCALE + r"\s*" + _UNIT, re.I)
+
+
+def find_price(text: str) -> Optional[Tuple[float, Optional[str], Tuple[int, int]]]:
+    """
+    (amount, per_unit or None, span) of the first price phrase in
+    already-cleaned ``text``; "12 per 100 g" is an amount of 0.12 per gram.
+    """
+    for pattern in _PRICE_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            amount = _to_number(match.group(1), match.group(2))
+            count, unit = match.group(3), match.group(4)
+            if unit and count and float(count) > 0:
+                amount /= float(count)
+            return amount, UNIT_ALIASES[unit.lower()] if unit else None, match.span()
+    return None
+
+
+def find_quantity(text: str, skip: Optional[Tuple[int, int]] = None) -> Optional[Tuple[float, str, Tuple[int, int]]]:
+    """(amount, unit, span) of the first "<number> <unit>" outside ``skip``."""
+    for match in _QUANTITY_RE.finditer(text):
+        if skip and skip[0] <= match.start() < skip[1]:
+            continue
+        return _to_number(match.group(1), match.group(2)), UNIT_ALIASES[match.group(3).lower()], match.span()
+    return None
+
+
+# --- Validators ---
+Validator = Callable[[str, Optional[str]], Tuple[object, Optional[str]]]
+
+
+def validate_price(text: str, base_unit: Optional[str] = None):
+    """Positive amount; a price per quintal/tonne/gram is converted to one per ``base_unit``."""
+    cleaned = clean(str(text))
+    found = find_price(cleaned)
+    if found:
+        amount, per_unit, _ = found
+    else:
+        amount, per_unit = parse_number(cleaned), parse_unit(cleaned)
+    if amount is None:
+        return None, "I couldn't find a price in that."
+    if amount <= 0:
+        return None, "The price must be more than zero."
+    if base_unit:
+        if per_unit is None:
+            other = _PER_OTHER_RE.search(cleaned)
+            if other and parse_unit(other.group(1)) is None:
+                return None, f"Please give the price per {base_unit}, not per {other.group(1)}."
+            if re.search(r"\beach\b", cleaned, re.I):
+                return None, f"Please give the price per {base_unit}, not per piece."
+        else:
+            # Rs 1200 per quintal is Rs 12 per kg; a price per dozen has no price per kg
+            converted = convert(amount, base_unit, per_unit)
+            if converted is None:
+                return None, f"Please give the price per {base_unit}, not per {per_unit}."
+            amount = converted
+    return tidy(amount), None
+
+
+def validate_quantity(text: str, base_unit: Optional[str] = None):
+    """Positive amount; converted to ``base_unit`` when a compatible unit is given."""
+    cleaned = clean(str(text))
+    found = find_quantity(cleaned)
+    if found:
+        amount, unit, _ = found
+    else:
+        amount, unit = parse_number(cleaned), None
+    if amount is None:
+        return None, "I couldn't find a quantity in that."
+    if amount <= 0:
+        return None, "The quantity must be more than zero."
+    if base_unit:
+        if unit is None:
+            other = _NUMBER_WORD_RE.search(cleaned)
+            if other and other.group(3).lower() not in _NOT_UNITS and parse_unit(other.group(3)) is None:
+                return None, f"Please give the quantity in {base_unit}, not in {other.group(3)}."
+        else:
+            converted = convert(amount, unit, base_unit)
+            if converted is None:
+                return None, f"Please give the quantity in {base_unit}, not in {unit}."
+            amount = converted
+    return tidy(amount), None
+
+
+def validate_unit(text: str, base_unit: Optional[str] = None):
+    """A known unit; one convertible to ``base_unit`` is stored as ``base_unit``, like the quantity it goes with."""
+    unit = parse_unit(normalize_digits(str(text)))
+    if unit is None:
+        return None, f"Please say one of: {', '.join(UNITS)}."
+    if base_unit and convert(1.0, unit, base_unit) is not None:
+        return base_unit, None
+    return unit, None
+
+
+VALIDATORS: Dict[str, Validator] = {
+    "price": validate_price,
+    "quantity": validate_quantity,
+    "unit": validate_unit,
+}
@@ -0,0 +1,190 @@
+"""
+Prefetching the audio of the next form question while the user answers.
+
+The form engine knows what the next reply will almost certainly be: the
+next field's question or, if the answer does not parse, the same question
+with its validator's error in front. As soon as question k is sent, those
+candidate replies are translated and synthesized in the session's language
+in background tasks. When the answer arrives and the reply text matches a
+prefetched one, translation and TTS are skipped (or their remaining time
+awaited if they are still running).
+
+Each session has one slot holding the candidates for its next reply.
+Scheduling again, taking a reply, or ending the session cancels whatever
+in the slot was not used. Slots of sessions that went quiet are dropped
+after ``ttl`` seconds, and only the ``max_sessions`` most recent are kept,
+so abandoned sessions do not pin rendered audio. Prefetch tasks run under
+their own turn deadline, so they are not cut short when the turn that
+started them ends. A failed or shed prefetch counts as a miss, and the
+reply is rendered as usual.
+
+Prefetching is speculative and competes with live turns for the same
+provider slots, so it yields to them: nothing is scheduled unless
+``admit()`` says there is spare capacity (see
+``agent_core.limiter.spare_capacity``), and prefetch calls are never
+hedged.
+
+``OpeningCache`` covers the reply before any answer: the first question
+of a form whose session was started from that form's page. It is the same
+for every such session, so its rendering per language (and audio format)
+is shared across sessions and made once.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .deadline import turn_deadline
+from .forms import Form, FormStep
+from .hedging import speculative
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# (text to say, language) -> (text as said, base64 audio or None); no audio counts as a miss
+Rendered = Tuple[str, Optional[str]]
+Render = Callable[[str, str], Awaitable[Rendered]]
+
+_outcomes = {
+    outcome: REGISTRY.counter("prefetch_replies_total", "Replies by prefetch outcome", outcome=outcome)
+    for outcome in ("hit", "miss")
+}
+_cancelled = REGISTRY.counter("prefetch_cancelled_total", "Prefetches cancelled before they finished")
+_skipped = REGISTRY.counter("prefetch_skipped_total", "Prefetches not started because providers were busy")
+_expired = REGISTRY.counter("prefetch_expired_total", "Session slots dropped unused (idle or over the cap)")
+_openings = {
+    outcome: REGISTRY.counter("opening_renders_total", "Opening questions by cache outcome", outcome=outcome)
+    for outcome in ("hit", "miss")
+}
+
+
+def likely_steps(form: Form, step: FormStep) -> List[FormStep]:
+    """
+    The steps most likely to follow ``step``: its field answered (the next
+    field is asked), and its field rejected by the validator (asked again).
+    """
+    if step.done:
+        return []
+    mask = step.mask | step.field.bit
+    following = [FormStep(form.next_field(mask), step.url, mask)]
+    if step.field.validator is not None:
+        following.append(FormStep(step.field, step.url, step.mask, error=step.field.validate("")[1]))
+    return [candidate for candidate in following if not candidate.done]
+
+
+class Prefetcher:
+    """Per-session slot of background-rendered candidate replies."""
+
+    def __init__(self, render: Render, admit: Optional[Callable[[], bool]] = None, ttl: float = 300.0,
+                 max_sessions: int = 1024):
+        self.render = render
+        self.admit = admit
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        # session -> (scheduled at, slot), oldest first
+        self._slots: "OrderedDict[str, Tuple[float, Dict[Tuple[str, str], asyncio.Task]]]" = OrderedDict()
+        REGISTRY.gauge("prefetch_sessions", "Sessions with prefetched replies", fn=lambda: len(self._slots))
+
+    async def _run(self, text: str, language: str) -> Rendered:
+        with turn_deadline(), speculative():  # a fresh budget, not what is left of the turn that scheduled it
+            return await self.render(text, language)
+
+    def _expire(self, now: float):
+        while self._slots:
+            session_id, (scheduled_at, _) = next(iter(self._slots.items()))
+            if len(self._slots) <= self.max_sessions and now - scheduled_at < self.ttl:
+                break
+            self._cancel(self._slots.pop(session_id)[1])
+            _expired.inc()
+
+    def schedule(self, session_id: str, texts: Iterable[str], language: str):
+        """Starts rendering ``texts`` for the session's next reply, replacing its slot."""
+        self.cancel(session_id)
+        if self.admit is not None and not self.admit():
+            _skipped.inc()
+            return
+        slot = {}
+        for text in dict.fromkeys(texts):
+            task = asyncio.ensure_future(self._run(text, language))
+            task.add_done_callback(_retrieve)
+            slot[(text, language)] = task
+        if slot:
+            now = time.monotonic()
+            self._slots[session_id] = (now, slot)
+            self._expire(now)
+
+    async def take(self, session_id: str, text: str, language: str) -> Optional[Rendered]:
+        """The prefetched rendering of ``text``, or None; empties the session's slot either way."""
+        self._expire(time.monotonic())
+        slot = self._slots.pop(session_id, (0.0, {}))[1]
+        task = slot.pop((text, language), None)
+        self._cancel(slot)
+        if task is not None:
+            try:
+                rendered = await task
+            except Exception as e:
+                logger.info("Prefetch for session %s failed, rendering the reply again: %s", session_id, e)
+            else:
+                if rendered and rendered[1]:
+                    _outcomes["hit"].inc()
+                    return rendered
+        _outcomes["miss"].inc()
+        return None
+
+    def cancel(self, session_id: str):
+        """Drops the session's slot (new prediction, or the session ended)."""
+        self._cancel(self._slots.pop(session_id, (0.0, {}))[1])
+
+    @staticmethod
+    def _cancel(slot: Dict[Tuple[str, str], asyncio.Task]):
+        for task in slot.values():
+            if not task.done():
+                task.cancel()
+                _cancelled.inc()
+
+
+class OpeningCache:
+    """
+    Renderings of fixed replies shared by every session, keyed by the render
+    arguments. Concurrent requests for the same key share one render; a
+    rendering without audio (or a failed one) is not kept.
+    """
+
+    def __init__(self, render: Callable[..., Awaitable[Any]], max_entries: int = 256):
+        self.render = render
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, asyncio.Task]" = OrderedDict()
+
+    async def _run(self, key: tuple):
+        with turn_deadline():  # shared by several sessions, so not bound to one turn's budget
+            return await self.render(*key)
+
+    async def get(self, *key):
+        task = self._entries.get(key)
+        if task is not None:
+            self._entries.move_to_end(key)
+            _openings["hit"].inc()
+        else:
+            _openings["miss"].inc()
+            task = self._entries[key] = asyncio.ensure_future(self._run(key))
+            task.add_done_callback(_retrieve)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        try:
+            rendered = await asyncio.shield(task)  # one caller going away does not cancel the others' render
+        except Exception:
+            self._forget(key, task)
+            raise
+        if not rendered or not rendered[1]:
+            self._forget(key, task)
+        return rendered
+
+    def _forget(self, key: tuple, task: asyncio.Task):
+        if self._entries.get(key) is task:
+            del self._entries[key]
+
+
+def _retrieve(task: asyncio.Task):
+    if not task.cancelled():
+        task.exception()  # failures surface in take(); don't log them as never retrieved
@@ -0,0 +1,272 @@
+"""
+Fuzzy lookup of a farmer's existing products for the post flow.
+
+The post form asks "Which existing product do you want to post?" and used
+to store whatever the farmer said. To find the real ``Product`` row we
+would need an LLM call or a scan of the farmer's products on every
+answer. Instead each farmer gets an in-memory index of product names,
+built the first time it is needed:
+
+* names are matched on character trigrams, once as spelled and once as
+  a phonetic key that folds the usual transliteration variants
+  ("bhindi"/"bindi", "aloo"/"alu", "tamaatar"/"tamatar", plurals);
+* an inverted index from trigram to products scores only the products
+  that share a trigram with the answer, so a lookup takes microseconds;
+* filler words ("I want to post my ...") are dropped from the answer.
+
+``ProductIndex.resolve`` returns the product if one clearly wins, up to
+``k`` candidates to ask about if several are close, or nothing. A single
+candidate is offered as "Did you mean X?"; the caller keeps its id and
+passes it back with the next answer, so "yes" takes it and "no" asks for
+the name again instead of storing the word. Indexes
+are kept per farmer in ``ProductCatalog`` (LRU, ``AGENT_PRODUCT_INDEX_TTL``
+seconds). Call ``invalidate(farmer_id)`` when the farmer's products change.
+By default products are read from the app's Prisma SQLite database
+(``AGENT_PRODUCTS_DB``, default ``prisma/dev.db``).
+
+    AGENT_PRODUCT_INDEX_TTL=300         seconds before an index is reloaded
+    AGENT_PRODUCT_INDEX_FARMERS=1024    farmers kept in memory
+"""
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+from .forms import Form, FormStep
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_SLOT = "product_ref"
+DEFAULT_DB = Path(__file__).resolve().parents[2] / "prisma" / "dev.db"
+DEFAULT_TTL = 300.0
+DEFAULT_FARMERS = 1024
+
+ACCEPT_SCORE = 0.6   # the best match must score at least this...
+MIN_LEAD = 0.15      # ...and lead the runner-up by this much to be taken without asking
+SUGGEST_SCORE = 0.3  # weaker matches are not offered as candidates
+DICE_WEIGHT = 0.6    # the rest of the score is how much of the name the answer covers
+
+FILLER_WORDS = frozenset("""
+    a an the my our this that these those i we want wanna would like to post about of for on it is
+    product products existing one some please which called named
+""".split())
+
+# Replies to a single-candidate "Did you mean X?"
+_YES = re.compile(r"^\s*(?:yes|yeah|yep|yup|ok(?:ay)?|sure|correct|right|that one|haan?|ha+|ji|han ji|"
+                  r"हाँ|हां|जी|ಹೌದು)\b[\s.!]*$", re.I)
+_NO = re.compile(r"^\s*(?:no|nope|nah|not that(?: one)?|wrong|nahi+n?|nai|illa|नहीं|नही|ಇಲ್ಲ)\b[\s.!]*$", re.I)
+
+# Transliteration variants folded by the phonetic key, applied in order
+_PHONETIC_RULES = [
+    (re.compile(r"(?<=\w)(oes|ies|s)\b"), lambda m: {"oes": "o", "ies": "i"}.get(m.group(1), "")),
+    (re.compile(r"ph"), "f"),
+    (re.compile(r"([kgcjtdpbsr])h"), r"\1"),  # aspirates and sh/ch: bh->b, kh->k, sh->s
+    (re.compile(r"ck|q"), "k"),
+    (re.compile(r"x"), "ks"),
+    (re.compile(r"w"), "v"),
+    (re.compile(r"z"), "j"),
+    (re.compile(r"ee|ea|ii|y\b"), "i"),
+    (re.compile(r"oo|uu|ou"), "u"),
+    (re.compile(r"(\w)\1+"), r"\1"),         # aa->a, double consonants
+    (re.compile(r"(?<=\w\w\w)a\b"), ""),     # final schwa: "karela"/"karel"
+]
+
+_lookups = {
+    outcome: REGISTRY.counter("product_lookups_total", "Product name lookups by outcome", outcome=outcome)
+    for outcome in ("resolved", "ambiguous", "unmatched")
+}
+_loads = REGISTRY.counter("product_index_loads_total", "Per-farmer product indexes built")
+
+
+def _words(text: str) -> List[str]:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c) or not c.isascii())
+    return re.findall(r"\w+", text)
+
+
+def phonetic_key(text: str) -> str:
+    """Spelling-insensitive form of a (romanized) product name."""
+    key = " ".join(_words(text))
+    for pattern, replacement in _PHONETIC_RULES:
+        key = pattern.sub(replacement, key)
+    return key
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    padded = f" {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class Product(NamedTuple):
+    id: str
+    name: str
+
+
+class Match(NamedTuple):
+    product: Product
+    score: float
+
+
+class Resolution(NamedTuple):
+    product: Optional[Product]  # set when one product clearly matches
+    candidates: List[Match]     # best first; more than one when asking the farmer to choose
+
+
+class ProductIndex:
+    """Trigram index over one farmer's product names."""
+
+    def __init__(self, products: Iterable[Tuple[str, str]]):
+        self.products = [Product(str(product_id), name) for product_id, name in products if name]
+        # Per product: spelled and phonetic trigram sets; per trigram: the products having it
+        self._grams: List[Tuple[FrozenSet[str], FrozenSet[str]]] = []
+        self._postings: Tuple[Dict[str, List[int]], Dict[str, List[int]]] = ({}, {})
+        for i, product in enumerate(self.products):
+            grams = (trigrams(" ".join(_words(product.name))), trigrams(phonetic_key(product.name)))
+            self._grams.append(grams)
+            for postings, gram_set in zip(self._postings, grams):
+                for gram in gram_set:
+                    postings.setdefault(gram, []).append(i)
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def match(self, answer: str, k: int = 3) -> List[Match]:
+        """Up to ``k`` products scoring at least ``SUGGEST_SCORE``, best first."""
+        words = [w for w in _words(answer) if w not in FILLER_WORDS] or _words(answer)
+        if not words or not self.products:
+            return []
+        query = " ".join(words)
+        scores: Dict[int, float] = {}
+        for which, gram_set in enumerate((trigrams(query), trigrams(phonetic_key(query)))):
+            postings = self._postings[which]
+            shared: Dict[int, int] = {}
+            for gram in gram_set:
+                for i in postings.get(gram, ()):
+                    shared[i] = shared.get(i, 0) + 1
+            for i, count in shared.items():
+                size = len(self._grams[i][which])
+                score = DICE_WEIGHT * 2 * count / (len(gram_set) + size) + (1 - DICE_WEIGHT) * count / size
+                if score > scores.get(i, 0.0):
+                    scores[i] = score
+        best = sorted(scores.items(), key=lambda item: -item[1])[:k]
+        return [Match(self.products[i], round(score, 3)) for i, score in best if score >= SUGGEST_SCORE]
+
+    def resolve(self, answer: str, k: int = 3) -> Resolution:
+        candidates = self.match(answer, k)
+        if candidates and candidates[0].score >= ACCEPT_SCORE and (
+                len(candidates) == 1 or candidates[0].score - candidates[1].score >= MIN_LEAD):
+            _lookups["resolved"].inc()
+            return Resolution(candidates[0].product, candidates[:1])
+        _lookups["ambiguous" if candidates else "unmatched"].inc()
+        return Resolution(None, candidates)
+
+
+def sqlite_loader(path=None) -> Callable[[str], List[Tuple[str, str]]]:
+    """Reads a farmer's (id, name) pairs from the Prisma ``Product`` table."""
+    path = Path(path or os.getenv("AGENT_PRODUCTS_DB", DEFAULT_DB))
+
+    def load(farmer_id: str) -> List[Tuple[str, str]]:
+        if not path.exists():
+            logger.warning("Product database %s not found, farmer %s has no products to match", path, farmer_id)
+            return []
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            return conn.execute('SELECT id, name FROM "Product" WHERE farmerId = ?', (farmer_id,)).fetchall()
+        finally:
+            conn.close()
+
+    return load
+
+
+class ProductCatalog:
+    """Lazily built ``ProductIndex`` per farmer, least recently used dropped first."""
+
+    def __init__(self, loader: Optional[Callable[[str], Iterable[Tuple[str, str]]]] = None,
+                 ttl: float = DEFAULT_TTL, max_farmers: int = DEFAULT_FARMERS):
+        self.loader = loader or sqlite_loader()
+        self.ttl = ttl
+        self.max_farmers = max_farmers
+        self._indexes: "OrderedDict[str, Tuple[float, ProductIndex]]" = OrderedDict()
+        REGISTRY.gauge("product_index_farmers", "Farmers with a product index in memory", fn=lambda: len(self._indexes))
+
+    @classmethod
+    def from_env(cls, loader=None) -> "ProductCatalog":
+        return cls(loader, float(os.getenv("AGENT_PRODUCT_INDEX_TTL", DEFAULT_TTL)),
+                   int(os.getenv("AGENT_PRODUCT_INDEX_FARMERS", DEFAULT_FARMERS)))
+
+    def cached(self, farmer_id: str) -> Optional[ProductIndex]:
+        entry = self._indexes.get(farmer_id)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        self._indexes.move_to_end(farmer_id)
+        return entry[1]
+
+    def _store(self, farmer_id: str, products) -> ProductIndex:
+        index = ProductIndex(products)
+        _loads.inc()
+        self._indexes[farmer_id] = (time.monotonic(), index)
+        self._indexes.move_to_end(farmer_id)
+        while len(self._indexes) > self.max_farmers:
+            self._indexes.popitem(last=False)
+        return index
+
+    def get(self, farmer_id: str) -> ProductIndex:
+        return self.cached(farmer_id) or self._store(farmer_id, self.loader(farmer_id))
+
+    async def aget(self, farmer_id: str) -> ProductIndex:
+        """``get`` with the database read off the event loop."""
+        return self.cached(farmer_id) or self._store(farmer_id, await asyncio.to_thread(self.loader, farmer_id))
+
+    def invalidate(self, farmer_id: Optional[str] = None):
+        """Drops one farmer's index (their products changed), or all of them."""
+        if farmer_id is None:
+            self._indexes.clear()
+        else:
+            self._indexes.pop(farmer_id, None)
+
+
+def choice_prompt(candidates: List[Match]) -> str:
+    names = [match.product.name for match in candidates]
+    listed = ", ".join(names[:-1]) + f" or {names[-1]}" if len(names) > 1 else names[0]
+    return f"Did you mean {listed}?"
+
+
+def resolve_product_answer(form: Form, data: dict, step: FormStep, index: Optional[ProductIndex],
+                           offered: Optional[str] = None) -> Tuple[FormStep, Optional[str]]:
+    """
+    Replaces a just-saved product answer with the matching product's id.
+    If several products are close, the answer is unsaved and the question
+    asked again with the candidates; if nothing matches (or the farmer has
+    no index), the answer is kept as said. Also returns the id of a single
+    candidate offered as "Did you mean X?" (else None): pass it back as
+    ``offered`` with the next answer, which may then be a yes or a no.
+    """
+    field = form.by_slot.get(PRODUCT_SLOT)
+    if field is None or index is None or not len(index) or field.key not in step.saved_keys:
+        return step, None
+    answer = str(data[field.key])
+    saved = tuple(key for key in step.saved_keys if key != field.key)
+    if offered is not None and any(product.id == offered for product in index.products):
+        if _YES.match(answer):
+            data[field.key] = offered
+            return FormStep(step.field, form.url(data), step.mask, step.saved_keys, step.error), None
+        if _NO.match(answer):
+            del data[field.key]
+            return FormStep(field, form.url(data), step.mask & ~field.bit, saved,
+                            "Which product is it then? Please say its name."), None
+    resolution = index.resolve(answer)
+    if resolution.product is not None:
+        data[field.key] = resolution.product.id
+        return FormStep(step.field, form.url(data), step.mask, step.saved_keys, step.error), None
+    if not resolution.candidates:
+        return step, None
+    del data[field.key]
+    single = resolution.candidates[0].product.id if len(resolution.candidates) == 1 else None
+    return FormStep(field, form.url(data), step.mask & ~field.bit, saved, choice_prompt(resolution.candidates)), single
@@ -0,0 +1,368 @@
+"""
+Looking inside a live worker: a sampling CPU profiler, tracemalloc
+snapshots and per-session memory, for the admin endpoints of the servers.
+
+Nothing here costs anything until an admin asks for it:
+
+* ``SamplingProfiler.profile(seconds)`` reads every thread's Python stack
+  (``sys._current_frames``) each ``interval`` for ``seconds`` from a thread
+  of its own and returns the stacks in the collapsed format
+  (``thread;outer (file:line);inner (file:line) count`` per line) that
+  flamegraph.pl, speedscope and inferno read. Threads parked in a selector,
+  a lock or a queue are left out unless ``idle`` is set. One profile runs
+  at a time (``ProfilerBusy``);
+* ``MemoryTracer`` starts ``tracemalloc`` on request, keeps the last few
+  snapshots under numeric ids and diffs any two of them (or one against
+  now), grouped by line or by traceback; ``stop()`` ends the tracing, and
+  with it its overhead;
+* ``session_memory`` sizes the objects reachable from each session's entry
+  in a session store (``conversation_states``, the websocket
+  ``ConnectionManager``), stopping at modules, classes and functions and
+  at a bounded number of objects per session.
+
+``admin_router(sessions)`` builds the ``/admin`` FastAPI router every
+server includes; ``sessions`` returns that server's ``(session id, held
+objects)`` pairs. ``AdminGate`` guards it: with no ``AGENT_ADMIN_TOKEN`` the
+endpoints are off (404); with one they need it in the ``X-Admin-Token``
+header. FastAPI is imported only when a router is built, so the Flask
+backend can use the rest of this module without it.
+
+    AGENT_ADMIN_TOKEN=              admin endpoints are off unless set
+    AGENT_PROFILE_MAX_SECONDS=60    longest CPU profile one request can ask for
+    AGENT_PROFILE_INTERVAL=0.005    seconds between stack samples
+"""
+import asyncio
+import gc
+import hmac
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Literal, Optional, Tuple
+
+from .metrics import REGISTRY
+
+ADMIN_HEADER = "X-Admin-Token"
+DEFAULT_MAX_SECONDS = 60.0
+DEFAULT_INTERVAL = 0.005
+DEFAULT_SNAPSHOTS = 8
+DEFAULT_MAX_OBJECTS = 200_000
+
+MemoryGroup = Literal["lineno", "filename", "traceback"]  # tracemalloc statistics key types
+
+# (file name, function) of the Python frame a thread sits in while it waits for work
+IDLE_FRAMES = frozenset({
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("socket.py", "accept"),
+})
+
+_profiles = REGISTRY.counter("admin_profiles_total", "CPU profiles taken through the admin endpoints")
+_snapshots = REGISTRY.counter("admin_memory_snapshots_total", "tracemalloc snapshots taken through the admin endpoints")
+
+
+class ProfilerBusy(RuntimeError):
+    """Another CPU profile is already running in this worker."""
+
+
+class AdminGate:
+    """Checks the admin token of a request; disabled when no token is configured."""
+
+    def __init__(self, token: Optional[str] = None):
+        self.token = token or None
+
+    @classmethod
+    def from_env(cls) -> "AdminGate":
+        return cls(os.getenv("AGENT_ADMIN_TOKEN"))
+
+    @property
+    def enabled(self) -> bool:
+        return self.token is not None
+
+    def allows(self, token: Optional[str]) -> bool:
+        return self.enabled and token is not None and hmac.compare_digest(token.encode(), self.token.encode())
+
+
+def _frame_label(code: types.CodeType) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples every thread's stack on a timer; no hooks are installed, so nothing slows down meanwhile."""
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, max_seconds: float = DEFAULT_MAX_SECONDS):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "SamplingProfiler":
+        return cls(
+            interval=float(os.getenv("AGENT_PROFILE_INTERVAL", DEFAULT_INTERVAL)),
+            max_seconds=float(os.getenv("AGENT_PROFILE_MAX_SECONDS", DEFAULT_MAX_SECONDS)),
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def profile(self, seconds: float, interval: Optional[float] = None, idle: bool = False) -> Tuple[str, dict]:
+        """
+        Samples for ``seconds`` (capped at ``max_seconds``) and returns the
+        collapsed stacks and a summary. Blocks the calling thread for the
+        whole time: call it through ``asyncio.to_thread``.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A CPU profile is already running")
+        try:
+            _profiles.inc()
+            return self._sample(min(max(seconds, 0.0), self.max_seconds), interval or self.interval, idle)
+        finally:
+            self._lock.release()
+
+    def _sample(self, seconds: float, interval: float, idle: bool) -> Tuple[str, dict]:
+        stacks: Counter = Counter()
+        labels: Dict[types.CodeType, str] = {}
+        me = threading.get_ident()
+        samples = 0
+        started = time.perf_counter()
+        deadline = started + seconds
+        while True:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                code = frame.f_code
+                if not idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _frame_label(code)
+                    stack.append(label)
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                stacks[";".join(reversed(stack))] += 1
+            del frame
+            samples += 1
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            time.sleep(min(interval, deadline - now))
+        elapsed = time.perf_counter() - started
+        collapsed = "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        return collapsed, {"seconds": round(elapsed, 3), "samples": samples, "stacks": len(stacks),
+                           "interval": interval, "idle": idle}
+
+
+class MemoryTracer:
+    """tracemalloc on demand: start, numbered snapshots (the last ``keep``), diffs, stop."""
+
+    def __init__(self, keep: int = DEFAULT_SNAPSHOTS):
+        self.keep = keep
+        self._snapshots: "OrderedDict[int, Tuple[float, tracemalloc.Snapshot]]" = OrderedDict()
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ]
+
+    def status(self) -> dict:
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+            "snapshots": [{"id": snapshot_id, "taken_at": taken_at}
+                          for snapshot_id, (taken_at, _) in self._snapshots.items()],
+        }
+
+    def start(self, frames: int = 1) -> dict:
+        """Starts tracing (``frames`` deep tracebacks); allocations made before are not seen."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        return self.status()
+
+    def stop(self) -> dict:
+        tracemalloc.stop()
+        with self._lock:
+            self._snapshots.clear()
+        return self.status()
+
+    def _take(self) -> tracemalloc.Snapshot:
+        if not tracemalloc.is_tracing():
+            raise ValueError("tracemalloc is not running; start it first")
+        return tracemalloc.take_snapshot().filter_traces(self._filters)
+
+    def snapshot(self, top: int = 20, key_type: MemoryGroup = "lineno") -> dict:
+        """Takes and keeps a snapshot; returns its id and largest allocation sites. Slow: run it in a thread."""
+        snapshot = self._take()
+        _snapshots.inc()
+        with self._lock:
+            snapshot_id = self._next_id
+            self._next_id += 1
+            self._snapshots[snapshot_id] = (time.time(), snapshot)
+            while len(self._snapshots) > self.keep:
+                self._snapshots.popitem(last=False)
+        stats = snapshot.statistics(key_type)
+        return {
+            "id": snapshot_id,
+            "total_bytes": sum(stat.size for stat in stats),
+            "blocks": sum(stat.count for stat in stats),
+            "top": [{"where": _where(stat.traceback), "bytes": stat.size, "blocks": stat.count}
+                    for stat in stats[:top]],
+        }
+
+    def _get(self, snapshot_id: int) -> tracemalloc.Snapshot:
+        with self._lock:
+            if snapshot_id not in self._snapshots:
+                raise LookupError(f"No snapshot {snapshot_id} (kept: {list(self._snapshots)})")
+            return self._snapshots[snapshot_id][1]
+
+    def diff(self, base: int, against: Optional[int] = None, top: int = 20, key_type: MemoryGroup = "lineno"
+             ) -> dict:
+        """What grew between snapshot ``base`` and ``against`` (a new snapshot, not kept, if None)."""
+        old = self._get(base)
+        new = self._get(against) if against is not None else self._take()
+        stats = new.compare_to(old, key_type)
+        return {
+            "base": base,
+            "against": against if against is not None else "now",
+            "size_diff_bytes": sum(stat.size_diff for stat in stats),
+            "count_diff": sum(stat.count_diff for stat in stats),
+            "top": [{"where": _where(stat.traceback), "size_diff_bytes": stat.size_diff, "bytes": stat.size,
+                     "count_diff": stat.count_diff, "blocks": stat.count}
+                    for stat in stats[:top]],
+        }
+
+
+def _where(traceback: tracemalloc.Traceback) -> str:
+    return " <- ".join(f"{frame.filename}:{frame.lineno}" for frame in traceback)
+
+
+_OPAQUE = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+           types.CodeType, types.FrameType)
+
+
+def deep_size(obj: Any, max_objects: int = DEFAULT_MAX_OBJECTS) -> Tuple[int, int, bool]:
+    """
+    ``sys.getsizeof`` summed over everything reachable from ``obj``, each
+    object once: (bytes, objects, truncated). Modules, classes and functions
+    are not entered or counted (they are shared, not owned).
+    """
+    seen = set()
+    pending = [obj]
+    size = 0
+    while pending:
+        current = pending.pop()
+        if id(current) in seen or isinstance(current, _OPAQUE):
+            continue
+        if len(seen) >= max_objects:
+            return size, len(seen), True
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+        pending.extend(gc.get_referents(current))
+    return size, len(seen), False
+
+
+def session_memory(sessions: Iterable[Tuple[str, Any]], top: int = 20, max_objects: int = DEFAULT_MAX_OBJECTS) -> dict:
+    """
+    Per-session ``deep_size`` of ``(session id, what the worker holds for it)``
+    pairs, largest first. Objects shared by sessions count in each of them.
+    Pass a list, not a live dict view: this runs in a worker thread.
+    """
+    sizes = []
+    for session_id, held in sessions:
+        size, objects, truncated = deep_size(held, max_objects)
+        sizes.append({"session_id": session_id, "bytes": size, "objects": objects, "truncated": truncated})
+    sizes.sort(key=lambda entry: entry["bytes"], reverse=True)
+    return {
+        "sessions": len(sizes),
+        "total_bytes": sum(entry["bytes"] for entry in sizes),
+        "top": sizes[:top],
+    }
+
+
+def admin_router(sessions: Callable[[], List[Tuple[str, Any]]]):
+    """
+    The ``/admin`` router: CPU profiles, tracemalloc and per-session memory.
+    ``sessions`` is called on the event loop and must return a list (not a
+    live view) of what the server holds per session; the sizing runs in a
+    thread.
+    """
+    from fastapi import APIRouter, Depends, Header, HTTPException, Query
+    from fastapi.responses import PlainTextResponse
+
+    gate = AdminGate.from_env()
+    profiler = SamplingProfiler.from_env()
+    memory = MemoryTracer()
+
+    def require_admin(x_admin_token: Optional[str] = Header(None)):
+        if not gate.enabled:
+            raise HTTPException(status_code=404, detail="Not Found")
+        if not gate.allows(x_admin_token):
+            raise HTTPException(status_code=403, detail=f"{ADMIN_HEADER} header missing or wrong")
+
+    admin = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+    @admin.get("/profile/cpu", response_class=PlainTextResponse)
+    async def profile_cpu(seconds: float = Query(10, gt=0), interval: Optional[float] = Query(None, gt=0, le=1),
+                          idle: bool = False):
+        """Samples every thread's stack for ``seconds``; collapsed stacks for flamegraph.pl or speedscope."""
+        try:
+            collapsed, summary = await asyncio.to_thread(profiler.profile, seconds, interval, idle)
+        except ProfilerBusy as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        return PlainTextResponse(collapsed, headers={"X-Profile-Samples": str(summary["samples"]),
+                                                     "X-Profile-Seconds": str(summary["seconds"])})
+
+    @admin.get("/memory")
+    async def memory_status():
+        return memory.status()
+
+    @admin.post("/memory/start")
+    async def memory_start(frames: int = Query(1, ge=1, le=64)):
+        """Starts tracemalloc; snapshots and diffs only see allocations made after this."""
+        return memory.start(frames)
+
+    @admin.post("/memory/stop")
+    async def memory_stop():
+        return memory.stop()
+
+    @admin.post("/memory/snapshot")
+    async def memory_snapshot(top: int = Query(20, ge=1, le=500), group: MemoryGroup = "lineno"):
+        try:
+            return await asyncio.to_thread(memory.snapshot, top, group)
+        except ValueError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+
+    @admin.get("/memory/diff")
+    async def memory_diff(base: int, against: Optional[int] = None, top: int = Query(20, ge=1, le=500),
+                          group: MemoryGroup = "lineno"):
+        """What grew since snapshot ``base`` (until snapshot ``against``, or now)."""
+        try:
+            return await asyncio.to_thread(memory.diff, base, against, top, group)
+        except LookupError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+
+    @admin.get("/memory/sessions")
+    async def memory_sessions(top: int = Query(20, ge=1, le=500)):
+        """Memory the server holds for each session, largest first."""
+        return await asyncio.to_thread(session_memory, sessions(), top)
+
+    return admin
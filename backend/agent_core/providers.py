@@ -0,0 +1,222 @@
+"""
+Provider abstraction for the external services the voice agent talks to.
+
+Every backend reaches the LLM, speech-to-text, translation and text-to-speech
+through a ``ProviderSet`` instead of calling ChatGroq / Sarvam directly, so
+the same code can run against the live APIs, synthetic fakes or a recorded
+session (see ``agent_core.fakes``).
+
+Every provider is wrapped in an adaptive concurrency limiter (see
+``agent_core.limiter``), bounded by the per-turn deadline (``agent_core.deadline``)
+and optionally hedged (``agent_core.hedging``). Identical concurrent TTS and
+translation calls are coalesced (``agent_core.singleflight``), and concurrent
+TTS calls are sent together in micro-batches (``agent_core.batching``).
+Backends are picked per kind from the environment:
+
+    AGENT_PROVIDERS=live|synthetic|replay        default for every kind
+    AGENT_PROVIDERS_<KIND>=...                   override for llm/stt/translate/tts
+    AGENT_PROVIDER_RECORD=calls.jsonl            record live/synthetic calls
+    AGENT_PROVIDER_REPLAY=calls.jsonl            source for the replay backend
+    AGENT_FAKE_<SETTING>_<KIND>=...              fault profile for synthetic kinds
+                                                 (LATENCY, JITTER, ERROR_RATE,
+                                                  TIMEOUT_RATE, TIMEOUT_AFTER, MAX_RPS)
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_KINDS = ("llm", "stt", "translate", "tts")
+
+
+class ProviderError(Exception):
+    """An external provider call failed (HTTP error, bad payload, injected fault)."""
+
+
+class ProviderTimeout(ProviderError, asyncio.TimeoutError):
+    """An external provider call did not answer in time."""
+
+
+class LLMResult:
+    """Minimal stand-in for an AIMessage: fakes only need ``.content``."""
+
+    type = "ai"
+
+    def __init__(self, content: str):
+        self.content = content
+
+    def __repr__(self) -> str:
+        return f"LLMResult(content={self.content!r})"
+
+
+class LLMProvider:
+    """Chat model. Mirrors the ``invoke``/``ainvoke`` surface of ChatGroq."""
+
+    name = "llm"
+
+    def invoke(self, messages) -> Any:
+        raise NotImplementedError
+
+    async def ainvoke(self, messages) -> Any:
+        return await asyncio.to_thread(self.invoke, messages)
+
+
+class STTProvider:
+    name = "stt"
+
+    async def transcribe(self, audio_bytes: bytes, filename: str = "audio.wav", prompt: str = "") -> Tuple[str, str]:
+        """Returns (transcript, detected_language_code)."""
+        raise NotImplementedError
+
+
+class TranslateProvider:
+    name = "translate"
+
+    async def translate(self, text: str, source_language_code: str, target_language_code: str) -> str:
+        raise NotImplementedError
+
+
+class TTSProvider:
+    name = "tts"
+
+    async def synthesize(self, text: str, language_code: str = "en-IN", sample_rate: int = 8000) -> str:
+        """Returns base64 encoded WAV audio."""
+        raise NotImplementedError
+
+
+class GroqLLM(LLMProvider):
+    """Live backend around an existing ChatGroq client."""
+
+    name = "groq"
+
+    def __init__(self, client):
+        self.client = client
+
+    def invoke(self, messages):
+        return self.client.invoke(messages)
+
+    async def ainvoke(self, messages):
+        return await self.client.ainvoke(messages)
+
+
+class ProviderSet:
+    """The four providers a backend needs, addressable by kind."""
+
+    def __init__(self, llm: LLMProvider, stt: STTProvider, translate: TranslateProvider, tts: TTSProvider):
+        self.llm = llm
+        self.stt = stt
+        self.translate = translate
+        self.tts = tts
+
+    def get(self, kind: str):
+        return getattr(self, kind)
+
+    def describe(self) -> Dict[str, str]:
+        return {kind: getattr(self.get(kind), "name", type(self.get(kind)).__name__) for kind in PROVIDER_KINDS}
+
+
+def message_role_and_content(message) -> Tuple[str, str]:
+    """(role, content) for a LangChain message, (role, content) tuple or plain string."""
+    if isinstance(message, str):
+        return "human", message
+    if isinstance(message, tuple):
+        return message[0], message[1]
+    return getattr(message, "type", "human"), getattr(message, "content", str(message))
+
+
+def normalize_messages(messages) -> list:
+    """LLM input as a list of (role, content) pairs, whatever form it came in."""
+    if isinstance(messages, str):
+        return [("human", messages)]
+    return [message_role_and_content(m) for m in messages]
+
+
+def _env(name: str, kind: str, default: Optional[str] = None) -> Optional[str]:
+    return os.getenv(f"{name}_{kind.upper()}", os.getenv(name, default))
+
+
+def _build_provider(kind: str, backend: str, live_llm, fake_latency: Optional[str], sarvam_factory, seed: int):
+    from . import fakes
+    from .batching import batch
+    from .deadline import DeadlineProvider
+    from .hedging import hedge
+    from .limiter import guard
+    from .singleflight import coalesce
+
+    profile = fakes.FaultProfile.from_env(kind, fake_latency)
+    replay_path = os.getenv("AGENT_PROVIDER_REPLAY")
+    if backend == "live":
+        if kind == "llm":
+            client = live_llm() if callable(live_llm) and not hasattr(live_llm, "invoke") else live_llm
+            if client is None:
+                raise ValueError("Live LLM backend requested but no ChatGroq client was supplied")
+            provider = GroqLLM(client)
+        else:
+            provider = sarvam_factory()
+    elif backend == "synthetic":
+        provider = fakes.SYNTHETIC_BACKENDS[kind](profile, seed=seed)
+    elif backend == "replay":
+        if not replay_path:
+            raise ValueError("AGENT_PROVIDERS=replay needs AGENT_PROVIDER_REPLAY=<calls.jsonl>")
+        provider = fakes.ReplayProvider(kind, replay_path, profile, seed=seed)
+    else:
+        raise ValueError(f"Unknown provider backend '{backend}' for {kind}")
+    provider = hedge(kind, batch(kind, provider))
+    record_path = os.getenv("AGENT_PROVIDER_RECORD")
+    if record_path and backend != "replay":
+        provider = fakes.RecordingProvider(kind, provider, record_path)
+    return coalesce(kind, guard(kind, DeadlineProvider(kind, provider)))
+
+
+def build_providers(
+    live_llm: Union[Any, Callable[[], Any], None] = None,
+    defaults: Optional[Dict[str, str]] = None,
+    fake_latency: Optional[Dict[str, str]] = None,
+    sarvam_api_key: Optional[str] = None,
+    seed: Optional[int] = None,
+) -> ProviderSet:
+    """
+    Builds the ProviderSet for a backend.
+
+    ``live_llm`` is the ChatGroq client (or a factory for it) used when the
+    LLM kind is live. ``defaults`` maps kind -> backend when no environment
+    override exists, and ``fake_latency`` gives per-kind latency specs for
+    synthetic kinds (so each script keeps its historical placeholder delays).
+    """
+    defaults = defaults or {}
+    fake_latency = fake_latency or {}
+    seed = int(os.getenv("AGENT_FAKE_SEED", "0")) if seed is None else seed
+    sarvam = []
+
+    def sarvam_factory():
+        # One Sarvam client serves every live speech kind
+        if not sarvam:
+            from .sarvam import SarvamClient
+            sarvam.append(SarvamClient(sarvam_api_key or os.getenv("SARVAM_API_KEY")))
+        return sarvam[0]
+
+    providers = {
+        kind: _build_provider(
+            kind, _env("AGENT_PROVIDERS", kind, defaults.get(kind, "live")),
+            live_llm, fake_latency.get(kind), sarvam_factory, seed + index,
+        )
+        for index, kind in enumerate(PROVIDER_KINDS)
+    }
+    provider_set = ProviderSet(**providers)
+    logger.info("Providers configured: %s", provider_set.describe())
+    return provider_set
+
+
+def build_llm(live_llm, default: str = "live", fake_latency: Optional[str] = None) -> LLMProvider:
+    """
+    Just the LLM provider, for the text-only backends. ``live_llm`` is the
+    ChatGroq client or a callable building it; it is only called for the live
+    backend, so with ``AGENT_PROVIDERS_LLM=synthetic|replay`` those backends
+    run offline without a Groq key.
+    """
+    seed = int(os.getenv("AGENT_FAKE_SEED", "0"))
+    provider = _build_provider("llm", _env("AGENT_PROVIDERS", "llm", default), live_llm, fake_latency, None, seed)
+    logger.info("LLM provider configured: %s", getattr(provider, 'name', type(provider).__name__))
+    return provider
@@ -0,0 +1,437 @@
+"""
+Fruit and vegetable recommendations for consumers' dietary goals and
+health conditions.
+
+The consumer assistant is meant to plan purchases from
+``ConsumerProfile.dietaryGoals`` and ``healthConditions``. Asking the LLM
+would mean sending it the catalog on every request. Instead the catalog is
+compiled once into a products x features matrix:
+
+* each product is matched by name (English or romanized Hindi/Kannada,
+  through ``products.phonetic_key``) to a reference item with approximate
+  nutrients per 100 g; products that are not fruit or vegetables are left
+  out, including processed goods named after one ("Potato Chips", "Mango
+  Pickle") and other fruits that share a word ("Custard Apple");
+* features are those nutrients scaled to 0..1, plus "organic" and price;
+* a profile turns into a weight per feature (``RULES``: "diabetes" weighs
+  sugar and glycemic index down, "anemia" weighs iron up, ...) and hard
+  limits (``LIMITS``: no high-potassium produce for kidney disease).
+
+Scoring every product is one matrix-vector product. The best product of
+each reference item is found with one ``np.maximum.reduceat`` over rows
+grouped by item, so the ``k`` recommendations are ``k`` different foods.
+Results are cached per (weights, limits, k). The cache and the matrix are
+rebuilt when the catalog changes: its row count and latest ``updatedAt``
+are checked every ``AGENT_RECOMMEND_CHECK_INTERVAL`` seconds, and
+``invalidate()`` forces a rebuild.
+
+The voice agent calls this through ``recommendation_tool`` (a LangChain
+tool). Products and profiles are read from the app's Prisma SQLite
+database (``AGENT_PRODUCTS_DB``, as in ``agent_core.products``).
+
+    AGENT_RECOMMEND_CHECK_INTERVAL=30    seconds between catalog change checks
+    AGENT_RECOMMEND_CACHE=4096           cached profile results
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .metrics import REGISTRY
+from .products import DEFAULT_DB, phonetic_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECK_INTERVAL = 30.0
+DEFAULT_CACHE = 4096
+DEFAULT_LIMIT = 5
+
+NUTRIENTS = ("calories", "protein", "fibre", "sugar", "glycemic_index", "potassium", "sodium",
+             "vitamin_c", "iron", "calcium", "vitamin_a")
+FEATURES = NUTRIENTS + ("organic", "price")
+
+# Approximate values per 100 g: kcal, protein g, fibre g, sugar g, glycemic index,
+# potassium mg, sodium mg, vitamin C mg, iron mg, calcium mg, vitamin A ug
+REFERENCE = {
+    "tomato":       (18, 0.9, 1.2, 2.6, 15, 237, 5, 14, 0.3, 10, 42),
+    "potato":       (77, 2.0, 2.2, 0.8, 78, 425, 6, 20, 0.8, 12, 0),
+    "onion":        (40, 1.1, 1.7, 4.2, 10, 146, 4, 7, 0.2, 23, 0),
+    "okra":         (33, 1.9, 3.2, 1.5, 20, 299, 7, 23, 0.6, 82, 36),
+    "spinach":      (23, 2.9, 2.2, 0.4, 15, 558, 79, 28, 2.7, 99, 469),
+    "carrot":       (41, 0.9, 2.8, 4.7, 39, 320, 69, 6, 0.3, 33, 835),
+    "cauliflower":  (25, 1.9, 2.0, 1.9, 15, 299, 30, 48, 0.4, 22, 0),
+    "cabbage":      (25, 1.3, 2.5, 3.2, 10, 170, 18, 37, 0.5, 40, 5),
+    "brinjal":      (25, 1.0, 3.0, 3.5, 15, 229, 2, 2, 0.2, 9, 1),
+    "bitter gourd": (17, 1.0, 2.8, 1.0, 15, 296, 5, 84, 0.4, 19, 24),
+    "bottle gourd": (14, 0.6, 0.5, 1.5, 15, 150, 2, 10, 0.2, 26, 0),
+    "cucumber":     (15, 0.7, 0.5, 1.7, 15, 147, 2, 3, 0.3, 16, 5),
+    "peas":         (81, 5.4, 5.7, 5.7, 48, 244, 5, 40, 1.5, 25, 38),
+    "beans":        (31, 1.8, 2.7, 3.3, 15, 211, 6, 12, 1.0, 37, 35),
+    "fenugreek":    (49, 4.4, 1.1, 0.5, 15, 400, 76, 52, 1.9, 395, 380),
+    "sweet potato": (86, 1.6, 3.0, 4.2, 63, 337, 55, 2, 0.6, 30, 709),
+    "beetroot":     (43, 1.6, 2.8, 6.8, 64, 325, 78, 5, 0.8, 16, 2),
+    "pumpkin":      (26, 1.0, 0.5, 2.8, 75, 340, 1, 9, 0.8, 21, 426),
+    "drumstick":    (37, 2.1, 3.2, 1.5, 15, 461, 42, 141, 0.4, 30, 4),
+    "garlic":       (149, 6.4, 2.1, 1.0, 30, 401, 17, 31, 1.7, 181, 0),
+    "ginger":       (80, 1.8, 2.0, 1.7, 15, 415, 13, 5, 0.6, 16, 0),
+    "green chilli": (40, 2.0, 1.5, 5.1, 15, 340, 7, 242, 1.2, 18, 59),
+    "coriander":    (23, 2.1, 2.8, 0.9, 15, 521, 46, 27, 1.8, 67, 337),
+    "banana":       (89, 1.1, 2.6, 12.2, 51, 358, 1, 9, 0.3, 5, 3),
+    "mango":        (60, 0.8, 1.6, 13.7, 51, 168, 1, 36, 0.2, 11, 54),
+    "apple":        (52, 0.3, 2.4, 10.4, 36, 107, 1, 5, 0.1, 6, 3),
+    "guava":        (68, 2.6, 5.4, 8.9, 12, 417, 2, 228, 0.3, 18, 31),
+    "papaya":       (43, 0.5, 1.7, 7.8, 60, 182, 8, 61, 0.3, 20, 47),
+    "orange":       (47, 0.9, 2.4, 9.4, 43, 181, 0, 53, 0.1, 40, 11),
+    "pomegranate":  (83, 1.7, 4.0, 13.7, 35, 236, 3, 10, 0.3, 10, 0),
+    "watermelon":   (30, 0.6, 0.4, 6.2, 76, 112, 1, 8, 0.2, 7, 28),
+    "grapes":       (69, 0.7, 0.9, 15.5, 53, 191, 2, 3, 0.4, 10, 3),
+    "amla":         (44, 0.9, 4.3, 0.5, 15, 198, 1, 600, 0.3, 25, 15),
+    "lemon":        (29, 1.1, 2.8, 2.5, 20, 138, 2, 53, 0.6, 26, 1),
+    "jackfruit":    (95, 1.7, 1.5, 19.1, 50, 448, 2, 14, 0.2, 24, 5),
+}
+
+# Other names farmers list the same produce under
+ALIASES = {
+    "tamatar": "tomato", "aloo": "potato", "alugadde": "potato", "pyaaz": "onion", "eerulli": "onion",
+    "bhindi": "okra", "ladies finger": "okra", "palak": "spinach", "gajar": "carrot",
+    "gobhi": "cauliflower", "phool gobhi": "cauliflower", "patta gobhi": "cabbage", "baingan": "brinjal",
+    "eggplant": "brinjal", "badanekai": "brinjal", "karela": "bitter gourd", "lauki": "bottle gourd",
+    "kheera": "cucumber", "matar": "peas", "pea": "peas", "methi": "fenugreek", "shakarkandi": "sweet potato",
+    "chukandar": "beetroot", "beet": "beetroot", "kaddu": "pumpkin", "moringa": "drumstick",
+    "lahsun": "garlic", "adrak": "ginger", "mirchi": "green chilli", "chilli": "green chilli",
+    "dhaniya": "coriander", "kela": "banana", "aam": "mango", "seb": "apple", "amrood": "guava",
+    "santra": "orange", "anar": "pomegranate", "tarbooz": "watermelon", "angoor": "grapes",
+    "gooseberry": "amla", "nimbu": "lemon", "kathal": "jackfruit",
+}
+
+# A name with any of these words is not the fresh item it mentions
+NOT_FRESH = (
+    "chips", "chip", "wafers", "pickle", "pickles", "achar", "ketchup", "sauce", "chutney", "jam", "murabba",
+    "powder", "seeds", "seed", "juice", "squash", "syrup", "pulp", "puree", "paste", "papad", "flakes",
+    "flour", "atta", "oil", "dried", "dry", "candy", "halwa", "namkeen",
+    "custard", "wood",  # custard apple, wood apple
+)
+
+# Profile keyword -> feature weights; a profile adds up the weights of every keyword it mentions
+RULES = {
+    ("weight loss", "lose weight", "slim", "fat loss", "obes"): {"calories": -1.0, "fibre": 0.6, "sugar": -0.4},
+    ("muscle", "protein", "weight gain", "gym"): {"protein": 1.0, "calories": 0.3},
+    ("diabet", "blood sugar", "insulin"): {"sugar": -1.0, "glycemic_index": -1.0, "fibre": 0.5},
+    ("blood pressure", "hypertension", "bp"): {"sodium": -1.0, "potassium": 0.6},
+    ("heart", "cholesterol", "cardi"): {"fibre": 0.6, "potassium": 0.4, "sodium": -0.6},
+    ("kidney", "renal", "ckd"): {"potassium": -1.0, "sodium": -0.5},
+    ("anemi", "anaemi", "iron", "haemoglobin", "hemoglobin"): {"iron": 1.0, "vitamin_c": 0.4},
+    ("immun", "cold", "vitamin c"): {"vitamin_c": 1.0, "vitamin_a": 0.3},
+    ("digest", "constipation", "gut", "fibre", "fiber"): {"fibre": 1.0},
+    ("bone", "calcium", "osteo"): {"calcium": 1.0},
+    ("eye", "vision"): {"vitamin_a": 1.0},
+    ("pregnan",): {"iron": 0.6, "calcium": 0.4, "vitamin_c": 0.3},
+    ("organic", "chemical free", "pesticide"): {"organic": 0.5},
+    ("budget", "cheap", "affordable", "save money"): {"price": -0.8},
+}
+DEFAULT_WEIGHTS = {"fibre": 0.4, "vitamin_c": 0.3, "potassium": 0.2, "sugar": -0.2}  # "healthy eating"
+
+# Profile keyword -> (nutrient, upper limit per 100 g); produce at or over the limit is never recommended
+LIMITS = {
+    ("kidney", "renal", "ckd"): ("potassium", 350.0),
+    ("diabet", "blood sugar", "insulin"): ("glycemic_index", 70.0),
+}
+
+REASONS = {
+    "calories": ("rich in energy", "low in calories"), "protein": ("high in protein", "low in protein"),
+    "fibre": ("high in fibre", "low in fibre"), "sugar": ("sweet", "low in sugar"),
+    "glycemic_index": ("quick energy", "low glycemic index"),
+    "potassium": ("rich in potassium", "low in potassium"), "sodium": ("salty", "low in sodium"),
+    "vitamin_c": ("rich in vitamin C", "low in vitamin C"), "iron": ("rich in iron", "low in iron"),
+    "calcium": ("rich in calcium", "low in calcium"), "vitamin_a": ("rich in vitamin A", "low in vitamin A"),
+    "organic": ("organic", "conventional"), "price": ("premium", "good value"),
+}
+GENERIC_REASON = "a good match for your profile"  # when no weighted feature sets the product apart
+
+_ASKS = re.compile(r"\b(recommend|suggest)|\bwhat (should|can) i (buy|eat|get)\b|\bgood for (me|my)\b", re.I)
+
+_requests = {
+    outcome: REGISTRY.counter("recommend_requests_total", "Recommendation requests by cache outcome", outcome=outcome)
+    for outcome in ("hit", "miss")
+}
+_builds = REGISTRY.counter("recommend_catalog_builds_total", "Product feature matrices built")
+_score_seconds = REGISTRY.histogram("recommend_score_seconds", "Time to score the catalog for one profile")
+
+
+class Profile(NamedTuple):
+    goals: str
+    conditions: Tuple[str, ...]
+
+
+class Recommendation(NamedTuple):
+    product_id: str
+    name: str
+    food: str
+    price: float
+    unit: Optional[str]
+    score: float
+    reason: str
+
+
+def parse_profile(dietary_goals: Optional[str], health_conditions: Optional[str]) -> Profile:
+    """Profile from the ``ConsumerProfile`` columns (either may be a JSON list or plain text)."""
+    def as_list(value) -> List[str]:
+        if not value:
+            return []
+        try:
+            parsed = json.loads(value)
+        except (TypeError, ValueError):
+            parsed = value
+        if isinstance(parsed, str):
+            return [parsed]
+        return [str(item) for item in parsed] if isinstance(parsed, list) else [str(parsed)]
+
+    return Profile(", ".join(as_list(dietary_goals)), tuple(as_list(health_conditions)))
+
+
+def _mentions(text: str, keywords: Tuple[str, ...]) -> bool:
+    """Whether a word in ``text`` starts with one of the keywords ("diabet" matches "diabetic")."""
+    return any(re.search(r"\b" + re.escape(keyword), text) for keyword in keywords)
+
+
+def wants_recommendation(text: str) -> bool:
+    """Whether an (English) message asks what to buy or eat."""
+    return bool(_ASKS.search(text or ""))
+
+
+@functools.lru_cache(maxsize=DEFAULT_CACHE)
+def profile_weights(profile: Profile) -> Tuple[np.ndarray, Tuple[Tuple[str, float], ...]]:
+    """(weight per feature, nutrient limits) for a profile; the array is shared, don't modify it."""
+    text = f" {profile.goals} {' '.join(profile.conditions)} ".lower()
+    weights = dict.fromkeys(FEATURES, 0.0)
+    matched = False
+    for keywords, rule in RULES.items():
+        if _mentions(text, keywords):
+            matched = True
+            for feature, weight in rule.items():
+                weights[feature] += weight
+    for feature, weight in ({} if matched else DEFAULT_WEIGHTS).items():
+        weights[feature] += weight
+    limits = tuple(sorted({limit for keywords, limit in LIMITS.items() if _mentions(text, keywords)}))
+    return np.array([weights[f] for f in FEATURES], dtype=np.float32), limits
+
+
+_ALIAS_KEYS = {phonetic_key(name): food for name, food in [*((f, f) for f in REFERENCE), *ALIASES.items()]}
+_NOT_FRESH_KEYS = frozenset(phonetic_key(word) for word in NOT_FRESH)
+
+
+def food_of(name: str) -> Optional[str]:
+    """Reference item a product name refers to ("Desi Bhindi" -> "okra"), or None ("Aam Papad")."""
+    words = phonetic_key(name).split()
+    if _NOT_FRESH_KEYS.intersection(words):
+        return None
+    for size in (2, 1):  # "sweet potato" before "potato"
+        for i in range(len(words) - size + 1):
+            food = _ALIAS_KEYS.get(" ".join(words[i:i + size]))
+            if food is not None:
+                return food
+    return None
+
+
+class CatalogMatrix:
+    """Feature matrix of every fruit/vegetable product, rows grouped by reference item."""
+
+    def __init__(self, rows: Iterable[Tuple[str, str, str, float, Optional[str]]], version=None):
+        self.version = version
+        foods = list(REFERENCE)
+        food_index = {food: i for i, food in enumerate(foods)}
+        reference = np.array([REFERENCE[food] for food in foods], dtype=np.float32)
+
+        kept = []
+        for product_id, name, description, price, unit in rows:
+            food = food_of(name or "")
+            if food is not None:
+                organic = "organic" in f"{name} {description or ''}".lower()
+                kept.append((food_index[food], str(product_id), name, float(price or 0.0), unit, organic))
+        kept.sort(key=lambda row: row[0])
+
+        item = np.array([row[0] for row in kept], dtype=np.int64)
+        self.ids = [row[1] for row in kept]
+        self.names = [row[2] for row in kept]
+        self.units = [row[4] for row in kept]
+        self.prices = np.array([row[3] for row in kept], dtype=np.float32)
+        self.foods = foods
+        self.item = item
+        # Raw nutrients for limits; features scaled to 0..1 for scoring
+        self.raw = reference[item] if len(kept) else np.zeros((0, len(NUTRIENTS)), dtype=np.float32)
+        scale = reference.max(axis=0)
+        price_scale = float(np.median(self.prices)) if len(kept) else 1.0
+        self.features = np.hstack([
+            self.raw / scale,
+            np.array([[row[5]] for row in kept], dtype=np.float32).reshape(-1, 1),
+            (self.prices / (self.prices + (price_scale or 1.0))).reshape(-1, 1),
+        ]).astype(np.float32)
+        self.means = self.features.mean(axis=0) if len(kept) else np.zeros(len(FEATURES), dtype=np.float32)
+        # First row of each item present, for reduceat
+        self.starts = np.flatnonzero(np.r_[True, item[1:] != item[:-1]]) if len(kept) else np.zeros(0, np.int64)
+        _builds.inc()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def top(self, weights: np.ndarray, limits: Sequence[Tuple[str, float]] = (), k: int = DEFAULT_LIMIT
+            ) -> List[Recommendation]:
+        """Best product of each of the ``k`` best-scoring foods."""
+        if not len(self):
+            return []
+        started = time.perf_counter()
+        scores = self.features @ weights
+        for nutrient, limit in limits:
+            scores[self.raw[:, NUTRIENTS.index(nutrient)] >= limit] = -np.inf
+        best = np.maximum.reduceat(scores, self.starts)
+        order = [g for g in np.argsort(-best, kind="stable")[:k] if np.isfinite(best[g])]
+        results = []
+        for group in order:
+            start = self.starts[group]
+            end = self.starts[group + 1] if group + 1 < len(self.starts) else len(scores)
+            row = start + int(np.argmax(scores[start:end]))
+            contribution = weights * (self.features[row] - self.means)
+            feature = int(np.argmax(contribution))
+            # Zero-weight features contribute 0, so only a feature the profile cares about and that
+            # this product beats the catalog average on can explain the pick
+            if contribution[feature] > 0:
+                reason = REASONS[FEATURES[feature]][0 if weights[feature] > 0 else 1]
+            else:
+                reason = GENERIC_REASON
+            results.append(Recommendation(self.ids[row], self.names[row], self.foods[self.item[row]],
+                                          round(float(self.prices[row]), 2), self.units[row],
+                                          round(float(scores[row]), 4), reason))
+        _score_seconds.observe(time.perf_counter() - started)
+        return results
+
+
+def sqlite_source(path=None):
+    """(catalog version, load catalog rows, load a consumer's profile) over the Prisma database."""
+    path = Path(path or os.getenv("AGENT_PRODUCTS_DB", DEFAULT_DB))
+
+    def query(sql: str, params=()):
+        if not path.exists():
+            logger.warning("Product database %s not found, no products to recommend", path)
+            return []
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def version():
+        rows = query('SELECT COUNT(*), MAX(updatedAt) FROM "Product"')
+        return tuple(rows[0]) if rows else None
+
+    def products():
+        return query('SELECT id, name, description, price, unit FROM "Product"')
+
+    def profile(user_id: str) -> Optional[Profile]:
+        rows = query('SELECT dietaryGoals, healthConditions FROM "ConsumerProfile" WHERE userId = ? OR id = ?',
+                     (user_id, user_id))
+        return parse_profile(*rows[0]) if rows else None
+
+    return version, products, profile
+
+
+class Recommender:
+    """Catalog matrix plus a per-profile result cache, rebuilt when the catalog changes."""
+
+    def __init__(self, version: Callable[[], object], products: Callable[[], Iterable],
+                 profile: Callable[[str], Optional[Profile]], check_interval: float = DEFAULT_CHECK_INTERVAL,
+                 cache_size: int = DEFAULT_CACHE):
+        self.version = version
+        self.products = products
+        self.profile = profile
+        self.check_interval = check_interval
+        self.cache_size = cache_size
+        self.matrix: Optional[CatalogMatrix] = None
+        self._checked_at = 0.0
+        self._cache: "OrderedDict[tuple, List[Recommendation]]" = OrderedDict()
+        self._lock = threading.Lock()  # requests run in worker threads (arecommend_for)
+        REGISTRY.gauge("recommend_catalog_products", "Products in the recommendation matrix",
+                       fn=lambda: len(self.matrix) if self.matrix is not None else 0)
+
+    @classmethod
+    def from_env(cls, path=None) -> "Recommender":
+        return cls(*sqlite_source(path), check_interval=float(os.getenv("AGENT_RECOMMEND_CHECK_INTERVAL",
+                                                                         DEFAULT_CHECK_INTERVAL)),
+                   cache_size=int(os.getenv("AGENT_RECOMMEND_CACHE", DEFAULT_CACHE)))
+
+    def invalidate(self):
+        """Forces a rebuild on the next request (the catalog changed)."""
+        with self._lock:
+            self.matrix = None
+            self._cache.clear()
+
+    def current(self) -> CatalogMatrix:
+        """The matrix for the current catalog, rebuilt if it changed (call with the lock held)."""
+        now = time.monotonic()
+        if self.matrix is not None and now - self._checked_at < self.check_interval:
+            return self.matrix
+        self._checked_at = now
+        version = self.version()
+        if self.matrix is None or version != self.matrix.version:
+            logger.info("Building recommendation matrix for catalog version %s", version)
+            self.matrix = CatalogMatrix(self.products(), version)
+            self._cache.clear()
+        return self.matrix
+
+    def recommend(self, profile: Profile, k: int = DEFAULT_LIMIT) -> List[Recommendation]:
+        weights, limits = profile_weights(profile)
+        key = (weights.tobytes(), limits, k)
+        with self._lock:
+            matrix = self.current()
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                _requests["hit"].inc()
+                return cached
+        _requests["miss"].inc()
+        results = matrix.top(weights, limits, k)
+        with self._lock:
+            if matrix is self.matrix:  # not rebuilt meanwhile
+                self._cache[key] = results
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return results
+
+    def recommend_for(self, user_id: str, k: int = DEFAULT_LIMIT) -> List[Recommendation]:
+        """Recommendations for a consumer's stored profile (general healthy eating if there is none)."""
+        return self.recommend(self.profile(user_id) or Profile("", ()), k)
+
+    async def arecommend_for(self, user_id: str, k: int = DEFAULT_LIMIT) -> List[Recommendation]:
+        """``recommend_for`` with the database reads and any rebuild off the event loop."""
+        return await asyncio.to_thread(self.recommend_for, user_id, k)
+
+
+def describe(recommendations: List[Recommendation]) -> str:
+    """One sentence for the voice reply."""
+    if not recommendations:
+        return "I could not find fruits or vegetables in the catalog to recommend right now."
+    items = [f"{r.name} ({r.reason}, ₹{r.price:g}{'/' + r.unit if r.unit else ''})" for r in recommendations]
+    return "Based on your goals, I suggest: " + "; ".join(items) + "."
+
+
+def recommendation_tool(recommender: Recommender, user_id: Optional[str] = None):
+    """
+    LangChain tool for the voice agent. With ``user_id`` bound, the agent
+    only chooses how many items to suggest.
+    """
+    from langchain_core.tools import StructuredTool
+
+    async def recommend_produce(consumer_id: str = "", limit: int = DEFAULT_LIMIT) -> str:
+        """Suggest fruits and vegetables from the catalog for the consumer's dietary goals and health conditions."""
+        return describe(await recommender.arecommend_for(user_id or consumer_id, max(1, min(limit, 10))))
+
+    return StructuredTool.from_function(coroutine=recommend_produce, name="recommend_produce")
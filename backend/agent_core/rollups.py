@@ -0,0 +1,400 @@
+"""
+Incremental demand and sales rollups for the farmer dashboard.
+
+The farmer ``analytics`` and ``demand`` pages need sales and demand
+totals across ``Order``/``OrderItem``/``CartItem``. Aggregating the order
+tables on every page load costs a full scan per request. This job keeps
+the totals in small summary tables in a separate SQLite file
+(``AGENT_ROLLUP_DB``) and the dashboard reads those.
+
+Order lines are folded in incrementally. The watermark is the
+``(createdAt, id)`` of the last ``OrderItem`` aggregated. Each run reads the
+next lines after it (one seek on ``ORDER_ITEM_INDEXES``) into a temp table,
+upserts their sums into every rollup, and moves the watermark. All of this
+happens in one transaction, so a crash never counts a line twice. Lines
+younger than ``settle`` seconds wait for the next run, so a transaction
+that commits late does not slip in behind the watermark.
+
+Rollups (``lines`` = order lines, ``quantity`` = units, ``revenue`` = sum of
+quantity x price):
+
+* ``rollup_product_day``, ``rollup_farmer_day`` and ``rollup_location_day``:
+  per-day series (UTC days);
+* ``rollup_location_week``: per consumer location, product and week, for
+  local demand (weeks keep it compact: locations x products x days would
+  be as large as the order lines themselves);
+* ``rollup_farmer_total`` and ``rollup_product_total``: all-time totals;
+* ``cart_demand``: what sits in carts now (a snapshot, rebuilt every run,
+  since cart rows are edited and deleted);
+* ``demand_top`` and ``location_top``: the most ordered products (overall
+  and per location) and the busiest locations over ``DEMAND_WINDOWS``,
+  re-ranked whenever new lines came in or the day changed.
+
+Dashboard totals are one primary-key lookup. A series of ``d`` days and a
+top ``k`` list are ``d``- and ``k``-row range reads. Cancelled orders are skipped when aggregated. A
+status change after that is not subtracted; ``--backfill`` rebuilds
+everything from scratch.
+
+Example (from ``backend/``)::
+
+    python -m agent_core.rollups --source ../prisma/dev.db --backfill
+    python -m agent_core.rollups --source ../prisma/dev.db --watch 60
+
+    AGENT_ROLLUP_DB=prisma/rollups.db   where the rollups are kept
+    AGENT_PRODUCTS_DB=prisma/dev.db     the app database aggregated from
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .metrics import REGISTRY
+from .products import DEFAULT_DB
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROLLUP_DB = DEFAULT_DB.with_name("rollups.db")
+DEFAULT_BATCH = 50_000
+DEFAULT_SETTLE = 5.0
+UNKNOWN_LOCATION = "unknown"
+DAY_MS = 86_400_000
+DEMAND_WINDOWS = (7, 30)  # days; the top products for these are ranked on every refresh
+DEMAND_TOP = 50
+
+# Prisma keeps DateTime as epoch milliseconds in SQLite; ISO text is accepted too
+_EPOCH_MS = ("(CASE typeof({0}) WHEN 'integer' THEN {0} WHEN 'real' THEN CAST({0} AS INTEGER) "
+             "ELSE CAST((julianday({0}) - 2440587.5) * 86400000 AS INTEGER) END)")
+
+# Needed on the source database for the watermark seek (also in the Prisma schema)
+ORDER_ITEM_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS "OrderItem_createdAt_id_idx" ON "OrderItem" ("createdAt", "id")',
+)
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS rollup_product_day (
+        product_id TEXT NOT NULL, day INTEGER NOT NULL, farmer_id TEXT NOT NULL,
+        lines INTEGER NOT NULL, quantity INTEGER NOT NULL, revenue REAL NOT NULL,
+        PRIMARY KEY (product_id, day)) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS rollup_product_day_day ON rollup_product_day (day)",
+    """CREATE TABLE IF NOT EXISTS rollup_farmer_day (
+        farmer_id TEXT NOT NULL, day INTEGER NOT NULL,
+        lines INTEGER NOT NULL, quantity INTEGER NOT NULL, revenue REAL NOT NULL,
+        PRIMARY KEY (farmer_id, day)) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS rollup_location_day (
+        location TEXT NOT NULL, day INTEGER NOT NULL,
+        lines INTEGER NOT NULL, quantity INTEGER NOT NULL, revenue REAL NOT NULL,
+        PRIMARY KEY (location, day)) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS rollup_location_week (
+        location TEXT NOT NULL, week INTEGER NOT NULL, product_id TEXT NOT NULL,
+        lines INTEGER NOT NULL, quantity INTEGER NOT NULL, revenue REAL NOT NULL,
+        PRIMARY KEY (week, location, product_id)) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS demand_top (
+        days INTEGER NOT NULL, location TEXT NOT NULL, rank INTEGER NOT NULL, product_id TEXT NOT NULL,
+        name TEXT, farmer_id TEXT, quantity INTEGER NOT NULL, lines INTEGER NOT NULL,
+        PRIMARY KEY (days, location, rank)) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS location_top (
+        days INTEGER NOT NULL, rank INTEGER NOT NULL, location TEXT NOT NULL,
+        quantity INTEGER NOT NULL, lines INTEGER NOT NULL,
+        PRIMARY KEY (days, rank)) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS rollup_product_total (
+        product_id TEXT PRIMARY KEY, farmer_id TEXT NOT NULL, name TEXT,
+        lines INTEGER NOT NULL, quantity INTEGER NOT NULL, revenue REAL NOT NULL, last_day INTEGER NOT NULL)""",
+    "CREATE INDEX IF NOT EXISTS rollup_product_total_farmer ON rollup_product_total (farmer_id, revenue)",
+    """CREATE TABLE IF NOT EXISTS rollup_farmer_total (
+        farmer_id TEXT PRIMARY KEY, lines INTEGER NOT NULL, quantity INTEGER NOT NULL, revenue REAL NOT NULL)""",
+    """CREATE TABLE IF NOT EXISTS cart_demand (
+        product_id TEXT PRIMARY KEY, farmer_id TEXT NOT NULL, carts INTEGER NOT NULL, quantity INTEGER NOT NULL)""",
+    "CREATE INDEX IF NOT EXISTS cart_demand_farmer ON cart_demand (farmer_id)",
+    "CREATE TABLE IF NOT EXISTS rollup_state (name TEXT PRIMARY KEY, value TEXT NOT NULL)",
+)
+ROLLUP_TABLES = ("rollup_product_day", "rollup_farmer_day", "rollup_location_day", "rollup_location_week",
+                 "rollup_product_total", "rollup_farmer_total", "cart_demand", "demand_top", "location_top",
+                 "rollup_state")
+
+_BATCH = f"""
+CREATE TEMP TABLE batch AS
+SELECT oi.createdAt AS created_at, oi.id AS id, oi.productId AS product_id, p.farmerId AS farmer_id,
+       p.name AS name, COALESCE(NULLIF(TRIM(cp.location), ''), '{UNKNOWN_LOCATION}') AS location,
+       {_EPOCH_MS.format("oi.createdAt")} / {DAY_MS} AS day,
+       oi.quantity AS quantity, oi.quantity * oi.price AS revenue, o.status AS status
+FROM src."OrderItem" oi
+JOIN src."Order" o ON o.id = oi.orderId
+JOIN src."Product" p ON p.id = oi.productId
+LEFT JOIN src."ConsumerProfile" cp ON cp.userId = o.userId
+WHERE (oi.createdAt, oi.id) > (:created_at, :id) AND {_EPOCH_MS.format("oi.createdAt")} <= :cutoff
+ORDER BY oi.createdAt, oi.id
+LIMIT :limit
+"""
+
+_SUMS = "COUNT(*), SUM(quantity), SUM(revenue)"
+_ADD = "lines = lines + excluded.lines, quantity = quantity + excluded.quantity, revenue = revenue + excluded.revenue"
+_UPSERTS = (
+    f"""INSERT INTO rollup_product_day SELECT product_id, day, farmer_id, {_SUMS} FROM counted
+        GROUP BY product_id, day ON CONFLICT DO UPDATE SET {_ADD}""",
+    f"""INSERT INTO rollup_farmer_day SELECT farmer_id, day, {_SUMS} FROM counted
+        GROUP BY farmer_id, day ON CONFLICT DO UPDATE SET {_ADD}""",
+    f"""INSERT INTO rollup_location_day SELECT location, day, {_SUMS} FROM counted
+        GROUP BY location, day ON CONFLICT DO UPDATE SET {_ADD}""",
+    f"""INSERT INTO rollup_location_week SELECT location, day / 7, product_id, {_SUMS} FROM counted
+        GROUP BY location, day / 7, product_id ON CONFLICT DO UPDATE SET {_ADD}""",
+    f"""INSERT INTO rollup_product_total SELECT product_id, farmer_id, MAX(name), {_SUMS}, MAX(day) FROM counted
+        GROUP BY product_id ON CONFLICT DO UPDATE SET {_ADD}, name = excluded.name,
+        last_day = MAX(last_day, excluded.last_day)""",
+    f"""INSERT INTO rollup_farmer_total SELECT farmer_id, {_SUMS} FROM counted
+        GROUP BY farmer_id ON CONFLICT DO UPDATE SET {_ADD}""",
+)
+_COUNTED = "CREATE TEMP VIEW counted AS SELECT * FROM batch WHERE status != 'CANCELLED'"
+_CARTS = """
+INSERT INTO cart_demand
+SELECT c.productId, p.farmerId, COUNT(*), SUM(c.quantity)
+FROM src."CartItem" c JOIN src."Product" p ON p.id = c.productId
+GROUP BY c.productId
+"""
+
+# Top products per window, overall (location '') and per location (whole weeks), and top locations
+_RANKS = (
+    """INSERT INTO demand_top
+       SELECT :days, '', rank, r.product_id, t.name, t.farmer_id, r.quantity, r.lines FROM (
+           SELECT product_id, SUM(quantity) AS quantity, SUM(lines) AS lines,
+                  ROW_NUMBER() OVER (ORDER BY SUM(quantity) DESC, product_id) AS rank
+           FROM rollup_product_day WHERE day >= :first GROUP BY product_id) r
+       LEFT JOIN rollup_product_total t ON t.product_id = r.product_id WHERE rank <= :top""",
+    """INSERT INTO demand_top
+       SELECT :days, r.location, rank, r.product_id, t.name, t.farmer_id, r.quantity, r.lines FROM (
+           SELECT location, product_id, SUM(quantity) AS quantity, SUM(lines) AS lines,
+                  ROW_NUMBER() OVER (PARTITION BY location ORDER BY SUM(quantity) DESC, product_id) AS rank
+           FROM rollup_location_week WHERE week >= :first / 7 GROUP BY location, product_id) r
+       LEFT JOIN rollup_product_total t ON t.product_id = r.product_id WHERE rank <= :top""",
+    """INSERT INTO location_top
+       SELECT :days, ROW_NUMBER() OVER (ORDER BY SUM(quantity) DESC, location), location, SUM(quantity), SUM(lines)
+       FROM rollup_location_day WHERE day >= :first GROUP BY location""",
+)
+
+_lines = REGISTRY.counter("rollup_order_lines_total", "Order lines folded into the rollups")
+_refresh_seconds = REGISTRY.histogram("rollup_refresh_seconds", "Time per rollup refresh")
+
+
+def day_label(day: int) -> str:
+    return (datetime.date(1970, 1, 1) + datetime.timedelta(days=int(day))).isoformat()
+
+
+def today() -> int:
+    return int(time.time() // 86400)
+
+
+class RollupStore:
+    """The rollup tables: refreshed from the app database, read by the dashboard."""
+
+    def __init__(self, path=None, source=None):
+        self.path = Path(path or os.getenv("AGENT_ROLLUP_DB", DEFAULT_ROLLUP_DB))
+        self.source = Path(source or os.getenv("AGENT_PRODUCTS_DB", DEFAULT_DB))
+        # uri=True so the source can be attached read-only with a file: URI
+        self.conn = sqlite3.connect(str(self.path), uri=True, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")  # dashboard reads go on during a refresh
+        for statement in SCHEMA:
+            self.conn.execute(statement)
+        self._reader = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._reader.row_factory = sqlite3.Row
+        self._lock = threading.Lock()         # the refresh
+        self._read_lock = threading.Lock()    # the dashboard connection
+        REGISTRY.gauge("rollup_lag_seconds", "Seconds since the rollups were last refreshed", fn=self.lag_seconds)
+
+    # --- Refresh (the aggregation job) ---
+    def _attach(self):
+        if not self.source.exists():
+            raise FileNotFoundError(f"Source database {self.source} not found")
+        self.conn.execute("ATTACH DATABASE ? AS src", (f"file:{self.source}?mode=ro",))
+
+    def _state(self, name: str, default=None):
+        row = self.conn.execute("SELECT value FROM rollup_state WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _watermark(self):
+        return self._state("watermark", [-1, ""])  # before any createdAt, whichever type it has
+
+    def _rank(self):
+        """Re-ranks ``demand_top`` and ``location_top`` for ``DEMAND_WINDOWS`` (in the open transaction)."""
+        day = today()
+        self.conn.execute("DELETE FROM demand_top")
+        self.conn.execute("DELETE FROM location_top")
+        for days in DEMAND_WINDOWS:
+            for statement in _RANKS:
+                self.conn.execute(statement, {"days": days, "first": day - days + 1, "top": DEMAND_TOP})
+        self.conn.execute("INSERT OR REPLACE INTO rollup_state VALUES ('ranked_day', ?)", (json.dumps(day),))
+
+    def refresh(self, batch: int = DEFAULT_BATCH, settle: float = DEFAULT_SETTLE,
+                max_batches: Optional[int] = None) -> Dict[str, object]:
+        """Folds order lines newer than the watermark into the rollups; returns what it did."""
+        started = time.perf_counter()
+        cutoff = int((time.time() - settle) * 1000)
+        folded, batches = 0, 0
+        with self._lock:
+            self._attach()
+            try:
+                while max_batches is None or batches < max_batches:
+                    created_at, row_id = self._watermark()
+                    self.conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        self.conn.execute(_BATCH, {"created_at": created_at, "id": row_id, "cutoff": cutoff,
+                                                   "limit": batch})
+                        last = self.conn.execute(
+                            "SELECT created_at, id FROM batch ORDER BY created_at DESC, id DESC LIMIT 1").fetchone()
+                        count = self.conn.execute("SELECT COUNT(*) FROM batch").fetchone()[0]
+                        if count:
+                            self.conn.execute(_COUNTED)
+                            for statement in _UPSERTS:
+                                self.conn.execute(statement)
+                            self.conn.execute("INSERT OR REPLACE INTO rollup_state VALUES ('watermark', ?)",
+                                              (json.dumps([last[0], last[1]]),))
+                            self.conn.execute("DROP VIEW counted")
+                        self.conn.execute("DROP TABLE batch")
+                        self.conn.execute("COMMIT")
+                    except BaseException:
+                        self.conn.execute("ROLLBACK")
+                        raise
+                    folded += count
+                    batches += 1
+                    _lines.inc(count)
+                    if count < batch:
+                        break
+                self.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self.conn.execute("DELETE FROM cart_demand")
+                    self.conn.execute(_CARTS)
+                    if folded or self._state("ranked_day") != today():
+                        self._rank()
+                    self.conn.execute("INSERT OR REPLACE INTO rollup_state VALUES ('refreshed_at', ?)",
+                                      (json.dumps(time.time()),))
+                    self.conn.execute("COMMIT")
+                except BaseException:
+                    self.conn.execute("ROLLBACK")
+                    raise
+            finally:
+                self.conn.execute("DETACH DATABASE src")
+            watermark = self._watermark()
+        elapsed = time.perf_counter() - started
+        _refresh_seconds.observe(elapsed)
+        return {"lines": folded, "batches": batches, "seconds": round(elapsed, 3), "watermark": watermark}
+
+    def reset(self):
+        """Empties every rollup and the watermark (before a backfill)."""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            for table in ROLLUP_TABLES:
+                self.conn.execute(f"DELETE FROM {table}")
+            self.conn.execute("COMMIT")
+
+    def backfill(self, batch: int = DEFAULT_BATCH, settle: float = DEFAULT_SETTLE) -> Dict[str, object]:
+        """Rebuilds the rollups from every order line."""
+        self.reset()
+        return self.refresh(batch, settle)
+
+    # --- Reads (the dashboard) ---
+    def _rows(self, sql: str, params=()) -> List[dict]:
+        with self._read_lock:
+            return [dict(row) for row in self._reader.execute(sql, params)]
+
+    def _refreshed_at(self) -> Optional[float]:
+        row = self._rows("SELECT value FROM rollup_state WHERE name = 'refreshed_at'")
+        return json.loads(row[0]["value"]) if row else None
+
+    def lag_seconds(self) -> float:
+        refreshed_at = self._refreshed_at()
+        return round(time.time() - refreshed_at, 1) if refreshed_at is not None else -1.0
+
+    def farmer_dashboard(self, farmer_id: str, days: int = 30, top: int = 5) -> dict:
+        """Totals, a daily series for the last ``days`` days, best-selling products and cart demand."""
+        first = today() - days + 1
+        totals = self._rows("SELECT lines, quantity, revenue FROM rollup_farmer_total WHERE farmer_id = ?",
+                            (farmer_id,))
+        series = self._rows("SELECT day, lines, quantity, revenue FROM rollup_farmer_day "
+                            "WHERE farmer_id = ? AND day >= ? ORDER BY day", (farmer_id, first))
+        products = self._rows("SELECT product_id, name, lines, quantity, revenue FROM rollup_product_total "
+                              "WHERE farmer_id = ? ORDER BY revenue DESC LIMIT ?", (farmer_id, top))
+        carts = self._rows("SELECT COALESCE(SUM(carts), 0) AS carts, COALESCE(SUM(quantity), 0) AS quantity "
+                           "FROM cart_demand WHERE farmer_id = ?", (farmer_id,))
+        return {
+            "farmer_id": farmer_id,
+            "totals": totals[0] if totals else {"lines": 0, "quantity": 0, "revenue": 0.0},
+            "daily": [{**row, "day": day_label(row["day"])} for row in series],
+            "top_products": products,
+            "in_carts": carts[0],
+            "lag_seconds": self.lag_seconds(),
+        }
+
+    def demand(self, days: int = 7, location: Optional[str] = None, top: int = 20) -> dict:
+        """
+        Most ordered products over the last ``days`` days, overall or for one
+        location (whole weeks, so at least ``days`` days), and the busiest
+        locations. ``DEMAND_WINDOWS`` up to ``DEMAND_TOP`` products are read
+        ranked; other windows are summed from the daily rollups.
+        """
+        if days in DEMAND_WINDOWS and top <= DEMAND_TOP:
+            products = self._rows("SELECT product_id, name, farmer_id, quantity, lines FROM demand_top "
+                                  "WHERE days = ? AND location = ? AND rank <= ? ORDER BY rank",
+                                  (days, location or "", top))
+            locations = self._rows("SELECT location, quantity, lines FROM location_top "
+                                   "WHERE days = ? AND rank <= ? ORDER BY rank", (days, top))
+        else:
+            first = today() - days + 1
+            totals, where, params = ("rollup_product_day", "day >= ?", (first,)) if location is None else \
+                ("rollup_location_week", "week >= ? AND location = ?", (first // 7, location))
+            products = self._rows(
+                f"""SELECT r.product_id, t.name, t.farmer_id, SUM(r.quantity) AS quantity, SUM(r.lines) AS lines
+                    FROM {totals} r LEFT JOIN rollup_product_total t ON t.product_id = r.product_id
+                    WHERE {where} GROUP BY r.product_id ORDER BY quantity DESC, r.product_id LIMIT ?""",
+                (*params, top))
+            locations = self._rows(
+                "SELECT location, SUM(quantity) AS quantity, SUM(lines) AS lines FROM rollup_location_day "
+                "WHERE day >= ? GROUP BY location ORDER BY quantity DESC, location LIMIT ?", (first, top))
+        return {"days": days, "location": location, "products": products, "locations": locations,
+                "lag_seconds": self.lag_seconds()}
+
+
+def ensure_source_indexes(source) -> None:
+    """Creates ``ORDER_ITEM_INDEXES`` on a source database that lacks them (needs write access)."""
+    conn = sqlite3.connect(source)
+    try:
+        for statement in ORDER_ITEM_INDEXES:
+            conn.execute(statement)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Refresh the farmer dashboard rollups")
+    parser.add_argument("--source", help="App database (default AGENT_PRODUCTS_DB or prisma/dev.db)")
+    parser.add_argument("--rollups", help="Rollup database (default AGENT_ROLLUP_DB or prisma/rollups.db)")
+    parser.add_argument("--backfill", action="store_true", help="Rebuild every rollup from scratch first")
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH, help="Order lines per transaction")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE,
+                        help="Leave lines younger than this many seconds for the next run")
+    parser.add_argument("--watch", type=float, help="Keep refreshing every this many seconds")
+    parser.add_argument("--ensure-index", action="store_true", help="Create the OrderItem watermark index")
+    return parser
+
+
+def main(args) -> dict:
+    store = RollupStore(args.rollups, args.source)
+    if args.ensure_index:
+        ensure_source_indexes(store.source)
+    result = store.backfill(args.batch, args.settle) if args.backfill else store.refresh(args.batch, args.settle)
+    logger.info("Folded %s order lines in %s s", result['lines'], result['seconds'])
+    while args.watch:
+        time.sleep(args.watch)
+        result = store.refresh(args.batch, args.settle)
+        if result["lines"]:
+            logger.info("Folded %s order lines in %s s", result['lines'], result['seconds'])
+    return result
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(main(build_parser().parse_args()), indent=2))
@@ -0,0 +1,111 @@
+"""
+Thin Sarvam.ai HTTP client shared by the backends (STT, translate, TTS).
+
+Every request carries a timeout taken from the current turn's stage budget
+(``agent_core.deadline``), so a hung connection frees its worker thread.
+"""
+import asyncio
+import logging
+import os
+from typing import List, Optional, Tuple
+
+import requests
+
+from . import deadline
+from .logs import truncate
+from .providers import ProviderError, ProviderTimeout
+
+logger = logging.getLogger(__name__)
+
+SARVAM_API_BASE_URL = os.getenv("SARVAM_API_BASE_URL", "https://api.sarvam.ai").rstrip("/")
+
+
+class SarvamClient:
+    """
+    Live Sarvam backend. Implements the STT, translation and TTS provider
+    interfaces so one instance can serve all three slots of a ProviderSet.
+    Non-200 responses raise ProviderError; callers decide how to degrade.
+    """
+
+    name = "sarvam"
+    tts_model = "bulbul:v2"
+
+    def __init__(self, api_key: Optional[str], base_url: str = SARVAM_API_BASE_URL):
+        self.api_key = api_key
+        self.stt_url = f"{base_url}/speech-to-text-translate"
+        self.tts_url = f"{base_url}/text-to-speech"
+        self.translate_url = f"{base_url}/translate"
+
+    def _require_key(self):
+        if not self.api_key:
+            raise ProviderError("SARVAM_API_KEY not available")
+
+    async def _post(self, kind: str, url: str, **kwargs) -> dict:
+        timeout = deadline.budget(kind)
+        try:
+            response = await asyncio.to_thread(requests.request, "POST", url, timeout=timeout, **kwargs)
+        except requests.Timeout:
+            raise ProviderTimeout(f"Sarvam {kind} request timed out after {timeout:.2f}s") from None
+        except requests.RequestException as e:
+            raise ProviderError(f"Sarvam {kind} request failed: {e}") from e
+        if response.status_code != 200:
+            raise ProviderError(f"Sarvam API error: {response.status_code} - {response.text}")
+        return response.json()
+
+    async def transcribe(self, audio_bytes: bytes, filename: str = "audio.wav", prompt: str = "") -> Tuple[str, str]:
+        self._require_key()
+        result = await self._post(
+            "stt",
+            self.stt_url,
+            headers={"api-subscription-key": self.api_key},
+            data={"model": "saaras:v2", "prompt": prompt, "with_diarization": False},
+            files=[("file", (filename, audio_bytes, "audio/wav"))],
+        )
+        logger.debug("Sarvam STT API response: %s", result)
+        return result.get("transcript", ""), result.get("language_code", "")
+
+    async def translate(self, text: str, source_language_code: str = "en-IN", target_language_code: str = "kn-IN") -> str:
+        self._require_key()
+        result = await self._post(
+            "translate",
+            self.translate_url,
+            headers={"Content-Type": "application/json", "api-subscription-key": self.api_key},
+            json={
+                "input": text,
+                "source_language_code": source_language_code,
+                "target_language_code": target_language_code,
+                "speaker_gender": "Female",
+                "mode": "formal",
+                "model": "mayura:v1",
+                "enable_preprocessing": False,
+                "output_script": "spoken-form-in-native",
+                "numerals_format": "native",
+            },
+        )
+        translated_text = result.get("translated_text")
+        if not translated_text:
+            raise ProviderError(f"Unexpected translation response format: {truncate(result)}")
+        return translated_text
+
+    async def synthesize(self, text: str, language_code: str = "en-IN", sample_rate: int = 8000) -> str:
+        return (await self.synthesize_batch([text], language_code, sample_rate))[0]
+
+    async def synthesize_batch(self, texts: List[str], language_code: str = "en-IN",
+                               sample_rate: int = 8000) -> List[str]:
+        """One request for several texts (the ``inputs`` list); audios come back in order."""
+        self._require_key()
+        result = await self._post(
+            "tts",
+            self.tts_url,
+            headers={"Content-Type": "application/json", "api-subscription-key": self.api_key},
+            json={
+                "inputs": list(texts),
+                "target_language_code": language_code,
+                "speech_sample_rate": sample_rate,
+                "enable_preprocessing": True,
+                "model": self.tts_model,
+            },
+        )
+        if "audios" not in result or len(result["audios"]) != len(texts):
+            raise ProviderError(f"Unexpected TTS response format: {truncate(result)}")  # may hold the audio
+        return result["audios"]
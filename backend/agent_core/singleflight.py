@@ -0,0 +1,109 @@
+"""
+Request coalescing ("single-flight") for identical in-flight provider calls.
+
+When many sessions reach the same question at once they ask for the very same
+TTS audio or translation. The first caller starts the provider call; callers
+that arrive with identical arguments while it is still running await the same
+future instead of firing their own request.
+
+* Errors (including ProviderBusy) are delivered to every caller that shared
+  the call.
+* A caller that is cancelled only stops waiting; the shared call keeps going
+  for the others, and is cancelled only when nobody is waiting any more.
+
+    AGENT_SINGLEFLIGHT=tts,translate | on | off     kinds to coalesce
+"""
+import asyncio
+import os
+from typing import Dict, Hashable, Tuple
+
+from .metrics import REGISTRY
+
+DEFAULT_KINDS = "tts,translate"
+
+
+class SingleFlight:
+    """Shares one in-flight task between concurrent callers with the same key."""
+
+    def __init__(self, name: str):
+        self._calls: Dict[Tuple[int, Hashable], asyncio.Task] = {}
+        self._waiters: Dict[Tuple[int, Hashable], int] = {}
+
+        labels = {"provider": name}
+        REGISTRY.gauge("provider_singleflight_inflight", "Distinct calls in flight", lambda: len(self._calls), **labels)
+        self.leaders = REGISTRY.counter("provider_singleflight_calls_total", "Calls that reached the provider", **labels)
+        self.collapsed = REGISTRY.counter("provider_singleflight_collapsed_total", "Duplicate calls served by an in-flight call", **labels)
+
+    async def do(self, key: Hashable, fn):
+        """Runs ``fn()`` unless an identical call is in flight, and returns its result."""
+        # Futures are bound to their loop; keep loops apart so tests/benchmarks can reuse providers
+        slot = (id(asyncio.get_running_loop()), key)
+        task = self._calls.get(slot)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[slot] = task
+            task.add_done_callback(lambda t: self._forget(slot, t))
+            self.leaders.inc()
+        else:
+            self.collapsed.inc()
+        self._waiters[slot] = self._waiters.get(slot, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters.get(slot, 0) <= 1 and not task.done():
+                task.cancel()  # last interested caller is gone
+            raise
+        finally:
+            self._waiters[slot] = self._waiters.get(slot, 1) - 1
+            if self._waiters[slot] <= 0:
+                self._waiters.pop(slot, None)
+
+    def _forget(self, slot, task: asyncio.Task):
+        if self._calls.get(slot) is task:
+            del self._calls[slot]
+        if not task.cancelled():
+            task.exception()  # mark retrieved; callers already got it through shield
+
+
+class SingleFlightProvider:
+    """Coalesces identical async calls to the wrapped provider."""
+
+    def __init__(self, kind: str, inner, group: SingleFlight):
+        self.kind = kind
+        self.inner = inner
+        self.group = group
+        self.name = getattr(inner, "name", type(inner).__name__)
+
+    async def _call(self, method: str, *args):
+        return await self.group.do((method,) + args, lambda: getattr(self.inner, method)(*args))
+
+    def invoke(self, messages):
+        return self.inner.invoke(messages)
+
+    async def ainvoke(self, messages):
+        return await self.inner.ainvoke(messages)
+
+    async def transcribe(self, audio_bytes, filename="audio.wav", prompt=""):
+        # Upload filenames differ per call even for identical audio
+        return await self.group.do(("transcribe", audio_bytes, prompt),
+                                   lambda: self.inner.transcribe(audio_bytes, filename, prompt))
+
+    async def translate(self, text, source_language_code, target_language_code):
+        return await self._call("translate", text, source_language_code, target_language_code)
+
+    async def synthesize(self, text, language_code="en-IN", sample_rate=8000):
+        return await self._call("synthesize", text, language_code, sample_rate)
+
+
+def singleflight_enabled(kind: str) -> bool:
+    setting = os.getenv("AGENT_SINGLEFLIGHT", DEFAULT_KINDS).lower()
+    if setting in ("on", "1", "true", "all"):
+        return True
+    return kind in [k.strip() for k in setting.split(",")]
+
+
+def coalesce(kind: str, provider):
+    """Wraps ``provider`` in a SingleFlightProvider if AGENT_SINGLEFLIGHT enables this kind."""
+    if not singleflight_enabled(kind):
+        return provider
+    return SingleFlightProvider(kind, provider, SingleFlight(kind))
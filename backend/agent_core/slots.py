@@ -0,0 +1,192 @@
+"""
+Multi-slot extraction: fill several form fields from one utterance.
+
+"50 kg of organic tomatoes at 30 rupees per kg" answers the price, quantity
+and (for the app profile) unit questions in one go. Each turn runs:
+
+1. a local parser for prices, quantities and units (``agent_core.normalize``,
+   no network);
+2. one structured-output LLM call asking for every still-missing field as a
+   JSON object (skipped when the utterance is a short direct answer).
+
+Local values win for the numeric slots; the LLM fills the rest. If nothing
+was extracted for the awaited field and the LLM call did not succeed, the
+whole utterance is saved as its answer, the same as before extraction existed.
+
+    AGENT_SLOT_EXTRACTION=on|local|off     local = parser only, no LLM call
+"""
+import json
+import logging
+import os
+import re
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from . import normalize
+from .forms import FORM_PROFILES, Form, FormStep
+from .limiter import ProviderBusy
+from .providers import normalize_messages
+
+logger = logging.getLogger(__name__)
+
+SLOT_PROMPT_MARKER = "slot extractor"
+DIRECT_ANSWER_MAX_WORDS = 3
+
+
+def parse_local(utterance: str) -> Dict[str, str]:
+    """
+    Slot role -> phrase for prices, quantities and units found in
+    ``utterance`` ("30 per kg", "2 quintal", "quintal"); the form's
+    validators turn them into typed values.
+    """
+    text = normalize.clean(utterance)
+    slots: Dict[str, str] = {}
+    price = normalize.find_price(text)
+    if price:
+        amount, per_unit, _ = price
+        # Not tidied: "12 per 100 g" is 0.12 per gram, which rounding to paise would lose
+        slots["price"] = f"{amount:g} per {per_unit}" if per_unit else str(normalize.tidy(amount))
+    quantity = normalize.find_quantity(text, skip=price[2] if price else None)
+    if quantity:
+        amount, unit, _ = quantity
+        slots["quantity"] = f"{normalize.tidy(amount)} {unit}"
+        slots["unit"] = unit
+    return slots
+
+
+def local_values(form: Form, utterance: str, await_key: Optional[str]) -> Dict[str, str]:
+    """Form key -> value from the local parser, limited to fields ``form`` has."""
+    values = {}
+    for slot, value in parse_local(utterance).items():
+        field = form.by_slot.get(slot)
+        if field is not None:
+            values[field.key] = value
+    awaited = form.by_key.get(await_key) if await_key else None
+    if awaited is not None and awaited.slot in ("price", "quantity") and awaited.key not in values:
+        # "thirty five", "₹ ೪೦": a single number answers the numeric question
+        if len(normalize.numbers(normalize.clean(utterance))) == 1:
+            values[awaited.key] = utterance
+    return values
+
+
+def extraction_messages(form: Form, utterance: str, missing, await_key: Optional[str]) -> list:
+    lines = "\n".join(f"- {f.key}: {f.question}" for f in missing)
+    awaited = form.by_key.get(await_key) if await_key else None
+    context = f"\nThe farmer was just asked: \"{awaited.question}\" (field {awaited.key})." if awaited else ""
+    prompt = (
+        f"You are a {SLOT_PROMPT_MARKER} for an agricultural marketplace form.\n"
+        f"Extract values for these fields from the farmer's message:\n{lines}\n{context}\n"
+        "Return ONLY a JSON object mapping field names to string values. "
+        "Omit fields the message does not mention. Numbers only for prices and quantities."
+    )
+    return [("system", prompt), ("human", utterance)]
+
+
+def parse_llm_values(form: Form, content: Optional[str]) -> Optional[Dict[str, str]]:
+    """Valid ``{key: value}`` pairs from the LLM reply, or None if it is not a JSON object."""
+    match = re.search(r"\{.*\}", content or "", re.S)
+    if not match:
+        return None
+    try:
+        raw = json.loads(match.group(0))
+    except ValueError:
+        return None
+    if not isinstance(raw, dict):
+        return None
+    return {
+        key: str(value).strip() for key, value in raw.items()
+        if key in form.by_key and value is not None and str(value).strip()
+    }
+
+
+def extraction_mode() -> str:
+    """``AGENT_SLOT_EXTRACTION``, lower-cased: "on", "local" (parser only) or "off"."""
+    return os.getenv("AGENT_SLOT_EXTRACTION", "on").lower()
+
+
+def _plan(form: Form, data: dict, utterance: Optional[str], await_key: Optional[str]):
+    """(local values, missing fields for the LLM or None to skip the call)."""
+    if not utterance or not utterance.strip() or extraction_mode() in ("off", "0", "false"):
+        return {}, None
+    local = local_values(form, utterance, await_key)
+    missing = [f for f in form.fields if f.key not in data and f.key not in local]
+    direct_answer = await_key is not None and len(utterance.split()) <= DIRECT_ANSWER_MAX_WORDS
+    if not missing or direct_answer or extraction_mode() == "local":
+        return local, None
+    return local, missing
+
+
+def _merge(form: Form, utterance: Optional[str], await_key: Optional[str], local: Dict[str, str],
+           llm_values: Optional[Dict[str, str]]) -> Dict[str, str]:
+    values = dict(llm_values or {})
+    values.update(local)  # the parser is more reliable for numbers
+    if await_key and await_key not in values and utterance is not None:
+        values[await_key] = utterance  # legacy behaviour: the utterance answers the question
+    # Keep form order so the URL lists fields the way the form asks them
+    ordered = {f.key: values[f.key] for f in form.fields if f.key in values}
+    if await_key in values and await_key not in ordered:
+        ordered[await_key] = values[await_key]
+    return ordered
+
+
+@contextmanager
+def llm_failure_tolerated(what: str):
+    """Load shedding propagates; any other failure of the LLM call is logged and leaves the fallback in place."""
+    try:
+        yield
+    except ProviderBusy:
+        raise
+    except Exception as e:
+        logger.warning("%s failed: %s", what, e)
+
+
+def _finish(form: Form, data: dict, utterance: Optional[str], await_key: Optional[str], local: Dict[str, str],
+            llm_values: Optional[Dict[str, str]], mask: Optional[int], url: Optional[str]) -> FormStep:
+    values = _merge(form, utterance, await_key, local, llm_values)
+    if len(values) > 1:
+        logger.info("Filled %s fields from one utterance: %s", len(values), list(values))
+    return form.fill(data, values, mask, url)
+
+
+def fill_slots(form: Form, data: dict, utterance: Optional[str], await_key: Optional[str], llm,
+           mask: Optional[int] = None, url: Optional[str] = None) -> FormStep:
+    """Fills every field ``utterance`` mentions and returns the next form step (sync LLM)."""
+    local, missing = _plan(form, data, utterance, await_key)
+    llm_values = None
+    if missing:
+        with llm_failure_tolerated("Slot extraction LLM call"):
+            response = llm.invoke(extraction_messages(form, utterance, missing, await_key))
+            llm_values = parse_llm_values(form, response.content)
+    return _finish(form, data, utterance, await_key, local, llm_values, mask, url)
+
+
+async def afill_slots(form: Form, data: dict, utterance: Optional[str], await_key: Optional[str], llm,
+                  mask: Optional[int] = None, url: Optional[str] = None) -> FormStep:
+    """Async variant of ``fill_slots`` for backends using ``llm.ainvoke``."""
+    local, missing = _plan(form, data, utterance, await_key)
+    llm_values = None
+    if missing:
+        with llm_failure_tolerated("Slot extraction LLM call"):
+            response = await llm.ainvoke(extraction_messages(form, utterance, missing, await_key))
+            llm_values = parse_llm_values(form, response.content)
+    return _finish(form, data, utterance, await_key, local, llm_values, mask, url)
+
+
+def synthetic_extraction(messages) -> Optional[str]:
+    """
+    Stand-in structured output for the fakes/stubs: the local parser's values
+    for the fields listed in the prompt, as JSON. None if this is not a slot
+    extraction prompt.
+    """
+    pairs = normalize_messages(messages)
+    system = " ".join(content for role, content in pairs if role == "system")
+    if SLOT_PROMPT_MARKER not in system:
+        return None
+    user = " ".join(content for role, content in pairs if role != "system")
+    slots = parse_local(user)
+    roles = {
+        spec[0]: spec[2]
+        for profile in FORM_PROFILES.values() for form in profile.values() for spec in form["fields"] if len(spec) > 2
+    }
+    keys = re.findall(r"^- (\w+): ", system, re.M)
+    return json.dumps({key: slots[roles[key]] for key in keys if roles.get(key) in slots})
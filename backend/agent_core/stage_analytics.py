@@ -0,0 +1,310 @@
+"""
+Offline latency analytics over the stage timestamps stored with every message.
+
+``websocket.py`` stores ``received_at``/``stt_completed_at`` on each user
+message and ``llm_completed_at``/``tts_completed_at`` on the assistant reply
+that follows it. This module pairs the two per turn and reports where the
+time went:
+
+* ``stt``   = stt_completed_at - received_at   (0 for text input)
+* ``llm``   = llm_completed_at - stt_completed_at
+* ``tts``   = tts_completed_at - llm_completed_at (includes output translation)
+* ``total`` = tts_completed_at - received_at
+
+Rows are paired in SQL (``LAG`` over each session, which the keyset index
+from ``history.HISTORY_INDEXES`` already orders) and read ``--chunk`` rows at
+a time. Each chunk is binned into fixed-width duration histograms with
+numpy, so memory stays constant however many rows there are, and
+percentiles come from the cumulative counts. They are exact at
+``--resolution`` (the timestamps are whole seconds today); anything above
+``--max-seconds`` lands in the last bin.
+
+The report has per-stage percentiles overall, per language, per hour of day
+(UTC) and per day, plus regressions: days whose p50 or p95 is more than
+``--threshold`` and ``--min-delta`` seconds above the pooled previous
+``--baseline-days``.
+
+``by_language`` needs the user's language on each user message, and no
+backend stores one yet: ``websocket.py`` passes only the timestamps to
+``DBManager.add_user_message_background`` (``DBManager`` lives outside this
+package). Until it does, every turn is reported under "unknown"; a table
+that keeps the language elsewhere can be named with ``--language-column``.
+
+Example (from ``backend/``)::
+
+    python -m agent_core.stage_analytics --db chat.sqlite --out results/latency-report.json
+"""
+import argparse
+import json
+import logging
+import sqlite3
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("stt", "llm", "tts", "total")
+PERCENTILES = (50, 90, 95, 99)
+TIMESTAMP_COLUMNS = ("received_at", "stt_completed_at", "llm_completed_at", "tts_completed_at")
+UNKNOWN_LANGUAGE = "unknown"
+
+_TURNS = """
+SELECT received_at, stt_completed_at, llm_completed_at, tts_completed_at, language FROM (
+    SELECT role, llm_completed_at, tts_completed_at,
+           LAG(role) OVER turn AS previous_role,
+           LAG(received_at) OVER turn AS received_at,
+           LAG(stt_completed_at) OVER turn AS stt_completed_at,
+           LAG({language}) OVER turn AS language
+    FROM {table}
+    WINDOW turn AS (PARTITION BY session_id ORDER BY created_at, id)
+) WHERE role = 'assistant' AND previous_role = 'user'
+"""
+
+
+def turn_query(conn: sqlite3.Connection, table: str = "chat_messages", language_column: str = "language") -> str:
+    """
+    The pairing query; ValueError if ``table`` lacks the timestamp columns.
+    Without ``language_column`` (the usual case today) languages are NULL.
+    """
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    missing = [c for c in ("id", "session_id", "role", "created_at", *TIMESTAMP_COLUMNS) if c not in columns]
+    if missing:
+        raise ValueError(f"Table {table} has no column(s) {', '.join(missing)}")
+    if language_column not in columns:
+        logger.warning("Table %s has no %s column, languages are reported as %s",
+                       table, language_column, UNKNOWN_LANGUAGE)
+        language_column = "NULL"
+    return _TURNS.format(table=table, language=language_column)
+
+
+def stream_turns(conn: sqlite3.Connection, query: str, chunk: int = 50_000) -> Iterator[Tuple[np.ndarray, List]]:
+    """``(timestamps, languages)`` per chunk; timestamps is (n, 4) float, NaN where missing."""
+    cursor = conn.execute(query)
+    while True:
+        rows = cursor.fetchmany(chunk)
+        if not rows:
+            break
+        yield np.array([row[:4] for row in rows], dtype=float), [row[4] for row in rows]
+
+
+def stage_durations(timestamps: np.ndarray) -> np.ndarray:
+    """(n, len(STAGES)) durations in seconds from (n, 4) timestamp rows."""
+    received, stt, llm, tts = timestamps.T
+    return np.stack([stt - received, llm - stt, tts - llm, tts - received], axis=1)
+
+
+class StageHistograms:
+    """
+    Duration histograms per stage, grouped by language, hour of day and day.
+
+    ``counts[group]`` is a (len(STAGES), bins) int64 array; bin ``i`` holds
+    durations in ``[i, i + 1) * resolution`` and the last bin everything
+    longer. Negative durations (clock skew, missing stages) are dropped.
+    """
+
+    def __init__(self, resolution: float = 1.0, max_seconds: float = 600.0):
+        self.resolution = resolution
+        self.bins = int(max_seconds / resolution) + 1
+        self.overall = np.zeros((len(STAGES), self.bins), dtype=np.int64)
+        self.hours = np.zeros((24, len(STAGES), self.bins), dtype=np.int64)
+        self.languages: Dict[str, np.ndarray] = {}
+        self.days: Dict[int, np.ndarray] = {}
+        self.turns = 0
+        self.dropped = 0
+
+    def _bin(self, durations: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        valid = np.isfinite(durations) & (durations >= 0)
+        index = np.minimum((np.where(valid, durations, 0) / self.resolution).astype(np.int64), self.bins - 1)
+        return index, valid
+
+    def _add(self, target: np.ndarray, group: np.ndarray, groups: int, index: np.ndarray, valid: np.ndarray):
+        """Adds every valid (group, stage, bin) sample to ``target`` with one bincount per stage."""
+        for stage in range(len(STAGES)):
+            keep = valid[:, stage]
+            flat = group[keep] * self.bins + index[keep, stage]
+            target[:, stage] += np.bincount(flat, minlength=groups * self.bins).reshape(groups, self.bins)
+
+    def add(self, timestamps: np.ndarray, languages: List[Optional[str]]):
+        durations = stage_durations(timestamps)
+        index, valid = self._bin(durations)
+        self.turns += len(durations)
+        self.dropped += int((~valid).any(axis=1).sum())
+        self.overall += np.stack([np.bincount(index[valid[:, s], s], minlength=self.bins)
+                                  for s in range(len(STAGES))])
+
+        received = timestamps[:, 0]
+        dated = np.isfinite(received)
+        seconds = np.where(dated, received, 0).astype(np.int64)
+        self._add(self.hours, np.where(dated, seconds // 3600 % 24, 0), 24, index, valid & dated[:, None])
+
+        names, language_index = np.unique([lang or UNKNOWN_LANGUAGE for lang in languages], return_inverse=True)
+        grouped = np.zeros((len(names), len(STAGES), self.bins), dtype=np.int64)
+        self._add(grouped, language_index.reshape(-1), len(names), index, valid)
+        for name, counts in zip(names, grouped):
+            self.languages.setdefault(str(name), np.zeros_like(counts))[...] += counts
+
+        day = seconds // 86400
+        day_names, day_index = np.unique(day[dated], return_inverse=True)
+        grouped = np.zeros((len(day_names), len(STAGES), self.bins), dtype=np.int64)
+        self._add(grouped, day_index.reshape(-1), len(day_names), index[dated], valid[dated])
+        for name, counts in zip(day_names, grouped):
+            self.days.setdefault(int(name), np.zeros_like(counts))[...] += counts
+
+
+def percentiles(counts: np.ndarray, resolution: float, qs=PERCENTILES) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ``(totals, values)`` for histograms of shape (..., bins): totals has shape
+    (...), values (..., len(qs)) in seconds (NaN where a histogram is empty).
+    Nearest-rank on the cumulative counts, reported at the bin's lower edge.
+    """
+    cumulative = np.cumsum(counts, axis=-1)
+    totals = cumulative[..., -1]
+    ranks = np.ceil(np.multiply.outer(totals, np.asarray(qs) / 100.0)).clip(min=1)
+    reached = cumulative[..., None, :] >= ranks[..., None]
+    values = reached.argmax(axis=-1) * resolution
+    return totals, np.where(totals[..., None] > 0, values, np.nan)
+
+
+def _summary(counts: np.ndarray, resolution: float) -> Dict[str, dict]:
+    totals, values = percentiles(counts, resolution)
+    report = {}
+    for s, stage in enumerate(STAGES):
+        report[stage] = {"count": int(totals[s])}
+        if totals[s]:
+            report[stage].update({f"p{q}": round(float(v), 3) for q, v in zip(PERCENTILES, values[s])})
+    return report
+
+
+def regressions(days: np.ndarray, day_names: List[int], resolution: float, baseline_days: int = 7,
+                threshold: float = 0.2, min_delta: float = 2.0, min_samples: int = 50) -> List[dict]:
+    """
+    Days whose p50 or p95 of a stage exceeds the pooled previous
+    ``baseline_days`` by more than ``threshold`` (relative) and at least
+    ``min_delta`` seconds, with at least ``min_samples`` turns on both sides.
+    The absolute floor keeps whole-second timestamps from flagging a median
+    that flips between two adjacent seconds.
+    """
+    if len(days) < 2:
+        return []
+    cumulative = np.concatenate([np.zeros_like(days[:1]), np.cumsum(days, axis=0)])
+    ends = np.arange(1, len(days))
+    starts = np.maximum(ends - baseline_days, 0)
+    baseline = cumulative[ends] - cumulative[starts]
+    current = days[1:]
+    qs = (50, 95)
+    base_totals, base_values = percentiles(baseline, resolution, qs)
+    cur_totals, cur_values = percentiles(current, resolution, qs)
+    enough = (base_totals >= min_samples) & (cur_totals >= min_samples)
+    with np.errstate(invalid="ignore"):
+        worse = (cur_values > base_values * (1 + threshold)) & (cur_values - base_values >= max(min_delta, resolution))
+    flagged = worse & enough[..., None]
+    found = []
+    for day, stage, q in zip(*np.nonzero(flagged)):
+        found.append({
+            "day": _day_label(day_names[day + 1]),
+            "stage": STAGES[stage],
+            "percentile": f"p{qs[q]}",
+            "value": round(float(cur_values[day, stage, q]), 3),
+            "baseline": round(float(base_values[day, stage, q]), 3),
+            "baseline_days": int(ends[day] - starts[day]),
+            "samples": int(cur_totals[day, stage]),
+        })
+    return found
+
+
+def _day_label(day: int) -> str:
+    return str(np.datetime64(int(day), "D"))
+
+
+def analyze(conn: sqlite3.Connection, table: str = "chat_messages", language_column: str = "language",
+            chunk: int = 50_000, resolution: float = 1.0, max_seconds: float = 600.0,
+            baseline_days: int = 7, threshold: float = 0.2, min_delta: float = 2.0, min_samples: int = 50) -> dict:
+    """Streams every turn out of ``table`` and returns the report as a dict."""
+    histograms = StageHistograms(resolution, max_seconds)
+    for timestamps, languages in stream_turns(conn, turn_query(conn, table, language_column), chunk):
+        histograms.add(timestamps, languages)
+        logger.debug("%s turns read", histograms.turns)
+
+    day_names = sorted(histograms.days)
+    days = (np.stack([histograms.days[d] for d in day_names]) if day_names
+            else np.zeros((0, len(STAGES), histograms.bins), dtype=np.int64))
+    return {
+        "turns": histograms.turns,
+        "turns_with_missing_stages": histograms.dropped,
+        "resolution_seconds": resolution,
+        "max_seconds": max_seconds,
+        "overall": _summary(histograms.overall, resolution),
+        "by_language": {name: _summary(counts, resolution) for name, counts in sorted(histograms.languages.items())},
+        "by_hour_utc": {f"{hour:02d}": _summary(histograms.hours[hour], resolution)
+                        for hour in range(24) if histograms.hours[hour].any()},
+        "by_day": {_day_label(d): _summary(counts, resolution) for d, counts in zip(day_names, days)},
+        "regressions": regressions(days, day_names, resolution, baseline_days, threshold, min_delta, min_samples),
+    }
+
+
+def render_text(report: dict) -> str:
+    """The report as fixed-width tables, one row per group."""
+    header = f"{'':<14}" + "".join(f"{stage + ' p50/p95':>18}" for stage in STAGES) + f"{'turns':>9}"
+
+    def table(title: str, groups: Dict[str, dict]) -> List[str]:
+        lines = [title, header]
+        for name, summary in groups.items():
+            cells = "".join(
+                f"{summary[stage].get('p50', '-'):>9}/{summary[stage].get('p95', '-'):<8}" for stage in STAGES)
+            lines.append(f"{name:<14}{cells}{summary['total']['count']:>9}")
+        return lines + [""]
+
+    lines = [f"{report['turns']} turns ({report['turns_with_missing_stages']} with a missing stage), "
+             f"durations in seconds at {report['resolution_seconds']} s resolution", ""]
+    lines += table("Overall", {"all": report["overall"]})
+    lines += table("By language", report["by_language"])
+    lines += table("By hour of day (UTC)", report["by_hour_utc"])
+    lines += table("By day", report["by_day"])
+    lines.append("Regressions")
+    for found in report["regressions"] or [{"none": True}]:
+        if "none" in found:
+            lines.append("  none")
+            continue
+        lines.append(f"  {found['day']} {found['stage']} {found['percentile']}: {found['value']} s "
+                     f"vs {found['baseline']} s over the previous {found['baseline_days']} day(s) "
+                     f"({found['samples']} turns)")
+    return "\n".join(lines)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Per-stage latency report from stored message timestamps")
+    parser.add_argument("--db", required=True, help="SQLite database holding the chat messages")
+    parser.add_argument("--table", default="chat_messages")
+    parser.add_argument("--language-column", default="language", help="Column with the user's language code")
+    parser.add_argument("--chunk", type=int, default=50_000, help="Rows fetched per chunk")
+    parser.add_argument("--resolution", type=float, default=1.0, help="Histogram bin width in seconds")
+    parser.add_argument("--max-seconds", type=float, default=600.0, help="Longer durations share the last bin")
+    parser.add_argument("--baseline-days", type=int, default=7)
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative increase flagged as a regression")
+    parser.add_argument("--min-delta", type=float, default=2.0, help="Smallest increase in seconds flagged")
+    parser.add_argument("--min-samples", type=int, default=50, help="Turns needed per day and per baseline")
+    parser.add_argument("--format", choices=("text", "json"), default="text", help="Format printed to stdout")
+    parser.add_argument("--out", help="Also write the JSON report to this path")
+    return parser
+
+
+def main(args) -> dict:
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    try:
+        report = analyze(conn, args.table, args.language_column, args.chunk, args.resolution, args.max_seconds,
+                         args.baseline_days, args.threshold, args.min_delta, args.min_samples)
+    finally:
+        conn.close()
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(report, fh, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    cli_args = build_parser().parse_args()
+    result = main(cli_args)
+    print(json.dumps(result, indent=2) if cli_args.format == "json" else render_text(result), file=sys.stdout)
@@ -0,0 +1,6 @@
+"""Load generators and micro-benchmarks for the voice-agent backends.
+
+Run everything from the ``backend/`` folder, e.g.::
+
+    python -m benchmarks.load_test --help
+"""
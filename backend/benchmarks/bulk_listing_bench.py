@@ -0,0 +1,159 @@
+"""
+Turns and LLM calls per product: one questionnaire per product versus bulk
+listing.
+
+A farmer lists ``--products`` crops. In ``dialog`` mode every crop runs the
+product questionnaire (with multi-slot extraction) and its own summary call.
+In ``bulk`` mode the farmer dictates the crops a few per utterance, says
+"done", and all summaries come from one batched call. Synthetic providers
+with their latency profiles stand in for STT, the LLM and TTS.
+
+Example (from ``backend/``)::
+
+    python -m benchmarks.bulk_listing_bench --farmers 50 --products 12 \\
+        --latency llm=const:0.8 --out results/bulk.json
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from agent_core import bulk
+from agent_core.forms import load_forms
+from agent_core.providers import build_providers
+from agent_core.slots import afill_slots
+
+from .stats import StageRecorder, git_revision, summarize, timestamp, write_results
+from .stubs import parse_kind_specs, synthetic_wav
+
+logger = logging.getLogger(__name__)
+
+MODES = ("dialog", "bulk")
+
+# (dictated phrase, answers by slot role for the questionnaire)
+CROPS = [
+    ("tomatoes 50 kg at 30 rupees per kg", {"product_name": "Tomatoes", "category": "Vegetables",
+     "description": "Organic red tomatoes", "price": "30", "quantity": "50", "unit": "kg"}),
+    ("onions 2 quintals at Rs 1200 per quintal", {"product_name": "Onions", "category": "Vegetables",
+     "description": "Dry red onions", "price": "12", "quantity": "2", "unit": "quintal"}),
+    ("300 pieces of coconut at 18 rupees each", {"product_name": "Coconut", "category": "Fruits",
+     "description": "Tender coconuts", "price": "18", "quantity": "300", "unit": "piece"}),
+    ("ragi 800 kg at 42 per kg", {"product_name": "Ragi", "category": "Millets",
+     "description": "Finger millet, sun dried", "price": "42", "quantity": "800", "unit": "kg"}),
+]
+
+
+class CountingLLM:
+    """Counts calls made through it."""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        return await self.inner.ainvoke(messages)
+
+
+async def dialog_session(providers, llm, form, crops, audio: bytes) -> int:
+    turns = 0
+    for phrase, answers in crops:
+        data = {}
+        step = form.advance(data, mask=0, url=form.empty_url)
+        utterance, await_key = f"I want to sell {phrase}", None
+        while True:
+            turns += 1
+            await providers.stt.transcribe(audio, "bench.wav", "")
+            step = await afill_slots(form, data, utterance, await_key, llm, step.mask, step.url)
+            if step.done:
+                await llm.ainvoke([("system", form.summary_prompt(data))])
+                await providers.tts.synthesize("All questions answered!", "en-IN", 8000)
+                break
+            await providers.tts.synthesize(step.prompt, "en-IN", 8000)
+            utterance, await_key = answers[step.field.slot], step.key
+    return turns
+
+
+async def bulk_session(providers, llm, form, crops, per_utterance: int, audio: bytes) -> int:
+    turns = 0
+    rows = []
+    for start in range(0, len(crops), per_utterance):
+        turns += 1
+        await providers.stt.transcribe(audio, "bench.wav", "")
+        utterance = ", ".join(phrase for phrase, _ in crops[start:start + per_utterance])
+        rows.extend(await bulk.aextract_rows(form, utterance, llm))
+        await providers.tts.synthesize("Say the next products, or 'done' to finish.", "en-IN", 8000)
+    turns += 1
+    await providers.stt.transcribe(audio, "bench.wav", "")
+    summaries = await bulk.asummarize_rows(form, rows, llm)
+    bulk.bulk_result(form, rows, summaries)
+    await providers.tts.synthesize(f"All {len(rows)} products are ready.", "en-IN", 8000)
+    return turns
+
+
+async def run_mode(mode: str, providers, form, args) -> dict:
+    recorder = StageRecorder()
+    limit = asyncio.Semaphore(args.concurrency)
+    audio = synthetic_wav(1000, seed="bulk-bench")
+    crops = [CROPS[i % len(CROPS)] for i in range(args.products)]
+
+    async def farmer():
+        llm = CountingLLM(providers.llm)
+        async with limit:
+            started = time.perf_counter()
+            if mode == "bulk":
+                turns = await bulk_session(providers, llm, form, crops, args.per_utterance, audio)
+            else:
+                turns = await dialog_session(providers, llm, form, crops, audio)
+            recorder.record("seconds_per_product", (time.perf_counter() - started) / len(crops))
+        recorder.record("turns_per_product", turns / len(crops))
+        recorder.record("llm_calls_per_product", llm.calls / len(crops))
+        recorder.sessions += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(farmer() for _ in range(args.farmers)))
+    return {
+        "farmers": recorder.sessions,
+        **{name: summarize(samples) for name, samples in recorder.samples.items()},
+        "elapsed": round(time.perf_counter() - started, 3),
+    }
+
+
+async def main(args) -> dict:
+    latencies = {"stt": "const:0.5", "translate": "const:0.3", "tts": "const:0.6", "llm": "const:0.8"}
+    latencies.update(parse_kind_specs(args.latency))
+    providers = build_providers(
+        defaults={kind: "synthetic" for kind in latencies}, fake_latency=latencies, seed=args.seed,
+    )
+    form = load_forms("app").get("product")
+    results = {
+        "meta": {"started_at": timestamp(), "git_revision": git_revision(), "farmers": args.farmers,
+                 "products": args.products, "per_utterance": args.per_utterance,
+                 "concurrency": args.concurrency, "latency": latencies},
+        "modes": {},
+    }
+    for mode in args.mode or MODES:
+        results["modes"][mode] = run = await run_mode(mode, providers, form, args)
+        logger.info(f"{mode}: {run['turns_per_product'].get('mean')} turns, "
+                    f"{run['llm_calls_per_product'].get('mean')} LLM calls, "
+                    f"{run['seconds_per_product'].get('mean')} s per product")
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Turns and LLM calls per product, dialog vs bulk listing")
+    parser.add_argument("--mode", action="append", choices=MODES, help="Modes to run (default: all)")
+    parser.add_argument("--farmers", type=int, default=20)
+    parser.add_argument("--products", type=int, default=12, help="Products per farmer")
+    parser.add_argument("--per-utterance", type=int, default=4, help="Products dictated per bulk utterance")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", action="append", help="kind=spec for the synthetic providers, e.g. llm=const:0.8")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="Write JSON results to this path")
+    return parser
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    cli_args = build_parser().parse_args()
+    write_results(cli_args.out, asyncio.run(main(cli_args)))
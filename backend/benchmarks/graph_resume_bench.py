@@ -0,0 +1,128 @@
+"""
+Per-turn LangGraph overhead as the conversation history grows: re-invoking
+the graph from its entry point every turn versus resuming a paused thread.
+
+``intent-classification.py`` used to call ``app.invoke(state)`` with the
+whole state on every reply, starting again at ``classify_intent``. It now
+pauses in an ``await_*`` node and the next reply resumes there through the
+checkpointer. Both are driven with the synthetic LLM at zero latency (so
+only graph work is measured) through back-to-back product requests on one
+thread, and per-turn times are grouped by the number of messages in the
+history. Needs langgraph (and langgraph-checkpoint-sqlite for ``--db``).
+
+Example (from ``backend/``)::
+
+    python -m benchmarks.graph_resume_bench --history 400 --out results/graph.json
+"""
+import argparse
+import importlib.util
+import logging
+import os
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from .stats import git_revision, summarize, timestamp, write_results
+
+logger = logging.getLogger(__name__)
+
+MODES = ("reinvoke", "resume")
+ANSWERS = ["I want to add a new product", "Tomato", "Vegetables", "Fresh red tomatoes", "30", "50"]
+
+
+def load_graph_module(db: str):
+    os.environ.setdefault("AGENT_PROVIDERS_LLM", "synthetic")
+    os.environ.setdefault("AGENT_FAKE_LATENCY_LLM", "const:0")
+    os.environ.setdefault("AGENT_SLOT_EXTRACTION", "local")
+    os.environ["AGENT_GRAPH_DB"] = db
+    path = Path(__file__).resolve().parent.parent / "intent-classification.py"
+    spec = importlib.util.spec_from_file_location("intent_classification", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def legacy_graph(module):
+    """The old wiring: no checkpointer, every reply re-enters at classify_intent."""
+    workflow = module.StateGraph(module.AgentState)
+    workflow.add_node("classify_intent", module.classify_intent_and_return_base_url)
+    workflow.add_node("product_form", module.product_form)
+    workflow.add_node("post_form", module.post_form)
+    workflow.set_entry_point("classify_intent")
+    workflow.add_conditional_edges("classify_intent", lambda s: s["intent"],
+                                   {"product": "product_form", "post": "post_form"})
+    workflow.add_edge("product_form", module.END)
+    workflow.add_edge("post_form", module.END)
+    return workflow.compile()
+
+
+def run_reinvoke(module, history: int) -> dict:
+    graph = legacy_graph(module)
+    state = module.AgentState(messages=[])
+    per_size = defaultdict(list)
+    turn = 0
+    while len(state.get("messages", [])) < history:
+        size = len(state.get("messages", []))
+        state["messages"] = module.add_messages(state.get("messages", []),
+                                                [module.HumanMessage(content=ANSWERS[turn % len(ANSWERS)])])
+        started = time.perf_counter()
+        state = graph.invoke(state, {"recursion_limit": 10})
+        per_size[size].append(time.perf_counter() - started)
+        turn += 1
+        if state.get("done"):
+            state = module.AgentState(messages=state["messages"], intent=None, product_data=None, await_key=None,
+                                      done=False, summary=None, url=None, base_url=None, form_mask=0)
+            turn = 0
+    return per_size
+
+
+def run_resume(module, history: int) -> dict:
+    graph = module.app
+    thread_id = f"bench-{time.time_ns()}"
+    per_size = defaultdict(list)
+    size, turn = 0, 0
+    while size < history:
+        started = time.perf_counter()
+        state = module.chat_turn(graph, ANSWERS[turn % len(ANSWERS)], thread_id)
+        per_size[size].append(time.perf_counter() - started)
+        size = len(state["messages"])
+        turn = 0 if state.get("done") else turn + 1
+    return per_size
+
+
+def bucketed(per_size: dict, bucket: int) -> dict:
+    buckets = defaultdict(list)
+    for size, samples in per_size.items():
+        buckets[size // bucket * bucket].extend(samples)
+    return {f"{start}-{start + bucket - 1}": summarize(samples) for start, samples in sorted(buckets.items())}
+
+
+def main(args) -> dict:
+    module = load_graph_module(args.db)
+    results = {
+        "meta": {"started_at": timestamp(), "git_revision": git_revision(), "history": args.history,
+                 "bucket": args.bucket, "db": args.db},
+        "modes": {},
+    }
+    for mode in args.mode or MODES:
+        runner = run_resume if mode == "resume" else run_reinvoke
+        results["modes"][mode] = buckets = bucketed(runner(module, args.history), args.bucket)
+        last = list(buckets)[-1]
+        logger.info(f"{mode}: p50 {buckets[last].get('p50')} s per turn at {last} messages")
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Per-turn graph overhead, re-invoke vs checkpointed resume")
+    parser.add_argument("--mode", action="append", choices=MODES, help="Modes to run (default: all)")
+    parser.add_argument("--history", type=int, default=300, help="Stop once the thread has this many messages")
+    parser.add_argument("--bucket", type=int, default=50, help="Group turns by history size in buckets of N")
+    parser.add_argument("--db", default=":memory:", help="SQLite path for the checkpointer")
+    parser.add_argument("--out", help="Write JSON results to this path")
+    return parser
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    cli_args = build_parser().parse_args()
+    write_results(cli_args.out, main(cli_args))
@@ -0,0 +1,119 @@
+"""
+Tail-latency benchmark for hedged Sarvam calls.
+
+Starts the stub server with a heavy-tailed (Pareto) latency for one route and
+drives the live ``SarvamClient`` against it twice: plain, then wrapped in a
+``HedgedProvider``. Reports p50/p95/p99 for both runs together with the hedge
+rate and the extra requests the stub actually served.
+
+Example (from ``backend/``)::
+
+    python -m benchmarks.hedging_bench --kind tts --latency pareto:0.2,1.5@20 \\
+        --calls 2000 --concurrency 50 --max-hedge-rate 0.1 --out results/hedging.json
+
+Requires ``requests`` (the same dependency as the live Sarvam client).
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from agent_core.deadline import DeadlineProvider, turn_deadline
+from agent_core.hedging import HedgedProvider, HedgePolicy
+from agent_core.providers import ProviderError
+from agent_core.sarvam import SarvamClient
+
+from .stats import StageRecorder, git_revision, timestamp, write_results
+from .stubs import StubServer, synthetic_wav
+
+logger = logging.getLogger(__name__)
+
+CALLS = {
+    "stt": lambda p, audio: p.transcribe(audio, "bench.wav", ""),
+    "translate": lambda p, audio: p.translate("Fresh tomatoes from my farm", "en-IN", "kn-IN"),
+    "tts": lambda p, audio: p.synthesize("Fresh tomatoes from my farm", "en-IN", 8000),
+}
+
+
+async def drive(provider, kind: str, calls: int, concurrency: int, turn_slo: float) -> dict:
+    recorder = StageRecorder()
+    limit = asyncio.Semaphore(concurrency)
+    audio = synthetic_wav(1000, seed="hedging-bench")
+
+    async def one():
+        async with limit:
+            started = time.perf_counter()
+            try:
+                with turn_deadline(turn_slo):
+                    await CALLS[kind](provider, audio)
+            except ProviderError as e:
+                recorder.error(type(e).__name__)
+                return
+            recorder.record(kind, time.perf_counter() - started)
+            recorder.turns += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(calls)))
+    return recorder.to_dict(time.perf_counter() - started)
+
+
+async def main(args) -> dict:
+    stub = StubServer({args.kind: args.latency}, seed=args.seed)
+    base_url = await stub.start()
+    client = SarvamClient("stub-key", base_url=base_url)
+    results = {
+        "meta": {
+            "started_at": timestamp(),
+            "git_revision": git_revision(),
+            "kind": args.kind,
+            "latency": repr(stub.latencies[args.kind]),
+            "calls": args.calls,
+            "concurrency": args.concurrency,
+            "turn_slo": args.turn_slo,
+            "quantile": args.quantile,
+            "max_hedge_rate": args.max_hedge_rate,
+        },
+        "runs": {},
+    }
+    try:
+        policy = HedgePolicy(f"bench-{args.kind}", quantile=args.quantile, max_rate=args.max_hedge_rate)
+        variants = {
+            "baseline": DeadlineProvider(args.kind, client),
+            "hedged": DeadlineProvider(args.kind, HedgedProvider(args.kind, client, policy)),
+        }
+        for name, provider in variants.items():
+            served_before = stub.requests[args.kind]
+            run = await drive(provider, args.kind, args.calls, args.concurrency, args.turn_slo)
+            run["stub_requests"] = stub.requests[args.kind] - served_before
+            if name == "hedged":
+                run["hedged"] = int(policy.hedged.read())
+                run["hedge_wins"] = int(policy.hedge_wins.read())
+                run["hedge_throttled"] = int(policy.throttled.read())
+                run["hedge_delay"] = policy.delay
+            results["runs"][name] = run
+            stage = run["stages"].get(args.kind, {})
+            logger.info(f"{name}: p50={stage.get('p50')} p95={stage.get('p95')} p99={stage.get('p99')} "
+                        f"requests={run['stub_requests']}")
+    finally:
+        await stub.stop()
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Compare plain vs hedged Sarvam calls against a heavy-tailed stub")
+    parser.add_argument("--kind", choices=sorted(CALLS), default="tts")
+    parser.add_argument("--latency", default="pareto:0.2,1.5@20", help="Stub latency spec for --kind")
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--turn-slo", type=float, default=30.0, help="Per-call turn deadline in seconds")
+    parser.add_argument("--quantile", type=float, default=95.0, help="Hedge after this latency quantile")
+    parser.add_argument("--max-hedge-rate", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="Write JSON results to this path")
+    return parser
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    cli_args = build_parser().parse_args()
+    write_results(cli_args.out, asyncio.run(main(cli_args)))
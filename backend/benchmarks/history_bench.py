@@ -0,0 +1,117 @@
+"""
+Session history reads at 10k, 100k and 1M messages per user.
+
+For each size one user gets a session of that many messages in a SQLite
+``HistoryStore``, then the benchmark times:
+
+* ``full_json``: the old response, every message in one JSON document;
+* ``first_page`` / ``deep_page``: one keyset page at the start and at 90%;
+* ``offset_deep_page``: the same deep page with ``LIMIT/OFFSET``;
+* ``ndjson_stream``: streaming the whole history page by page
+  (``largest_chunk_bytes`` is what the server holds at once).
+
+Page reads are measured with and without ``HISTORY_INDEXES``.
+
+Example (from ``backend/``)::
+
+    python -m benchmarks.history_bench --sizes 10000,100000,1000000 --out results/history.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+
+from agent_core.history import HistoryStore, encode_cursor, ndjson_stream, page_messages
+
+from .stats import git_revision, summarize, timestamp, write_results
+
+logger = logging.getLogger(__name__)
+
+SESSION = "bench-session"
+
+
+def populate(store: HistoryStore, size: int, batch: int = 50_000):
+    for start in range(0, size, batch):
+        store.add_messages([
+            (f"msg-{i:09d}", SESSION, "user" if i % 2 == 0 else "assistant",
+             f"Message {i}: 50 kg of tomatoes at 30 rupees per kg", f"2026-01-01T00:00:00.{i:09d}")
+            for i in range(start, min(start + batch, size))
+        ])
+
+
+def timed(fn, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+async def stream_all(store: HistoryStore, page_size: int) -> dict:
+    started = time.perf_counter()
+    total, largest = 0, 0
+    async for chunk in ndjson_stream(lambda c: page_messages(store, SESSION, c, page_size)):
+        total += len(chunk)
+        largest = max(largest, len(chunk))
+    return {"seconds": round(time.perf_counter() - started, 4), "bytes": total, "largest_chunk_bytes": largest}
+
+
+def bench_size(size: int, args) -> dict:
+    path = os.path.join(tempfile.mkdtemp(prefix="history-bench-"), "history.sqlite")
+    store = HistoryStore(path)
+    populate(store, size)
+    deep = int(size * 0.9)
+    deep_key = (f"2026-01-01T00:00:00.{deep:09d}", f"msg-{deep:09d}")
+    offset_query = ("SELECT id, session_id, role, content, created_at FROM chat_messages WHERE session_id = ? "
+                    "ORDER BY created_at, id LIMIT ? OFFSET ?")
+    result = {"cursor_example": encode_cursor(deep_key)}
+    for indexed in (False, True):
+        (store.ensure_indexes if indexed else store.drop_indexes)()
+        label = "indexed" if indexed else "unindexed"
+        result[label] = {
+            "first_page": timed(lambda: store.messages_page(SESSION, limit=args.page_size), args.repeat),
+            "deep_page": timed(lambda: store.messages_page(SESSION, deep_key, args.page_size), args.repeat),
+            "offset_deep_page": timed(
+                lambda: store.conn.execute(offset_query, (SESSION, args.page_size, deep)).fetchall(), args.repeat),
+        }
+    result["full_json"] = timed(lambda: json.dumps(store.all_messages(SESSION)), 1)
+    result["full_json"]["bytes"] = len(json.dumps(store.all_messages(SESSION)))
+    result["ndjson_stream"] = asyncio.run(stream_all(store, args.page_size))
+    store.conn.close()
+    os.remove(path)
+    return result
+
+
+def main(args) -> dict:
+    sizes = [int(s) for s in args.sizes.split(",")]
+    results = {
+        "meta": {"started_at": timestamp(), "git_revision": git_revision(), "sizes": sizes,
+                 "page_size": args.page_size, "repeat": args.repeat},
+        "sizes": {},
+    }
+    for size in sizes:
+        results["sizes"][str(size)] = run = bench_size(size, args)
+        logger.info(f"{size} messages: full JSON {run['full_json']['mean']} s, "
+                    f"deep page {run['indexed']['deep_page']['p50']} s indexed / "
+                    f"{run['unindexed']['deep_page']['p50']} s unindexed, "
+                    f"OFFSET {run['indexed']['offset_deep_page']['p50']} s")
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Keyset pagination and NDJSON streaming of session history")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated messages per user")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20, help="Timed reads per page query")
+    parser.add_argument("--out", help="Write JSON results to this path")
+    return parser
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    cli_args = build_parser().parse_args()
+    write_results(cli_args.out, main(cli_args))
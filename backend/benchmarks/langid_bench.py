@@ -0,0 +1,92 @@
+"""
+Cost and accuracy of local language identification for typed messages.
+
+Each sample is a message a farmer might type (native script, romanized
+Hindi/Kannada, English, bare numbers) with the language it should be
+treated as. The conversation replays them on one session through
+``SessionLanguages``, so short replies inherit the session's language.
+Reported: microseconds per decision, accuracy, and how many remote
+translate calls the turns need (only non-English ones) versus asking the
+translate API for the language of every message.
+
+Example (from ``backend/``)::
+
+    python -m benchmarks.langid_bench --repeat 20000 --out results/langid.json
+"""
+import argparse
+import logging
+import time
+
+from agent_core.langid import ENGLISH, SessionLanguages, identify
+
+from .stats import git_revision, timestamp, write_results
+
+logger = logging.getLogger(__name__)
+
+# (message, expected language) in conversation order
+SAMPLES = [
+    ("I want to sell tomatoes", "en-IN"),
+    ("Tomato", "en-IN"),
+    ("Fresh red tomatoes from my farm", "en-IN"),
+    ("30", "en-IN"),
+    ("Ragi", "en-IN"),
+    ("Tur dal", "en-IN"),
+    ("मुझे प्याज बेचना है", "hi-IN"),
+    ("प्याज", "hi-IN"),
+    ("50", "hi-IN"),
+    ("mujhe aloo bechna hai", "hi-IN"),
+    ("kitne ka hai bhai", "hi-IN"),
+    ("Ragi", "hi-IN"),
+    ("ನನಗೆ ಟೊಮೆಟೊ ಮಾರಬೇಕು", "kn-IN"),
+    ("40", "kn-IN"),
+    ("nanage eerulli maarabeku", "kn-IN"),
+    ("bele eshtu ide", "kn-IN"),
+    ("ok", "kn-IN"),
+    ("Jowar", "kn-IN"),
+    ("எனக்கு தக்காளி விற்க வேண்டும்", "ta-IN"),
+    ("నాకు ఉల్లిపాయలు అమ్మాలి", "te-IN"),
+    ("What is the price of rice today", "en-IN"),
+    ("Price is 30 rupees per kg", "en-IN"),
+]
+
+
+def main(args) -> dict:
+    results = {
+        "meta": {"started_at": timestamp(), "git_revision": git_revision(), "repeat": args.repeat},
+        "samples": [],
+    }
+    languages = SessionLanguages()
+    correct = 0
+    for message, expected in SAMPLES:
+        detected = languages.detect("bench", message)
+        correct += detected == expected
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            identify(message)
+        micros = (time.perf_counter() - started) / args.repeat * 1e6
+        results["samples"].append({"message": message, "expected": expected, "detected": detected,
+                                   "identified": identify(message), "us_per_message": round(micros, 2)})
+        logger.info(f"{message!r}: {detected} (expected {expected}) in {micros:.1f} us")
+    translated = sum(1 for sample in results["samples"] if sample["detected"] != ENGLISH)
+    results["summary"] = {
+        "accuracy": round(correct / len(SAMPLES), 3),
+        "max_us_per_message": max(sample["us_per_message"] for sample in results["samples"]),
+        # one translate call in per non-English turn, versus one extra detection call for every turn
+        "remote_calls_local_id": translated,
+        "remote_calls_remote_id": len(SAMPLES) + translated,
+    }
+    logger.info(f"Summary: {results['summary']}")
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Microbenchmark local language identification")
+    parser.add_argument("--repeat", type=int, default=20000, help="Identifications per sample")
+    parser.add_argument("--out", help="Write JSON results to this path")
+    return parser
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    cli_args = build_parser().parse_args()
+    write_results(cli_args.out, main(cli_args))
@@ -0,0 +1,267 @@
+"""
+End-to-end load generator for the voice-agent backends.
+
+Simulated farmers replay the scripted conversations in ``scenarios/`` against
+either the HTTP API of ``full-agentic-integration.py`` or ``graph-service.py``
+(``/start_session`` + ``/interact/{session_id}``) or the ``/ws/{client_id}`` websocket served by
+``websocket.py``. Sarvam and Groq are replaced by ``benchmarks.stubs`` with
+configurable latency distributions, and the results (throughput, p50/p95/p99
+per stage, error rates, worker RSS) are written as JSON so runs can be
+compared across commits.
+
+Examples (from ``backend/``)::
+
+    # Launch the HTTP server against local stubs and drive 2000 farmers
+    python -m benchmarks.load_test --mode http --launch full-agentic-integration:app \\
+        --farmers 2000 --concurrency 500 --out results/http.json
+
+    # Same contract, served by the async LangGraph service
+    python -m benchmarks.load_test --mode http --launch graph-service:app --farmers 2000 --concurrency 500
+
+    # Drive an already running websocket app that was started with
+    # SARVAM_API_BASE_URL / GROQ_API_BASE pointing at `python -m benchmarks.stubs`
+    python -m benchmarks.load_test --mode ws --base-url ws://127.0.0.1:8000 --server-pid 1234
+
+Requires ``httpx`` (HTTP mode) or ``websockets`` (websocket mode).
+"""
+import argparse
+import asyncio
+import base64
+import glob
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from typing import List, Optional
+
+from agent_core.latency import LatencyModel
+
+from .stats import RssSampler, StageRecorder, git_revision, timestamp, write_results
+from .stubs import StubServer, parse_kind_specs, synthetic_wav
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios")
+TERMINAL_WS_STATUSES = ("response_ready", "error", "busy")
+
+
+def load_scenarios(paths: List[str], stub: StubServer) -> List[dict]:
+    """Load scenario files and materialise audio turns as WAV bytes."""
+    scenarios = []
+    for path in paths:
+        with open(path) as f:
+            scenario = json.load(f)
+        for turn in scenario["turns"]:
+            audio = turn.get("audio")
+            if not audio:
+                continue
+            if "path" in audio:
+                with open(os.path.join(os.path.dirname(path), audio["path"]), "rb") as f:
+                    turn["audio_bytes"] = f.read()
+            else:
+                turn["audio_bytes"] = synthetic_wav(audio.get("duration_ms", 1000), seed=audio["transcript"])
+            stub.register_audio(turn["audio_bytes"], audio["transcript"], audio.get("language_code", "en-IN"))
+        scenarios.append(scenario)
+    return scenarios
+
+
+async def run_http_farmer(client, base_url: str, scenario: dict, recorder: StageRecorder, think: LatencyModel, rng: random.Random):
+    try:
+        response = await client.post(f"{base_url}/start_session")
+        response.raise_for_status()
+        session_id = response.json()["session_id"]
+    except Exception as e:
+        recorder.error(f"start_session:{type(e).__name__}")
+        return
+    for turn in scenario["turns"]:
+        if "audio_bytes" in turn:
+            body = {"bytes": base64.b64encode(turn["audio_bytes"]).decode("ascii")}
+        else:
+            body = {"text": turn["text"]}
+        started = time.perf_counter()
+        try:
+            response = await client.post(f"{base_url}/interact/{session_id}", json=body)
+        except Exception as e:
+            recorder.error(f"transport:{type(e).__name__}")
+            return
+        recorder.record("turn_total", time.perf_counter() - started)
+        if response.status_code != 200:
+            recorder.error(f"http_{response.status_code}")
+            return
+        payload = response.json()
+        if payload.get("status") not in ("success", "complete"):
+            recorder.error(f"status_{payload.get('status')}")
+            return
+        recorder.turns += 1
+        recorder.record("server_processing", payload.get("processing_time"))
+        for stage, seconds in (payload.get("stage_timings") or {}).items():
+            recorder.record(stage, seconds)
+        await asyncio.sleep(think.sample(rng))
+    recorder.sessions += 1
+
+
+async def run_ws_farmer(base_url: str, scenario: dict, recorder: StageRecorder, think: LatencyModel, rng: random.Random):
+    import websockets
+
+    client_id = f"loadtest-{uuid.uuid4().hex[:12]}"
+    try:
+        async with websockets.connect(f"{base_url}/ws/{client_id}", max_size=None) as ws:
+            for turn in scenario["turns"]:
+                started = time.perf_counter()
+                first_status_at = None
+                await ws.send(turn["audio_bytes"] if "audio_bytes" in turn else turn["text"])
+                while True:
+                    message = json.loads(await ws.recv())
+                    if first_status_at is None:
+                        first_status_at = time.perf_counter()
+                    if message.get("status") in TERMINAL_WS_STATUSES:
+                        break
+                recorder.record("turn_total", time.perf_counter() - started)
+                recorder.record("first_status", first_status_at - started)
+                if message["status"] != "response_ready":
+                    recorder.error(f"status_{message['status']}")
+                    return
+                recorder.turns += 1
+                for stage, seconds in (message.get("performance") or {}).items():
+                    recorder.record(stage, seconds)
+                await asyncio.sleep(think.sample(rng))
+    except Exception as e:
+        recorder.error(f"transport:{type(e).__name__}")
+        return
+    recorder.sessions += 1
+
+
+def launch_server(app: str, port: int, stub_url: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "AGENT_PROVIDERS": "live",
+        "SARVAM_API_BASE_URL": stub_url,
+        "SARVAM_API_KEY": env.get("SARVAM_API_KEY", "stub-key"),
+        "GROQ_API_BASE": stub_url,
+        "GROQ_API_KEY": env.get("GROQ_API_KEY", "stub-key"),
+    })
+    command = [sys.executable, "-m", "uvicorn", app, "--app-dir", BACKEND_DIR,
+               "--port", str(port), "--log-level", "warning"]
+    logger.info(f"Launching server: {' '.join(command)}")
+    return subprocess.Popen(command, env=env)
+
+
+async def wait_until_ready(url: str, timeout: float = 60.0):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.25)
+    raise RuntimeError(f"Server at {url} did not become ready within {timeout}s")
+
+
+async def main(args) -> dict:
+    rng = random.Random(args.seed)
+    stub = StubServer(
+        parse_kind_specs(args.stub_latency),
+        {kind: float(rate) for kind, rate in parse_kind_specs(args.stub_error_rate).items()},
+        seed=args.seed,
+    )
+    stub_url = await stub.start()
+    scenarios = load_scenarios(args.scenario or sorted(glob.glob(os.path.join(SCENARIO_DIR, "*.json"))), stub)
+
+    server: Optional[subprocess.Popen] = None
+    base_url = args.base_url
+    server_pid = args.server_pid
+    if args.launch:
+        server = launch_server(args.launch, args.port, stub_url)
+        server_pid = server.pid
+        base_url = f"{'ws' if args.mode == 'ws' else 'http'}://127.0.0.1:{args.port}"
+        await wait_until_ready(f"http://127.0.0.1:{args.port}/")
+
+    recorder = StageRecorder()
+    think = LatencyModel.parse(args.think_time)
+    sampler = RssSampler(server_pid, args.rss_interval) if server_pid else None
+    if sampler:
+        sampler.start()
+
+    limit = asyncio.Semaphore(args.concurrency)
+    ramp_step = args.ramp_up / args.farmers if args.farmers else 0.0
+
+    async def farmer(index: int, client):
+        await asyncio.sleep(index * ramp_step)
+        scenario = scenarios[index % len(scenarios)]
+        async with limit:
+            if args.mode == "http":
+                await run_http_farmer(client, base_url, scenario, recorder, think, rng)
+            else:
+                await run_ws_farmer(base_url, scenario, recorder, think, rng)
+
+    started = time.perf_counter()
+    try:
+        if args.mode == "http":
+            import httpx
+
+            limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+            async with httpx.AsyncClient(timeout=args.request_timeout, limits=limits) as client:
+                await asyncio.gather(*(farmer(i, client) for i in range(args.farmers)))
+        else:
+            await asyncio.gather(*(farmer(i, None) for i in range(args.farmers)))
+    finally:
+        elapsed = time.perf_counter() - started
+        if sampler:
+            await sampler.stop()
+        if server:
+            server.terminate()
+            server.wait(timeout=10)
+        await stub.stop()
+
+    results = {
+        "meta": {
+            "started_at": timestamp(),
+            "git_revision": git_revision(),
+            "mode": args.mode,
+            "target": args.launch or base_url,
+            "farmers": args.farmers,
+            "concurrency": args.concurrency,
+            "scenarios": [s["name"] for s in scenarios],
+            "stub_latency": {kind: repr(model) for kind, model in stub.latencies.items()},
+            "seed": args.seed,
+        },
+        "stub_requests": stub.requests,
+        "rss": sampler.to_dict() if sampler else None,
+    }
+    results.update(recorder.to_dict(elapsed))
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Load-test the voice agent with simulated farmers")
+    parser.add_argument("--mode", choices=("http", "ws"), default="http")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="Target when not using --launch")
+    parser.add_argument("--launch", help="uvicorn app to start against the stubs, e.g. full-agentic-integration:app")
+    parser.add_argument("--port", type=int, default=8765, help="Port for --launch")
+    parser.add_argument("--server-pid", type=int, help="PID to sample RSS from when not using --launch")
+    parser.add_argument("--farmers", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--ramp-up", type=float, default=10.0, help="Seconds over which farmers start")
+    parser.add_argument("--think-time", default="uniform:0.5,2.0", help="Latency spec between turns")
+    parser.add_argument("--scenario", action="append", help="Scenario JSON (default: all in scenarios/)")
+    parser.add_argument("--stub-latency", action="append", help="kind=spec, e.g. tts=pareto:0.3,1.5@8")
+    parser.add_argument("--stub-error-rate", action="append", help="kind=fraction, e.g. llm=0.02")
+    parser.add_argument("--request-timeout", type=float, default=60.0)
+    parser.add_argument("--rss-interval", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="Write JSON results to this path")
+    return parser
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    cli_args = build_parser().parse_args()
+    write_results(cli_args.out, asyncio.run(main(cli_args)))
@@ -0,0 +1,169 @@
+"""
+Logging overhead per turn: ``basicConfig``-style synchronous logging against
+the queued, sampled setup in agent_core/logs.py.
+
+A turn is the log traffic of one websocket turn (``--info`` INFO and
+``--debug`` DEBUG records, one of them a Sarvam TTS response with
+``--audio-kb`` of base64 audio). Each mode runs ``--turns`` turns and times
+only the logging calls, i.e. what the request handler waits for:
+
+* ``sync_debug``: a StreamHandler on the root logger at DEBUG with eager
+  f-strings, as websocket.py had;
+* ``sync_info``: the same at INFO (the f-strings are still built);
+* ``queued``: ``configure_logging`` at DEBUG with lazy arguments, JSON
+  records and ``--debug-sample`` of the turns keeping their DEBUG records;
+* ``queued_unsampled``: the same keeping every DEBUG record.
+
+Records go to a file; ``--sink-ms`` adds that much latency to every write,
+like a stderr pipe read by a slow log shipper. Turns are ``--gap-ms`` apart
+(the time a real turn spends waiting on its providers). ``drain_s`` is the
+time the writer thread still needed after the last turn, ``bytes`` what was
+written and ``dropped`` the records lost to a full queue.
+
+Example (from ``backend/``)::
+
+    python -m benchmarks.logging_bench --turns 2000 --sink-ms 0.2 --out results/logging.json
+"""
+import argparse
+import base64
+import logging
+import os
+import tempfile
+import time
+import uuid
+
+from agent_core.logs import configure_logging, log_context, shutdown_logging
+from agent_core.metrics import REGISTRY
+
+from .stats import git_revision, summarize, timestamp, write_results
+
+logger = logging.getLogger(__name__)
+turn_logger = logging.getLogger("agent.turn")
+
+
+class SlowFile:
+    """A file whose writes take ``delay`` seconds longer, like a pipe nobody is reading fast enough."""
+
+    def __init__(self, path, delay: float):
+        self.file = open(path, "w")
+        self.delay = delay
+
+    def write(self, text):
+        if self.delay:
+            time.sleep(self.delay)
+        return self.file.write(text)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def eager_turn(session_id: str, tts_response: dict, args):
+    turn_logger.info(f"Interaction received for session: {session_id}")
+    turn_logger.debug(f"Sarvam TTS API response: {tts_response}")
+    for i in range(args.debug - 1):
+        turn_logger.debug(f"Step {i} for session {session_id}: awaiting 'product_name' "
+                          f"with {len(tts_response)} keys")
+    for i in range(args.info - 1):
+        turn_logger.info(f"Stage {i} done for session {session_id} in {0.0123 * i:.3f}s")
+
+
+def lazy_turn(session_id: str, tts_response: dict, args):
+    turn_logger.info("Interaction received for session: %s", session_id)
+    turn_logger.debug("Sarvam TTS API response: %s", tts_response)
+    for i in range(args.debug - 1):
+        turn_logger.debug("Step %s for session %s: awaiting '%s' with %s keys", i, session_id, "product_name",
+                          len(tts_response))
+    for i in range(args.info - 1):
+        turn_logger.info("Stage %s done for session %s in %.3fs", i, session_id, 0.0123 * i)
+
+
+def run_mode(name: str, args, tts_response: dict, workdir: str) -> dict:
+    path = os.path.join(workdir, f"{name}.log")
+    sink = SlowFile(path, args.sink_ms / 1000)
+    root = logging.getLogger()
+    saved = (list(root.handlers), root.level)
+    for handler in saved[0]:
+        root.removeHandler(handler)
+
+    if name.startswith("sync"):
+        handler = logging.StreamHandler(sink)
+        handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+        root.addHandler(handler)
+        root.setLevel(logging.DEBUG if name == "sync_debug" else logging.INFO)
+        turn = eager_turn
+    else:
+        rate = 1.0 if name == "queued_unsampled" else args.debug_sample
+        configure_logging(logging.DEBUG, fmt="json", stream=sink, sample={logging.DEBUG: rate},
+                          queue_size=args.queue)
+        turn = lazy_turn
+
+    dropped = REGISTRY.counter("log_records_total", outcome="dropped")
+    dropped_before = dropped.read()
+    timings = []
+    for n in range(args.turns):
+        session_id = f"s{n % 100}"
+        started = time.perf_counter()
+        if name.startswith("sync"):
+            turn(session_id, tts_response, args)
+        else:
+            with log_context(session_id):
+                turn(session_id, tts_response, args)
+        timings.append(time.perf_counter() - started)
+        if args.gap_ms:
+            time.sleep(args.gap_ms / 1000)  # the turn waiting on its providers; the writer thread runs meanwhile
+
+    started = time.perf_counter()
+    if name.startswith("sync"):
+        root.removeHandler(handler)
+    else:
+        shutdown_logging()
+        root.removeHandler(root.handlers[0])
+    drain = time.perf_counter() - started
+    sink.close()
+    for handler in saved[0]:
+        root.addHandler(handler)
+    root.setLevel(saved[1])
+    return {"turn": summarize(timings), "drain_s": round(drain, 3), "bytes": os.path.getsize(path),
+            "dropped": int(dropped.read() - dropped_before)}
+
+
+def main(args) -> dict:
+    audio = base64.b64encode(os.urandom(args.audio_kb * 768)).decode()  # base64 is 4/3 of the bytes
+    tts_response = {"request_id": uuid.uuid4().hex, "audios": [audio]}
+    results = {
+        "meta": {"started_at": timestamp(), "git_revision": git_revision(), "turns": args.turns,
+                 "records_per_turn": args.info + args.debug, "audio_kb": args.audio_kb,
+                 "debug_sample": args.debug_sample, "sink_ms": args.sink_ms, "gap_ms": args.gap_ms},
+        "modes": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="logging_bench_") as workdir:
+        for name in ("sync_debug", "sync_info", "queued", "queued_unsampled"):
+            results["modes"][name] = result = run_mode(name, args, tts_response, workdir)
+            logger.info(f"{name}: p50 {result['turn']['p50'] * 1e6:.0f} us, p99 {result['turn']['p99'] * 1e6:.0f} us "
+                        f"per turn, {result['bytes'] / 1e6:.1f} MB written, {result['dropped']} dropped, "
+                        f"drained in {result['drain_s']} s")
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Per-turn logging overhead, synchronous vs queued and sampled")
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--info", type=int, default=10, help="INFO records per turn")
+    parser.add_argument("--debug", type=int, default=15, help="DEBUG records per turn")
+    parser.add_argument("--audio-kb", type=int, default=100, help="Base64 audio in the logged TTS response (KB)")
+    parser.add_argument("--debug-sample", type=float, default=0.05, help="Share of turns keeping DEBUG records")
+    parser.add_argument("--sink-ms", type=float, default=0.0, help="Extra latency of every write to the log sink")
+    parser.add_argument("--gap-ms", type=float, default=2.0,
+                        help="Pause between turns (untimed), standing in for the provider calls of a turn")
+    parser.add_argument("--queue", type=int, default=10_000, help="Queue size of the queued modes")
+    parser.add_argument("--out", help="Write JSON results to this path")
+    return parser
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    cli_args = build_parser().parse_args()
+    write_results(cli_args.out, main(cli_args))
@@ -0,0 +1,122 @@
+"""
+Audio turns per second with the media work on the event loop, in the
+default thread pool, and in ``MediaPool`` worker processes (1..N).
+
+A turn is the CPU-bound part of an audio interaction: base64-decode the
+upload, sniff/convert it (``--prepare``, needs python-magic and pydub),
+base64-encode the reply audio and ``json.dumps`` the reply payload.
+``--concurrency`` turns run at once for ``--seconds``; alongside them a
+ticker measures how late the event loop wakes up (``loop_lag``), which is
+what every other session on the server would feel.
+
+Example (from ``backend/``)::
+
+    python -m benchmarks.media_pool_bench --workers 1,2,4,8 --out results/media.json
+"""
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import time
+
+from agent_core.fakes import silent_wav_base64
+from agent_core.media import MediaPool, prepare_audio
+
+from .stats import git_revision, summarize, timestamp, write_results
+
+logger = logging.getLogger(__name__)
+
+
+def make_audio(seconds: float, sample_rate: int) -> bytes:
+    """A WAV of roughly ``seconds`` of audio (16-bit mono)."""
+    return base64.b64decode(silent_wav_base64("x" * int(seconds / 0.06), sample_rate))
+
+
+async def inline_turn(upload_b64: str, reply_audio: bytes, prepare: bool):
+    audio = base64.b64decode(upload_b64)
+    if prepare:
+        prepare_audio(audio)
+    payload = {"status": "response_ready", "text": "ok", "audio_base64": base64.b64encode(reply_audio).decode()}
+    json.dumps(payload)
+
+
+async def pool_turn(pool: MediaPool, upload_b64: str, reply_audio: bytes, prepare: bool):
+    audio = await pool.b64decode(upload_b64)
+    if prepare:
+        await pool.prepare_audio(audio)
+    payload = {"status": "response_ready", "text": "ok", "audio_base64": await pool.b64encode(reply_audio)}
+    await pool.dumps(payload)
+
+
+async def measure(turn, args) -> dict:
+    stop = time.perf_counter() + args.seconds
+    done = 0
+    lags = []
+
+    async def worker():
+        nonlocal done
+        while time.perf_counter() < stop:
+            await turn()
+            done += 1
+            await asyncio.sleep(0)
+
+    async def ticker():
+        while time.perf_counter() < stop:
+            expected = time.perf_counter() + 0.01
+            await asyncio.sleep(0.01)
+            lags.append(max(0.0, time.perf_counter() - expected))
+
+    started = time.perf_counter()
+    await asyncio.gather(ticker(), *(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    return {"turns": done, "turns_per_second": round(done / elapsed, 2), "loop_lag": summarize(lags)}
+
+
+async def run_mode(mode: str, workers: int, args, upload_b64: str, reply_audio: bytes) -> dict:
+    if mode == "loop":
+        return await measure(lambda: inline_turn(upload_b64, reply_audio, args.prepare), args)
+    pool = MediaPool(workers=workers if mode == "processes" else 0, min_bytes=0)
+    try:
+        if mode == "processes":
+            await pool_turn(pool, upload_b64, reply_audio, args.prepare)  # start the workers before timing
+        return await measure(lambda: pool_turn(pool, upload_b64, reply_audio, args.prepare), args)
+    finally:
+        pool.shutdown()
+
+
+def main(args) -> dict:
+    upload_b64 = base64.b64encode(make_audio(args.upload_seconds, 16000)).decode()
+    reply_audio = make_audio(args.reply_seconds, 8000)
+    workers = [int(w) for w in args.workers.split(",")] if args.workers else [1, os.cpu_count() or 1]
+    results = {
+        "meta": {"started_at": timestamp(), "git_revision": git_revision(), "cpu_count": os.cpu_count(),
+                 "concurrency": args.concurrency, "seconds": args.seconds, "prepare": args.prepare,
+                 "upload_bytes": len(upload_b64), "reply_bytes": len(reply_audio)},
+        "modes": {},
+    }
+    runs = [("loop", 0), ("threads", 0)] + [("processes", w) for w in workers]
+    for mode, count in runs:
+        label = f"processes-{count}" if mode == "processes" else mode
+        results["modes"][label] = run = asyncio.run(run_mode(mode, count, args, upload_b64, reply_audio))
+        logger.info(f"{label}: {run['turns_per_second']} turns/s, loop lag p99 {run['loop_lag'].get('p99')} s")
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Media work on the loop vs threads vs a process pool")
+    parser.add_argument("--workers", help="Comma-separated pool sizes (default: 1 and the CPU count)")
+    parser.add_argument("--concurrency", type=int, default=32, help="Turns in flight at once")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Duration of each run")
+    parser.add_argument("--upload-seconds", type=float, default=15.0, help="Length of the uploaded audio")
+    parser.add_argument("--reply-seconds", type=float, default=10.0, help="Length of the reply audio")
+    parser.add_argument("--prepare", action="store_true", help="Also sniff/convert uploads (python-magic, pydub)")
+    parser.add_argument("--out", help="Write JSON results to this path")
+    return parser
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    cli_args = build_parser().parse_args()
+    write_results(cli_args.out, main(cli_args))
@@ -0,0 +1,68 @@
+"""
+Per-answer cost of the local numeric/unit validators.
+
+Each sample is an answer a farmer might give to the price, quantity or unit
+question (native digits, lakh/crore, number words, currency phrases, junk).
+The benchmark reports microseconds per validation, which is what an invalid
+answer costs before it is asked again, versus a whole voice round-trip.
+
+Example (from ``backend/``)::
+
+    python -m benchmarks.normalize_bench --repeat 20000 --out results/normalize.json
+"""
+import argparse
+import logging
+import time
+
+from agent_core.normalize import VALIDATORS
+
+from .stats import git_revision, timestamp, write_results
+
+logger = logging.getLogger(__name__)
+
+# (slot role, base unit, answer)
+SAMPLES = [
+    ("price", "kg", "30"),
+    ("price", "kg", "thirty five rupees per kg"),
+    ("price", "kg", "Rs 1,200 per quintal"),
+    ("price", "kg", "₹ ४०"),
+    ("price", "kg", "ರೂ ೪೦ ಪ್ರತಿ ಕೆಜಿ"),
+    ("price", "kg", "not sure"),
+    ("quantity", None, "1.5 lakh"),
+    ("quantity", None, "2 quintals"),
+    ("quantity", None, "two hundred and fifty"),
+    ("quantity", None, "a lot"),
+    ("unit", None, "kilos"),
+    ("unit", None, "दर्जन"),
+]
+
+
+def main(args) -> dict:
+    results = {
+        "meta": {"started_at": timestamp(), "git_revision": git_revision(), "repeat": args.repeat},
+        "samples": [],
+    }
+    for slot, unit, answer in SAMPLES:
+        validate = VALIDATORS[slot]
+        value, error = validate(answer, unit)
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            validate(answer, unit)
+        micros = (time.perf_counter() - started) / args.repeat * 1e6
+        results["samples"].append({"slot": slot, "answer": answer, "value": value, "error": error,
+                                   "us_per_answer": round(micros, 2)})
+        logger.info(f"{slot} {answer!r}: {value if error is None else 'invalid'} in {micros:.1f} us")
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Microbenchmark the local answer validators")
+    parser.add_argument("--repeat", type=int, default=20000, help="Validations per sample")
+    parser.add_argument("--out", help="Write JSON results to this path")
+    return parser
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    cli_args = build_parser().parse_args()
+    write_results(cli_args.out, main(cli_args))
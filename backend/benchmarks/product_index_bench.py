@@ -0,0 +1,146 @@
+"""
+Lookup time and accuracy of the per-farmer product index used by the post
+flow (agent_core/products.py), against a full scan with difflib.
+
+A farmer's catalog is ``--products`` names drawn from common produce
+(with qualifiers such as "Organic" or "Desi"). Each query is one of their
+names the way a farmer might say it: a transliteration variant, a plural,
+or wrapped in filler ("I want to post my ..."). Reported per method:
+microseconds per lookup, and how often the right product is taken
+outright, offered among the candidates, or missed.
+
+Example (from ``backend/``)::
+
+    python -m benchmarks.product_index_bench --products 50 --queries 2000 --out results/product_index.json
+"""
+import argparse
+import difflib
+import logging
+import random
+import time
+
+from agent_core.products import ProductIndex
+
+from .stats import git_revision, summarize, timestamp, write_results
+
+logger = logging.getLogger(__name__)
+
+# name in the catalog -> ways a farmer says it
+PRODUCE = {
+    "Tomato": ["tomatoes", "tomatos", "tamato"],
+    "Aloo": ["alu", "aaloo", "aloo"],
+    "Bhindi": ["bindi", "bhendi", "bhindi"],
+    "Pyaaz": ["pyaz", "pyaj", "pyaaz"],
+    "Karela": ["karela", "karele", "karella"],
+    "Baingan": ["bengan", "baigan", "baingan"],
+    "Gobhi": ["gobi", "gobhee", "gobhi"],
+    "Mirchi": ["mirch", "mirchee", "mirchi"],
+    "Dhaniya": ["dhania", "dhaniya", "daniya"],
+    "Basmati Rice": ["basmati", "basmathi rice", "basmati rice"],
+    "Sona Masuri Rice": ["sona masoori", "sona masuri", "masuri rice"],
+    "Mango": ["mangoes", "mangos", "mango"],
+    "Banana": ["bananas", "banana", "kela banana"],
+    "Groundnut": ["ground nuts", "groundnuts", "groundnut"],
+    "Ragi": ["raagi", "ragi", "finger millet ragi"],
+    "Jowar": ["jowaar", "jwar", "jowar"],
+    "Turmeric": ["turmeric", "tumeric", "turmerik"],
+    "Coconut": ["coconuts", "cocoanut", "coconut"],
+}
+QUALIFIERS = ["", "Organic ", "Desi ", "Fresh ", "Red ", "Green ", "Hybrid "]
+FILLERS = ["{}", "my {}", "I want to post my {}", "post about the {}", "{} please"]
+MAX_PRODUCTS = len(QUALIFIERS) * len(PRODUCE)  # distinct qualifier + produce names
+
+
+def catalog_size(text: str) -> int:
+    size = int(text)
+    if not 1 <= size <= MAX_PRODUCTS:
+        raise argparse.ArgumentTypeError(f"must be between 1 and {MAX_PRODUCTS} (distinct product names)")
+    return size
+
+
+def make_catalog(rng: random.Random, size: int):
+    if not 1 <= size <= MAX_PRODUCTS:
+        raise ValueError(f"A catalog holds 1 to {MAX_PRODUCTS} distinct names, not {size}")
+    names = {}
+    while len(names) < size:
+        base = rng.choice(list(PRODUCE))
+        names.setdefault(rng.choice(QUALIFIERS) + base, base)
+    return [(f"p{i}", name, base) for i, (name, base) in enumerate(names.items())]
+
+
+def make_queries(rng: random.Random, catalog, count: int):
+    queries = []
+    for _ in range(count):
+        product_id, name, base = rng.choice(catalog)
+        qualifier = name[:-len(base)].strip().lower()
+        spoken = " ".join(filter(None, [qualifier, rng.choice(PRODUCE[base])]))
+        queries.append((rng.choice(FILLERS).format(spoken), product_id))
+    return queries
+
+
+def scan_lookup(catalog, answer: str):
+    """Baseline: difflib over every product name."""
+    names = {name.lower(): product_id for product_id, name, _ in catalog}
+    close = difflib.get_close_matches(answer.lower(), list(names), n=3, cutoff=0.3)
+    return [names[name] for name in close]
+
+
+def measure(lookup, queries) -> dict:
+    outcomes = {"taken": 0, "offered": 0, "missed": 0}
+    timings = []
+    for answer, expected in queries:
+        started = time.perf_counter()
+        taken, offered = lookup(answer)
+        timings.append((time.perf_counter() - started) * 1e6)
+        if taken == expected:
+            outcomes["taken"] += 1
+        elif expected in offered:
+            outcomes["offered"] += 1
+        else:
+            outcomes["missed"] += 1
+    return {"microseconds": summarize(timings),
+            **{outcome: round(count / len(queries), 4) for outcome, count in outcomes.items()}}
+
+
+def main(args) -> dict:
+    rng = random.Random(args.seed)
+    catalog = make_catalog(rng, args.products)
+    queries = make_queries(rng, catalog, args.queries)
+
+    started = time.perf_counter()
+    index = ProductIndex((product_id, name) for product_id, name, _ in catalog)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    def index_lookup(answer):
+        resolution = index.resolve(answer)
+        return (resolution.product.id if resolution.product else None,
+                [match.product.id for match in resolution.candidates])
+
+    def difflib_lookup(answer):
+        ids = scan_lookup(catalog, answer)
+        return (ids[0] if len(ids) == 1 else None), ids
+
+    results = {
+        "meta": {"started_at": timestamp(), "git_revision": git_revision(), "products": len(catalog),
+                 "queries": len(queries), "build_ms": round(build_ms, 3)},
+        "methods": {"index": measure(index_lookup, queries), "difflib_scan": measure(difflib_lookup, queries)},
+    }
+    for method, result in results["methods"].items():
+        logger.info(f"{method}: p50 {result['microseconds'].get('p50')} us, taken {result['taken']}, "
+                    f"offered {result['offered']}, missed {result['missed']}")
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Per-farmer product index vs a full difflib scan")
+    parser.add_argument("--products", type=catalog_size, default=50, help="Products in the farmer's catalog")
+    parser.add_argument("--queries", type=int, default=2000, help="Spoken product names to resolve")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write JSON results to this path")
+    return parser
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    cli_args = build_parser().parse_args()
+    write_results(cli_args.out, main(cli_args))
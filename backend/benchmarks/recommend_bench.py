@@ -0,0 +1,116 @@
+"""
+Latency of produce recommendations (agent_core/recommend.py) over a large
+synthetic catalog.
+
+``--products`` products are generated from the reference foods and their
+local names, with qualifiers, random prices and an "organic" share. The
+benchmark reports the time to build the feature matrix, then for a set of
+consumer profiles:
+
+* ``score``: scoring the whole catalog for one profile (cache bypassed);
+* ``cached``: a repeated request served from the per-profile cache;
+* ``python_loop``: the same scoring as a plain Python loop over products,
+  the cost of doing it without the matrix (``--loop-repeat`` runs).
+
+Example (from ``backend/``)::
+
+    python -m benchmarks.recommend_bench --products 100000 --out results/recommend.json
+"""
+import argparse
+import logging
+import random
+import time
+
+from agent_core.recommend import (ALIASES, FEATURES, REFERENCE, CatalogMatrix, Profile, Recommender,
+                                  profile_weights)
+
+from .stats import git_revision, summarize, timestamp, write_results
+
+logger = logging.getLogger(__name__)
+
+PROFILES = [
+    Profile("weight loss", ("diabetes",)),
+    Profile("healthy eating", ("hypertension",)),
+    Profile("", ("chronic kidney disease",)),
+    Profile("more iron", ("anemia", "pregnancy")),
+    Profile("muscle gain, budget", ()),
+    Profile("", ()),
+]
+QUALIFIERS = ["", "Organic ", "Desi ", "Fresh ", "Hybrid ", "Farm ", "Local "]
+OTHER = ["Basmati Rice", "Wheat Flour", "Cow Ghee", "Jaggery", "Honey", "Toor Dal"]  # not fruit/vegetables
+
+
+def make_rows(rng: random.Random, count: int):
+    names = list(REFERENCE) + list(ALIASES) + OTHER
+    return [
+        (f"p{i}", (rng.choice(QUALIFIERS) + rng.choice(names)).title(), "", round(rng.uniform(10, 200), 2), "kg")
+        for i in range(count)
+    ]
+
+
+def loop_top(rows_features, weights, k: int):
+    """Reference implementation: score each product in Python, keep the best per food."""
+    best = {}
+    for food, product_id, features in rows_features:
+        score = sum(w * f for w, f in zip(weights, features))
+        if food not in best or score > best[food][0]:
+            best[food] = (score, product_id)
+    return sorted(best.items(), key=lambda item: -item[1][0])[:k]
+
+
+def main(args) -> dict:
+    rng = random.Random(args.seed)
+    rows = make_rows(rng, args.products)
+
+    started = time.perf_counter()
+    matrix = CatalogMatrix(rows, version=1)
+    build_seconds = time.perf_counter() - started
+    recommender = Recommender(lambda: 1, lambda: rows, lambda user_id: None, check_interval=3600)
+    recommender.matrix, recommender._checked_at = matrix, time.monotonic()
+
+    rows_features = [(matrix.item[i], matrix.ids[i], matrix.features[i].tolist()) for i in range(len(matrix))]
+    results = {
+        "meta": {"started_at": timestamp(), "git_revision": git_revision(), "products": args.products,
+                 "matched": len(matrix), "features": len(FEATURES), "build_seconds": round(build_seconds, 4)},
+        "profiles": {},
+    }
+    for profile in PROFILES:
+        weights, limits = profile_weights(profile)
+        score, cached, loop = [], [], []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            matrix.top(weights, limits, args.k)
+            score.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            recommender.recommend(profile, args.k)
+            cached.append(time.perf_counter() - started)
+        for _ in range(args.loop_repeat):
+            started = time.perf_counter()
+            loop_top(rows_features, weights.tolist(), args.k)
+            loop.append(time.perf_counter() - started)
+        label = "; ".join(filter(None, [profile.goals, ", ".join(profile.conditions)])) or "(no profile)"
+        results["profiles"][label] = result = {
+            "recommended": [item.name for item in recommender.recommend(profile, args.k)],
+            "score": summarize(score), "cached": summarize(cached), "python_loop": summarize(loop),
+        }
+        logger.info(f"{label}: score p50 {result['score']['p50'] * 1000:.2f} ms, cached p50 "
+                    f"{result['cached']['p50'] * 1e6:.1f} us, python loop p50 {result['python_loop']['p50'] * 1000:.0f} ms")
+    logger.info(f"Matrix of {len(matrix)} products built in {build_seconds:.2f} s")
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Recommendation latency over a large catalog")
+    parser.add_argument("--products", type=int, default=100_000, help="Products in the synthetic catalog")
+    parser.add_argument("-k", type=int, default=5, help="Recommendations per request")
+    parser.add_argument("--repeat", type=int, default=50, help="Timed requests per profile")
+    parser.add_argument("--loop-repeat", type=int, default=3, help="Timed runs of the Python loop per profile")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write JSON results to this path")
+    return parser
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    cli_args = build_parser().parse_args()
+    write_results(cli_args.out, main(cli_args))
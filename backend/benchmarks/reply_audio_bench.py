@@ -0,0 +1,99 @@
+"""
+Bytes on the wire and time to playback per reply, for each rung of the
+reply audio ladders (agent_core/audio_out.py) over typical rural links.
+
+For every quality the benchmark synthesizes a reply of ``--reply-seconds``
+(the synthetic TTS, so silence: real speech compresses less well under
+WAV's fixed rate and about the same under Opus CBR), transcodes it the way
+the websocket does, wraps it in the JSON reply payload and reports:
+
+* ``payload_bytes``: what the client downloads (base64 in JSON);
+* ``encode_seconds``: transcoding time on this machine;
+* ``playback_seconds`` per link: encode + RTT + payload transfer, i.e. when
+  the client can start playing (it needs the whole payload first).
+
+Opus rungs need pydub and ffmpeg; without them their size is estimated from
+the bitrate and marked ``"estimated": true``.
+
+Example (from ``backend/``)::
+
+    python -m benchmarks.reply_audio_bench --reply-seconds 8 --out results/reply_audio.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from agent_core.audio_out import LADDERS, encode_reply, transcoder_available
+from agent_core.fakes import silent_wav_base64
+from agent_core.media import MediaPool
+
+from .stats import git_revision, timestamp, write_results
+
+logger = logging.getLogger(__name__)
+
+# name -> (downlink bits per second, round-trip seconds)
+LINKS = {
+    "2g": (40_000, 0.8),
+    "3g": (384_000, 0.3),
+    "4g": (8_000_000, 0.08),
+}
+
+
+async def measure(quality, args, media: MediaPool) -> dict:
+    wav = silent_wav_base64("x" * int(args.reply_seconds / 0.06), quality.sample_rate)
+    estimated = quality.codec != "wav" and not transcoder_available()
+    started = time.perf_counter()
+    audio, used = await encode_reply(media, wav, quality)
+    encode_seconds = time.perf_counter() - started
+    if estimated:
+        # base64 of an Ogg Opus stream at the nominal bitrate
+        audio, used, encode_seconds = "A" * int(quality.bitrate * args.reply_seconds / 8 * 4 / 3), quality, 0.0
+    payload = json.dumps({"status": "response_ready", "text": "x" * 120, "audio_base64": audio,
+                          "audio_format": used.describe()})
+    result = {
+        "codec": used.codec, "sample_rate": used.sample_rate, "bitrate": used.bitrate,
+        "payload_bytes": len(payload), "encode_seconds": round(encode_seconds, 4),
+        "playback_seconds": {
+            link: round(encode_seconds + rtt + len(payload) * 8 / bps, 3) for link, (bps, rtt) in LINKS.items()
+        },
+    }
+    if estimated:
+        result["estimated"] = True
+    return result
+
+
+async def run(args) -> dict:
+    media = MediaPool(workers=args.workers)
+    try:
+        return {quality.name: await measure(quality, args, media)
+                for ladder in LADDERS.values() for quality in ladder}
+    finally:
+        media.shutdown()
+
+
+def main(args) -> dict:
+    results = {
+        "meta": {"started_at": timestamp(), "git_revision": git_revision(), "reply_seconds": args.reply_seconds,
+                 "transcoder": transcoder_available(), "links": LINKS},
+        "qualities": asyncio.run(run(args)),
+    }
+    for name, run_result in results["qualities"].items():
+        logger.info(f"{name}: {run_result['payload_bytes']} bytes, playback on 2G after "
+                    f"{run_result['playback_seconds']['2g']} s{' (estimated)' if run_result.get('estimated') else ''}")
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Reply audio size and time to playback per quality")
+    parser.add_argument("--reply-seconds", type=float, default=8.0, help="Length of the spoken reply")
+    parser.add_argument("--workers", type=int, default=1, help="Media pool workers used for transcoding")
+    parser.add_argument("--out", help="Write JSON results to this path")
+    return parser
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    cli_args = build_parser().parse_args()
+    write_results(cli_args.out, main(cli_args))
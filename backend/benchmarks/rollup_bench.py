@@ -0,0 +1,202 @@
+"""
+Cost of the farmer dashboard rollups (agent_core/rollups.py) on a large
+synthetic order history, against ad hoc queries over the order tables.
+
+A SQLite database is created with the app's Prisma migrations and filled
+with ``--orders`` orders (about 1.5 lines each) spread over ``--days`` days,
+placed by consumers in ``--locations`` locations, for ``--products``
+products of ``--farmers`` farmers, plus open carts. The newest ``--new``
+orders are held back. Reported:
+
+* ``backfill``: building every rollup from the existing history;
+* ``incremental``: folding in the held-back orders after they are inserted;
+* ``farmer_dashboard``, ``demand`` and ``demand_location``: dashboard reads
+  from the rollups (``demand_other_window``: a window that is not ranked
+  ahead, summed from the daily rollups);
+* ``adhoc_farmer`` and ``adhoc_demand``: the same figures computed with
+  GROUP BY over ``Order``/``OrderItem`` (``--adhoc-repeat`` runs).
+
+The rollup totals are checked against the ad hoc ones (``consistent``).
+
+Example (from ``backend/``)::
+
+    python -m benchmarks.rollup_bench --orders 2000000 --out results/rollups.json
+"""
+import argparse
+import logging
+import math
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from agent_core.rollups import DAY_MS, RollupStore, today
+
+from .stats import git_revision, summarize, timestamp, write_results
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = Path(__file__).resolve().parents[2] / "prisma" / "migrations"
+CHUNK = 100_000
+
+ADHOC_FARMER = """
+SELECT COUNT(*), SUM(oi.quantity), SUM(oi.quantity * oi.price)
+FROM "OrderItem" oi JOIN "Order" o ON o.id = oi.orderId JOIN "Product" p ON p.id = oi.productId
+WHERE p.farmerId = ? AND o.status != 'CANCELLED'
+"""
+ADHOC_DEMAND = """
+SELECT oi.productId, SUM(oi.quantity) AS quantity
+FROM "OrderItem" oi JOIN "Order" o ON o.id = oi.orderId
+WHERE oi.createdAt >= ? AND o.status != 'CANCELLED'
+GROUP BY oi.productId ORDER BY quantity DESC LIMIT 20
+"""
+
+
+def create_source(path: Path):
+    conn = sqlite3.connect(path)
+    for migration in sorted(MIGRATIONS.glob("*/migration.sql")):
+        conn.executescript(migration.read_text())
+    return conn
+
+
+def order_rows(rng: random.Random, products, consumers, start: int, count: int, first_ms: int, step_ms: float):
+    """Orders ``start``..``start + count`` and their lines, oldest first."""
+    orders, lines = [], []
+    for n in range(start, start + count):
+        created = int(first_ms + n * step_ms)
+        order_id = f"o{n:010d}"
+        status = "CANCELLED" if rng.random() < 0.03 else rng.choice(("PENDING", "DELIVERED", "DELIVERED"))
+        total = 0.0
+        for j in range(rng.choice((1, 1, 1, 2, 2, 3))):
+            product_id, price = rng.choice(products)
+            quantity = rng.randint(1, 5)
+            total += quantity * price
+            lines.append((f"{order_id}-{j}", quantity, price, order_id, product_id, created, created))
+        orders.append((order_id, rng.choice(consumers), status, round(total, 2), created, created))
+    return orders, lines
+
+
+def insert_orders(conn, rng, products, consumers, start, count, first_ms, step_ms):
+    for chunk in range(start, start + count, CHUNK):
+        orders, lines = order_rows(rng, products, consumers, chunk, min(CHUNK, start + count - chunk),
+                                   first_ms, step_ms)
+        conn.executemany('INSERT INTO "Order" VALUES (?, ?, ?, ?, ?, ?)', orders)
+        conn.executemany('INSERT INTO "OrderItem" VALUES (?, ?, ?, ?, ?, ?, ?)', lines)
+        conn.commit()
+
+
+def populate(conn, rng: random.Random, args):
+    now = int(time.time() * 1000)
+    locations = [f"District {i}" for i in range(args.locations)]
+    consumers = [f"c{i}" for i in range(args.consumers)]
+    farmers = [f"f{i}" for i in range(args.farmers)]
+    products = [(f"p{i}", round(rng.uniform(10, 200), 2)) for i in range(args.products)]
+    conn.executemany('INSERT INTO "User" (id, email, name, createdAt, updatedAt, role) VALUES (?, ?, ?, ?, ?, ?)',
+                     [(user, f"{user}@example.com", user, now, now, "CONSUMER" if user[0] == "c" else "FARMER")
+                      for user in consumers + farmers])
+    conn.executemany('INSERT INTO "ConsumerProfile" VALUES (?, ?, ?, ?, ?, ?, ?)',
+                     [(f"cp{user}", user, rng.choice(locations), None, "[]", now, now) for user in consumers])
+    conn.executemany('INSERT INTO "Product" VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                     [(product_id, f"Produce {product_id}", "", price, "", "kg", rng.choice(farmers), now, now)
+                      for product_id, price in products])
+    carts = {(rng.choice(consumers), rng.choice(products)[0]) for _ in range(args.consumers // 2)}
+    conn.executemany('INSERT INTO "CartItem" VALUES (?, ?, ?, ?, ?, ?)',
+                     [(f"ci{i}", rng.randint(1, 5), user, product_id, now, now)
+                      for i, (user, product_id) in enumerate(carts)])
+    conn.commit()
+    first_ms = now - args.days * DAY_MS
+    step_ms = (now - 60_000 - first_ms) / args.orders
+    return products, consumers, farmers, first_ms, step_ms
+
+
+def timed(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return summarize(timings)
+
+
+def main(args) -> dict:
+    rng = random.Random(args.seed)
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="rollup_bench_"))
+    source_path, rollup_path = workdir / "source.db", workdir / "rollups.db"
+    for path in (source_path, rollup_path):
+        path.unlink(missing_ok=True)
+
+    started = time.perf_counter()
+    conn = create_source(source_path)
+    products, consumers, farmers, first_ms, step_ms = populate(conn, rng, args)
+    held_back = min(args.new, args.orders)
+    insert_orders(conn, rng, products, consumers, 0, args.orders - held_back, first_ms, step_ms)
+    generate_seconds = time.perf_counter() - started
+    lines = conn.execute('SELECT COUNT(*) FROM "OrderItem"').fetchone()[0]
+    logger.info(f"Generated {args.orders - held_back} orders ({lines} lines) in {generate_seconds:.1f} s")
+
+    store = RollupStore(rollup_path, source_path)
+    backfill = store.backfill(settle=0)
+    logger.info(f"Backfill: {backfill['lines']} lines in {backfill['seconds']} s")
+
+    insert_orders(conn, rng, products, consumers, args.orders - held_back, held_back, first_ms, step_ms)
+    incremental = store.refresh(settle=0)
+    logger.info(f"Incremental: {incremental['lines']} lines from {held_back} new orders in {incremental['seconds']} s")
+
+    farmer_ids = [rng.choice(farmers) for _ in range(args.repeat)]
+    since = (today() - 6) * DAY_MS
+    farmer_reads = iter(farmer_ids * 2)
+    results = {
+        "meta": {"started_at": timestamp(), "git_revision": git_revision(), "orders": args.orders,
+                 "order_lines": conn.execute('SELECT COUNT(*) FROM "OrderItem"').fetchone()[0],
+                 "products": args.products, "farmers": args.farmers, "locations": args.locations,
+                 "days": args.days, "generate_seconds": round(generate_seconds, 1),
+                 "rollup_db_bytes": rollup_path.stat().st_size, "source_db_bytes": source_path.stat().st_size},
+        "backfill": backfill,
+        "incremental": {**incremental, "new_orders": held_back},
+        "farmer_dashboard": timed(lambda: store.farmer_dashboard(next(farmer_reads)), args.repeat),
+        "demand": timed(lambda: store.demand(7), args.repeat),
+        "demand_location": timed(lambda: store.demand(7, "District 0"), args.repeat),
+        "demand_other_window": timed(lambda: store.demand(14), args.adhoc_repeat),
+        "adhoc_farmer": timed(lambda: conn.execute(ADHOC_FARMER, (rng.choice(farmers),)).fetchall(),
+                              args.adhoc_repeat),
+        "adhoc_demand": timed(lambda: conn.execute(ADHOC_DEMAND, (since,)).fetchall(), args.adhoc_repeat),
+    }
+    check = farmer_ids[:20]
+    results["consistent"] = all(
+        math.isclose(store.farmer_dashboard(farmer_id)["totals"]["revenue"],
+                     conn.execute(ADHOC_FARMER, (farmer_id,)).fetchone()[2] or 0.0, rel_tol=1e-9, abs_tol=1e-6)
+        for farmer_id in check)
+    for name in ("farmer_dashboard", "demand", "demand_location", "demand_other_window", "adhoc_farmer",
+                 "adhoc_demand"):
+        logger.info(f"{name}: p50 {results[name]['p50'] * 1000:.3f} ms")
+    logger.info(f"Rollups consistent with the order tables: {results['consistent']}")
+    conn.close()
+    if not args.workdir:
+        for path in workdir.iterdir():
+            path.unlink()
+        workdir.rmdir()
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Dashboard rollups vs ad hoc queries over a large order history")
+    parser.add_argument("--orders", type=int, default=2_000_000, help="Orders in the synthetic history")
+    parser.add_argument("--new", type=int, default=10_000, help="Newest orders inserted after the backfill")
+    parser.add_argument("--days", type=int, default=365, help="Days the orders are spread over")
+    parser.add_argument("--products", type=int, default=5_000)
+    parser.add_argument("--farmers", type=int, default=500)
+    parser.add_argument("--consumers", type=int, default=50_000)
+    parser.add_argument("--locations", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=200, help="Timed dashboard reads")
+    parser.add_argument("--adhoc-repeat", type=int, default=5, help="Timed ad hoc queries")
+    parser.add_argument("--workdir", help="Keep the generated databases here (default: a temporary directory)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write JSON results to this path")
+    return parser
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    cli_args = build_parser().parse_args()
+    write_results(cli_args.out, main(cli_args))
@@ -0,0 +1,132 @@
+"""
+Turns and wall-clock time per completed listing, with and without multi-slot
+extraction.
+
+Simulated farmers open with a rich sentence ("50 kg of organic tomatoes at
+30 rupees per kg") and then answer whatever the form asks. Every turn pays
+for STT, the slot-extraction LLM call (when one is made) and TTS of the next
+question, using the synthetic providers and their latency profiles. The same
+farmers are run for each AGENT_SLOT_EXTRACTION mode:
+
+* ``off``: one field per turn (the old behaviour);
+* ``local``: local number/unit/price parser only;
+* ``on``: parser plus one structured-output LLM call.
+
+Example (from ``backend/``)::
+
+    python -m benchmarks.slot_filling_bench --listings 200 --concurrency 50 \\
+        --latency llm=const:0.8 --latency tts=const:0.6 --out results/slots.json
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from agent_core.forms import load_forms
+from agent_core.providers import build_providers
+from agent_core.slots import afill_slots
+
+from .stats import StageRecorder, git_revision, summarize, timestamp, write_results
+from .stubs import parse_kind_specs, synthetic_wav
+
+logger = logging.getLogger(__name__)
+
+MODES = ("off", "local", "on")
+
+# (opening utterance, answers by slot role)
+FARMERS = [
+    ("I want to sell 50 kg of organic tomatoes at 30 rupees per kg",
+     {"product_name": "Tomato", "category": "Vegetables", "description": "Organic red tomatoes, harvested this week",
+      "price": "30", "quantity": "50", "unit": "kg"}),
+    ("Add my onions, 2 quintals, Rs 25/kg",
+     {"product_name": "Onion", "category": "Vegetables", "description": "Dry red onions from Nashik",
+      "price": "25", "quantity": "2", "unit": "quintal"}),
+    ("I have 300 pieces of coconut to list",
+     {"product_name": "Coconut", "category": "Fruits", "description": "Tender coconuts, full of water",
+      "price": "18", "quantity": "300", "unit": "piece"}),
+    ("I want to add a new product",
+     {"product_name": "Ragi", "category": "Millets", "description": "Finger millet, cleaned and sun dried",
+      "price": "42", "quantity": "800", "unit": "kg"}),
+]
+
+
+async def complete_listing(providers, form, opening: str, answers: dict, recorder: StageRecorder, audio: bytes) -> int:
+    data = {}
+    step = form.advance(data, mask=0, url=form.empty_url)
+    utterance, await_key = opening, None
+    turns = 0
+    started = time.perf_counter()
+    while True:
+        turns += 1
+        await providers.stt.transcribe(audio, "bench.wav", "")
+        step = await afill_slots(form, data, utterance, await_key, providers.llm, step.mask, step.url)
+        if step.done:
+            await providers.llm.ainvoke([("system", form.summary_prompt(data))])
+            await providers.tts.synthesize("All questions answered!", "en-IN", 8000)
+            break
+        await providers.tts.synthesize(step.prompt, "en-IN", 8000)
+        utterance, await_key = answers[step.field.slot], step.key
+    recorder.record("listing_seconds", time.perf_counter() - started)
+    recorder.record("turns", turns)
+    recorder.sessions += 1
+    return turns
+
+
+async def run_mode(mode: str, providers, form, listings: int, concurrency: int) -> dict:
+    os.environ["AGENT_SLOT_EXTRACTION"] = mode
+    recorder = StageRecorder()
+    limit = asyncio.Semaphore(concurrency)
+    audio = synthetic_wav(1000, seed="slot-bench")
+
+    async def farmer(index: int):
+        opening, answers = FARMERS[index % len(FARMERS)]
+        async with limit:
+            await complete_listing(providers, form, opening, answers, recorder, audio)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(farmer(i) for i in range(listings)))
+    elapsed = time.perf_counter() - started
+    return {
+        "listings": recorder.sessions,
+        "turns_per_listing": summarize(recorder.samples["turns"]),
+        "seconds_per_listing": summarize(recorder.samples["listing_seconds"]),
+        "elapsed": round(elapsed, 3),
+    }
+
+
+async def main(args) -> dict:
+    latencies = {"stt": "const:0.5", "translate": "const:0.3", "tts": "const:0.6", "llm": "const:0.8"}
+    latencies.update(parse_kind_specs(args.latency))
+    providers = build_providers(
+        defaults={kind: "synthetic" for kind in latencies}, fake_latency=latencies, seed=args.seed,
+    )
+    form = load_forms(args.profile).get("product")
+    results = {
+        "meta": {"started_at": timestamp(), "git_revision": git_revision(), "profile": args.profile,
+                 "listings": args.listings, "concurrency": args.concurrency, "latency": latencies},
+        "modes": {},
+    }
+    for mode in args.mode or MODES:
+        results["modes"][mode] = run = await run_mode(mode, providers, form, args.listings, args.concurrency)
+        logger.info(f"{mode}: {run['turns_per_listing'].get('mean')} turns, "
+                    f"{run['seconds_per_listing'].get('mean')} s per listing")
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Turns and time per listing with multi-slot extraction")
+    parser.add_argument("--profile", default="app", help="Form profile from agent_core.forms")
+    parser.add_argument("--mode", action="append", choices=MODES, help="Extraction modes to run (default: all)")
+    parser.add_argument("--listings", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", action="append", help="kind=spec for the synthetic providers, e.g. llm=const:0.8")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="Write JSON results to this path")
+    return parser
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    cli_args = build_parser().parse_args()
+    write_results(cli_args.out, asyncio.run(main(cli_args)))
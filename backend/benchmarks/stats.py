@@ -0,0 +1,168 @@
+"""Percentiles, per-stage recorders and process RSS sampling for benchmarks."""
+import asyncio
+import json
+import os
+import subprocess
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list (q in 0..100)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(q / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[rank]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """count/mean/p50/p95/p99/max for a list of samples (seconds)."""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 6),
+        "p50": round(percentile(ordered, 50), 6),
+        "p95": round(percentile(ordered, 95), 6),
+        "p99": round(percentile(ordered, 99), 6),
+        "max": round(ordered[-1], 6),
+    }
+
+
+class StageRecorder:
+    """Collects latency samples per stage plus error counts per kind."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.turns = 0
+        self.sessions = 0
+
+    def record(self, stage: str, seconds: Optional[float]):
+        if seconds is not None:
+            self.samples[stage].append(float(seconds))
+
+    def error(self, kind: str):
+        self.errors[kind] += 1
+
+    def to_dict(self, elapsed: float) -> dict:
+        attempted = self.turns + sum(self.errors.values())
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "throughput": {
+                "turns": self.turns,
+                "sessions": self.sessions,
+                "turns_per_s": round(self.turns / elapsed, 3) if elapsed else 0.0,
+                "sessions_per_s": round(self.sessions / elapsed, 3) if elapsed else 0.0,
+            },
+            "stages": {stage: summarize(values) for stage, values in sorted(self.samples.items())},
+            "errors": {
+                "total": sum(self.errors.values()),
+                "rate": round(sum(self.errors.values()) / attempted, 6) if attempted else 0.0,
+                "by_kind": dict(self.errors),
+            },
+        }
+
+
+def _read_status_rss(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        return None
+    return None
+
+
+def _child_pids(pid: int) -> List[int]:
+    children = []
+    try:
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+                if int(fields[1]) == pid:
+                    children.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                continue
+    except OSError:
+        pass
+    return children
+
+
+def process_tree_rss(pid: int) -> Dict[int, int]:
+    """RSS in bytes for ``pid`` and its direct children (uvicorn workers)."""
+    result = {}
+    for p in [pid] + _child_pids(pid):
+        rss = _read_status_rss(p)
+        if rss is not None:
+            result[p] = rss
+    return result
+
+
+class RssSampler:
+    """Periodically samples the RSS of a server process tree."""
+
+    def __init__(self, pid: int, interval: float = 1.0):
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[Dict[int, int]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            self.samples.append(process_tree_rss(self.pid))
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.samples.append(process_tree_rss(self.pid))
+
+    def to_dict(self) -> dict:
+        per_worker: Dict[int, List[int]] = defaultdict(list)
+        for sample in self.samples:
+            for pid, rss in sample.items():
+                per_worker[pid].append(rss)
+        return {
+            "pid": self.pid,
+            "samples": len(self.samples),
+            "workers": {
+                str(pid): {"max_bytes": max(values), "mean_bytes": int(sum(values) / len(values)), "last_bytes": values[-1]}
+                for pid, values in per_worker.items()
+            },
+        }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path: Optional[str], results: dict):
+    """Print results as JSON and optionally write them to ``path``."""
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if path:
+        with open(path, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+def timestamp() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
@@ -0,0 +1,230 @@
+"""
+Local stand-ins for the Sarvam and Groq HTTP APIs.
+
+A single asyncio HTTP/1.1 server answers:
+
+    POST /speech-to-text-translate        Sarvam STT (multipart upload)
+    POST /text-to-speech                  Sarvam TTS ("inputs" list)
+    POST /translate                       Sarvam translate
+    POST /openai/v1/chat/completions      Groq (OpenAI compatible) chat
+
+Each route sleeps for a delay drawn from its ``LatencyModel`` and can fail a
+configurable fraction of requests with a 503, so the backends can be driven
+under load without touching the real providers. Point the backends at it
+with ``SARVAM_API_BASE_URL`` and ``GROQ_API_BASE``.
+
+Standalone:  python -m benchmarks.stubs --port 9100 --latency tts=lognormal:0.6,0.4
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import logging
+import random
+import re
+import struct
+import time
+import wave
+from typing import Dict, Optional, Tuple
+
+from agent_core.latency import LatencyModel
+from agent_core.bulk import synthetic_bulk
+from agent_core.slots import synthetic_extraction
+
+logger = logging.getLogger(__name__)
+
+ROUTE_KINDS = {
+    "/speech-to-text-translate": "stt",
+    "/text-to-speech": "tts",
+    "/translate": "translate",
+    "/openai/v1/chat/completions": "llm",
+}
+
+DEFAULT_LATENCIES = {
+    "stt": "lognormal:0.5,0.3",
+    "tts": "lognormal:0.6,0.3",
+    "translate": "lognormal:0.3,0.3",
+    "llm": "lognormal:0.4,0.4",
+}
+
+
+def synthetic_wav(duration_ms: int, sample_rate: int = 16000, seed: str = "") -> bytes:
+    """Low-level noise WAV whose bytes are stable for a given seed."""
+    rng = random.Random(seed)
+    n_samples = int(sample_rate * duration_ms / 1000)
+    frames = struct.pack(f"<{n_samples}h", *(rng.randint(-300, 300) for _ in range(n_samples)))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(frames)
+    return buffer.getvalue()
+
+
+def _silent_wav_base64(seconds: float, sample_rate: int) -> str:
+    n_samples = max(1, int(sample_rate * seconds))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(b"\x00\x00" * n_samples)
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def _multipart_file(body: bytes, content_type: str) -> bytes:
+    match = re.search(r'boundary="?([^";]+)"?', content_type)
+    if not match:
+        return b""
+    boundary = b"--" + match.group(1).encode()
+    for part in body.split(boundary):
+        head, sep, payload = part.partition(b"\r\n\r\n")
+        if sep and b'name="file"' in head:
+            return payload[:-2] if payload.endswith(b"\r\n") else payload
+    return b""
+
+
+class StubServer:
+    """Fake Sarvam + Groq endpoints with per-route latency and error injection."""
+
+    def __init__(self, latencies: Optional[Dict[str, str]] = None, error_rates: Optional[Dict[str, float]] = None, seed: int = 0):
+        specs = dict(DEFAULT_LATENCIES)
+        specs.update(latencies or {})
+        self.latencies = {kind: LatencyModel.parse(spec) for kind, spec in specs.items()}
+        self.error_rates = error_rates or {}
+        self.rng = random.Random(seed)
+        self.transcripts: Dict[str, Tuple[str, str]] = {}
+        self.requests: Dict[str, int] = {kind: 0 for kind in ROUTE_KINDS.values()}
+        self._server: Optional[asyncio.base_events.Server] = None
+        self.base_url = ""
+
+    def register_audio(self, audio: bytes, transcript: str, language_code: str = "en-IN"):
+        """Make the STT stub return ``transcript`` for this exact audio payload."""
+        self.transcripts[hashlib.sha256(audio).hexdigest()] = (transcript, language_code)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        bound_port = self._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{bound_port}"
+        logger.info(f"Stub server listening on {self.base_url}")
+        return self.base_url
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    # --- HTTP plumbing ---
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0") or 0))
+                status, payload = await self._dispatch(method, path.split("?", 1)[0], headers, body)
+                raw = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(raw)}\r\n\r\n".encode() + raw
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method: str, path: str, headers: dict, body: bytes) -> Tuple[int, dict]:
+        kind = ROUTE_KINDS.get(path)
+        if method != "POST" or kind is None:
+            return 404, {"error": f"No stub for {method} {path}"}
+        self.requests[kind] += 1
+        await asyncio.sleep(self.latencies[kind].sample(self.rng))
+        if self.rng.random() < self.error_rates.get(kind, 0.0):
+            return 503, {"error": f"injected {kind} failure"}
+        if kind == "stt":
+            return 200, self._stt(_multipart_file(body, headers.get("content-type", "")))
+        request = json.loads(body or b"{}")
+        return 200, getattr(self, f"_{kind}")(request)
+
+    # --- Route handlers ---
+    def _stt(self, audio: bytes) -> dict:
+        transcript, language_code = self.transcripts.get(
+            hashlib.sha256(audio).hexdigest(), ("I want to add a new product", "en-IN")
+        )
+        return {"transcript": transcript, "language_code": language_code}
+
+    def _tts(self, request: dict) -> dict:
+        sample_rate = int(request.get("speech_sample_rate", 8000))
+        # Roughly 60 ms of speech per character keeps payload sizes realistic
+        return {"audios": [_silent_wav_base64(0.06 * len(text), sample_rate) for text in request.get("inputs", [])]}
+
+    def _translate(self, request: dict) -> dict:
+        return {"translated_text": f"[{request.get('target_language_code')}] {request.get('input', '')}"}
+
+    def _llm(self, request: dict) -> dict:
+        messages = request.get("messages", [])
+        system = " ".join(m.get("content", "") for m in messages if m.get("role") == "system")
+        user = " ".join(m.get("content", "") for m in messages if m.get("role") == "user").lower()
+        pairs = [(m.get("role"), m.get("content", "")) for m in messages]
+        extracted = synthetic_extraction(pairs) or synthetic_bulk(pairs)
+        if "intent classifier" in system:
+            content = "post" if re.search(r"\b(post|advertis|caption)", user) else "product"
+        elif extracted is not None:
+            content = extracted
+        else:
+            content = "Fresh, farm-picked produce grown without shortcuts. Order today for doorstep delivery."
+        return {
+            "id": f"stub-{self.requests['llm']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+
+def parse_kind_specs(items) -> Dict[str, str]:
+    """Turn ``["tts=const:0.2", ...]`` into ``{"tts": "const:0.2"}``."""
+    result = {}
+    for item in items or []:
+        kind, _, spec = item.partition("=")
+        if kind not in DEFAULT_LATENCIES:
+            raise ValueError(f"Unknown stub kind '{kind}', expected one of {sorted(DEFAULT_LATENCIES)}")
+        result[kind] = spec
+    return result
+
+
+async def _serve_forever(args):
+    stub = StubServer(
+        parse_kind_specs(args.latency),
+        {kind: float(rate) for kind, rate in parse_kind_specs(args.error_rate).items()},
+        seed=args.seed,
+    )
+    await stub.start(args.host, args.port)
+    print(f"SARVAM_API_BASE_URL={stub.base_url} GROQ_API_BASE={stub.base_url}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Sarvam/Groq stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", action="append", help="kind=spec, e.g. tts=pareto:0.2,1.5")
+    parser.add_argument("--error-rate", action="append", help="kind=fraction, e.g. stt=0.01")
+    parser.add_argument("--seed", type=int, default=0)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_serve_forever(parser.parse_args()))
@@ -0,0 +1,106 @@
+"""
+TTS throughput and latency with and without cross-session micro-batching
+(agent_core/batching.py) against a rate-limited local fake.
+
+``--sessions`` sessions each synthesize ``--calls`` replies back to back,
+spread over ``--languages``. The fake TTS (``SyntheticTTS``) takes
+``--latency`` per request and admits ``--max-rps`` requests per second, a
+whole batch counting as one request, the way a per-request provider quota
+does. Every run reports replies per second, provider requests sent and the
+per-reply latency; batched runs also report the mean batch size.
+
+Example (from ``backend/``)::
+
+    python -m benchmarks.tts_batch_bench --sessions 64 --max-rps 20 --sizes 1,4,8,16 --out results/tts_batch.json
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from agent_core.batching import BatchingTTS
+from agent_core.fakes import FaultProfile, SyntheticTTS
+
+from .stats import git_revision, summarize, timestamp, write_results
+
+logger = logging.getLogger(__name__)
+
+
+class CountingTTS(SyntheticTTS):
+    """The synthetic TTS, counting the requests that reach it."""
+
+    def __init__(self, profile: FaultProfile, seed: int = 0):
+        super().__init__(profile, seed)
+        self.requests = 0
+        self.texts = 0
+
+    async def synthesize(self, text, language_code="en-IN", sample_rate=8000):
+        self.requests += 1
+        self.texts += 1
+        return await super().synthesize(text, language_code, sample_rate)
+
+    async def synthesize_batch(self, texts, language_code="en-IN", sample_rate=8000):
+        self.requests += 1
+        self.texts += len(texts)
+        return await super().synthesize_batch(texts, language_code, sample_rate)
+
+
+async def run(size: int, args) -> dict:
+    fake = CountingTTS(FaultProfile(latency=args.latency, max_rps=args.max_rps), seed=args.seed)
+    provider = BatchingTTS(fake, max_size=size, max_wait=args.max_wait) if size else fake
+    languages = args.languages.split(",")
+    latencies = []
+
+    async def session(index: int):
+        language = languages[index % len(languages)]
+        for call in range(args.calls):
+            started = time.perf_counter()
+            await provider.synthesize(f"Question {call} for session {index}", language, 8000)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(session(i) for i in range(args.sessions)))
+    elapsed = time.perf_counter() - started
+    return {
+        "replies": fake.texts,
+        "replies_per_second": round(fake.texts / elapsed, 2),
+        "provider_requests": fake.requests,
+        "mean_batch_size": round(fake.texts / max(1, fake.requests), 2),
+        "latency": summarize(latencies),
+    }
+
+
+def main(args) -> dict:
+    sizes = [int(s) for s in args.sizes.split(",")]
+    results = {
+        "meta": {"started_at": timestamp(), "git_revision": git_revision(), "sessions": args.sessions,
+                 "calls": args.calls, "languages": args.languages, "latency": args.latency,
+                 "max_rps": args.max_rps, "max_wait": args.max_wait},
+        "runs": {},
+    }
+    for size in [0] + sizes:
+        label = f"batched-{size}" if size else "unbatched"
+        results["runs"][label] = result = asyncio.run(run(size, args))
+        logger.info(f"{label}: {result['replies_per_second']} replies/s over {result['provider_requests']} "
+                    f"requests, p50 {result['latency'].get('p50')} s, p99 {result['latency'].get('p99')} s")
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="TTS throughput with and without micro-batching")
+    parser.add_argument("--sessions", type=int, default=64, help="Concurrent sessions")
+    parser.add_argument("--calls", type=int, default=5, help="Replies synthesized per session")
+    parser.add_argument("--languages", default="hi-IN,kn-IN,en-IN", help="Languages the sessions are spread over")
+    parser.add_argument("--latency", default="lognormal:0.6,0.3", help="Fake TTS latency per request")
+    parser.add_argument("--max-rps", type=float, default=20.0, help="Requests per second the fake admits")
+    parser.add_argument("--sizes", default="4,8,16", help="Comma-separated max batch sizes to compare")
+    parser.add_argument("--max-wait", type=float, default=0.02, help="Seconds a call may wait for a batch")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write JSON results to this path")
+    return parser
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    cli_args = build_parser().parse_args()
+    write_results(cli_args.out, main(cli_args))
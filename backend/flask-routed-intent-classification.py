@@ -1,16 +1,27 @@
-import urllib.parse
 from typing import TypedDict, Annotated, List, Optional, Dict
 from uuid import uuid4 # To generate session IDs for example
+import logging
 import os
 
 # Flask imports
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 
 # Langchain/LangGraph core components (even if not compiling the full graph)
 from langgraph.graph.message import add_messages # We'll use this helper
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, BaseMessage
 from langchain_groq import ChatGroq
 
+from agent_core.forms import load_forms
+from agent_core.idempotency import HEADER, REPLAYED_HEADER, IdempotencyConflict, ResponseCache, fingerprint
+from agent_core.limiter import ProviderBusy
+from agent_core.logs import configure_logging, start_turn_log
+from agent_core.metrics import REGISTRY
+from agent_core.providers import build_llm
+from agent_core.slots import fill_slots
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
 # --- Environment Variable for API Key (Recommended) ---
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "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") # Replace if needed
 if not GROQ_API_KEY:
@@ -28,27 +39,25 @@ class AgentState(TypedDict, total=False):
     summary: str
     url: str
     base_url: str
+    form_mask: int
 
 # ─────────────────────────────────────────
 # 2. Groq Client (remains the same)
 # ─────────────────────────────────────────
-llm = ChatGroq(
+llm = build_llm(lambda: ChatGroq(
     model="llama-3.3-70b-versatile",
     api_key=GROQ_API_KEY,
     temperature=0
-)
+))
 
 # ─────────────────────────────────────────
 # 3. Intent Classification Logic (Separated for direct use)
 # ─────────────────────────────────────────
-PRODUCT_BASE_URL = "https://example.com/post-product"
-POST_BASE_URL = "https://example.com/post-existing-product"
-
 def determine_intent_and_base_url(user_message_content: str) -> tuple[str, str]:
     """
     Classifies intent and returns the intent string and base URL.
     """
-    print("--> Classifying intent...")
+    logger.debug("Classifying intent...")
     prompt = """
 You are an intent classifier for an agricultural marketplace app.
 Analyze the user message and classify it as exactly ONE of these intents: "product" or "post".
@@ -59,82 +68,47 @@ Return ONLY the word "product" or "post".
             SystemMessage(content=prompt),
             HumanMessage(content=user_message_content)
         ])
-        intent = response.content.strip().lower().split()[0] if response.content else ""
+        intent, recognized = forms.parse_intent(response.content)
+        if not recognized:
+            logger.warning("Intent '%s' not recognized (from msg: '%s...'), defaulting to 'product'",
+                           response.content, user_message_content[:50])
+    except ProviderBusy:
+        raise
     except Exception as e:
-        print(f"Error invoking LLM for intent classification: {e}")
+        logger.error("Error invoking LLM for intent classification: %s", e)
         intent = "product" # Default on LLM error
 
-    if intent not in ("product", "post"):
-        print(f"Warning: Intent '{intent}' not recognized (from msg: '{user_message_content[:50]}...'), defaulting to 'product'")
-        intent = "product"
-
-    base_url = PRODUCT_BASE_URL if intent == "product" else POST_BASE_URL
-    print(f"--> Intent classified as: {intent}, Base URL: {base_url}")
+    base_url = forms.get(intent).base_url
+    logger.debug("Intent classified as: %s, Base URL: %s", intent, base_url)
     return intent, base_url
 
 # ─────────────────────────────────────────
-# 4. Question lists (remains the same)
+# 4. Question lists (compiled once from agent_core/forms.py)
 # ─────────────────────────────────────────
-product_fields = [
-    ("ProductName",              "What is the product name?"),
-    ("Category",                 "Which category does it belong to?"),
-    ("Description_about_the_crop","Briefly describe the crop."),
-    ("Price_per_kg",             "Price per kg (numbers only)."),
-    ("Total_quantity_produced",  "Total quantity produced (numbers only).")
-]
-post_fields = [
-    ("ExistingProduct",  "Which existing product do you want to post?"),
-    ("Caption",          "What caption would you like to use?"),
-    ("AdditionalMessage","Any additional message? (or 'none')")
-]
+forms = load_forms("example")
+PRODUCT_BASE_URL = forms.get("product").base_url
+POST_BASE_URL = forms.get("post").base_url
+product_fields = forms.get("product").pairs
+post_fields = forms.get("post").pairs
 
 # ─────────────────────────────────────────
 # 5. Helper: summarizer LLM call (remains the same)
 # ─────────────────────────────────────────
 def summarize(intent: str, data: dict) -> str:
-    print(f"--> Generating summary for intent '{intent}'...")
+    logger.debug("Generating summary for intent '%s'...", intent)
     try:
-        if intent == "product":
-            prompt = (
-                "You are a marketplace assistant. Using the details below, "
-                "write a short, compelling product listing (max 60 words).\n"
-                f"Details: {data}"
-            )
-        else: # 'post' intent
-            prompt = (
-                "You are a social‑media assistant. Combine the details below "
-                "into a catchy post caption (max 40 words).\n"
-                f"Details: {data}"
-            )
+        prompt = forms.get(intent).summary_prompt(data)
         summary = llm.invoke(prompt).content.strip()
-        print(f"--> Summary generated.")
+        logger.debug("Summary generated.")
         return summary
+    except ProviderBusy:
+        raise
     except Exception as e:
-        print(f"Error invoking LLM for summary: {e}")
+        logger.error("Error invoking LLM for summary: %s", e)
         return "[Error generating summary]"
 
 # ─────────────────────────────────────────
-# 6. Helper: URL Generator (remains the same)
-# ─────────────────────────────────────────
-def generate_url(base_url: str, data: dict) -> str:
-    """Generates a URL with query parameters from a dictionary."""
-    if not base_url: return ""
-    url_prefix = base_url
-    if data and not url_prefix.endswith('?'):
-        url_prefix += '?'
-    elif not data and not url_prefix.endswith('?'):
-         url_prefix += '?'
-
-    params = "&".join(
-        f"{urllib.parse.quote_plus(k.replace('_','-'))}="
-        f"{urllib.parse.quote_plus(str(v))}" for k, v in data.items() if v
-    )
-    # Ensure trailing '?' if no params generated but base_url didn't have one
-    return url_prefix + params if params else (url_prefix if url_prefix.endswith('?') else url_prefix + '?')
-
-
-# ─────────────────────────────────────────
-# 7. Core Form Logic (Slightly adapted for direct use)
+# 6. Core Form Logic (Slightly adapted for direct use)
 # ─────────────────────────────────────────
 def run_form_step(state: AgentState) -> AgentState:
     """
@@ -144,52 +118,42 @@ def run_form_step(state: AgentState) -> AgentState:
     """
     intent = state.get("intent")
     if not intent:
-        print("Error: Intent missing in run_form_step state.")
+        logger.error("Intent missing in run_form_step state.")
         state["messages"] = add_messages(state.get("messages", []), [AIMessage(content="Internal error: Could not determine task type.")])
         state["done"] = True # Mark as done to prevent further processing
         return state
 
-    fields = product_fields if intent == "product" else post_fields
-    base_url = state.get("base_url", "")
+    form = forms.get(intent)
     data = state.get("product_data", {})
     new_messages = [] # Messages to add in this step
 
-    print(f"--> Running form step for intent: {intent}")
+    logger.debug("Running form step for intent: %s", intent)
 
     # --- Save previous answer if applicable ---
     key_to_save = state.get("await_key")
-    # Check if the *last* message is human and await_key was set *before* this call
-    if key_to_save and state.get("messages") and isinstance(state["messages"][-1], HumanMessage):
-        last_user_message = state["messages"][-1].content.strip()
-        print(f"--> Saving answer for '{key_to_save}': '{last_user_message}'")
-        data[key_to_save] = last_user_message
-    # We will determine the *next* await_key below
-    current_await_key = None
+    utterance = None
+    # The *last* human message answers await_key and may fill other fields too
+    if state.get("messages") and isinstance(state["messages"][-1], HumanMessage):
+        utterance = state["messages"][-1].content
+        logger.debug("Extracting answers (awaiting '%s') from: '%s'", key_to_save, utterance.strip())
 
     # --- Determine next step: Ask next question OR finalize ---
-    next_key_to_ask = None
-    question_to_ask = None
-    for key, q in fields:
-        if key not in data: # Find the first key *not* present in data
-            next_key_to_ask = key
-            question_to_ask = q
-            break
-
-    current_url = generate_url(base_url, data) # URL reflecting current data
-
-    if next_key_to_ask and question_to_ask:
-        print(f"--> Asking next question for key: '{next_key_to_ask}'")
+    step = fill_slots(form, data, utterance, key_to_save, llm, state.get("form_mask"), state.get("url"))
+    current_url = step.url # URL reflecting current data
+
+    if not step.done:
+        logger.debug("Asking next question for key: '%s'", step.key)
         msg_content = (
-            f"{question_to_ask}\n(please type your answer)\n\n"
+            f"{step.prompt}\n(please type your answer)\n\n"
             f"Current progress URL: {current_url}"
         )
         new_messages.append(AIMessage(content=msg_content))
-        current_await_key = next_key_to_ask # Set key we are waiting for
+        current_await_key = step.key # Set key we are waiting for
         is_done = False
         summary_text = state.get("summary") # Preserve summary if it existed
     else:
         # --- All questions answered → Finalize ---
-        print("--> All questions answered. Finalizing.")
+        logger.debug("All questions answered. Finalizing.")
         summary_text = summarize(intent, data)
         msg_content = (f"All questions answered! Here is a concise summary:\n\n{summary_text}\n\n"
                        f"Final submission link:\n{current_url}")
@@ -199,6 +163,7 @@ def run_form_step(state: AgentState) -> AgentState:
 
     # Update state dictionary directly
     state["product_data"] = data
+    state["form_mask"] = step.mask
     state["await_key"] = current_await_key
     state["done"] = is_done
     state["url"] = current_url
@@ -209,46 +174,57 @@ def run_form_step(state: AgentState) -> AgentState:
     return state
 
 # ─────────────────────────────────────────
-# 8. Flask Application Setup
+# 7. Flask Application Setup
 # ─────────────────────────────────────────
 
 app = Flask(__name__)
 
 # In-memory storage for conversation states. Replace with Redis/DB for production.
 conversation_states: Dict[str, AgentState] = {}
+# Replies to keyed /submit_answer requests, so client retries are answered once (AGENT_IDEMPOTENCY_*)
+responses = ResponseCache.from_env()
 
 @app.route('/start_form/<session_id>', methods=['POST'])
 def start_form(session_id):
     """
     Starts a new form process based on the user's initial message.
-    Determines intent, asks the first question.
+    Determines intent, asks the first question. With a "page" (the page the
+    assistant was opened on, e.g. "/farmer/add/post") that belongs to one
+    form, that form is started directly and "message" is optional.
     """
-    print(f"\n--- Request received: /start_form/{session_id} ---")
+    start_turn_log(session_id)
+    logger.info("Request received: /start_form/%s", session_id)
     if not request.is_json:
         return jsonify({"error": "Request must be JSON"}), 400
     data = request.get_json()
     user_message = data.get('message')
-    if not user_message:
+    page_intent = forms.intent_for_page(data.get('page'))
+    if not user_message and page_intent is None:
         return jsonify({"error": "Missing 'message' in request body"}), 400
 
-    print(f"User's initial message: {user_message}")
+    logger.info("User's initial message: %s", user_message)
 
-    # 1. Determine Intent and Base URL
-    intent, base_url = determine_intent_and_base_url(user_message)
+    # 1. Determine Intent and Base URL (the page already tells us, no LLM call)
+    if page_intent is not None:
+        intent, base_url = page_intent, forms.get(page_intent).base_url
+        logger.debug("Intent from page '%s': %s", data.get('page'), intent)
+    else:
+        intent, base_url = determine_intent_and_base_url(user_message)
 
     # 2. Initialize State
-    initial_human_message = HumanMessage(content=user_message)
+    initial_messages = [HumanMessage(content=user_message)] if user_message else []
     # Add an initial AI message confirming intent (optional but good UX)
     initial_ai_message = AIMessage(content=f"Okay, starting the '{intent}' process.")
     current_state = AgentState(
-        messages=[initial_human_message, initial_ai_message], # Start history
+        messages=initial_messages + [initial_ai_message], # Start history
         intent=intent,
         base_url=base_url,
         product_data={},
+        form_mask=0,
         await_key=None, # Will be set by run_form_step
         done=False,
         summary=None,
-        url=generate_url(base_url, {}) # Initial URL is just base + '?'
+        url=forms.get(intent).empty_url # Initial URL is just base + '?'
     )
 
     # 3. Run the first step of the form logic to get the first question
@@ -257,7 +233,7 @@ def start_form(session_id):
 
     # 4. Store the state
     conversation_states[session_id] = updated_state
-    print(f"State stored for session {session_id}. Awaiting key: {updated_state.get('await_key')}")
+    logger.info("State stored for session %s. Awaiting key: %s", session_id, updated_state.get('await_key'))
 
 
     # 5. Return the first question and current URL
@@ -267,6 +243,7 @@ def start_form(session_id):
 
     return jsonify({
         "session_id": session_id,
+        "intent": intent,
         "ai_message": last_ai_message, # Should be the first question
         "current_url": updated_state.get("url"),
         "is_done": updated_state.get("done", False)
@@ -278,7 +255,8 @@ def submit_answer(session_id):
     Submits an answer to the currently awaited question.
     Saves the answer, asks the next question, or finalizes.
     """
-    print(f"\n--- Request received: /submit_answer/{session_id} ---")
+    start_turn_log(session_id)
+    logger.info("Request received: /submit_answer/%s", session_id)
     if session_id not in conversation_states:
         return jsonify({"error": "Session not found. Use /start_form first."}), 404
 
@@ -289,24 +267,42 @@ def submit_answer(session_id):
     if user_answer is None: # Allow empty strings, but key must exist
         return jsonify({"error": "Missing 'answer' in request body"}), 400
 
-    print(f"User's answer: {user_answer}")
+    logger.info("User's answer: %s", user_answer)
 
+    # A retried request (same Idempotency-Key) gets the original reply instead of saving the answer again
+    idempotency_key = request.headers.get(HEADER)
+    if not idempotency_key:
+        return jsonify(answer_turn(session_id, user_answer))
+    try:
+        reply, replayed = responses.run(session_id, idempotency_key, fingerprint(user_answer),
+                                        lambda: answer_turn(session_id, user_answer))
+    except IdempotencyConflict as e:
+        return jsonify({"error": str(e)}), 422
+    response = jsonify(reply)
+    if replayed:
+        logger.info("Replaying reply for key %s", idempotency_key)
+        response.headers[REPLAYED_HEADER] = "true"
+    return response
+
+
+def answer_turn(session_id: str, user_answer: str) -> dict:
+    """Saves the answer and returns the next question or summary (the /submit_answer reply)."""
     # 1. Retrieve current state
     current_state = conversation_states[session_id]
 
     # 2. Check if already done
     if current_state.get("done"):
-        print("Process already marked as done.")
+        logger.info("Process already marked as done.")
         # Return last known state info
         last_ai_message = ""
         if current_state.get("messages") and isinstance(current_state["messages"][-1], AIMessage):
             last_ai_message = current_state["messages"][-1].content
-        return jsonify({
+        return {
             "session_id": session_id,
             "ai_message": f"(Process already complete) {last_ai_message}",
             "current_url": current_state.get("url"),
             "is_done": True
-        })
+        }
 
     # 3. Add user's answer to message history
     current_state["messages"] = add_messages(current_state.get("messages", []), [HumanMessage(content=user_answer)])
@@ -318,19 +314,20 @@ def submit_answer(session_id):
 
     # 5. Store updated state
     conversation_states[session_id] = updated_state
-    print(f"State updated for session {session_id}. Awaiting key: {updated_state.get('await_key')}, Done: {updated_state.get('done')}")
+    logger.info("State updated for session %s. Awaiting key: %s, Done: %s",
+                session_id, updated_state.get('await_key'), updated_state.get('done'))
 
     # 6. Return the next question/summary and URL
     last_ai_message = ""
     if updated_state.get("messages") and isinstance(updated_state["messages"][-1], AIMessage):
         last_ai_message = updated_state["messages"][-1].content
 
-    return jsonify({
+    return {
         "session_id": session_id,
         "ai_message": last_ai_message, # Next question or final summary
         "current_url": updated_state.get("url"),
         "is_done": updated_state.get("done", False)
-    })
+    }
 
 
 @app.route('/clear_state/<session_id>', methods=['GET'])
@@ -338,7 +335,8 @@ def clear_session_state(session_id):
     """Utility endpoint to clear the state for a specific session."""
     if session_id in conversation_states:
         del conversation_states[session_id]
-        print(f"Cleared state for session: {session_id}")
+        responses.discard(session_id)
+        logger.info("Cleared state for session: %s", session_id)
         return jsonify({"message": f"State cleared for session {session_id}"}), 200
     else:
         return jsonify({"error": "Session not found"}), 404
@@ -355,8 +353,23 @@ def get_session_state(session_id):
     else:
         return jsonify({"error": "Session not found"}), 404
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Provider limiter state and latency metrics (JSON or ?format=prometheus)."""
+    if request.args.get("format") == "prometheus":
+        return Response(REGISTRY.render_prometheus(), mimetype="text/plain")
+    return jsonify(REGISTRY.snapshot()), 200
+
+@app.errorhandler(ProviderBusy)
+def provider_busy(e):
+    """Load shedding: tell the client to retry instead of queueing the request."""
+    retry_after = max(1, round(e.retry_after))
+    response = jsonify({"status": "busy", "error": "Service is busy, please retry.", "retry_after": retry_after})
+    response.headers["Retry-After"] = str(retry_after)
+    return response, 503
+
 # ─────────────────────────────────────────
-# 9. Run Flask App
+# 8. Run Flask App
 # ─────────────────────────────────────────
 if __name__ == "__main__":
     print("Starting Flask server...")
@@ -366,6 +379,8 @@ if __name__ == "__main__":
     print("\n1. Start 'product' flow with initial request:")
     print(f'curl -X POST "http://127.0.0.1:5000/start_form/{example_session_id}" -H "Content-Type: application/json" -d \'{{"message": "I want to add my corn harvest"}}\'')
     print("\n   -> Server should respond with the first question (Product Name).")
+    print("\n   Opened from the add-product page, skip the intent classification:")
+    print(f'curl -X POST "http://127.0.0.1:5000/start_form/{example_session_id}" -H "Content-Type: application/json" -d \'{{"page": "/farmer/add/product"}}\'')
     print("\n2. Submit the answer for the first question:")
     print(f'curl -X POST "http://127.0.0.1:5000/submit_answer/{example_session_id}" -H "Content-Type: application/json" -d \'{{"answer": "Sweet Corn"}}\'')
     print("\n   -> Server should respond with the second question (Category).")
@@ -1,14 +1,12 @@
 import fastapi
-from fastapi import APIRouter, FastAPI, HTTPException, Body # Import Body for request body modeling
+from fastapi import APIRouter, FastAPI, HTTPException, Body, Header, Query, Response # Import Body for request body modeling
+from fastapi.responses import JSONResponse, PlainTextResponse
 import logging
 import asyncio
-import base64
 import binascii # For Base64 error handling
-import json
 import time
 import uuid
 import os
-import urllib.parse
 from typing import Dict, Optional, TypedDict, Annotated, List
 
 # Langchain/LangGraph related imports
@@ -17,7 +15,22 @@ from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, Base
 from langchain_groq import ChatGroq
 from pydantic import BaseModel, Field # For request/response models
 
-logging.basicConfig(level=logging.INFO)
+from agent_core.deadline import start_turn
+from agent_core.forms import FormStep, load_forms
+from agent_core.idempotency import REPLAYED_HEADER, IdempotencyConflict, ResponseCache, fingerprint
+from agent_core.langid import identify
+from agent_core.limiter import ProviderBusy, spare_capacity
+from agent_core.logs import configure_logging, start_turn_log
+from agent_core.media import MediaPool
+from agent_core.metrics import REGISTRY
+from agent_core.prefetch import OpeningCache, Prefetcher, likely_steps
+from agent_core.profiling import admin_router
+from agent_core.products import PRODUCT_SLOT, ProductCatalog, resolve_product_answer
+from agent_core.providers import ProviderError, build_providers
+from agent_core.rollups import RollupStore
+from agent_core.slots import afill_slots
+
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # --- Environment Variables ---
@@ -38,7 +51,10 @@ class AgentState(TypedDict, total=False):
     summary: str
     url: str
     base_url: str
+    form_mask: int
     detected_language_code: Optional[str]
+    farmer_id: Optional[str]
+    product_offer: Optional[str]  # product id offered as "Did you mean X?", for a yes/no answer
 
 # --- Global State Management (Keyed by Session ID) ---
 conversation_states: Dict[str, AgentState] = {}
@@ -51,40 +67,36 @@ llm = ChatGroq(
     temperature=0
 )
 
+# --- External Providers (LLM / STT / translation / TTS) ---
+# Speech kinds default to the synthetic backend with the old placeholder delays.
+# AGENT_PROVIDERS=live (plus SARVAM_API_KEY) switches them to Sarvam; see agent_core/providers.py.
+providers = build_providers(
+    live_llm=llm,
+    defaults={"stt": "synthetic", "translate": "synthetic", "tts": "synthetic"},
+    fake_latency={"stt": "const:0.5", "translate": "const:0.3", "tts": "const:0.6"},
+)
+
+# Base64 decoding of uploads runs in worker processes (AGENT_MEDIA_*, see agent_core/media.py)
+media = MediaPool.from_env()
+
+# Retried turns (same Idempotency-Key) are answered once (AGENT_IDEMPOTENCY_*, see agent_core/idempotency.py)
+responses = ResponseCache.from_env()
+
+# Per-farmer product name index for the post flow (AGENT_PRODUCT_INDEX_*, see agent_core/products.py)
+products = ProductCatalog.from_env()
+
+# Farmer dashboard figures, kept up to date by `python -m agent_core.rollups --watch` (AGENT_ROLLUP_DB)
+rollups = RollupStore()
+
 # --- Agent Configuration & Helpers ---
-# (Remain the same)
-PRODUCT_BASE_URL = "https://example.com/post-product"
-POST_BASE_URL = "https://example.com/post-existing-product"
-
-product_fields = [
-    ("ProductName",              "What is the product name?"),
-    ("Category",                 "Which category does it belong to?"),
-    ("Description_about_the_crop","Briefly describe the crop."),
-    ("Price_per_kg",             "Price per kg (numbers only)."),
-    ("Total_quantity_produced",  "Total quantity produced (numbers only).")
-]
-post_fields = [
-    ("ExistingProduct",  "Which existing product do you want to post?"),
-    ("Caption",          "What caption would you like to use?"),
-    ("AdditionalMessage","Any additional message? (or 'none')")
-]
-
-def generate_url(base_url: str, data: dict) -> str:
-    # (Remains the same)
-    if not base_url: return ""
-    url_prefix = base_url
-    if data and not url_prefix.endswith('?'):
-        url_prefix += '?'
-    elif not data and not url_prefix.endswith('?'):
-         url_prefix += '?'
-    params = "&".join(
-        f"{urllib.parse.quote_plus(k.replace('_','-'))}="
-        f"{urllib.parse.quote_plus(str(v))}" for k, v in data.items() if v
-    )
-    return url_prefix + params if params else (url_prefix if url_prefix.endswith('?') else url_prefix + '?')
+# Questionnaires, base URLs and summary prompts live in agent_core/forms.py
+forms = load_forms("example")
+PRODUCT_BASE_URL = forms.get("product").base_url
+POST_BASE_URL = forms.get("post").base_url
+product_fields = forms.get("product").pairs
+post_fields = forms.get("post").pairs
 
 # --- Core Agent Logic (Async) ---
-# (determine_intent_and_base_url, summarize, run_form_step remain the same async functions)
 async def determine_intent_and_base_url(user_message_content: str) -> tuple[str, str]:
     logger.info("--> Classifying intent...")
     prompt = """
@@ -93,42 +105,39 @@ Analyze the user message and classify it as exactly ONE of these intents: "produ
 Return ONLY the word "product" or "post".
 """
     try:
-        response = await llm.ainvoke([
+        response = await providers.llm.ainvoke([
             SystemMessage(content=prompt),
             HumanMessage(content=user_message_content)
         ])
-        intent = response.content.strip().lower().split()[0] if response.content else ""
+        intent, recognized = forms.parse_intent(response.content)
+        if not recognized:
+            logger.warning("Intent '%s' not recognized, defaulting to 'product'", response.content)
+    except ProviderBusy:
+        raise
     except Exception as e:
-        logger.error(f"Error invoking LLM for intent classification: {e}", exc_info=True)
-        intent = "product"
-    if intent not in ("product", "post"):
-        logger.warning(f"Intent '{intent}' not recognized, defaulting to 'product'")
+        logger.error("Error invoking LLM for intent classification: %s", e, exc_info=True)
         intent = "product"
-    base_url = PRODUCT_BASE_URL if intent == "product" else POST_BASE_URL
-    logger.info(f"--> Intent classified as: {intent}, Base URL: {base_url}")
+    base_url = forms.get(intent).base_url
+    logger.info("--> Intent classified as: %s, Base URL: %s", intent, base_url)
     return intent, base_url
 
 async def summarize(intent: str, data: dict) -> str:
-    logger.info(f"--> Generating summary for intent '{intent}'...")
+    logger.info("--> Generating summary for intent '%s'...", intent)
     try:
-        if intent == "product":
-            prompt_content = (
-                "You are a marketplace assistant. Using the details below, write a short, compelling product listing (max 60 words).\n"
-                f"Details: {json.dumps(data)}"
-            )
-        else:
-            prompt_content = (
-                "You are a social‑media assistant. Combine the details below into a catchy post caption (max 40 words).\n"
-                f"Details: {json.dumps(data)}"
-            )
-        response = await llm.ainvoke([SystemMessage(content=prompt_content)])
+        prompt_content = forms.get(intent).summary_prompt(data)
+        response = await providers.llm.ainvoke([SystemMessage(content=prompt_content)])
         summary = response.content.strip()
-        logger.info(f"--> Summary generated.")
+        logger.info("--> Summary generated.")
         return summary
+    except ProviderBusy:
+        raise
     except Exception as e:
-        logger.error(f"Error invoking LLM for summary: {e}", exc_info=True)
+        logger.error("Error invoking LLM for summary: %s", e, exc_info=True)
         return "[Error generating summary]"
 
+def question_message(step: FormStep) -> str:
+    return f"{step.prompt}\n(Please provide your answer)"
+
 async def run_form_step(state: AgentState) -> AgentState:
     intent = state.get("intent")
     if not intent:
@@ -137,36 +146,34 @@ async def run_form_step(state: AgentState) -> AgentState:
         state["done"] = True
         return state
 
-    fields = product_fields if intent == "product" else post_fields
-    base_url = state.get("base_url", "")
+    form = forms.get(intent)
     data = state.get("product_data", {})
     new_messages = []
 
-    logger.info(f"--> Running form step for intent: {intent}")
+    logger.info("--> Running form step for intent: %s", intent)
 
+    # The latest user message answers the awaited field and may fill others too
     key_to_save = state.get("await_key")
-    if key_to_save and state.get("messages") and isinstance(state["messages"][-1], HumanMessage):
-        last_user_message = state["messages"][-1].content.strip()
-        logger.info(f"--> Saving answer for '{key_to_save}': '{last_user_message}'")
-        data[key_to_save] = last_user_message
-
-    current_await_key = None
-    next_key_to_ask = None
-    question_to_ask = None
-    for key, q in fields:
-        if key not in data:
-            next_key_to_ask = key
-            question_to_ask = q
-            break
-
-    current_url = generate_url(base_url, data)
+    utterance = None
+    if state.get("messages") and isinstance(state["messages"][-1], HumanMessage):
+        utterance = state["messages"][-1].content
+        logger.info("--> Extracting answers (awaiting '%s') from: '%s'", key_to_save, utterance.strip())
+
+    step = await afill_slots(form, data, utterance, key_to_save, providers.llm, state.get("form_mask"), state.get("url"))
+    # "my tomatoes" -> the id of the farmer's Tomato product, or ask which one if several are close
+    product_field = form.by_slot.get(PRODUCT_SLOT)
+    offered, state["product_offer"] = state.get("product_offer"), None
+    if product_field is not None and product_field.key in step.saved_keys and state.get("farmer_id"):
+        step, state["product_offer"] = resolve_product_answer(form, data, step, await products.aget(state["farmer_id"]),
+                                                              offered)
+    current_url = step.url
     summary_text = state.get("summary")
 
-    if next_key_to_ask and question_to_ask:
-        logger.info(f"--> Asking next question for key: '{next_key_to_ask}'")
-        msg_content = f"{question_to_ask}\n(Please provide your answer)"
+    if not step.done:
+        logger.info("--> Asking next question for key: '%s'", step.key)
+        msg_content = question_message(step)
         new_messages.append(AIMessage(content=msg_content))
-        current_await_key = next_key_to_ask
+        current_await_key = step.key
         is_done = False
     else:
         logger.info("--> All questions answered. Finalizing.")
@@ -178,6 +185,7 @@ async def run_form_step(state: AgentState) -> AgentState:
         is_done = True
 
     state["product_data"] = data
+    state["form_mask"] = step.mask
     state["await_key"] = current_await_key
     state["done"] = is_done
     state["url"] = current_url
@@ -186,35 +194,89 @@ async def run_form_step(state: AgentState) -> AgentState:
 
     return state
 
-# --- Placeholder Functions (Simulating External APIs) ---
-# (Remain the same async functions)
-async def placeholder_speech_to_text(audio_bytes: bytes, client_id: str) -> tuple[Optional[str], Optional[str]]:
-    # Simulate processing time and language detection
-    lang_code = "en-IN" # Default or simulate detection (e.g., random.choice(["en-IN", "hi-IN"]))
-    transcription = f"Dummy transcription in {lang_code} for session {client_id}" # Use session_id instead of client_id
-    logger.info(f"[Placeholder STT] Result: lang={lang_code}, text='{transcription}'")
-    await asyncio.sleep(0.5)
+# --- Provider Calls ---
+# Failures are logged and reported as None so the endpoint can degrade gracefully.
+# ProviderBusy (load shedding) propagates so the client gets an early "busy, please retry",
+# unless shed=False: once the turn has changed the session state a retry would answer the
+# next field, so the reply goes out in English or without audio instead.
+async def speech_to_text(audio_bytes: bytes, session_id: str) -> tuple[Optional[str], Optional[str]]:
+    try:
+        transcription, lang_code = await providers.stt.transcribe(audio_bytes, f"{session_id}.wav")
+    except ProviderBusy:
+        raise
+    except ProviderError as e:
+        logger.error("STT provider failed for session %s: %s", session_id, e)
+        return None, None
+    logger.info("[STT] Result: lang=%s, text='%s'", lang_code, transcription)
     return transcription, lang_code
 
-async def placeholder_translate(text: str, source_lang: str, target_lang: str) -> Optional[str]:
+async def translate_text(text: str, source_lang: str, target_lang: str, shed: bool = True) -> Optional[str]:
     if source_lang == target_lang:
         return text
-    logger.info(f"[Placeholder Translate] Translating '{text[:50]}...' from {source_lang} to {target_lang}")
-    await asyncio.sleep(0.3)
-    return f"Translated '{text}' to {target_lang}"
-
-async def placeholder_text_to_speech(text: str, lang_code: str) -> Optional[str]:
-    logger.info(f"[Placeholder TTS] Generating audio in '{lang_code}' for text: '{text[:50]}...'")
-    await asyncio.sleep(0.6)
-    dummy_wav_content = b"RIFF\x00\x00\x00\x00WAVEfmt \x10\x00\x00\x00\x01\x00\x01\x00\x80>\x00\x00\x00\xfa\x00\x00\x02\x00\x10\x00data\x00\x00\x00\x00"
-    dummy_base64 = base64.b64encode(dummy_wav_content).decode('utf-8')
-    return dummy_base64
+    logger.info("[Translate] Translating '%s...' from %s to %s", text[:50], source_lang, target_lang)
+    try:
+        return await providers.translate.translate(text, source_lang, target_lang)
+    except ProviderBusy as e:
+        if shed:
+            raise
+        logger.warning("Translation provider busy, not translating: %s", e)
+        return None
+    except ProviderError as e:
+        logger.error("Translation provider failed: %s", e)
+        return None
+
+async def text_to_speech(text: str, lang_code: str, shed: bool = True) -> Optional[str]:
+    logger.info("[TTS] Generating audio in '%s' for text: '%s...'", lang_code, text[:50])
+    try:
+        return await providers.tts.synthesize(text, lang_code)
+    except ProviderBusy as e:
+        if shed:
+            raise
+        logger.warning("TTS provider busy, no audio: %s", e)
+        return None
+    except ProviderError as e:
+        logger.error("TTS provider failed: %s", e)
+        return None
+
+async def render_reply(text: str, lang_code: str) -> tuple[str, Optional[str]]:
+    """(text in lang_code, or English if translation fails; TTS audio)."""
+    if lang_code != "en-IN":
+        text = await translate_text(text, "en-IN", lang_code) or text
+    return text, await text_to_speech(text, lang_code)
+
+# The next question's translation/TTS is rendered while the user answers the current one,
+# unless live turns already keep those providers busy
+prefetcher = Prefetcher(render_reply, admit=lambda: spare_capacity(providers.translate, providers.tts))
+# A form's first question, rendered once per language for sessions started from the form's page
+openings = OpeningCache(render_reply)
+
+def schedule_prefetch(session_id: str, state: AgentState, lang_code: str):
+    """Renders the likely next replies (next question, or this one asked again) in the background."""
+    if state.get("done") or not state.get("await_key"):
+        prefetcher.cancel(session_id)
+        return
+    form = forms.get(state.get("intent"))
+    current = FormStep(form.by_key[state["await_key"]], state.get("url", ""), state.get("form_mask", 0))
+    prefetcher.schedule(session_id, [question_message(step) for step in likely_steps(form, current)], lang_code)
 
 # --- Pydantic Models for Request/Response ---
+class SessionStartRequest(BaseModel):
+    page: Optional[str] = None        # Page the assistant was opened on ("/farmer/add/post") or an intent name
+    language: str = "en-IN"           # Language to ask the first question in
+    farmer_id: Optional[str] = None
+
+class SessionStartResponse(BaseModel):
+    session_id: str
+    intent: Optional[str] = None      # Set when the page bound the session to a form
+    text: Optional[str] = None        # The form's first question (in the requested language)
+    audio_base64: Optional[str] = None
+    current_url: Optional[str] = None
+
 class InteractionRequest(BaseModel):
     text: Optional[str] = None
     # Expect audio as Base64 encoded string
     audio_base64: Optional[str] = Field(None, alias="bytes") # Accept "bytes" field name for compatibility
+    farmer_id: Optional[str] = None # FarmerProfile id; lets the post flow match the farmer's products
 
     # Ensure at least one input is provided (can be done via validator if needed)
 
@@ -227,29 +289,77 @@ class InteractionResponse(BaseModel):
     status: str = "success"           # Overall status ("success", "error")
     error_message: Optional[str] = None # Error details if status is "error"
     processing_time: float
+    stage_timings: Optional[Dict[str, float]] = None # Seconds spent per stage (stt, agent, tts, ...)
 
 # --- FastAPI Router & HTTP Endpoints ---
 router = APIRouter()
 
-@router.post("/start_session", response_model=Dict[str, str])
-async def start_new_session():
-    """Starts a new conversation and returns a unique session ID."""
+@router.post("/start_session", response_model=SessionStartResponse)
+async def start_new_session(request: Optional[SessionStartRequest] = Body(None)):
+    """
+    Starts a new conversation and returns a unique session ID. Opened from a
+    form's page, the session is bound to that form and the first question
+    comes back with it, so the first message is not classified.
+    """
     session_id = str(uuid.uuid4())
-    # Initialize an empty state for this session
-    conversation_states[session_id] = AgentState(messages=[], product_data={}, done=False)
-    logger.info(f"Started new session: {session_id}")
-    return {"session_id": session_id}
+    intent = forms.intent_for_page(request.page) if request else None
+    if intent is None:
+        # Initialize an empty state for this session; the first message picks the form
+        conversation_states[session_id] = AgentState(messages=[], product_data={}, done=False)
+        if request and request.farmer_id:
+            conversation_states[session_id]["farmer_id"] = request.farmer_id
+        logger.info("Started new session: %s", session_id)
+        return SessionStartResponse(session_id=session_id)
+
+    form = forms.get(intent)
+    step = FormStep(form.first_field(), form.empty_url, 0)
+    question = question_message(step)
+    state = AgentState(
+        messages=[AIMessage(content=question)], intent=intent, base_url=form.base_url, product_data={},
+        form_mask=0, await_key=step.key, done=False, summary=None, url=form.empty_url,
+        detected_language_code=request.language, farmer_id=request.farmer_id,
+    )
+    try:
+        text, audio = await openings.get(question, request.language)
+    except ProviderBusy:  # the session still starts; the question goes out untranslated, without audio
+        text, audio = question, None
+    conversation_states[session_id] = state
+    schedule_prefetch(session_id, state, request.language)
+    logger.info("Started new session: %s on the '%s' form (page %s)", session_id, intent, request.page)
+    return SessionStartResponse(session_id=session_id, intent=intent, text=text, audio_base64=audio,
+                                current_url=form.empty_url)
 
 
 @router.post("/interact/{session_id}", response_model=InteractionResponse)
-async def interact(session_id: str, request: InteractionRequest):
+async def interact(session_id: str, request: InteractionRequest, response: Response,
+                   idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     """Handles a user interaction turn (text or audio) for a given session."""
+    if not idempotency_key:
+        return await run_turn(session_id, request)
+    # A retry of a turn that already ran (or is running) gets that turn's response
+    try:
+        result, replayed = await responses.arun(
+            session_id, idempotency_key, fingerprint(request.text, request.audio_base64),
+            lambda: run_turn(session_id, request), keep=lambda r: r.status != "error",
+        )
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if replayed:
+        logger.info("Replaying response for session %s, key %s", session_id, idempotency_key)
+        response.headers[REPLAYED_HEADER] = "true"
+    return result
+
+
+async def run_turn(session_id: str, request: InteractionRequest) -> InteractionResponse:
+    """One turn: STT/translate in, the form step, translate/TTS out."""
     start_time = time.time()
-    logger.info(f"Interaction received for session: {session_id}")
+    start_turn()  # provider calls below share the turn SLO (AGENT_TURN_SLO)
+    start_turn_log(session_id)  # records below carry the session and turn ids
+    logger.info("Interaction received for session: %s", session_id)
 
     # --- 0. Retrieve or Handle Session State ---
     if session_id not in conversation_states:
-        logger.error(f"Session ID not found: {session_id}")
+        logger.error("Session ID not found: %s", session_id)
         # Option 1: Raise error
         raise HTTPException(status_code=404, detail=f"Session not found: {session_id}. Use /start_session first.")
         # Option 2: Implicitly create (less explicit, might hide errors)
@@ -257,10 +367,12 @@ async def interact(session_id: str, request: InteractionRequest):
         # logger.info(f"Implicitly created state for session: {session_id}")
 
     current_state = conversation_states[session_id]
+    if request.farmer_id:
+        current_state["farmer_id"] = request.farmer_id
 
     # Check if the process for this session is already marked as done
     if current_state.get("done", False):
-        logger.warning(f"Interaction attempt on completed session: {session_id}")
+        logger.warning("Interaction attempt on completed session: %s", session_id)
         # Return the final state info without reprocessing
         return InteractionResponse(
             session_id=session_id,
@@ -279,28 +391,31 @@ async def interact(session_id: str, request: InteractionRequest):
     detected_language_code = current_state.get("detected_language_code", "en-IN") # Use previous or default
     final_text_for_client = None
     audio_output_base64 = None
+    stage_timings: Dict[str, float] = {}
 
     # --- 1. Process Input ---
     if request.text:
         original_user_text = request.text
-        logger.info(f"Received TEXT for session {session_id}: '{original_user_text[:100]}...'")
-        # Assume English for now, or add language detection/translation
-        user_input_for_agent = original_user_text
-        # detected_language_code remains as set above
+        logger.info("Received TEXT for session %s: '%s...'", session_id, original_user_text[:100])
+        # Identify the language locally; replies with no signal ("30", "ok") keep the session's language
+        detected_language_code = identify(original_user_text) or detected_language_code
+        current_state["detected_language_code"] = detected_language_code
 
     elif request.audio_base64:
-        logger.info(f"Received AUDIO (Base64) for session {session_id}: {len(request.audio_base64)} chars")
+        logger.info("Received AUDIO (Base64) for session %s: %s chars", session_id, len(request.audio_base64))
         try:
-            audio_bytes = base64.b64decode(request.audio_base64)
-            logger.info(f"Decoded Base64 to {len(audio_bytes)} audio bytes")
+            audio_bytes = await media.b64decode(request.audio_base64)
+            logger.info("Decoded Base64 to %s audio bytes", len(audio_bytes))
         except (binascii.Error, ValueError) as decode_error:
-            logger.error(f"Base64 decoding failed for {session_id}: {decode_error}")
+            logger.error("Base64 decoding failed for %s: %s", session_id, decode_error)
             raise HTTPException(status_code=400, detail="Invalid audio_base64 data provided.")
 
         # 1a. STT
-        stt_transcription, stt_lang_code = await placeholder_speech_to_text(audio_bytes, session_id) # Pass session_id for context
+        stage_start = time.time()
+        stt_transcription, stt_lang_code = await speech_to_text(audio_bytes, session_id) # Pass session_id for context
+        stage_timings["stt"] = round(time.time() - stage_start, 4)
         if not stt_transcription or not stt_lang_code:
-            logger.error(f"STT failed for {session_id}")
+            logger.error("STT failed for %s", session_id)
             # Return an error response within the model structure
             return InteractionResponse(
                 session_id=session_id, text="Could not understand audio.", is_done=False, status="error",
@@ -310,51 +425,56 @@ async def interact(session_id: str, request: InteractionRequest):
         detected_language_code = stt_lang_code
         current_state["detected_language_code"] = detected_language_code # Store detected lang
 
-        # 1b. Translate to English for Agent
-        if detected_language_code != "en-IN":
-            logger.info(f"Translating input from {detected_language_code} for {session_id}")
-            user_input_for_agent = await placeholder_translate(original_user_text, detected_language_code, "en-IN")
-            if not user_input_for_agent:
-                 logger.error(f"Input translation failed for {session_id}")
-                 return InteractionResponse(
-                     session_id=session_id, text="Could not translate your message.", is_done=False, status="error",
-                     error_message="Input translation failed.", processing_time=round(time.time() - start_time, 2)
-                 )
-            logger.info(f"Translated input for agent: '{user_input_for_agent[:100]}...'")
-        else:
-            user_input_for_agent = original_user_text # Already English
-
     else:
-        logger.warning(f"No text or audio provided for session {session_id}")
+        logger.warning("No text or audio provided for session %s", session_id)
         raise HTTPException(status_code=400, detail="No 'text' or 'audio_base64' provided in request.")
 
+    # 1b. Translate to English for Agent (text or speech)
+    if detected_language_code != "en-IN":
+        logger.info("Translating input from %s for %s", detected_language_code, session_id)
+        stage_start = time.time()
+        user_input_for_agent = await translate_text(original_user_text, detected_language_code, "en-IN")
+        stage_timings["translate_in"] = round(time.time() - stage_start, 4)
+        if not user_input_for_agent:
+             logger.error("Input translation failed for %s", session_id)
+             return InteractionResponse(
+                 session_id=session_id, text="Could not translate your message.", is_done=False, status="error",
+                 error_message="Input translation failed.", processing_time=round(time.time() - start_time, 2)
+             )
+        logger.info("Translated input for agent: '%s...'", user_input_for_agent[:100])
+    else:
+        user_input_for_agent = original_user_text # Already English
+
     if not user_input_for_agent: # Should be caught earlier, but double-check
-         logger.error(f"No valid input processed for agent for session {session_id}")
+         logger.error("No valid input processed for agent for session %s", session_id)
          return InteractionResponse(
              session_id=session_id, text="Failed to process input.", is_done=False, status="error",
              error_message="Internal input processing error.", processing_time=round(time.time() - start_time, 2)
          )
 
     # --- 2. Run Agent Logic ---
-    logger.info(f"Running agent logic for session {session_id}")
+    logger.info("Running agent logic for session %s", session_id)
+    stage_start = time.time()
+    # The step runs on a copy: a turn shed midway (ProviderBusy) leaves the session as it was for the retry
+    working_state = {**current_state, "product_data": dict(current_state.get("product_data") or {})}
     try:
         # Determine intent on first interaction for this session
-        if not current_state.get("intent"):
+        if not working_state.get("intent"):
             intent, base_url = await determine_intent_and_base_url(user_input_for_agent)
             initial_human_message = HumanMessage(content=user_input_for_agent)
-            current_state.update({
+            working_state.update({
                 "messages": [initial_human_message], "intent": intent, "base_url": base_url,
-                "product_data": {}, "await_key": None, "done": False, "summary": None,
-                "url": generate_url(base_url, {})
-                # Keeps detected_language_code if set from audio
+                "product_data": {}, "form_mask": 0, "await_key": None, "done": False, "summary": None,
+                "url": forms.get(intent).empty_url
+                # Keeps detected_language_code set above
             })
-            logger.info(f"Intent determined ({intent}). Running first form step for {session_id}.")
-            updated_state = await run_form_step(current_state)
+            logger.info("Intent determined (%s). Running first form step for %s.", intent, session_id)
+            updated_state = await run_form_step(working_state)
         else:
             # Process subsequent answers
-            current_state["messages"] = add_messages(current_state.get("messages", []), [HumanMessage(content=user_input_for_agent)])
-            logger.info(f"Running next form step for {session_id}.")
-            updated_state = await run_form_step(current_state)
+            working_state["messages"] = add_messages(working_state.get("messages", []), [HumanMessage(content=user_input_for_agent)])
+            logger.info("Running next form step for %s.", session_id)
+            updated_state = await run_form_step(working_state)
 
         # Store the updated state back (crucial!)
         conversation_states[session_id] = updated_state
@@ -362,39 +482,58 @@ async def interact(session_id: str, request: InteractionRequest):
         # Extract the latest AI message (agent's response in English)
         if updated_state.get("messages") and isinstance(updated_state["messages"][-1], AIMessage):
             agent_response_text = updated_state["messages"][-1].content
-            logger.info(f"Agent response (English): '{agent_response_text[:100]}...'")
+            logger.info("Agent response (English): '%s...'", agent_response_text[:100])
         else:
-            logger.error(f"No AIMessage found in updated state for {session_id}")
+            logger.error("No AIMessage found in updated state for %s", session_id)
             agent_response_text = "Sorry, an internal error occurred." # Default error
 
+    except ProviderBusy:
+        raise
     except Exception as agent_error:
-        logger.error(f"Error during agent processing for {session_id}: {agent_error}", exc_info=True)
+        logger.error("Error during agent processing for %s: %s", session_id, agent_error, exc_info=True)
         # Return error response
         return InteractionResponse(
             session_id=session_id, text="An error occurred processing your request.", is_done=False, status="error",
             error_message=str(agent_error), processing_time=round(time.time() - start_time, 2)
         )
 
+    stage_timings["agent"] = round(time.time() - stage_start, 4)
+
     # --- 3. Prepare Response for Client ---
     final_text_for_client = agent_response_text # Default to English
 
-    # 3a. Translate back if necessary
-    if detected_language_code != "en-IN":
-        logger.info(f"Translating response to {detected_language_code} for {session_id}")
-        translated_response = await placeholder_translate(agent_response_text, "en-IN", detected_language_code)
-        if translated_response:
-            final_text_for_client = translated_response
-            logger.info(f"Translated response for client: '{final_text_for_client[:100]}...'")
-        else:
-            logger.warning(f"Output translation failed for {session_id}, sending English text.")
-            # Keep final_text_for_client as English
-
-    # 3b. TTS
-    logger.info(f"Generating TTS for session {session_id}")
-    audio_output_base64 = await placeholder_text_to_speech(final_text_for_client, detected_language_code)
-    if not audio_output_base64:
-        logger.warning(f"TTS failed for {session_id}. Response will lack audio.")
-
+    # Predicted while the user was answering? Then translation and TTS are already done.
+    stage_start = time.time()
+    prefetched = await prefetcher.take(session_id, agent_response_text, detected_language_code)
+    if prefetched:
+        final_text_for_client, audio_output_base64 = prefetched
+        stage_timings["prefetch_wait"] = round(time.time() - stage_start, 4)
+        logger.info("Using prefetched reply audio for session %s", session_id)
+    else:
+        # 3a. Translate back if necessary
+        if detected_language_code != "en-IN":
+            logger.info("Translating response to %s for %s", detected_language_code, session_id)
+            stage_start = time.time()
+            # The state above is committed: degrade rather than shed from here on
+            translated_response = await translate_text(agent_response_text, "en-IN", detected_language_code,
+                                                       shed=False)
+            stage_timings["translate_out"] = round(time.time() - stage_start, 4)
+            if translated_response:
+                final_text_for_client = translated_response
+                logger.info("Translated response for client: '%s...'", final_text_for_client[:100])
+            else:
+                logger.warning("Output translation failed for %s, sending English text.", session_id)
+                # Keep final_text_for_client as English
+
+        # 3b. TTS
+        logger.info("Generating TTS for session %s", session_id)
+        stage_start = time.time()
+        audio_output_base64 = await text_to_speech(final_text_for_client, detected_language_code, shed=False)
+        stage_timings["tts"] = round(time.time() - stage_start, 4)
+        if not audio_output_base64:
+            logger.warning("TTS failed for %s. Response will lack audio.", session_id)
+
+    schedule_prefetch(session_id, updated_state, detected_language_code)
 
     # --- 4. Construct and Return Final Response ---
     response = InteractionResponse(
@@ -405,9 +544,10 @@ async def interact(session_id: str, request: InteractionRequest):
         current_url=updated_state.get("url"),
         status="success" if agent_response_text else "error", # Mark error if agent failed silently
         error_message="Agent did not produce a response." if not agent_response_text and updated_state.get("status") != "error" else None,
-        processing_time=round(time.time() - start_time, 2)
+        processing_time=round(time.time() - start_time, 2),
+        stage_timings=stage_timings
     )
-    logger.info(f"Sending response for session {session_id}, status: {response.status}, done: {response.is_done}")
+    logger.info("Sending response for session %s, status: %s, done: %s", session_id, response.status, response.is_done)
     return response
 
 
@@ -417,11 +557,30 @@ async def clear_session_state(session_id: str):
     """Deletes the state for a specific session."""
     if session_id in conversation_states:
         del conversation_states[session_id]
-        logger.info(f"Cleared state for session: {session_id}")
+        prefetcher.cancel(session_id)
+        responses.discard(session_id)
+        logger.info("Cleared state for session: %s", session_id)
         return # Return No Content on successful deletion
     else:
         raise HTTPException(status_code=404, detail="Session not found")
 
+@router.post("/products/invalidate/{farmer_id}", status_code=204)
+async def invalidate_products(farmer_id: str):
+    """Called by the app when a farmer's products change; their index is rebuilt on next use."""
+    products.invalidate(farmer_id)
+    logger.info("Invalidated product index for farmer: %s", farmer_id)
+
+@router.get("/dashboard/farmer/{farmer_id}")
+async def farmer_dashboard(farmer_id: str, days: int = Query(30, ge=1, le=366)):
+    """Sales totals, daily series, best sellers and cart demand for the farmer analytics page."""
+    return await asyncio.to_thread(rollups.farmer_dashboard, farmer_id, days)
+
+@router.get("/dashboard/demand")
+async def demand_dashboard(days: int = Query(7, ge=1, le=366), location: Optional[str] = None,
+                           top: int = Query(20, ge=1, le=100)):
+    """Most ordered products and busiest locations for the demand page."""
+    return await asyncio.to_thread(rollups.demand, days, location, top)
+
 @router.get("/get_session_state/{session_id}") # Keep GET for retrieving state
 async def get_session_state_debug(session_id: str):
     """Utility endpoint to view the current state for a session (debugging)."""
@@ -439,11 +598,33 @@ async def get_session_state_debug(session_id: str):
     else:
         raise HTTPException(status_code=404, detail="Session not found")
 
+@router.get("/metrics")
+async def metrics(format: str = "json"):
+    """Provider limiter state and latency metrics (JSON or Prometheus text)."""
+    if format == "prometheus":
+        return PlainTextResponse(REGISTRY.render_prometheus())
+    return REGISTRY.snapshot()
+
+async def provider_busy_handler(request, exc: ProviderBusy):
+    """Load shedding: tell the client to retry instead of queueing behind a slow provider."""
+    retry_after = max(1, round(exc.retry_after))
+    logger.warning("Shedding request to %s: %s", request.url.path, exc)
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": str(retry_after)},
+        content={"status": "busy", "error_message": "Service is busy, please retry.", "retry_after": retry_after},
+    )
+
+# --- Admin: CPU profiles and memory of this worker (off unless AGENT_ADMIN_TOKEN is set) ---
+admin = admin_router(lambda: list(conversation_states.items()))
+
 # --- FastAPI App Setup ---
 app = FastAPI(title="HTTP Agent Server")
 
 # Include the HTTP router
 app.include_router(router)
+app.include_router(admin)
+app.add_exception_handler(ProviderBusy, provider_busy_handler)
 
 @app.get("/")
 async def read_root():
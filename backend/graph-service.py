@@ -0,0 +1,441 @@
+"""
+Async HTTP service for the LangGraph agent in intent-classification.py.
+
+Same request/response contract as /interact/{session_id} in
+full-agentic-integration.py, so either server can sit behind the load test.
+The graph is compiled with its async nodes (llm.ainvoke) and driven with
+ainvoke, so thousands of sessions share one event loop:
+
+* a session is a checkpointer thread; the graph pauses in its await node
+  and the next turn resumes there (AGENT_GRAPH_DB, AsyncSqliteSaver);
+* turns of the same session are serialized by a per-session lock, turns of
+  different sessions run concurrently; only the AGENT_GRAPH_SESSIONS most
+  recently used sessions keep a lock while idle (the rest are found again
+  from their checkpoints);
+* LLM/STT/translation/TTS calls go through agent_core.providers, so their
+  concurrency is bounded by the adaptive limiter (AGENT_LIMIT_*) and
+  overload is shed as 503 + Retry-After;
+* a turn retried with the same Idempotency-Key runs once, the retry gets
+  the original response (agent_core.idempotency).
+
+Run: uvicorn graph-service:app --port 8001   (from backend/, or via importlib)
+"""
+import asyncio
+import binascii
+import contextlib
+import importlib.util
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi import APIRouter, Body, FastAPI, Header, HTTPException, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, Field
+
+from agent_core.deadline import start_turn
+from agent_core.idempotency import REPLAYED_HEADER, IdempotencyConflict, ResponseCache, fingerprint
+from agent_core.langid import ENGLISH, SessionLanguages
+from agent_core.limiter import ProviderBusy
+from agent_core.logs import configure_logging, start_turn_log
+from agent_core.media import MediaPool
+from agent_core.metrics import REGISTRY
+from agent_core.prefetch import OpeningCache
+from agent_core.profiling import admin_router
+from agent_core.providers import ProviderError, build_providers
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# --- The graph (loaded from the script next to this file) ---
+_spec = importlib.util.spec_from_file_location(
+    "intent_classification", Path(__file__).resolve().parent / "intent-classification.py"
+)
+graph_module = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(graph_module)
+AIMessage = graph_module.AIMessage
+
+# --- Speech providers (the graph has its own LLM provider) ---
+providers = build_providers(
+    defaults={"stt": "synthetic", "translate": "synthetic", "tts": "synthetic"},
+    fake_latency={"stt": "const:0.5", "translate": "const:0.3", "tts": "const:0.6"},
+)
+
+# Base64 decoding of uploads runs in worker processes (AGENT_MEDIA_*, see agent_core/media.py)
+media = MediaPool.from_env()
+
+
+@contextlib.asynccontextmanager
+async def open_checkpointer(path: str):
+    """AsyncSqliteSaver on ``path``; in-memory without langgraph-checkpoint-sqlite."""
+    try:
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    except ImportError:
+        logger.warning("langgraph-checkpoint-sqlite is not installed, checkpoints are kept in memory")
+        yield graph_module.MemorySaver()
+        return
+    async with AsyncSqliteSaver.from_conn_string(path) as saver:
+        yield saver
+
+
+# --- Sessions ---
+class SessionLocks:
+    """
+    One asyncio.Lock per session: a session's turns run one at a time.
+    Beyond ``max_sessions``, the least recently used idle locks are dropped;
+    ``_known`` re-adds a dropped session from its checkpoints on its next turn.
+    """
+
+    def __init__(self, max_sessions: int = 10_000):
+        self.max_sessions = max_sessions
+        self._locks: "OrderedDict[str, asyncio.Lock]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._locks
+
+    def add(self, session_id: str):
+        if session_id not in self._locks:
+            self._evict(len(self._locks) + 1 - self.max_sessions)
+            self._locks[session_id] = asyncio.Lock()
+        self._locks.move_to_end(session_id)
+
+    def get(self, session_id: str) -> asyncio.Lock:
+        self._locks.move_to_end(session_id)
+        return self._locks[session_id]
+
+    def _evict(self, count: int):
+        # A held lock (or one with waiters) is locked, so only sessions with no turn running are dropped
+        idle = []
+        for session_id, lock in self._locks.items():
+            if len(idle) >= count:
+                break
+            if not lock.locked():
+                idle.append(session_id)
+        for session_id in idle:
+            del self._locks[session_id]
+
+    def discard(self, session_id: str):
+        self._locks.pop(session_id, None)
+
+
+sessions = SessionLocks(int(os.getenv("AGENT_GRAPH_SESSIONS", "10000")))
+languages = SessionLanguages()  # typed text is identified locally, speech by STT
+responses = ResponseCache.from_env()  # keyed turns, so client retries run once
+graph = None  # compiled in lifespan(), once the checkpointer is open
+_inflight_turns = 0
+
+REGISTRY.gauge("graph_sessions", "Open graph sessions", fn=lambda: len(sessions))
+REGISTRY.gauge("graph_turns_inflight", "Graph turns currently running", fn=lambda: _inflight_turns)
+_turn_seconds = REGISTRY.histogram("graph_turn_seconds", "Graph ainvoke time per turn")
+
+
+def _config(session_id: str) -> dict:
+    return {"configurable": {"thread_id": session_id}}
+
+
+async def _known(session_id: str) -> bool:
+    """Started here, or checkpointed by an earlier run of the service."""
+    if session_id not in sessions and (await graph.aget_state(_config(session_id))).values:
+        sessions.add(session_id)
+    return session_id in sessions
+
+
+# --- Pydantic Models for Request/Response (same as full-agentic-integration.py) ---
+class SessionStartRequest(BaseModel):
+    page: Optional[str] = None
+    language: str = ENGLISH
+
+
+class SessionStartResponse(BaseModel):
+    session_id: str
+    intent: Optional[str] = None
+    text: Optional[str] = None
+    audio_base64: Optional[str] = None
+    current_url: Optional[str] = None
+
+
+class InteractionRequest(BaseModel):
+    text: Optional[str] = None
+    audio_base64: Optional[str] = Field(None, alias="bytes")
+
+
+class InteractionResponse(BaseModel):
+    session_id: str
+    text: str
+    audio_base64: Optional[str] = None
+    is_done: bool
+    current_url: Optional[str] = None
+    status: str = "success"
+    error_message: Optional[str] = None
+    processing_time: float
+    stage_timings: Optional[Dict[str, float]] = None
+
+
+# --- Provider Calls (None on failure, ProviderBusy propagates unless shed=False) ---
+# After achat_turn has checkpointed the turn, a shed reply would make the client's retry
+# answer the next field; the reply goes out in English or without audio instead.
+async def speech_to_text(audio_bytes: bytes, session_id: str):
+    try:
+        return await providers.stt.transcribe(audio_bytes, f"{session_id}.wav")
+    except ProviderBusy:
+        raise
+    except ProviderError as e:
+        logger.error("STT provider failed for session %s: %s", session_id, e)
+        return None, None
+
+
+async def translate_text(text: str, source_lang: str, target_lang: str, shed: bool = True) -> Optional[str]:
+    if source_lang == target_lang:
+        return text
+    try:
+        return await providers.translate.translate(text, source_lang, target_lang)
+    except ProviderBusy as e:
+        if shed:
+            raise
+        logger.warning("Translation provider busy, not translating: %s", e)
+        return None
+    except ProviderError as e:
+        logger.error("Translation provider failed: %s", e)
+        return None
+
+
+async def text_to_speech(text: str, lang_code: str, shed: bool = True) -> Optional[str]:
+    try:
+        return await providers.tts.synthesize(text, lang_code)
+    except ProviderBusy as e:
+        if shed:
+            raise
+        logger.warning("TTS provider busy, no audio: %s", e)
+        return None
+    except ProviderError as e:
+        logger.error("TTS provider failed: %s", e)
+        return None
+
+
+async def render_reply(text: str, lang_code: str):
+    """(text in lang_code, or English if translation fails; TTS audio)."""
+    if lang_code != ENGLISH:
+        text = await translate_text(text, ENGLISH, lang_code) or text
+    return text, await text_to_speech(text, lang_code)
+
+
+# A form's first question, rendered once per language for sessions started from the form's page
+openings = OpeningCache(render_reply)
+
+
+# --- FastAPI Router & HTTP Endpoints ---
+router = APIRouter()
+
+
+@router.post("/start_session", response_model=SessionStartResponse)
+async def start_new_session(request: Optional[SessionStartRequest] = Body(None)):
+    """New session; opened from a form's page, it starts on that form and returns its first question."""
+    session_id = str(uuid.uuid4())
+    sessions.add(session_id)
+    intent = graph_module.forms.intent_for_page(request.page) if request else None
+    if intent is None:
+        logger.info("Started new session: %s", session_id)
+        return SessionStartResponse(session_id=session_id)
+
+    languages.set(session_id, request.language)
+    async with sessions.get(session_id):
+        state = await graph_module.astart_form(graph, intent, session_id)
+    messages = state.get("messages") or []
+    question = messages[-1].content if messages and isinstance(messages[-1], AIMessage) else None
+    try:
+        text, audio = await openings.get(question, request.language) if question else (None, None)
+    except ProviderBusy:  # the session is already checkpointed; send the question untranslated, without audio
+        text, audio = question, None
+    logger.info("Started new session: %s on the '%s' form (page %s)", session_id, intent, request.page)
+    return SessionStartResponse(session_id=session_id, intent=intent, text=text, audio_base64=audio,
+                                current_url=state.get("url"))
+
+
+@router.post("/interact/{session_id}", response_model=InteractionResponse)
+async def interact(session_id: str, request: InteractionRequest, response: Response,
+                   idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    if not idempotency_key:
+        return await run_turn(session_id, request)
+    try:
+        result, replayed = await responses.arun(
+            session_id, idempotency_key, fingerprint(request.text, request.audio_base64),
+            lambda: run_turn(session_id, request), keep=lambda r: r.status != "error",
+        )
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return result
+
+
+async def run_turn(session_id: str, request: InteractionRequest) -> InteractionResponse:
+    """One turn: STT/translate in, resume the session's graph thread, translate/TTS out."""
+    global _inflight_turns
+    start_time = time.time()
+    start_turn()
+    start_turn_log(session_id)
+    if not await _known(session_id):
+        raise HTTPException(status_code=404, detail=f"Session not found: {session_id}. Use /start_session first.")
+
+    async with sessions.get(session_id):
+        snapshot = await graph.aget_state(_config(session_id))
+        values = snapshot.values or {}
+        if values.get("done") and not snapshot.next:
+            return InteractionResponse(
+                session_id=session_id,
+                text=f"(Process already complete) {values.get('summary', 'Summary not available.')}",
+                is_done=True, current_url=values.get("url"), status="complete",
+                processing_time=round(time.time() - start_time, 2),
+            )
+
+        stage_timings: Dict[str, float] = {}
+        if request.text:
+            user_input = request.text
+            language = languages.detect(session_id, user_input)
+        elif request.audio_base64:
+            try:
+                audio_bytes = await media.b64decode(request.audio_base64)
+            except (binascii.Error, ValueError):
+                raise HTTPException(status_code=400, detail="Invalid audio_base64 data provided.")
+            stage_start = time.time()
+            user_input, language = await speech_to_text(audio_bytes, session_id)
+            stage_timings["stt"] = round(time.time() - stage_start, 4)
+            if not user_input or not language:
+                return InteractionResponse(
+                    session_id=session_id, text="Could not understand audio.", is_done=False, status="error",
+                    error_message="STT failed.", processing_time=round(time.time() - start_time, 2),
+                )
+            languages.set(session_id, language)
+        else:
+            raise HTTPException(status_code=400, detail="No 'text' or 'audio_base64' provided in request.")
+
+        if language != ENGLISH:
+            stage_start = time.time()
+            user_input = await translate_text(user_input, language, ENGLISH)
+            stage_timings["translate_in"] = round(time.time() - stage_start, 4)
+            if not user_input:
+                return InteractionResponse(
+                    session_id=session_id, text="Could not translate your message.", is_done=False, status="error",
+                    error_message="Input translation failed.", processing_time=round(time.time() - start_time, 2),
+                )
+
+        stage_start = time.time()
+        _inflight_turns += 1
+        try:
+            state = await graph_module.achat_turn(graph, user_input, session_id)
+        except ProviderBusy:
+            raise
+        except Exception as agent_error:
+            logger.error("Error during graph turn for %s: %s", session_id, agent_error, exc_info=True)
+            return InteractionResponse(
+                session_id=session_id, text="An error occurred processing your request.", is_done=False,
+                status="error", error_message=str(agent_error), processing_time=round(time.time() - start_time, 2),
+            )
+        finally:
+            _inflight_turns -= 1
+            _turn_seconds.observe(time.time() - stage_start)
+        stage_timings["agent"] = round(time.time() - stage_start, 4)
+
+    messages = state.get("messages") or []
+    agent_text = messages[-1].content if messages and isinstance(messages[-1], AIMessage) else None
+    reply = agent_text or "Sorry, an internal error occurred."
+    if language != ENGLISH:
+        stage_start = time.time()
+        reply = await translate_text(reply, ENGLISH, language, shed=False) or reply
+        stage_timings["translate_out"] = round(time.time() - stage_start, 4)
+    stage_start = time.time()
+    audio_output = await text_to_speech(reply, language, shed=False)
+    stage_timings["tts"] = round(time.time() - stage_start, 4)
+
+    return InteractionResponse(
+        session_id=session_id,
+        text=reply,
+        audio_base64=audio_output,
+        is_done=state.get("done", False),
+        current_url=state.get("url"),
+        status="success" if agent_text else "error",
+        error_message=None if agent_text else "Agent did not produce a response.",
+        processing_time=round(time.time() - start_time, 2),
+        stage_timings=stage_timings,
+    )
+
+
+@router.delete("/clear_session/{session_id}", status_code=204)
+async def clear_session_state(session_id: str):
+    if not await _known(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    async with sessions.get(session_id):
+        if hasattr(graph.checkpointer, "adelete_thread"):
+            await graph.checkpointer.adelete_thread(session_id)
+        sessions.discard(session_id)
+        languages.discard(session_id)
+        responses.discard(session_id)
+    logger.info("Cleared state for session: %s", session_id)
+
+
+@router.get("/get_session_state/{session_id}")
+async def get_session_state_debug(session_id: str):
+    if not await _known(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    snapshot = await graph.aget_state(_config(session_id))
+    state_copy = dict(snapshot.values or {})
+    state_copy["messages"] = [
+        {"type": type(msg).__name__, "content": getattr(msg, "content", str(msg))}
+        for msg in state_copy.get("messages", [])
+    ]
+    state_copy["next"] = list(snapshot.next)
+    return state_copy
+
+
+@router.get("/metrics")
+async def metrics(format: str = "json"):
+    if format == "prometheus":
+        return PlainTextResponse(REGISTRY.render_prometheus())
+    return REGISTRY.snapshot()
+
+
+async def provider_busy_handler(request, exc: ProviderBusy):
+    retry_after = max(1, round(exc.retry_after))
+    logger.warning("Shedding request to %s: %s", request.url.path, exc)
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": str(retry_after)},
+        content={"status": "busy", "error_message": "Service is busy, please retry.", "retry_after": retry_after},
+    )
+
+
+# --- Admin: CPU profiles and memory of this worker (off unless AGENT_ADMIN_TOKEN is set) ---
+def checkpoint_sessions():
+    # In-memory checkpoints only: with SQLite the conversations are on disk, not in this worker
+    storage = getattr(getattr(graph, "checkpointer", None), "storage", None)
+    return [] if storage is None else list(storage.items())
+
+admin = admin_router(checkpoint_sessions)
+
+
+# --- FastAPI App Setup ---
+@contextlib.asynccontextmanager
+async def lifespan(_app: FastAPI):
+    global graph
+    async with open_checkpointer(graph_module.GRAPH_DB) as checkpointer:
+        graph = graph_module.build_graph(checkpointer, asynchronous=True)
+        logger.info("Graph service ready (checkpoints: %s)", graph_module.GRAPH_DB)
+        yield
+    media.shutdown()
+
+
+app = FastAPI(title="Graph Agent Server", lifespan=lifespan)
+app.include_router(router)
+app.include_router(admin)
+app.add_exception_handler(ProviderBusy, provider_busy_handler)
+
+
+@app.get("/")
+async def read_root():
+    return {"message": "Graph agent server is running. Use /start_session and /interact/{session_id}"}
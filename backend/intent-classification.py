@@ -1,10 +1,20 @@
-import urllib.parse
 from typing import TypedDict, Annotated, List, Optional
+from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages
+from langgraph.types import Command, interrupt
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, BaseMessage
 from langchain_groq import ChatGroq
+import logging
 import os
+import sqlite3
+
+from agent_core.forms import load_forms
+from agent_core.logs import configure_logging
+from agent_core.providers import build_llm
+from agent_core.slots import afill_slots, fill_slots
+
+logger = logging.getLogger(__name__)
 
 # --- Environment Variable for API Key (Recommended) ---
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "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") # Replace if needed
@@ -22,32 +32,21 @@ class AgentState(TypedDict, total=False):
     summary: str
     url: str # Stores the *latest* generated URL (base or progress)
     base_url: str # Stores the base URL determined by intent
+    form_mask: int # Answered fields as a bitmask (see agent_core.forms)
 
 # ─────────────────────────────────────────
 # 2. One Groq client for everything
 # ─────────────────────────────────────────
-llm = ChatGroq(
+llm = build_llm(lambda: ChatGroq(
     model="llama-3.3-70b-versatile",
     api_key=GROQ_API_KEY,
     temperature=0
-)
+))
 
 # ─────────────────────────────────────────
 # 3. MODIFIED Intent classifier + Base URL Returner
 # ─────────────────────────────────────────
-PRODUCT_BASE_URL = "https://example.com/post-product"
-POST_BASE_URL = "https://example.com/post-existing-product"
-
-def classify_intent_and_return_base_url(state: AgentState):
-    # Skip if intent already classified
-    if state.get("intent"):
-        print("--> Skipping intent classification (already done)")
-        # If we are re-entering but intent exists, don't add the base URL message again
-        return {}
-
-    print("--> Classifying intent...")
-    user_message = state["messages"][-1] # Classify based on the latest message
-    prompt = """
+INTENT_PROMPT = """
 You are an intent classifier for an agricultural marketplace app.
 Analyze the user message and classify it as exactly ONE of these intents:
 
@@ -65,22 +64,19 @@ Analyze the user message and classify it as exactly ONE of these intents:
 
 Return ONLY the word "product" or "post" without any additional text.
 """
-    response = llm.invoke([
-        SystemMessage(content=prompt),
-        user_message
-    ])
-    intent = response.content.strip().lower().split()[0] if response.content else ""
 
-    if intent not in ("product", "post"):
-        print(f"Warning: Intent '{intent}' not recognized, defaulting to 'product'")
-        intent = "product"
+def _intent_update(reply: str) -> dict:
+    """State update for a classifier reply (shared by the sync and async nodes)."""
+    intent, recognized = forms.parse_intent(reply)
+    if not recognized:
+        logger.warning("Intent '%s' not recognized, defaulting to 'product'", reply)
 
     # Determine base URL based on intent
-    base_url = PRODUCT_BASE_URL if intent == "product" else POST_BASE_URL
-    base_url_with_q = base_url + "?" # Add query marker for clarity
+    base_url = forms.get(intent).base_url
+    base_url_with_q = forms.get(intent).empty_url # Add query marker for clarity
 
-    print(f"--> Intent classified as: {intent}")
-    print(f"--> Base URL identified: {base_url_with_q}")
+    logger.debug("Intent classified as: %s", intent)
+    logger.debug("Base URL identified: %s", base_url_with_q)
 
     # Add the initial message containing *only* the base URL
     initial_message = AIMessage(content=f"Okay, I understand you want to '{intent}'. The base URL for this action is:\n{base_url_with_q}")
@@ -91,115 +87,94 @@ Return ONLY the word "product" or "post" without any additional text.
         "messages": [initial_message], # Add the base URL message
         "url": base_url_with_q, # Set initial URL state
         "product_data": {}, # Ensure product data is initialized/reset here
+        "form_mask": 0,
         "await_key": None, # Ensure await_key is reset
         "done": False,
          "summary": None,
     }
 
+def classify_intent_and_return_base_url(state: AgentState):
+    # Skip if intent already classified
+    if state.get("intent"):
+        logger.debug("Skipping intent classification (already done)")
+        # If we are re-entering but intent exists, don't add the base URL message again
+        return {}
+
+    logger.debug("Classifying intent...")
+    user_message = state["messages"][-1] # Classify based on the latest message
+    response = llm.invoke([
+        SystemMessage(content=INTENT_PROMPT),
+        user_message
+    ])
+    return _intent_update(response.content)
+
+async def aclassify_intent_and_return_base_url(state: AgentState):
+    """Async variant for the graph service (llm.ainvoke)."""
+    if state.get("intent"):
+        return {}
+    response = await llm.ainvoke([SystemMessage(content=INTENT_PROMPT), state["messages"][-1]])
+    return _intent_update(response.content)
+
 # ─────────────────────────────────────────
-# 4. Question lists
+# 4. Question lists (compiled once from agent_core/forms.py)
 # ─────────────────────────────────────────
-product_fields = [
-    ("ProductName",              "What is the product name?"),
-    ("Category",                 "Which category does it belong to?"),
-    ("Description_about_the_crop","Briefly describe the crop."),
-    ("Price_per_kg",             "Price per kg (numbers only)."),
-    ("Total_quantity_produced",  "Total quantity produced (numbers only).")
-]
-
-post_fields = [
-    ("ExistingProduct",  "Which existing product do you want to post?"),
-    ("Caption",          "What caption would you like to use?"),
-    ("AdditionalMessage","Any additional message? (or 'none')")
-]
+forms = load_forms("example")
+PRODUCT_BASE_URL = forms.get("product").base_url
+POST_BASE_URL = forms.get("post").base_url
+product_fields = forms.get("product").pairs
+post_fields = forms.get("post").pairs
 
 # ─────────────────────────────────────────
 # 5. Helper: summarizer LLM call (Unchanged)
 # ─────────────────────────────────────────
 def summarize(intent: str, data: dict) -> str:
-    print(f"--> Generating summary for intent '{intent}'...")
-    if intent == "product":
-        prompt = (
-            "You are a marketplace assistant. Using the details below, "
-            "write a short, compelling product listing (max 60 words).\n"
-            f"Details: {data}"
-        )
-    else: # 'post' intent
-        prompt = (
-            "You are a social‑media assistant. Combine the details below "
-            "into a catchy post caption (max 40 words).\n"
-            f"Details: {data}"
-        )
+    logger.debug("Generating summary for intent '%s'...", intent)
+    prompt = forms.get(intent).summary_prompt(data)
     summary = llm.invoke(prompt).content.strip()
-    print(f"--> Summary generated.")
+    logger.debug("Summary generated.")
     return summary
 
-# ─────────────────────────────────────────
-# 6. Helper: URL Generator (Unchanged)
-# ─────────────────────────────────────────
-def generate_url(base_url: str, data: dict) -> str:
-    """Generates a URL with query parameters from a dictionary."""
-    # Ensure base_url ends with '?' if needed and data exists
-    url_prefix = base_url
-    if data and not url_prefix.endswith('?'):
-        url_prefix += '?'
-    elif not data and not url_prefix.endswith('?'):
-         url_prefix += '?' # Ensure even empty URL has '?' if base didn't
-
-    params = "&".join(
-        f"{urllib.parse.quote_plus(k.replace('_','-'))}="
-        f"{urllib.parse.quote_plus(str(v))}" for k, v in data.items() if v
-    )
-    return url_prefix + params if data else url_prefix # Avoid trailing '?' if no params generated
+async def asummarize(intent: str, data: dict) -> str:
+    return (await llm.ainvoke(forms.get(intent).summary_prompt(data))).content.strip()
 
 # ─────────────────────────────────────────
-# 7. MODIFIED Generic form runner - Asks First Question or Processes Answer
+# 6. MODIFIED Generic form runner - Asks First Question or Processes Answer
 # ─────────────────────────────────────────
-def run_form(state: AgentState):
+def _form_inputs(state: AgentState):
+    """(intent, form, data, key_to_save, utterance) for one form step."""
     intent = state["intent"]
-    fields = product_fields if intent == "product" else post_fields
-    base_url = state["base_url"] # Get base URL from state
     data = state.get("product_data", {})
-    messages_to_add = []
-
-    print(f"--> Running form for intent: {intent}")
+    logger.debug("Running form for intent: %s", intent)
 
     # --- Check if we need to save an answer ---
     key_to_save = state.get("await_key")
-    # Only save if await_key is set AND the last message is from the user
-    if key_to_save and isinstance(state["messages"][-1], HumanMessage):
-        last_user_message = state["messages"][-1].content.strip()
-        print(f"--> Saving answer for '{key_to_save}': '{last_user_message}'")
-        data[key_to_save] = last_user_message
-    # Clear await_key regardless of whether we saved (prevents resaving)
-    # It will be set again if we ask another question.
+    utterance = None
+    # Only extract if the last message is from the user; it may fill several fields
+    if state.get("messages") and isinstance(state["messages"][-1], HumanMessage):
+        utterance = state["messages"][-1].content
+        logger.debug("Extracting answers (awaiting '%s') from: '%s'", key_to_save, utterance.strip())
+    return intent, forms.get(intent), data, key_to_save, utterance
+
+def _form_update(state: AgentState, data: dict, step, summary_text: Optional[str]) -> dict:
+    """State update after a form step; summary_text is only given once the form is done."""
+    messages_to_add = []
+    # await_key is cleared regardless of whether we saved (prevents resaving)
+    # and set again below if we ask another question.
     current_await_key = None
+    current_url = step.url # URL based on *current* data
 
-    # --- Determine next step: Ask next question OR finalize ---
-    next_key_to_ask = None
-    question_to_ask = None
-    for key, q in fields:
-        if key not in data: # Find the first key *not* present in data
-            next_key_to_ask = key
-            question_to_ask = q
-            break # Stop at the first unanswered question
-
-    current_url = generate_url(base_url, data) # Generate URL based on *current* data
-
-    if next_key_to_ask and question_to_ask:
-        print(f"--> Asking next question for key: '{next_key_to_ask}'")
+    if not step.done:
+        logger.debug("Asking next question for key: '%s'", step.key)
         msg_content = (
-            f"{question_to_ask}\n(please type your answer)\n\n"
+            f"{step.prompt}\n(please type your answer)\n\n"
             f"Current progress URL: {current_url}"
         )
         messages_to_add.append(AIMessage(content=msg_content))
-        current_await_key = next_key_to_ask # Set key we are waiting for
+        current_await_key = step.key # Set key we are waiting for
         is_done = False
         summary_text = state.get("summary") # Keep existing summary if any
     else:
         # --- All questions answered → Finalize ---
-        print("--> All questions answered. Finalizing.")
-        summary_text = summarize(intent, data)
         # URL already calculated as current_url with all data
         msg_content = (f"All questions answered! Here is a concise summary:\n\n{summary_text}\n\n"
                        f"Final submission link:\n{current_url}")
@@ -209,6 +184,7 @@ def run_form(state: AgentState):
 
     return {
         "product_data": data,
+        "form_mask": step.mask,
         "await_key": current_await_key,
         "done": is_done,
         "url": current_url, # Store current URL in state
@@ -216,67 +192,143 @@ def run_form(state: AgentState):
         "messages": messages_to_add # Add the new AI message
     }
 
+def run_form(state: AgentState):
+    intent, form, data, key_to_save, utterance = _form_inputs(state)
+
+    # --- Determine next step: Ask next question OR finalize ---
+    step = fill_slots(form, data, utterance, key_to_save, llm, state.get("form_mask"), state.get("url"))
+    summary_text = None
+    if step.done:
+        logger.debug("All questions answered. Finalizing.")
+        summary_text = summarize(intent, data)
+    return _form_update(state, data, step, summary_text)
+
+async def arun_form(state: AgentState):
+    """Async variant of run_form for the graph service (llm.ainvoke)."""
+    intent, form, data, key_to_save, utterance = _form_inputs(state)
+    step = await afill_slots(form, data, utterance, key_to_save, llm, state.get("form_mask"), state.get("url"))
+    summary_text = await asummarize(intent, data) if step.done else None
+    return _form_update(state, data, step, summary_text)
+
 
 # Node wrappers remain simple calls to run_form
 def product_form(state):
-    print("--> Entering product_form node")
+    logger.debug("Entering product_form node")
     return run_form(state)
 def post_form(state):
-    print("--> Entering post_form node")
+    logger.debug("Entering post_form node")
     return run_form(state)
 
+def await_answer(state: AgentState):
+    """Pauses the graph until the user answers; resumed with Command(resume=<answer>)."""
+    answer = interrupt({"await_key": state.get("await_key"), "url": state.get("url")})
+    logger.debug("Resumed with answer for '%s'", state.get('await_key'))
+    return {"messages": [HumanMessage(content=answer)]}
+
 # ─────────────────────────────────────────
-# 8. LangGraph wiring
+# 7. LangGraph wiring
 # ─────────────────────────────────────────
-workflow = StateGraph(AgentState)
-
-# Node 1: Classify intent and return base URL message
-workflow.add_node("classify_intent", classify_intent_and_return_base_url)
-
-# Node 2 & 3: Form runners (ask questions / finalize)
-workflow.add_node("product_form", product_form)
-workflow.add_node("post_form",    post_form)
-
-# Start at classification
-workflow.set_entry_point("classify_intent")
-
-# Edge 1: After classification, go to the correct form
-workflow.add_conditional_edges(
-    "classify_intent",
-    lambda s: s["intent"],
-    {"product": "product_form", "post": "post_form"}
-)
-
-# Edge 2: Loop within forms or end
+# Each turn used to re-invoke the graph from classify_intent with the whole
+# state. Now a form node that asks a question routes to an "await_<form>"
+# node that interrupts; the checkpointer persists the thread there and the
+# next reply resumes straight into the form node.
+GRAPH_DB = os.getenv("AGENT_GRAPH_DB", "graph_checkpoints.sqlite")
+
+def make_checkpointer(path: str = GRAPH_DB):
+    """SQLite checkpointer so paused conversations survive restarts (in-memory without langgraph-checkpoint-sqlite)."""
+    try:
+        from langgraph.checkpoint.sqlite import SqliteSaver
+    except ImportError:
+        logger.warning("langgraph-checkpoint-sqlite is not installed, checkpoints are kept in memory")
+        return MemorySaver()
+    return SqliteSaver(sqlite3.connect(path, check_same_thread=False))
+
+# Edge 2: Ask the next question (pause) or end
 def continue_form_loop(state: AgentState) -> str:
     """Determines if the form needs more input or should end."""
     if state.get("done"):
-        print("--> Form loop condition: Done=True, routing to END")
-        return END # End the graph if 'done' is True
+        logger.debug("Form loop condition: Done=True, routing to END")
+        return "end"
     elif state.get("await_key"):
-         # If we are waiting for an answer, stay in the graph but wait for human input
-         # The graph technically ends the current run here, expecting next invoke with user input
-         print(f"--> Form loop condition: await_key='{state['await_key']}', waiting for user input (Implicit END for this run)")
-         # NOTE: LangGraph implicitly handles this. We don't loop back immediately.
-         # The next app.invoke() call with the user's answer will restart the flow,
-         # hit the appropriate form node again, and the logic inside run_form() will save the answer.
-         # We return END here to signify the *current invocation* is finished.
-         return END
+        logger.debug("Form loop condition: await_key='%s', pausing for user input", state['await_key'])
+        return "await"
     else:
-       # This case should ideally not be reached if logic is correct (either done or await_key is set)
-       # But as a fallback, route to end.
-        print("--> Form loop condition: No await_key and not done. Fallback to END.")
-        return END
+        # Should not happen (either done or await_key is set); end instead of looping
+        logger.debug("Form loop condition: No await_key and not done. Fallback to END.")
+        return "end"
+
+def build_graph(checkpointer=None, asynchronous: bool = False):
+    """Compiles the graph; asynchronous=True uses the llm.ainvoke nodes (run with ainvoke/astream)."""
+    workflow = StateGraph(AgentState)
+
+    # Node 1: Classify intent and return base URL message
+    workflow.add_node("classify_intent", aclassify_intent_and_return_base_url if asynchronous
+                      else classify_intent_and_return_base_url)
+
+    # Node 2 & 3: Form runners (ask questions / finalize), each with its pause node
+    workflow.add_node("product_form", arun_form if asynchronous else product_form)
+    workflow.add_node("post_form",    arun_form if asynchronous else post_form)
+    workflow.add_node("await_product", await_answer)
+    workflow.add_node("await_post",    await_answer)
+
+    # Start at classification (only for the first message of a request)
+    workflow.set_entry_point("classify_intent")
+
+    # Edge 1: After classification, go to the correct form
+    workflow.add_conditional_edges(
+        "classify_intent",
+        lambda s: s["intent"],
+        {"product": "product_form", "post": "post_form"}
+    )
+    workflow.add_conditional_edges("product_form", continue_form_loop, {"await": "await_product", "end": END})
+    workflow.add_conditional_edges("post_form", continue_form_loop, {"await": "await_post", "end": END})
+    workflow.add_edge("await_product", "product_form")
+    workflow.add_edge("await_post", "post_form")
 
+    return workflow.compile(checkpointer=checkpointer)
 
-# Add edges from form nodes based on 'done' state or if waiting for input
-# If not done, the current invocation ends, waiting for the user's reply.
-# The next invocation will trigger the same form node again.
-workflow.add_conditional_edges("product_form", continue_form_loop)
-workflow.add_conditional_edges("post_form", continue_form_loop)
 
+app = build_graph(make_checkpointer())
 
-app = workflow.compile()
+def _new_request(user_input: str) -> dict:
+    # Clears the task fields of the previous request on the thread, keeps the history
+    return {
+        "messages": [HumanMessage(content=user_input)],
+        "intent": None, "product_data": None, "await_key": None, "done": False,
+        "summary": None, "url": None, "base_url": None, "form_mask": 0,
+    }
+
+def chat_turn(graph, user_input: str, thread_id: str) -> dict:
+    """Runs one user turn: resumes a paused thread, or starts a new request on it."""
+    config = {"configurable": {"thread_id": thread_id}, "recursion_limit": 10}
+    if graph.get_state(config).next:
+        return graph.invoke(Command(resume=user_input), config)
+    return graph.invoke(_new_request(user_input), config)
+
+async def achat_turn(graph, user_input: str, thread_id: str) -> dict:
+    """chat_turn for a graph built with asynchronous=True."""
+    config = {"configurable": {"thread_id": thread_id}, "recursion_limit": 10}
+    if (await graph.aget_state(config)).next:
+        return await graph.ainvoke(Command(resume=user_input), config)
+    return await graph.ainvoke(_new_request(user_input), config)
+
+def _bound_request(intent: str) -> dict:
+    # A request whose form is already known (the page it was opened from): classify_intent passes through
+    form = forms.get(intent)
+    return {
+        "messages": [], "intent": intent, "product_data": {}, "await_key": None, "done": False,
+        "summary": None, "url": form.empty_url, "base_url": form.base_url, "form_mask": 0,
+    }
+
+def start_form(graph, intent: str, thread_id: str) -> dict:
+    """Starts a request on the ``intent`` form without an LLM call; pauses at its first question."""
+    config = {"configurable": {"thread_id": thread_id}, "recursion_limit": 10}
+    return graph.invoke(_bound_request(intent), config)
+
+async def astart_form(graph, intent: str, thread_id: str) -> dict:
+    """start_form for a graph built with asynchronous=True."""
+    config = {"configurable": {"thread_id": thread_id}, "recursion_limit": 10}
+    return await graph.ainvoke(_bound_request(intent), config)
 
 # Optional visualization
 # try:
@@ -285,16 +337,16 @@ app = workflow.compile()
 #     pass
 
 # ─────────────────────────────────────────
-# 9. Interactive demo
+# 8. Interactive demo
 # ─────────────────────────────────────────
 if __name__ == "__main__":
+    configure_logging(fmt=os.getenv("AGENT_LOG_FORMAT", "text"))  # the graph's step log, below the chat
     print("\n=== Agricultural Marketplace Agent ===")
     print("Type 'quit' or 'exit' to end.")
     print("===================================")
 
-    # Initialize state
-    # Need to start with an empty list that add_messages can work with
-    current_state = AgentState(messages=[])
+    # The checkpointer holds the conversation; a paused thread is resumed on restart
+    thread_id = os.getenv("AGENT_GRAPH_THREAD", "cli")
 
     while True:
         user_input = input("You: ")
@@ -302,19 +354,10 @@ if __name__ == "__main__":
             print("Exiting chat.")
             break
 
-        # Add user message to the list for the *next* invocation
-        # Use add_messages correctly by passing the existing list and the new message
-        updated_messages = add_messages(current_state.get("messages", []), [HumanMessage(content=user_input)])
-        current_state["messages"] = updated_messages
-
-
         print("\n--- Agent thinking ---")
         try:
-            # Invoke the graph. It will run until it needs input or finishes.
-            response_state = app.invoke(current_state, {"recursion_limit": 10})
-
-            # Update the state for the next iteration
-            current_state = response_state
+            # Runs until the graph pauses for the next answer or finishes
+            current_state = chat_turn(app, user_input, thread_id)
 
             # Print the *last* message added by the agent in this turn
             if current_state.get("messages"):
@@ -330,19 +373,7 @@ if __name__ == "__main__":
             if current_state.get("done"):
                 print("\n--- Process Complete ---")
                 print("You can start a new request or type 'quit'.")
-                # Reset state for a potentially new request *except* messages
-                # Keep messages for conversation history view, but clear task-specific state
-                current_state = AgentState(
-                    messages=current_state.get("messages", []), # Keep history
-                    intent=None,
-                    product_data=None,
-                    await_key=None,
-                    done=False,
-                    summary=None,
-                    url=None,
-                    base_url=None
-                 )
-
+                # The next message starts a new request on the same thread (see chat_turn)
 
         except Exception as e:
             print(f"\n--- Error encountered ---")
@@ -350,9 +381,5 @@ if __name__ == "__main__":
             import traceback
             traceback.print_exc() # Print detailed traceback for debugging
             # Optionally print state upon error
-            print("State at error:", current_state)
+            print("State at error:", app.get_state({"configurable": {"thread_id": thread_id}}).values)
             print("An error occurred. Please try again or type 'quit' to exit.")
-            # Reset potentially problematic state keys
-            current_state['await_key'] = None
-            current_state['done'] = False # Ensure not stuck in done state
-            # break # Or continue allowing user to try again
\ No newline at end of file
@@ -1,10 +1,18 @@
-import urllib.parse
 from typing import TypedDict, Annotated, List, Optional, Tuple
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, BaseMessage
 from langchain_groq import ChatGroq
+import logging
 import os
 from copy import deepcopy # To avoid modifying input state directly
 
+from agent_core.bulk import BULK_INTENT, bulk_result, extract_rows, is_finish, summarize_rows
+from agent_core.forms import load_forms
+from agent_core.logs import configure_logging
+from agent_core.providers import build_llm
+from agent_core.slots import fill_slots
+
+logger = logging.getLogger(__name__)
+
 # --- Environment Variable for API Key (Recommended) ---
 # Ensure you have GROQ_API_KEY set in your environment,
 # or replace the default fallback value.
@@ -22,86 +30,78 @@ class AgentState(TypedDict, total=False):
     summary: str
     url: str # Stores the *latest* generated URL (base or progress or final)
     base_url: str # Stores the base URL determined by intent
+    form_mask: int # Answered fields as a bitmask (see agent_core.forms)
+    bulk_rows: List[dict] # Products dictated so far in bulk mode (see agent_core.bulk)
+    bulk_result: dict # Final bulk payload: per-item data, URL, summary, missing fields
 
 # ─────────────────────────────────────────
 # 2. One Groq client for everything (Unchanged)
 # ─────────────────────────────────────────
-llm = ChatGroq(
+llm = build_llm(lambda: ChatGroq(
     model="llama-3.3-70b-versatile", # Using 3.1 as 3.3 might not be available/stable
     api_key=GROQ_API_KEY,
     temperature=0
-)
+))
 
 # ─────────────────────────────────────────
-# 3. Constants and Field Definitions (Extracted)
+# 3. Constants and Field Definitions ("app" profile in agent_core/forms.py)
 # ─────────────────────────────────────────
-PRODUCT_BASE_URL = "/app/add/product"
-POST_BASE_URL = "/app/add/post"
-
-product_fields = [
-    ("name",              "What is the product name?"),
-    ("category",                 "Which category does it belong to?"),
-    ("description","Briefly describe the crop."),
-    ("price",             "Price per kg (numbers only)."),
-    ("quantity",  "Total quantity produced (numbers only)."),
-    ("unit",  "units in")
-
-]
-
-post_fields = [
-    ("productId",  "Which existing product do you want to post?"),
-    ("content",          "What caption would you like to use?"),
-    # ("AdditionalMessage","Any additional message? (or 'none')")
-]
+forms = load_forms("app")
+PRODUCT_BASE_URL = forms.get("product").base_url
+POST_BASE_URL = forms.get("post").base_url
+product_fields = forms.get("product").pairs
+post_fields = forms.get("post").pairs
 
 # ─────────────────────────────────────────
-# 4. Helper: summarizer LLM call (Unchanged)
+# 4. Helpers: summarizer LLM call and bulk listing
 # ─────────────────────────────────────────
 def summarize(intent: str, data: dict) -> str:
-    print(f"--> Generating summary for intent '{intent}'...")
-    if intent == "product":
-        prompt = (
-            "You are a marketplace assistant. Using the details below, "
-            "write a short, compelling product listing (max 60 words).\n"
-            f"Details: {data}"
-        )
-    else: # 'post' intent
-        prompt = (
-            "You are a social‑media assistant. Combine the details below "
-            "into a catchy post caption (max 40 words).\n"
-            f"Details: {data}"
-        )
+    logger.debug("Generating summary for intent '%s'...", intent)
+    prompt = forms.get(intent).summary_prompt(data)
     try:
         summary_text = llm.invoke(prompt).content.strip()
-        print(f"--> Summary generated.")
+        logger.debug("Summary generated.")
         return summary_text
     except Exception as e:
-        print(f"Error during summary generation: {e}")
+        logger.error("Error during summary generation: %s", e)
         return "[Error generating summary]"
 
-# ─────────────────────────────────────────
-# 5. Helper: URL Generator (Unchanged)
-# ─────────────────────────────────────────
-def generate_url(base_url: str, data: dict) -> str:
-    """Generates a URL with query parameters from a dictionary."""
-    url_prefix = base_url
-    query_params = []
-    for k, v in data.items():
-        if v is not None and str(v).strip(): # Ensure value exists and is not empty string
-             # Replace underscore with hyphen for URL key, handle None/empty values
-            url_key = urllib.parse.quote_plus(k.replace('_', '-'))
-            url_value = urllib.parse.quote_plus(str(v))
-            query_params.append(f"{url_key}={url_value}")
-
-    if query_params:
-        return f"{url_prefix}?{'&'.join(query_params)}"
+def run_bulk_step(state: AgentState, user_input: str) -> Tuple[str, str, Optional[str]]:
+    """One bulk-listing turn: add the products in user_input, or finish on 'done'.
+    Returns (response_message, url(s), placeholder_name)."""
+    form = forms.get("product")
+    rows = state.setdefault("bulk_rows", [])
+
+    if is_finish(user_input) and rows:
+        logger.debug("Finishing bulk listing: %s products, one batched summary call", len(rows))
+        result = bulk_result(form, rows, summarize_rows(form, rows, llm))
+        lines = []
+        for item in result["items"]:
+            line = f"{item['index']}. {item['data'].get('name', 'Product')}: {item['summary']}\n   {item['url']}"
+            if item["missing"]:
+                line += f"\n   (still missing: {', '.join(item['missing'])})"
+            lines.append(line)
+        state["bulk_result"] = result
+        state["summary"] = "\n".join(item["summary"] for item in result["items"])
+        state["done"] = True
+        state["await_key"] = None
+        urls = "\n".join(item["url"] for item in result["items"])
+        return (f"All {result['count']} products are ready ({result['complete']} complete):\n\n"
+                + "\n\n".join(lines)), urls, "SUMMARY"
+
+    added = extract_rows(form, user_input, llm)
+    rows.extend(added)
+    state["done"] = False
+    logger.debug("Bulk: %s products added, %s in total", len(added), len(rows))
+    names = ", ".join(str(row.get("name", "?")) for row in rows)
+    if not added:
+        msg = "I couldn't find a product in that. Tell me the products with quantity and price, e.g. 'tomatoes 50 kg at 30 per kg'."
     else:
-        # Return base URL with '?' only if it doesn't already have one
-        return url_prefix if url_prefix.endswith('?') else url_prefix + '?'
-
+        msg = f"Added {len(added)} product(s). So far: {names}."
+    return f"{msg}\nSay the next products, or 'done' to finish.", form.empty_url, "BULK"
 
 # ─────────────────────────────────────────
-# 6. The Consolidated Processing Function
+# 5. The Consolidated Processing Function
 # ─────────────────────────────────────────
 def process_input_and_generate_url(
     user_input: str,
@@ -122,7 +122,7 @@ def process_input_and_generate_url(
         - placeholder_name: The key of the next expected input,
                            'SUMMARY' if finished, or None.
     """
-    print(f"\n--- Processing Input: '{user_input}' ---")
+    logger.debug("Processing input: '%s'", user_input)
     # --- State Initialization and Update ---
     # Create a deep copy to avoid modifying the original state dict
     state = deepcopy(current_state)
@@ -138,7 +138,7 @@ def process_input_and_generate_url(
 
     # Reset 'done' flag if starting a new interaction after completion
     if state.get("done"):
-        print("--> Resetting state for new request (detected done=True)")
+        logger.debug("Resetting state for new request (detected done=True)")
         state = AgentState(messages=state["messages"]) # Keep history, clear rest
 
     # --- Local variables ---
@@ -148,7 +148,7 @@ def process_input_and_generate_url(
 
     # --- Intent Classification (if needed) ---
     if not state.get("intent"):
-        print("--> Classifying intent...")
+        logger.debug("Classifying intent...")
         intent_prompt = """
 You are an intent classifier for an agricultural marketplace app.
 Analyze the user message and classify it as exactly ONE of these intents:
@@ -165,90 +165,92 @@ Analyze the user message and classify it as exactly ONE of these intents:
    - "I need to advertise the cotton I already listed"
    - "Help me create a post for my listed mangoes"
 
-Return ONLY the word "product" or "post" without any additional text.
+3. "bulk" - When the user wants to list several products in one go
+   Examples:
+   - "I want to list all my crops"
+   - "Add tomatoes 50 kg, onions 2 quintals and 300 coconuts"
+
+Return ONLY the word "product", "post" or "bulk" without any additional text.
 """
         try:
             response = llm.invoke([
                 SystemMessage(content=intent_prompt),
                 HumanMessage(content=user_input) # Classify based on the *current* input
             ])
-            intent = response.content.strip().lower().split()[0] if response.content else ""
+            intent, recognized = forms.parse_intent(response.content, extra=(BULK_INTENT,))
+            if not recognized:
+                logger.warning("Intent '%s' not recognized, defaulting to 'product'", response.content)
 
-            if intent not in ("product", "post"):
-                print(f"Warning: Intent '{intent}' not recognized, defaulting to 'product'")
-                intent = "product"
+            base_url = forms.get(intent).base_url
+            initial_url = forms.get(intent).empty_url # URL to show initially
 
-            base_url = PRODUCT_BASE_URL if intent == "product" else POST_BASE_URL
-            initial_url = base_url + "?" # URL to show initially
-
-            print(f"--> Intent classified as: {intent}")
-            print(f"--> Base URL identified: {initial_url}")
+            logger.debug("Intent classified as: %s", intent)
+            logger.debug("Base URL identified: %s", initial_url)
 
             # Update state *after* classification
             state["intent"] = intent
             state["base_url"] = base_url
             state["url"] = initial_url
             state["product_data"] = {} # Reset data for new intent
+            state["form_mask"] = 0
             state["await_key"] = None
             state["done"] = False
             state["summary"] = None
+            state["bulk_rows"] = []
 
             # Don't add a separate base URL message, proceed directly to first question
             # generated_url = initial_url # Set generated_url for this turn
             # placeholder_name = None # No specific data awaited yet
 
         except Exception as e:
-            print(f"Error during intent classification: {e}")
+            logger.error("Error during intent classification: %s", e)
             ai_response_content = "Sorry, I couldn't understand your request due to an error. Please try again."
             state["messages"].append(AIMessage(content=ai_response_content))
             return state, ai_response_content, state.get("base_url", "") + "?", None # Return safe defaults
 
+    # --- Bulk listing: products are rows, no per-field questions ---
+    if state.get("intent") == BULK_INTENT:
+        ai_response_content, generated_url, placeholder_name = run_bulk_step(state, user_input)
+        state["url"] = generated_url
+        state["messages"].append(AIMessage(content=ai_response_content))
+
     # --- Form Processing (Runs if intent is now set) ---
-    if state.get("intent"):
+    elif state.get("intent"):
         intent = state["intent"]
-        fields = product_fields if intent == "product" else post_fields
-        base_url = state["base_url"]
+        form = forms.get(intent)
         data = state["product_data"] # Use the data from the current state
 
-        # --- Check if the current input is an answer to a previous question ---
+        # --- Extract answers from the current input ---
+        # It answers the awaited key (if any) and may fill several other fields,
+        # e.g. the intent message "50 kg tomatoes at Rs 30/kg" already has price/quantity/unit
         key_to_save = state.get("await_key")
-        if key_to_save:
-            # Assume user_input is the answer to the awaited key
-            print(f"--> Saving answer for '{key_to_save}': '{user_input}'")
-            data[key_to_save] = user_input.strip()
-            state["await_key"] = None # Clear the await key after saving
-
-        # --- Determine next step: Ask next question OR finalize ---
-        next_key_to_ask = None
-        question_to_ask = None
-        for key, q in fields:
-            if key not in data: # Find the first key *not* present in data
-                next_key_to_ask = key
-                question_to_ask = q
-                break # Stop at the first unanswered question
-
-        # --- Generate URL based on current data ---
-        # This happens *after* potentially saving an answer
-        generated_url = generate_url(base_url, data)
+        logger.debug("Extracting answers (awaiting '%s') from: '%s'", key_to_save, user_input)
+        state["await_key"] = None # Cleared here, set again if another question is asked
+
+        # --- Determine next step and the URL for the current data ---
+        # This happens *after* saving the extracted answers
+        step = fill_slots(form, data, user_input, key_to_save, llm, state.get("form_mask"), state.get("url"))
+        generated_url = step.url
         state["url"] = generated_url # Update URL in state
+        state["form_mask"] = step.mask
 
-        if next_key_to_ask and question_to_ask:
+        if not step.done:
             # --- Ask the next question ---
-            print(f"--> Asking next question for key: '{next_key_to_ask}'")
+            logger.debug("Asking next question for key: '%s'", step.key)
             msg_content = (
-                f"{question_to_ask}\n(please type your answer)\n\n"
+                f"{step.prompt}\n(please type your answer)\n\n"
                 f"Current progress URL: {generated_url}"
             )
             ai_response_content = msg_content
-            state["await_key"] = next_key_to_ask # Set key we are waiting for
+            state["await_key"] = step.key # Set key we are waiting for
             state["done"] = False
-            placeholder_name = next_key_to_ask
-            print(f"--> State: done=False, awaiting='{next_key_to_ask}'")
+            placeholder_name = step.key
+            logger.debug("State: done=False, awaiting='%s'", step.key)
 
         else:
             # --- All questions answered → Finalize ---
             if not state.get("done"): # Only finalize once
-                print("--> All questions answered. Finalizing.")
+                logger.debug("All questions answered. Finalizing.")
                 summary_text = summarize(intent, data)
                 state["summary"] = summary_text
                 # URL already calculated as generated_url with all data
@@ -259,10 +261,10 @@ Return ONLY the word "product" or "post" without any additional text.
                 state["await_key"] = None # No longer waiting
                 state["done"] = True
                 placeholder_name = "SUMMARY"
-                print(f"--> State: done=True, summary generated.")
+                logger.debug("State: done=True, summary generated.")
             else:
                 # If already done, just provide a reminder
-                print("--> Already finalized. Reminding user.")
+                logger.debug("Already finalized. Reminding user.")
                 ai_response_content = ("Looks like we've already completed that request. "
                                        f"The final summary was:\n\n{state['summary']}\n\n"
                                        f"Final URL:\n{generated_url}\n\n"
@@ -274,16 +276,18 @@ Return ONLY the word "product" or "post" without any additional text.
             state["messages"].append(AIMessage(content=ai_response_content))
 
     # --- Return the results ---
-    print(f"--- Returning State: await='{state.get('await_key')}', done='{state.get('done')}', url='{generated_url}' ---")
+    logger.debug("Returning state: await='%s', done='%s', url='%s'",
+                 state.get('await_key'), state.get('done'), generated_url)
     return state, ai_response_content, generated_url, placeholder_name
 
 # ─────────────────────────────────────────
-# 7. Interactive Demo using the single function
+# 6. Interactive Demo using the single function
 # ─────────────────────────────────────────
 if __name__ == "__main__":
+    configure_logging(fmt=os.getenv("AGENT_LOG_FORMAT", "text"))  # the step log, below the chat
     print("\n=== Agricultural Marketplace Agent (Single Function Version) ===")
     print("Type 'quit' or 'exit' to end.")
-    print("Example commands: 'Add new product', 'Post about my listed wheat'")
+    print("Example commands: 'Add new product', 'Post about my listed wheat', 'List all my crops'")
     print("================================================================")
 
     # Initialize conversation state
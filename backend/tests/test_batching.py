@@ -0,0 +1,54 @@
+"""Tests for agent_core/batching.py (run from ``backend/``: python -m pytest tests)."""
+import asyncio
+import time
+
+from agent_core.batching import MicroBatcher
+
+
+class _Sender:
+    """Records each batch and answers after ``delay`` seconds."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches = []
+
+    async def __call__(self, key, items):
+        self.batches.append(list(items))
+        await asyncio.sleep(self.delay)
+        return [f"{key}:{item}" for item in items]
+
+
+def test_a_lone_call_is_sent_without_waiting():
+    sender = _Sender()
+    batcher = MicroBatcher("test-lone", sender, max_size=8, max_wait=5.0)
+
+    async def run():
+        started = time.perf_counter()
+        result = await batcher.submit("k", "a")
+        return result, time.perf_counter() - started
+
+    result, elapsed = asyncio.run(run())
+    assert result == "k:a" and elapsed < 1.0
+    assert sender.batches == [["a"]]
+
+
+def test_calls_behind_a_request_in_flight_are_batched():
+    sender = _Sender(delay=0.05)
+    batcher = MicroBatcher("test-burst", sender, max_size=8, max_wait=5.0)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit("k", item) for item in "abcd"))
+
+    assert asyncio.run(run()) == ["k:a", "k:b", "k:c", "k:d"]
+    assert sender.batches == [["a"], ["b", "c", "d"]]
+
+
+def test_a_full_batch_is_sent_at_once():
+    sender = _Sender(delay=0.05)
+    batcher = MicroBatcher("test-full", sender, max_size=2, max_wait=5.0)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit("k", item) for item in "abcde"))
+
+    assert asyncio.run(run()) == ["k:a", "k:b", "k:c", "k:d", "k:e"]
+    assert sender.batches == [["a"], ["b", "c"], ["d", "e"]]
@@ -0,0 +1,51 @@
+"""Tests for agent_core/bulk.py (run from ``backend/``: python -m pytest tests)."""
+from agent_core import bulk
+from agent_core.forms import load_forms
+
+FORM = load_forms("example").get("product")
+
+
+class _Reply:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class _LLM:
+    """Returns the same extraction reply for every call."""
+
+    def __init__(self, content: str):
+        self.content = content
+
+    def invoke(self, messages):
+        return _Reply(self.content)
+
+
+def test_split_items_keeps_thousands_separators():
+    assert bulk.split_items("onions 1,200 kg at 25 per kg, tomatoes 50 kg; 300 coconuts") == [
+        "onions 1,200 kg at 25 per kg", "tomatoes 50 kg", "300 coconuts"]
+
+
+def test_split_items_attaches_nameless_pieces_to_the_product_before():
+    assert bulk.split_items("onions 2 quintals, Rs 25/kg and tomatoes") == ["onions 2 quintals Rs 25/kg", "tomatoes"]
+
+
+def test_local_rows():
+    rows = bulk.local_rows(FORM, "onions 1,200 kg at 25 per kg, tomatoes 50 kg at Rs 30/kg")
+    assert rows == [
+        {"Price_per_kg": "25 per kg", "Total_quantity_produced": "1200 kg", "ProductName": "Onions"},
+        {"Price_per_kg": "30 per kg", "Total_quantity_produced": "50 kg", "ProductName": "Tomatoes"},
+    ]
+
+
+def test_llm_numbers_win_when_the_parser_disagrees():
+    # The parser read "1,200" as 200 before the separator fix; a disagreeing local value must not override
+    local = [{"ProductName": "Onions", "Total_quantity_produced": "200 kg", "Price_per_kg": "25 per kg"}]
+    llm = [{"ProductName": "Onion", "Total_quantity_produced": "1200 kg"}]
+    assert bulk._choose(FORM, local, llm) == [
+        {"ProductName": "Onion", "Total_quantity_produced": "1200 kg", "Price_per_kg": "25 per kg"}]
+
+
+def test_extract_rows_keeps_large_quantities():
+    llm = _LLM('[{"ProductName": "Onions", "Total_quantity_produced": "1200 kg", "Price_per_kg": "25"}]')
+    assert bulk.extract_rows(FORM, "onions 1,200 kg at 25 per kg", llm) == [
+        {"ProductName": "Onions", "Price_per_kg": 25, "Total_quantity_produced": 1200}]
@@ -0,0 +1,56 @@
+"""Tests for agent_core/history.py (run from ``backend/``: python -m pytest tests)."""
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+from agent_core.history import HistoryStore, page_messages, stream_messages
+
+
+class _ListOnlyDB:
+    """A DBManager without page methods; counts how often the full list is fetched."""
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.fetches = 0
+
+    async def get_session_messages_async(self, session_id):
+        self.fetches += 1
+        return list(self.messages)
+
+
+def _collect(stream) -> list:
+    async def run():
+        return [chunk async for chunk in stream]
+    return [json.loads(line) for chunk in asyncio.run(run()) for line in chunk.decode().splitlines()]
+
+
+def test_stream_fetches_the_full_list_once():
+    db = _ListOnlyDB([{"id": f"m{i}", "created_at": f"2026-01-01T00:00:{i:02d}"} for i in range(25)])
+    lines = _collect(stream_messages(db, "s", limit=10))
+    assert db.fetches == 1
+    assert [row["id"] for row in lines[:-1]] == [f"m{i}" for i in range(25)]
+    assert lines[-1] == {"next_cursor": None}
+
+
+def test_integer_timestamps_sort_numerically():
+    db = _ListOnlyDB([{"id": "b", "created_at": 10}, {"id": "a", "created_at": 9}, {"id": "c", "created_at": 100}])
+    rows, cursor = asyncio.run(page_messages(db, "s", limit=2))
+    assert [row["id"] for row in rows] == ["a", "b"]
+    rows, cursor = asyncio.run(page_messages(db, "s", cursor, limit=2))
+    assert [row["id"] for row in rows] == ["c"] and cursor is None
+
+
+def test_datetimes_sort_in_time_order():
+    start = datetime(2026, 1, 1, 9)
+    db = _ListOnlyDB([{"id": str(i), "created_at": start + timedelta(hours=h)} for i, h in enumerate([3, 1, 2])])
+    lines = _collect(stream_messages(db, "s", limit=1))
+    assert [row["id"] for row in lines[:-1]] == ["1", "2", "0"]
+
+
+def test_page_methods_are_used_when_present():
+    store = HistoryStore()
+    store.add_messages([(f"m{i}", "s", "user", "hi", f"2026-01-01T00:00:{i:02d}") for i in range(5)])
+    rows, cursor = asyncio.run(page_messages(store, "s", limit=3))
+    assert [row["id"] for row in rows] == ["m0", "m1", "m2"]
+    lines = _collect(stream_messages(store, "s", cursor, limit=3))
+    assert [row["id"] for row in lines[:-1]] == ["m3", "m4"]
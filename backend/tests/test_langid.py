@@ -0,0 +1,29 @@
+"""Tests for agent_core/langid.py (run from ``backend/``: python -m pytest tests)."""
+import pytest
+
+from agent_core.langid import ENGLISH, SessionLanguages
+
+
+@pytest.mark.parametrize("name", ["Ragi", "Jowar", "Tur dal", "Kesar aam", "haan", "Basmati rice"])
+def test_a_product_name_keeps_the_session_language(name):
+    languages = SessionLanguages()
+    assert languages.detect("s", "I want to sell my crop") == ENGLISH
+    assert languages.detect("s", name) == ENGLISH
+
+
+def test_a_product_name_keeps_the_default_for_a_new_session():
+    assert SessionLanguages().detect("s", "Ragi") == ENGLISH
+
+
+def test_a_romanized_sentence_switches():
+    languages = SessionLanguages()
+    languages.detect("s", "I want to sell onions")
+    assert languages.detect("s", "mujhe tamatar bechna hai") == "hi-IN"
+    assert languages.detect("s", "Ragi") == "hi-IN"
+    assert languages.detect("s", "nanage tomato maarabeku") == "kn-IN"
+
+
+def test_native_script_switches_at_once():
+    languages = SessionLanguages()
+    languages.detect("s", "I want to sell onions")
+    assert languages.detect("s", "प्याज") == "hi-IN"
@@ -0,0 +1,76 @@
+"""Regression tests for agent_core/limiter.py (run from ``backend/``: python -m pytest tests)."""
+import asyncio
+
+import pytest
+
+from agent_core.limiter import AdaptiveLimiter, CircuitBreaker, CircuitOpen
+
+
+def _open_breaker() -> AdaptiveLimiter:
+    limiter = AdaptiveLimiter("test", initial_limit=4, breaker=CircuitBreaker(failure_threshold=1, cooldown=0.0))
+    limiter.breaker.record(False)
+    assert limiter.breaker.state == CircuitBreaker.OPEN
+    return limiter
+
+
+def test_cancelled_half_open_probes_are_given_back():
+    limiter = _open_breaker()
+
+    async def probe():
+        async with limiter.slot():
+            await asyncio.sleep(10)
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(probe(), timeout=0.01)
+        assert limiter.breaker.state == CircuitBreaker.HALF_OPEN
+        assert limiter.breaker.probes_in_flight == 0
+        async with limiter.slot():  # a new probe is admitted and closes the circuit
+            pass
+
+    asyncio.run(scenario())
+    assert limiter.breaker.state == CircuitBreaker.CLOSED
+    assert limiter.inflight == 0
+
+
+def test_cancelled_queued_probe_is_given_back():
+    limiter = _open_breaker()
+    limiter.limit = 1.0
+
+    async def scenario():
+        holder_entered = asyncio.Event()
+
+        async def holder():
+            async with limiter.slot():
+                holder_entered.set()
+                await asyncio.sleep(10)
+
+        task = asyncio.create_task(holder())
+        await holder_entered.wait()
+        queued = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert limiter.breaker.probes_in_flight == 0
+        assert limiter.inflight == 0
+        async with limiter.slot():
+            pass
+
+    asyncio.run(scenario())
+    assert limiter.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_open_circuit_still_sheds():
+    limiter = AdaptiveLimiter("test", breaker=CircuitBreaker(failure_threshold=1, cooldown=60.0))
+    limiter.breaker.record(False)
+
+    async def scenario():
+        with pytest.raises(CircuitOpen):
+            await limiter.acquire()
+
+    asyncio.run(scenario())
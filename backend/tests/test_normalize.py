@@ -0,0 +1,81 @@
+"""Tests for agent_core/normalize.py (run from ``backend/``: python -m pytest tests)."""
+import pytest
+
+from agent_core.normalize import clean, parse_number, validate_price, validate_quantity, validate_unit
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1,20,000", 120000),
+    ("1.5 lakh", 150000),
+    ("50k", 50000),
+    ("thirty five", 35),
+    ("two hundred and fifty", 250),
+    ("3 hundred", 300),
+    ("3 hundred fifty", 350),
+    ("2 thousand five hundred", 2500),
+    ("one and a half", 1.5),
+    ("two and a half lakh", 250000),
+    ("half", 0.5),
+    ("1 1/2", 1.5),
+    ("३०", 30),
+])
+def test_parse_number(text, expected):
+    assert parse_number(text) == expected
+
+
+def test_clean_keeps_per_unit_slashes():
+    assert clean("Rs 30/kg") == "Rs 30/kg"
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("2 quintals", 200),
+    ("500 grams", 0.5),
+    ("50", 50),
+    ("about 50", 50),
+    ("50 kg of tomatoes", 50),
+    ("one and a half quintal", 150),
+    ("half a kg", 0.5),
+])
+def test_quantity_in_kg(text, expected):
+    assert validate_quantity(text, "kg") == (expected, None)
+
+
+@pytest.mark.parametrize("text", ["10 dozen", "50 bags", "300 coconuts", "2 litres"])
+def test_quantity_in_other_units_is_reasked(text):
+    value, error = validate_quantity(text, "kg")
+    assert value is None and "in kg" in error
+
+
+def test_quantity_without_base_unit_keeps_the_number():
+    assert validate_quantity("10 dozen") == (10, None)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("₹30", 30),
+    ("30/kg", 30),
+    ("Rs 1200 per quintal", 12),
+    ("2500 per quintal", 25),
+    ("12 per 100 g", 120),
+    ("Rs 50 per 2 kg", 25),
+    ("thirty five rupees per kg", 35),
+])
+def test_price_per_kg(text, expected):
+    assert validate_price(text, "kg") == (expected, None)
+
+
+@pytest.mark.parametrize("text", ["50 rupees a dozen", "Rs 50 per bag", "25 rupees each", "Rs 40 per litre"])
+def test_price_per_other_unit_is_reasked(text):
+    value, error = validate_price(text, "kg")
+    assert value is None and "per kg" in error
+
+
+@pytest.mark.parametrize("text, error", [("", "couldn't find"), ("0", "more than zero"), ("a lot", "couldn't find")])
+def test_price_errors(text, error):
+    value, message = validate_price(text, "kg")
+    assert value is None and error in message
+
+
+def test_unit_follows_base_unit():
+    assert validate_unit("quintal", "kg") == ("kg", None)
+    assert validate_unit("dozen", "kg") == ("dozen", None)
+    assert validate_unit("bags", "kg")[0] is None
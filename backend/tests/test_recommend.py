@@ -0,0 +1,21 @@
+"""Tests for agent_core/recommend.py (run from ``backend/``: python -m pytest tests)."""
+import pytest
+
+from agent_core.recommend import food_of
+
+
+@pytest.mark.parametrize("name, food", [
+    ("Desi Bhindi", "okra"),
+    ("Sweet Potato", "sweet potato"),
+    ("Kesar aam", "mango"),
+    ("Organic Tomatoes", "tomato"),
+])
+def test_fresh_produce_is_matched(name, food):
+    assert food_of(name) == food
+
+
+@pytest.mark.parametrize("name", [
+    "Potato Chips", "Tomato Ketchup", "Mango Pickle", "Aam Papad", "Pumpkin seeds", "Custard apple", "Amla powder",
+])
+def test_processed_goods_and_other_fruits_are_left_out(name):
+    assert food_of(name) is None
@@ -0,0 +1,33 @@
+"""Tests for agent_core/slots.py (run from ``backend/``: python -m pytest tests)."""
+from agent_core import slots
+from agent_core.forms import load_forms
+
+FORM = load_forms("example").get("product")
+
+
+class _Reply:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class _LLM:
+    """Returns the same extraction reply for every call."""
+
+    def __init__(self, content: str):
+        self.content = content
+
+    def invoke(self, messages):
+        return _Reply(self.content)
+
+
+def test_utterance_answers_the_question_when_the_llm_fills_other_fields():
+    utterance = "Kesar from our family orchard, fresh this week"
+    llm = _LLM('{"Description_about_the_crop": "fresh this week"}')
+    data = {}
+    slots.fill_slots(FORM, data, utterance, "ProductName", llm)
+    assert data == {"ProductName": utterance, "Description_about_the_crop": "fresh this week"}
+
+
+def test_utterance_is_not_used_when_the_llm_answers_the_question():
+    values = slots._merge(FORM, "it is Kesar mango", "ProductName", {}, {"ProductName": "Kesar mango"})
+    assert values == {"ProductName": "Kesar mango"}
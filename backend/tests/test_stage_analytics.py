@@ -0,0 +1,45 @@
+"""Tests for agent_core/stage_analytics.py (run from ``backend/``: python -m pytest tests)."""
+import sqlite3
+
+import pytest
+
+from agent_core.stage_analytics import UNKNOWN_LANGUAGE, analyze, turn_query
+
+DAY = 20_000 * 86400  # a whole UTC day, in epoch seconds
+
+
+def _db(language: bool = True) -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:")
+    columns = ("id TEXT, session_id TEXT, role TEXT, created_at TEXT, received_at INTEGER, stt_completed_at INTEGER, "
+               "llm_completed_at INTEGER, tts_completed_at INTEGER")
+    conn.execute(f"CREATE TABLE chat_messages ({columns}{', language TEXT' if language else ''})")
+    rows = []
+    for turn in range(10):
+        start = DAY + turn * 60
+        user = (f"u{turn:02d}", "s", "user", f"{turn:02d}a", start, start + 1, None, None)
+        reply = (f"a{turn:02d}", "s", "assistant", f"{turn:02d}b", None, None, start + 1 + turn, start + 3 + turn)
+        rows += [user + ("hi-IN",), reply + (None,)] if language else [user, reply]
+    conn.executemany(f"INSERT INTO chat_messages VALUES ({', '.join('?' * len(rows[0]))})", rows)
+    return conn
+
+
+def test_turns_are_paired_and_summarized():
+    report = analyze(_db())
+    assert report["turns"] == 10 and report["turns_with_missing_stages"] == 0
+    assert report["overall"]["stt"] == {"count": 10, "p50": 1.0, "p90": 1.0, "p95": 1.0, "p99": 1.0}
+    assert report["overall"]["llm"]["p50"] == 4.0 and report["overall"]["llm"]["p99"] == 9.0
+    assert report["overall"]["total"]["p50"] == 7.0
+    assert list(report["by_language"]) == ["hi-IN"]
+    assert list(report["by_day"]) == ["2024-10-04"]
+
+
+def test_missing_language_column_reports_unknown():
+    report = analyze(_db(language=False))
+    assert list(report["by_language"]) == [UNKNOWN_LANGUAGE]
+
+
+def test_table_without_timestamps_is_rejected():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE chat_messages (id TEXT, session_id TEXT, role TEXT, created_at TEXT)")
+    with pytest.raises(ValueError, match="received_at"):
+        turn_query(conn)
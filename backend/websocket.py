@@ -1,22 +1,18 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from typing import List, Dict, Optional, Any
 import logging
 import torch
 import tempfile
 import os
-import io
-import magic
-from pydub import AudioSegment
 from dotenv import load_dotenv
 from transformers import pipeline, AutoProcessor, AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig, AutoModel, AutoModelForSpeechSeq2Seq
 
 import soundfile as sf
 import librosa
 import numpy as np
-import asyncio
 import base64
 import json
-import requests
 import time
 import random
 import uuid
@@ -26,8 +22,23 @@ from langgraph.graph.message import add_messages
 from langchain_groq import ChatGroq
 
 from ..database import DBManager
-
-logging.basicConfig(level=logging.DEBUG)
+from agent_core.audio_out import AudioProfile, encode_reply, negotiate
+from agent_core.deadline import turn_deadline
+from agent_core.forms import load_forms
+from agent_core.history import decode_cursor, page_messages, page_sessions, stream_messages, stream_sessions
+from agent_core.langid import ENGLISH, SessionLanguages
+from agent_core.limiter import ProviderBusy
+from agent_core.logs import configure_logging, log_context
+from agent_core.media import MediaPool
+from agent_core.metrics import REGISTRY
+from agent_core.profiling import admin_router
+from agent_core.prefetch import OpeningCache
+from agent_core.providers import ProviderError, build_providers
+from agent_core.recommend import Recommender, recommendation_tool, wants_recommendation
+from agent_core.slots import fill_slots
+
+# Queued JSON records; AGENT_LOG_LEVEL=DEBUG with AGENT_LOG_SAMPLE_DEBUG for the per-call detail
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Load environment variables (for API keys)
@@ -43,35 +54,40 @@ DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 TORCH_DTYPE = torch.bfloat16 if DEVICE == "cuda" and torch.cuda.is_available() and hasattr(torch, 'bfloat16') else torch.float16 # Use bfloat16 if available on CUDA
 DEFAULT_SAMPLING_RATE = 16000 # From Shuka example
 
-# Sarvam API endpoints
-SARVAM_STT_API_URL = "https://api.sarvam.ai/speech-to-text-translate"
-SARVAM_TTS_API_URL = "https://api.sarvam.ai/text-to-speech"
-SARVAM_TRANSLATE_API_URL = "https://api.sarvam.ai/translate"
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+
+# External providers: Sarvam (STT / translation / TTS) and Groq (LLM) by default.
+# Set AGENT_PROVIDERS=synthetic or replay to run offline, see agent_core/providers.py.
+# The Sarvam base URL comes from SARVAM_API_BASE_URL (benchmarks/stubs.py for load tests).
+providers = build_providers(
+    live_llm=lambda: ChatGroq(model="llama-3.3-70b-versatile", api_key=GROQ_API_KEY, temperature=0),
+    sarvam_api_key=SARVAM_API_KEY,
+)
+llm = providers.llm
 
 # Create database manager
 db_manager = DBManager()
 
+# CPU-bound audio conversion and payload encoding run in worker processes (AGENT_MEDIA_*)
+media = MediaPool.from_env()
+
+# Language of typed messages per session (spoken ones get theirs from STT)
+session_languages = SessionLanguages()
+
+# Produce recommendations for consumers' dietary goals (AGENT_RECOMMEND_*, see agent_core/recommend.py)
+recommender = Recommender.from_env()
+recommend_tool = recommendation_tool(recommender)
+
 # Ensure audio directory exists
 audio_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "audio_files")
 os.makedirs(audio_dir, exist_ok=True)
 
-# Constants from flask-converter
-PRODUCT_BASE_URL = "https://example.com/post-product"
-POST_BASE_URL = "https://example.com/post-existing-product"
-
-# Form fields
-product_fields = [
-    ("ProductName",              "What is the product name?"),
-    ("Category",                 "Which category does it belong to?"),
-    ("Description_about_the_crop","Briefly describe the crop."),
-    ("Price_per_kg",             "Price per kg (numbers only)."),
-    ("Total_quantity_produced",  "Total quantity produced (numbers only).")
-]
-post_fields = [
-    ("ExistingProduct",  "Which existing product do you want to post?"),
-    ("Caption",          "What caption would you like to use?"),
-    ("AdditionalMessage","Any additional message? (or 'none')")
-]
+# Form definitions (questions, base URLs, summary prompts) from agent_core/forms.py
+forms = load_forms("example")
+PRODUCT_BASE_URL = forms.get("product").base_url
+POST_BASE_URL = forms.get("post").base_url
+product_fields = forms.get("product").pairs
+post_fields = forms.get("post").pairs
 
 # Agent state definition
 class AgentState(TypedDict, total=False):
@@ -83,29 +99,42 @@ class AgentState(TypedDict, total=False):
     summary: str
     url: str
     base_url: str
+    form_mask: int
 
 # Reintroduce ConnectionManager
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[str, WebSocket] = {}
         self.user_sessions: Dict[str, str] = {}  # Map client_id to session_id
+        self.audio_profiles: Dict[str, AudioProfile] = {}  # Reply audio codec/quality per client
 
     async def connect(self, websocket: WebSocket, client_id: str):
         await websocket.accept()
         self.active_connections[client_id] = websocket
-        logger.info(f"Client {client_id} connected. Total clients: {len(self.active_connections)}")
+
+        # Reply audio format offered in the URL: ?codecs=opus,wav&sample_rate=16000&kbps=64
+        params = websocket.query_params
+        try:
+            sample_rate = int(params["sample_rate"]) if params.get("sample_rate") else None
+            kbps = float(params["kbps"]) if params.get("kbps") else None
+        except ValueError:
+            logger.warning("Ignoring malformed audio parameters from %s: %s", client_id, dict(params))
+            sample_rate = kbps = None
+        self.audio_profiles[client_id] = negotiate(params.get("codecs"), sample_rate, kbps)
+        logger.info("Client %s connected. Total clients: %s", client_id, len(self.active_connections))
 
         # Create or get session for this client - use async version to avoid blocking
         session_id, _ = await db_manager.get_or_create_session_async(client_id)
         self.user_sessions[client_id] = session_id
-        logger.debug(f"Client {client_id} using session {session_id}")
+        logger.debug("Client %s using session %s", client_id, session_id)
 
     def disconnect(self, client_id: str):
          if client_id in self.active_connections:
             del self.active_connections[client_id]
             if client_id in self.user_sessions:
                 del self.user_sessions[client_id]
-            logger.info(f"Client {client_id} disconnected. Total clients: {len(self.active_connections)}")
+            self.audio_profiles.pop(client_id, None)
+            logger.info("Client %s disconnected. Total clients: %s", client_id, len(self.active_connections))
 
     async def send_personal_message(self, message: str | bytes, client_id: str):
         if client_id in self.active_connections:
@@ -120,7 +149,7 @@ class ConnectionManager:
     async def broadcast(self, message: str):
         for client_id in self.active_connections:
             await self.active_connections[client_id].send_text(message)
-        logger.info(f"Broadcasted: {message[:10]}...")
+        logger.info("Broadcasted: %s...", message[:10])
         
     def get_session_id(self, client_id: str) -> Optional[str]:
         """Get the session ID for a client."""
@@ -130,17 +159,32 @@ class ConnectionManager:
         """Set the session ID for a client."""
         self.user_sessions[client_id] = session_id
 
+    def get_audio_profile(self, client_id: str) -> AudioProfile:
+        """Reply audio profile negotiated at connect (8 kHz WAV if none)."""
+        return self.audio_profiles.setdefault(client_id, negotiate())
+
+    def audio_ack(self, client_id: str, data: dict) -> bool:
+        """True if ``data`` is an ``audio_ack`` frame (fed to the client's audio profile), not a turn."""
+        text = data.get("text")
+        if not isinstance(text, str) or not text.startswith("{") or '"audio_ack"' not in text:
+            return False
+        try:
+            ack = json.loads(text)
+        except ValueError:
+            return False
+        if not isinstance(ack, dict) or ack.get("type") != "audio_ack":
+            return False
+        self.get_audio_profile(client_id).acked(str(ack.get("reply_id")))
+        return True
+
 manager = ConnectionManager()
 
 # Router using the manager
 router = APIRouter()
 
 async def sarvam_speech_to_text(audio_bytes, client_id: str, session_id: str, prompt="") -> str | None:
-    """Convert speech to text using Sarvam.ai API and save audio file"""
-    if not SARVAM_API_KEY:
-        logger.error("SARVAM_API_KEY not available. Cannot process speech to text.")
-        return None
-    
+    """Convert speech to text using the STT provider and save audio file"""
+    audio_filename = None
     try:
         # Generate a unique filename using user_id, session_id and timestamp
         timestamp = int(time.time())
@@ -151,49 +195,22 @@ async def sarvam_speech_to_text(audio_bytes, client_id: str, session_id: str, pr
         with open(audio_path, 'wb') as f:
             f.write(audio_bytes)
         
-        logger.debug(f"Saved audio file to {audio_path}")
-        
-        # Prepare API request
-        payload = {
-            'model': 'saaras:v2',
-            'prompt': prompt,
-            'with_diarization': False
-        }
-        
-        files = [
-            ('file', (audio_filename, open(audio_path, 'rb'), 'audio/wav'))
-        ]
+        logger.debug("Saved audio file to %s", audio_path)
         
-        headers = {
-            'api-subscription-key': SARVAM_API_KEY
-        }
-        
-        # Make API request
-        response = await asyncio.to_thread(
-            requests.request,
-            "POST", 
-            SARVAM_STT_API_URL, 
-            headers=headers, 
-            data=payload, 
-            files=files
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            logger.debug(f"Sarvam STT API response: {result}")
-            transcription = result.get('transcript', '')
-            detected_language_code = result.get('language_code', '')
-            # Return both the transcription and the audio filename for storage
-            return transcription, audio_filename, detected_language_code
-        else:
-            logger.error(f"Sarvam STT API error: {response.status_code} - {response.text}")
-            return None, audio_filename, None
+        transcription, detected_language_code = await providers.stt.transcribe(audio_bytes, audio_filename, prompt)
+        # Return both the transcription and the audio filename for storage
+        return transcription, audio_filename, detected_language_code
             
+    except ProviderBusy:
+        raise
+    except ProviderError as e:
+        logger.error("Sarvam STT API error: %s", e)
+        return None, audio_filename, None
     except Exception as e:
-        logger.error(f"Error in Sarvam speech-to-text API: {e}", exc_info=True)
+        logger.error("Error in Sarvam speech-to-text API: %s", e, exc_info=True)
         return None, None, None
 
-async def call_english_agent_api(text_input, session_history):
+async def call_english_agent_api(text_input, session_history, user_id: Optional[str] = None):
     """
     Call English agent API with the complete conversation history.
     This would be implemented based on the specific agent API details.
@@ -201,9 +218,13 @@ async def call_english_agent_api(text_input, session_history):
     # TODO: Replace with actual English agent API call
     # For now, we'll just echo back the input as a simple response
     try:
+        # "What should I buy?" is answered by the recommendation tool from the consumer's profile
+        if user_id and wants_recommendation(text_input):
+            return await recommend_tool.ainvoke({"consumer_id": user_id})
+
         # This is a placeholder - replace with actual API call
         # Here we would pass the entire session_history to the API
-        logger.debug(f"Calling English agent API with history of {len(session_history)} messages")
+        logger.debug("Calling English agent API with history of %s messages", len(session_history))
         
         # Just a simple response for now that acknowledges the history
         if len(session_history) > 1:
@@ -214,338 +235,322 @@ async def call_english_agent_api(text_input, session_history):
             
         return response
     except Exception as e:
-        logger.error(f"Error calling English agent API: {e}", exc_info=True)
+        logger.error("Error calling English agent API: %s", e, exc_info=True)
         return None
 
-async def sarvam_text_to_speech(text, target_lang_code="en-IN") -> str | None:
-    """Convert text to speech using Sarvam.ai API"""
-    if not SARVAM_API_KEY:
-        logger.error("SARVAM_API_KEY not available. Cannot process text to speech.")
+async def sarvam_text_to_speech(text, target_lang_code="en-IN", sample_rate=8000) -> str | None:
+    """Convert text to speech using the TTS provider"""
+    try:
+        logger.debug("Starting text-to-speech call for %s characters...", len(text))
+        audio_base64 = await providers.tts.synthesize(text, target_lang_code, sample_rate)
+        logger.debug("TTS call successful to language=%s", target_lang_code)
+        return audio_base64
+    except ProviderBusy:
+        raise
+    except ProviderError as e:
+        logger.error("Sarvam TTS API error: %s", e)
         return None
-    
+    except Exception as e:
+        logger.error("Error in Sarvam text-to-speech API: %s", e, exc_info=True)
+        return None
+
+async def sarvam_translate(text, source_language_code="en-IN", target_language_code="kn-IN") -> str | None:
+    """Translate text using the translation provider"""
     try:
-        logger.debug(f"Starting Sarvam.ai text-to-speech API call for {len(text)} characters...")
-        
-        # Prepare API request
-        payload = {
-            "inputs": [text],
-            "target_language_code": target_lang_code,
-            "speech_sample_rate": 8000,
-            "enable_preprocessing": True,
-            "model": "bulbul:v2"
-        }
+        logger.debug("Starting translation call for %s characters from %s to %s",
+                     len(text), source_language_code, target_language_code)
+        return await providers.translate.translate(text, source_language_code, target_language_code)
+    except ProviderBusy:
+        raise
+    except ProviderError as e:
+        logger.error("Sarvam Translation API error: %s", e)
+        return text  # Return original text on API error
+    except Exception as e:
+        logger.error("Error in Sarvam translation API: %s", e, exc_info=True)
+        return text  # Return original text on exception
+
+async def handle_client_message(client_id: str, data: dict):
+    """Processes one text or audio message from a connected client."""
+    response_text = None
+    detected_language_code = None
+    user_message = None  # The message to store in the database
+    session_id = manager.get_session_id(client_id)
+    
+    # Timestamp when message was received
+    received_timestamp = int(time.time())
+
+    target_language_code = "en-IN"
+    
+    # Check if data contains language parameter
+    if isinstance(data, dict) and "language" in data:
+        target_language_code = data["language"]
+    elif "text" in data and isinstance(data["text"], dict) and "language" in data["text"]:
+        target_language_code = data["text"]["language"]
+    elif "bytes" in data and isinstance(data["bytes"], dict) and "language" in data["bytes"]:
+        target_language_code = data["bytes"]["language"]
         
-        headers = {
-            "Content-Type": "application/json",
-            "api-subscription-key": SARVAM_API_KEY
-        }
+    logger.debug("Using target language code: %s", target_language_code)
+    
+    if not session_id:
+        logger.error("No session ID for client %s", client_id)
+        await manager.send_personal_message(json.dumps({"status": "error", "message": "Session not found"}), client_id)
+        return
+
+    # Get session history for context - use async version to avoid blocking
+    session_history = await db_manager.get_session_history_for_llm_async(session_id)
+    logger.debug("Retrieved history for session %s: %s messages", session_id, len(session_history))
+
+    if "text" in data:
+        text_data = data["text"]
+        logger.debug("Received text from %s: %s", client_id, text_data)
+        await manager.send_personal_message(json.dumps({"status": "processing_text", "message": "Processing text request..."}), client_id)
+
+        # For text input, STT is skipped; the language is identified locally
+        detected_language_code = session_languages.detect(
+            session_id, text_data if isinstance(text_data, str) else "", default=target_language_code
+        )
+        stt_completed_timestamp = received_timestamp
         
-        # Make API request
-        response = await asyncio.to_thread(
-            requests.request,
-            "POST", 
-            SARVAM_TTS_API_URL, 
-            json=payload, 
-            headers=headers
+        # Store user message in database with timestamps in the background
+        db_manager.add_user_message_background(
+            session_id, 
+            text_data, 
+            received_at=received_timestamp,
+            stt_completed_at=stt_completed_timestamp
         )
+        user_message = text_data
+
+        # Translate to English for the agent only when the text is not English
+        agent_input = text_data
+        if detected_language_code != ENGLISH:
+            await manager.send_personal_message(json.dumps({"status": "processing_translation", "message": "Translating message..."}), client_id)
+            agent_input = await sarvam_translate(text_data, detected_language_code, ENGLISH) or text_data
+            logger.debug("Translated text input from %s to English", detected_language_code)
         
-        if response.status_code == 200:
-            result = response.json()
-            logger.debug(f"Sarvam TTS API call successful to language={target_lang_code}")
+        # Call English agent API with the text and session history
+        await manager.send_personal_message(json.dumps({"status": "processing_llm", "message": "Thinking..."}), client_id)
+        response_text = await call_english_agent_api(agent_input, session_history, client_id)
+        # Timestamp when LLM completed
+        llm_completed_timestamp = int(time.time())
+
+    elif "bytes" in data:
+        bytes_data = data["bytes"]
+        logger.debug("Received audio bytes from %s: %s bytes", client_id, len(bytes_data))
+        await manager.send_personal_message(json.dumps({"status": "processing_audio", "message": "Processing audio..."}), client_id)
+
+        try:
+            # Convert WebM/Matroska uploads to mono WAV in the media worker pool
+            try:
+                prepared_audio = await media.prepare_audio(bytes_data, DEFAULT_SAMPLING_RATE)
+            except Exception as e:
+                logger.error("Error preparing audio: %s", e, exc_info=True)
+                raise ValueError(f"Audio preparation failed: {e}")
+
+            # Send status update: Processing speech to text
+            await manager.send_personal_message(json.dumps({"status": "processing_stt", "message": "Converting speech to text..."}), client_id)
+
+            # Call Sarvam STT API and get transcription and audio filename
+            transcribed_text, audio_filename, detected_language_code = await sarvam_speech_to_text(prepared_audio, client_id, session_id)
             
-            # Extract audio data
-            if "audios" in result:
-                audio_base64 = result["audios"][0]
-                return audio_base64
-            else:
-                logger.error(f"Unexpected TTS response format: {result}")
-                return None
-        else:
-            logger.error(f"Sarvam TTS API error: {response.status_code} - {response.text}")
-            return None
+            # Timestamp when STT completed
+            stt_completed_timestamp = int(time.time())
             
-    except Exception as e:
-        logger.error(f"Error in Sarvam text-to-speech API: {e}", exc_info=True)
-        return None
+            if not transcribed_text:
+                logger.error("Speech-to-text conversion failed for client %s", client_id)
+                await manager.send_personal_message(json.dumps({
+                    "status": "error",
+                    "message": "Failed to convert speech to text."
+                }), client_id)
+                return
+                
+            logger.debug("Transcribed text: %s", transcribed_text)
+
+            # Store user message with audio file reference in the background
+            db_manager.add_user_message_background(
+                session_id, 
+                transcribed_text,
+                audio_file=audio_filename,
+                transcription=transcribed_text,
+                received_at=received_timestamp,
+                stt_completed_at=stt_completed_timestamp
+            )
+            user_message = transcribed_text
 
-async def sarvam_translate(text, source_language_code="en-IN", target_language_code="kn-IN") -> str | None:
-    """Translate text using Sarvam.ai API"""
-    if not SARVAM_API_KEY:
-        logger.error("SARVAM_API_KEY not available. Cannot translate text.")
-        return text  # Return original text if API key not available
-    
-    try:
-        logger.debug(f"Starting Sarvam.ai translation API call for {len(text)} characters from {source_language_code} to {target_language_code}")
+            # Send status update: Processing with LLM
+            await manager.send_personal_message(json.dumps({"status": "processing_llm", "message": "Thinking..."}), client_id)
+            
+            # Call English agent API with the transcribed text and session history
+            response_text = await call_english_agent_api(transcribed_text, session_history, client_id)
+            # Timestamp when LLM completed
+            llm_completed_timestamp = int(time.time())
+
+        except ProviderBusy:
+            raise
+        except Exception as e:
+            logger.error("Error processing audio for %s: %s", client_id, e, exc_info=True)
+            await manager.send_personal_message(json.dumps({"status": "error", "message": f"Error processing audio: {e}"}), client_id)
+            return # Skip to next message
+
+    # Process assistant response
+    if response_text:
+        # Store original English response
+        original_response_text = response_text
         
-        # Prepare API request
-        payload = {
-            "input": text,
-            "source_language_code": source_language_code,
-            "target_language_code": target_language_code,
-            "speaker_gender": "Female",
-            "mode": "formal",
-            "model": "mayura:v1",
-            "enable_preprocessing": False,
-            "output_script": "spoken-form-in-native",
-            "numerals_format": "native"
-        }
+        # Translate if needed (detected_language_code exists and is not English)
+        translation_start_timestamp = None
+        translation_completed_timestamp = None
+        
+        if detected_language_code and detected_language_code != "en-IN":
+            translation_start_timestamp = int(time.time())
+            await manager.send_personal_message(json.dumps({"status": "processing_translation", "message": "Translating response..."}), client_id)
+            translated_text = await sarvam_translate(response_text, "en-IN", detected_language_code)
+            translation_completed_timestamp = int(time.time())
+            if translated_text:
+                response_text = translated_text
+                logger.debug("Translated response from English to %s", detected_language_code)
         
-        headers = {
-            "Content-Type": "application/json",
-            "api-subscription-key": SARVAM_API_KEY
-        }
+        # Determine the target language for TTS
+        tts_language_code = detected_language_code if detected_language_code else target_language_code
         
-        # Make API request
-        response = await asyncio.to_thread(
-            requests.request,
-            "POST", 
-            SARVAM_TRANSLATE_API_URL, 
-            json=payload, 
-            headers=headers
+        # TTS using Sarvam API
+        await manager.send_personal_message(json.dumps({"status": "processing_tts", "message": "Generating audio response..."}), client_id)
+        audio_profile = manager.get_audio_profile(client_id)
+        reply_quality = audio_profile.choose()
+        audio_output_base64 = await sarvam_text_to_speech(
+            response_text, target_lang_code=tts_language_code, sample_rate=reply_quality.sample_rate
         )
+        if audio_output_base64:
+            # Transcode to the connection's codec (Opus) in the media worker pool
+            audio_output_base64, reply_quality = await encode_reply(media, audio_output_base64, reply_quality)
         
-        if response.status_code == 200:
-            result = response.json()
-            logger.debug(f"Sarvam Translation API call successful")
+        # Timestamp when TTS completed
+        tts_completed_timestamp = int(time.time())
+
+        # Add assistant response to database with timestamps in the background
+        db_manager.add_assistant_message_background(
+            session_id, 
+            original_response_text,  # Store original English response
+            llm_completed_at=llm_completed_timestamp,
+            tts_completed_at=tts_completed_timestamp
+        )
+
+        if audio_output_base64:
+            # Calculate and log performance metrics
+            stt_duration = stt_completed_timestamp - received_timestamp if stt_completed_timestamp and received_timestamp else 0
+            llm_duration = llm_completed_timestamp - stt_completed_timestamp if llm_completed_timestamp and stt_completed_timestamp else 0
+            translation_duration = translation_completed_timestamp - translation_start_timestamp if translation_completed_timestamp and translation_start_timestamp else 0
+            tts_duration = tts_completed_timestamp - (translation_completed_timestamp or llm_completed_timestamp) if tts_completed_timestamp else 0
+            total_duration = tts_completed_timestamp - received_timestamp if tts_completed_timestamp and received_timestamp else 0
             
-            # Extract translated text
-            translated_text = result.get("translated_text")
-            if translated_text:
-                return translated_text
-            else:
-                logger.error(f"Unexpected translation response format: {result}")
-                return text  # Return original text on unexpected response format
-        else:
-            logger.error(f"Sarvam Translation API error: {response.status_code} - {response.text}")
-            return text  # Return original text on API error
+            logger.info("Performance metrics for %s: STT: %ss, LLM: %ss, Translation: %ss, TTS: %ss, Total: %ss",
+                        client_id, stt_duration, llm_duration, translation_duration, tts_duration, total_duration,
+                        extra={"stt_s": stt_duration, "llm_s": llm_duration, "translation_s": translation_duration,
+                               "tts_s": tts_duration, "total_s": total_duration})
             
-    except Exception as e:
-        logger.error(f"Error in Sarvam translation API: {e}", exc_info=True)
-        return text  # Return original text on exception
+            reply_id = uuid.uuid4().hex
+            response_payload = {
+                "status": "response_ready",
+                "reply_id": reply_id,  # echoed in an audio_ack to time the transfer
+                "text": response_text,
+                "audio_base64": audio_output_base64,
+                "audio_format": reply_quality.describe(),
+                "performance": {
+                    "stt_duration": stt_duration,
+                    "llm_duration": llm_duration,
+                    "translation_duration": translation_duration,
+                    "tts_duration": tts_duration,
+                    "total_duration": total_duration
+                }
+            }
+            payload_text = await media.dumps(response_payload)
+            audio_profile.sent(reply_id, len(payload_text))
+            send_started = time.perf_counter()
+            await manager.send_personal_message(payload_text, client_id)
+            # The client's ack (or, without acks, how fast the reply drained) drives the next reply's quality
+            audio_profile.observe(len(payload_text), time.perf_counter() - send_started)
+        else:
+            logger.error("TTS generation failed for client %s.", client_id)
+            await manager.send_personal_message(json.dumps({
+                "status": "error",
+                "message": "Audio generation failed. Displaying text response.",
+                "text": response_text,
+                "performance": {
+                    "stt_duration": stt_duration,
+                    "llm_duration": llm_duration,
+                    "translation_duration": translation_duration,
+                    "total_duration": llm_completed_timestamp - received_timestamp if llm_completed_timestamp and received_timestamp else 0
+                }
+            }), client_id)
+    else:
+        # API failed to return text
+        error_message = "AI failed to generate a response."
+        logger.error("API Error for %s: %s", client_id, error_message)
+        await manager.send_personal_message(json.dumps({"status": "error", "message": error_message}), client_id)
+
+
+async def render_opening(question: str, language: str, quality) -> tuple:
+    """(question in language, reply audio, quality actually used) for the opening cache."""
+    text = await sarvam_translate(question, ENGLISH, language) if language != ENGLISH else question
+    audio = await sarvam_text_to_speech(text, target_lang_code=language, sample_rate=quality.sample_rate)
+    if audio:
+        audio, quality = await encode_reply(media, audio, quality)
+    return text, audio, quality
+
+# A form's first question, rendered once per language and audio format for connections opened on the form's page
+openings = OpeningCache(render_opening)
+
+async def send_opening(client_id: str, intent: str, language: str):
+    """Sends the first question of the ``intent`` form (the page's form) without any LLM call."""
+    session_id = manager.get_session_id(client_id)
+    question = forms.get(intent).first_field().question
+    session_languages.set(session_id, language)
+    try:
+        text, audio, quality = await openings.get(question, language, manager.get_audio_profile(client_id).choose())
+    except ProviderBusy:
+        text, audio, quality = question, None, None
+    db_manager.add_assistant_message_background(session_id, question)
+    await manager.send_personal_message(json.dumps({
+        "status": "form_started",
+        "intent": intent,
+        "text": text,
+        "audio_base64": audio,
+        "audio_format": quality.describe() if audio else None,
+    }), client_id)
+    logger.info("Client %s opened on the '%s' form, sent its first question", client_id, intent)
 
 @router.websocket("/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: str):
     await manager.connect(websocket, client_id)
 
     try:
+        # Opened on a form's page (?page=/farmer/add/post&language=hi-IN): ask its first question right away
+        intent = forms.intent_for_page(websocket.query_params.get("page"))
+        if intent is not None:
+            with turn_deadline(), log_context(manager.get_session_id(client_id)):
+                await send_opening(client_id, intent, websocket.query_params.get("language") or ENGLISH)
+
         while True:
             data = await websocket.receive()
-            response_text = None
-            user_message = None  # The message to store in the database
-            session_id = manager.get_session_id(client_id)
-            
-            # Timestamp when message was received
-            received_timestamp = int(time.time())
-
-            target_language_code = "en-IN"
-            
-            # Check if data contains language parameter
-            if isinstance(data, dict) and "language" in data:
-                target_language_code = data["language"]
-            elif "text" in data and isinstance(data["text"], dict) and "language" in data["text"]:
-                target_language_code = data["text"]["language"]
-            elif "bytes" in data and isinstance(data["bytes"], dict) and "language" in data["bytes"]:
-                target_language_code = data["bytes"]["language"]
-                
-            logger.debug(f"Using target language code: {target_language_code}")
-            
-            if not session_id:
-                logger.error(f"No session ID for client {client_id}")
-                await manager.send_personal_message(json.dumps({"status": "error", "message": "Session not found"}), client_id)
-                continue
-
-            if not SARVAM_API_KEY:
-                logger.error("SARVAM_API_KEY not available. Cannot process request.")
-                await manager.send_personal_message(json.dumps({"status": "error", "message": "AI processing service unavailable."}), client_id)
+            if manager.audio_ack(client_id, data):
                 continue
-
-            # Get session history for context - use async version to avoid blocking
-            session_history = await db_manager.get_session_history_for_llm_async(session_id)
-            logger.debug(f"Retrieved history for session {session_id}: {len(session_history)} messages")
-
-            if "text" in data:
-                text_data = data["text"]
-                logger.debug(f"Received text from {client_id}: {text_data}")
-                await manager.send_personal_message(json.dumps({"status": "processing_text", "message": "Processing text request..."}), client_id)
-
-                # For text input, STT is skipped
-                stt_completed_timestamp = received_timestamp
-                
-                # Store user message in database with timestamps in the background
-                db_manager.add_user_message_background(
-                    session_id, 
-                    text_data, 
-                    received_at=received_timestamp,
-                    stt_completed_at=stt_completed_timestamp
-                )
-                user_message = text_data
-                
-                # Call English agent API with the text and session history
-                await manager.send_personal_message(json.dumps({"status": "processing_llm", "message": "Thinking..."}), client_id)
-                response_text = await call_english_agent_api(text_data, session_history)
-                # Timestamp when LLM completed
-                llm_completed_timestamp = int(time.time())
-
-            elif "bytes" in data:
-                bytes_data = data["bytes"]
-                logger.debug(f"Received audio bytes from {client_id}: {len(bytes_data)} bytes")
-                await manager.send_personal_message(json.dumps({"status": "processing_audio", "message": "Processing audio..."}), client_id)
-
-                try:
-                    # Convert audio format if needed
-                    def prepare_audio_data():
-                        try:
-                            audio_file = io.BytesIO(bytes_data)
-                            file_type = magic.from_buffer(bytes_data[:1024])  # Check first 1KB
-                            
-                            # Handle WebM/Matroska format specifically
-                            if 'WebM' in file_type or 'Matroska' in file_type:
-                                # Convert using pydub
-                                audio = AudioSegment.from_file(audio_file, format="webm")
-                                audio = audio.set_frame_rate(DEFAULT_SAMPLING_RATE).set_channels(1)
-                                
-                                # Convert to WAV format
-                                output_buffer = io.BytesIO()
-                                audio.export(output_buffer, format="wav")
-                                output_buffer.seek(0)
-                                return output_buffer.read()
-                            
-                            # If already in WAV format, return as is
-                            return bytes_data
-                            
-                        except Exception as e:
-                            logger.error(f"Error preparing audio: {e}", exc_info=True)
-                            raise ValueError(f"Audio preparation failed: {e}")
-
-                    # Prepare audio data for API
-                    prepared_audio = await asyncio.to_thread(prepare_audio_data)
-
-                    # Send status update: Processing speech to text
-                    await manager.send_personal_message(json.dumps({"status": "processing_stt", "message": "Converting speech to text..."}), client_id)
-
-                    # Call Sarvam STT API and get transcription and audio filename
-                    transcribed_text, audio_filename, detected_language_code = await sarvam_speech_to_text(prepared_audio, client_id, session_id)
-                    
-                    # Timestamp when STT completed
-                    stt_completed_timestamp = int(time.time())
-                    
-                    if not transcribed_text:
-                        logger.error(f"Speech-to-text conversion failed for client {client_id}")
-                        await manager.send_personal_message(json.dumps({
-                            "status": "error",
-                            "message": "Failed to convert speech to text."
-                        }), client_id)
-                        continue
-                        
-                    logger.debug(f"Transcribed text: {transcribed_text}")
-
-                    # Store user message with audio file reference in the background
-                    db_manager.add_user_message_background(
-                        session_id, 
-                        transcribed_text,
-                        audio_file=audio_filename,
-                        transcription=transcribed_text,
-                        received_at=received_timestamp,
-                        stt_completed_at=stt_completed_timestamp
-                    )
-                    user_message = transcribed_text
-
-                    # Send status update: Processing with LLM
-                    await manager.send_personal_message(json.dumps({"status": "processing_llm", "message": "Thinking..."}), client_id)
-                    
-                    # Call English agent API with the transcribed text and session history
-                    response_text = await call_english_agent_api(transcribed_text, session_history)
-                    # Timestamp when LLM completed
-                    llm_completed_timestamp = int(time.time())
-
-                except Exception as e:
-                    logger.error(f"Error processing audio for {client_id}: {e}", exc_info=True)
-                    await manager.send_personal_message(json.dumps({"status": "error", "message": f"Error processing audio: {e}"}), client_id)
-                    continue # Skip to next message
-
-            # Process assistant response
-            if response_text:
-                # Store original English response
-                original_response_text = response_text
-                
-                # Translate if needed (detected_language_code exists and is not English)
-                translation_start_timestamp = None
-                translation_completed_timestamp = None
-                
-                if detected_language_code and detected_language_code != "en-IN":
-                    translation_start_timestamp = int(time.time())
-                    await manager.send_personal_message(json.dumps({"status": "processing_translation", "message": "Translating response..."}), client_id)
-                    translated_text = await sarvam_translate(response_text, "en-IN", detected_language_code)
-                    translation_completed_timestamp = int(time.time())
-                    if translated_text:
-                        response_text = translated_text
-                        logger.debug(f"Translated response from English to {detected_language_code}")
-                
-                # Determine the target language for TTS
-                tts_language_code = detected_language_code if detected_language_code else target_language_code
-                
-                # TTS using Sarvam API
-                await manager.send_personal_message(json.dumps({"status": "processing_tts", "message": "Generating audio response..."}), client_id)
-                audio_output_base64 = await sarvam_text_to_speech(response_text, target_lang_code=tts_language_code)
-                
-                # Timestamp when TTS completed
-                tts_completed_timestamp = int(time.time())
-
-                # Add assistant response to database with timestamps in the background
-                db_manager.add_assistant_message_background(
-                    session_id, 
-                    original_response_text,  # Store original English response
-                    llm_completed_at=llm_completed_timestamp,
-                    tts_completed_at=tts_completed_timestamp
-                )
-
-                if audio_output_base64:
-                    # Calculate and log performance metrics
-                    stt_duration = stt_completed_timestamp - received_timestamp if stt_completed_timestamp and received_timestamp else 0
-                    llm_duration = llm_completed_timestamp - stt_completed_timestamp if llm_completed_timestamp and stt_completed_timestamp else 0
-                    translation_duration = translation_completed_timestamp - translation_start_timestamp if translation_completed_timestamp and translation_start_timestamp else 0
-                    tts_duration = tts_completed_timestamp - (translation_completed_timestamp or llm_completed_timestamp) if tts_completed_timestamp else 0
-                    total_duration = tts_completed_timestamp - received_timestamp if tts_completed_timestamp and received_timestamp else 0
-                    
-                    logger.info(f"Performance metrics for {client_id}: STT: {stt_duration}s, LLM: {llm_duration}s, Translation: {translation_duration}s, TTS: {tts_duration}s, Total: {total_duration}s")
-                    
-                    response_payload = {
-                        "status": "response_ready",
-                        "text": response_text,
-                        "audio_base64": audio_output_base64,
-                        "performance": {
-                            "stt_duration": stt_duration,
-                            "llm_duration": llm_duration,
-                            "translation_duration": translation_duration,
-                            "tts_duration": tts_duration,
-                            "total_duration": total_duration
-                        }
-                    }
-                    await manager.send_personal_message(json.dumps(response_payload), client_id)
-                else:
-                    logger.error(f"TTS generation failed for client {client_id}.")
-                    await manager.send_personal_message(json.dumps({
-                        "status": "error",
-                        "message": "Audio generation failed. Displaying text response.",
-                        "text": response_text,
-                        "performance": {
-                            "stt_duration": stt_duration,
-                            "llm_duration": llm_duration,
-                            "translation_duration": translation_duration,
-                            "total_duration": llm_completed_timestamp - received_timestamp if llm_completed_timestamp and received_timestamp else 0
-                        }
-                    }), client_id)
-            else:
-                # API failed to return text
-                error_message = "AI failed to generate a response."
-                logger.error(f"API Error for {client_id}: {error_message}")
-                await manager.send_personal_message(json.dumps({"status": "error", "message": error_message}), client_id)
+            try:
+                # Each message is one turn; provider calls share its SLO (AGENT_TURN_SLO)
+                with turn_deadline(), log_context(manager.get_session_id(client_id)):
+                    await handle_client_message(client_id, data)
+            except ProviderBusy as e:
+                # Load shedding: answer immediately instead of queueing behind a slow provider
+                logger.warning("Shedding message from %s: %s", client_id, e)
+                await manager.send_personal_message(json.dumps({
+                    "status": "busy",
+                    "message": "Service is busy, please retry.",
+                    "retry_after": max(1, round(e.retry_after))
+                }), client_id)
 
     except WebSocketDisconnect:
-        logger.debug(f"WebSocket disconnected for client {client_id}. Cleaning up resources.")
+        logger.debug("WebSocket disconnected for client %s. Cleaning up resources.", client_id)
         manager.disconnect(client_id)
     except Exception as e:
-        logger.error(f"Error in WebSocket endpoint for client {client_id}: {e}", exc_info=True)
+        logger.error("Error in WebSocket endpoint for client %s: %s", client_id, e, exc_info=True)
         # Clean up and disconnect on general errors too
         manager.disconnect(client_id)
 
@@ -557,17 +562,23 @@ async def create_new_session(user_id: str):
         session_id, _ = await db_manager.create_session_async(user_id)
         return {"status": "success", "session_id": session_id}
     except Exception as e:
-        logger.error(f"Error creating new session: {e}", exc_info=True)
+        logger.error("Error creating new session: %s", e, exc_info=True)
         return {"status": "error", "message": str(e)}
 
 @router.get("/sessions/list")
-async def list_sessions(user_id: str):
-    """List all sessions for a user."""
+async def list_sessions(user_id: str, cursor: Optional[str] = None, limit: Optional[int] = None, format: str = "json"):
+    """List a user's sessions, oldest first, one page at a time (format=ndjson streams them all)."""
     try:
-        sessions = await db_manager.get_all_sessions_async(user_id)
-        return {"status": "success", "sessions": sessions}
+        if format == "ndjson":
+            decode_cursor(cursor)  # reject a bad cursor before the 200 starts streaming
+            return StreamingResponse(
+                stream_sessions(db_manager, user_id, cursor, limit),
+                media_type="application/x-ndjson",
+            )
+        sessions, next_cursor = await page_sessions(db_manager, user_id, cursor, limit)
+        return {"status": "success", "sessions": sessions, "next_cursor": next_cursor}
     except Exception as e:
-        logger.error(f"Error listing sessions: {e}", exc_info=True)
+        logger.error("Error listing sessions: %s", e, exc_info=True)
         return {"status": "error", "message": str(e)}
 
 @router.post("/sessions/switch")
@@ -585,19 +596,62 @@ async def switch_session(user_id: str, session_id: str):
         else:
             return {"status": "error", "message": "Failed to switch session"}
     except Exception as e:
-        logger.error(f"Error switching session: {e}", exc_info=True)
+        logger.error("Error switching session: %s", e, exc_info=True)
         return {"status": "error", "message": str(e)}
 
 @router.get("/sessions/{session_id}/history")
-async def get_session_history(session_id: str):
-    """Get the message history for a session."""
+async def get_session_history(session_id: str, cursor: Optional[str] = None, limit: Optional[int] = None,
+                              format: str = "json"):
+    """Get a session's messages, oldest first, one page at a time (format=ndjson streams them all)."""
     try:
-        messages = await db_manager.get_session_messages_async(session_id)
-        return {"status": "success", "messages": messages}
+        if format == "ndjson":
+            decode_cursor(cursor)  # reject a bad cursor before the 200 starts streaming
+            return StreamingResponse(
+                stream_messages(db_manager, session_id, cursor, limit),
+                media_type="application/x-ndjson",
+            )
+        messages, next_cursor = await page_messages(db_manager, session_id, cursor, limit)
+        return {"status": "success", "messages": messages, "next_cursor": next_cursor}
     except Exception as e:
-        logger.error(f"Error retrieving session history: {e}", exc_info=True)
+        logger.error("Error retrieving session history: %s", e, exc_info=True)
         return {"status": "error", "message": str(e)}
 
+@router.get("/recommendations/{user_id}")
+async def get_recommendations(user_id: str, limit: int = 5):
+    """Fruits and vegetables from the catalog for the consumer's dietary goals and health conditions."""
+    try:
+        items = await recommender.arecommend_for(user_id, max(1, min(limit, 20)))
+        return {"status": "success", "recommendations": [item._asdict() for item in items]}
+    except Exception as e:
+        logger.error("Error computing recommendations: %s", e, exc_info=True)
+        return {"status": "error", "message": str(e)}
+
+@router.post("/recommendations/invalidate")
+async def invalidate_recommendations():
+    """Called by the app after catalog changes so the next request rebuilds the product matrix."""
+    recommender.invalidate()
+    return {"status": "success"}
+
+@router.get("/metrics")
+async def get_metrics(format: str = "json"):
+    """Provider limiter state and latency metrics (JSON or Prometheus text)."""
+    if format == "prometheus":
+        return PlainTextResponse(REGISTRY.render_prometheus())
+    return REGISTRY.snapshot()
+
+# --- Admin: CPU profiles and memory of this worker (off unless AGENT_ADMIN_TOKEN is set) ---
+def connected_sessions():
+    # The sockets themselves are left out: through their ASGI scope they reach the whole server
+    return [
+        (client_id, {"session_id": session_id, "audio_profile": manager.audio_profiles.get(client_id),
+                     "language": session_languages.get(session_id)})
+        for client_id, session_id in list(manager.user_sessions.items())
+    ]
+
+admin = admin_router(connected_sessions)
+
+router.include_router(admin)
+
 def get_websocket_router():
     return router 
 
@@ -606,7 +660,7 @@ def determine_intent_and_base_url(user_message_content: str) -> tuple[str, str]:
     """
     Classifies intent and returns the intent string and base URL.
     """
-    print("--> Classifying intent...")
+    logger.debug("Classifying intent...")
     prompt = """
 You are an intent classifier for an agricultural marketplace app.
 Analyze the user message and classify it as exactly ONE of these intents: "product" or "post".
@@ -617,17 +671,18 @@ Return ONLY the word "product" or "post".
             SystemMessage(content=prompt),
             HumanMessage(content=user_message_content)
         ])
-        intent = response.content.strip().lower().split()[0] if response.content else ""
+        intent, recognized = forms.parse_intent(response.content)
+        if not recognized:
+            logger.warning("Intent '%s' not recognized (from msg: '%s...'), defaulting to 'product'",
+                           response.content, user_message_content[:50])
+    except ProviderBusy:
+        raise
     except Exception as e:
-        print(f"Error invoking LLM for intent classification: {e}")
+        logger.error("Error invoking LLM for intent classification: %s", e)
         intent = "product" # Default on LLM error
 
-    if intent not in ("product", "post"):
-        print(f"Warning: Intent '{intent}' not recognized (from msg: '{user_message_content[:50]}...'), defaulting to 'product'")
-        intent = "product"
-
-    base_url = PRODUCT_BASE_URL if intent == "product" else POST_BASE_URL
-    print(f"--> Intent classified as: {intent}, Base URL: {base_url}")
+    base_url = forms.get(intent).base_url
+    logger.debug("Intent classified as: %s, Base URL: %s", intent, base_url)
     return intent, base_url
 
 # Form step logic
@@ -639,52 +694,42 @@ def run_form_step(state: AgentState) -> AgentState:
     """
     intent = state.get("intent")
     if not intent:
-        print("Error: Intent missing in run_form_step state.")
+        logger.error("Intent missing in run_form_step state.")
         state["messages"] = add_messages(state.get("messages", []), [AIMessage(content="Internal error: Could not determine task type.")])
         state["done"] = True # Mark as done to prevent further processing
         return state
 
-    fields = product_fields if intent == "product" else post_fields
-    base_url = state.get("base_url", "")
+    form = forms.get(intent)
     data = state.get("product_data", {})
     new_messages = [] # Messages to add in this step
 
-    print(f"--> Running form step for intent: {intent}")
+    logger.debug("Running form step for intent: %s", intent)
 
     # --- Save previous answer if applicable ---
     key_to_save = state.get("await_key")
-    # Check if the *last* message is human and await_key was set *before* this call
-    if key_to_save and state.get("messages") and isinstance(state["messages"][-1], HumanMessage):
-        last_user_message = state["messages"][-1].content.strip()
-        print(f"--> Saving answer for '{key_to_save}': '{last_user_message}'")
-        data[key_to_save] = last_user_message
-    # We will determine the *next* await_key below
-    current_await_key = None
+    utterance = None
+    # The *last* human message answers await_key and may fill other fields too
+    if state.get("messages") and isinstance(state["messages"][-1], HumanMessage):
+        utterance = state["messages"][-1].content
+        logger.debug("Extracting answers (awaiting '%s') from: '%s'", key_to_save, utterance.strip())
 
     # --- Determine next step: Ask next question OR finalize ---
-    next_key_to_ask = None
-    question_to_ask = None
-    for key, q in fields:
-        if key not in data: # Find the first key *not* present in data
-            next_key_to_ask = key
-            question_to_ask = q
-            break
-
-    current_url = generate_url(base_url, data) # URL reflecting current data
-
-    if next_key_to_ask and question_to_ask:
-        print(f"--> Asking next question for key: '{next_key_to_ask}'")
+    step = fill_slots(form, data, utterance, key_to_save, llm, state.get("form_mask"), state.get("url"))
+    current_url = step.url # URL reflecting current data
+
+    if not step.done:
+        logger.debug("Asking next question for key: '%s'", step.key)
         msg_content = (
-            f"{question_to_ask}\n(please type your answer)\n\n"
+            f"{step.prompt}\n(please type your answer)\n\n"
             f"Current progress URL: {current_url}"
         )
         new_messages.append(AIMessage(content=msg_content))
-        current_await_key = next_key_to_ask # Set key we are waiting for
+        current_await_key = step.key # Set key we are waiting for
         is_done = False
         summary_text = state.get("summary") # Preserve summary if it existed
     else:
         # --- All questions answered → Finalize ---
-        print("--> All questions answered. Finalizing.")
+        logger.debug("All questions answered. Finalizing.")
         summary_text = summarize(intent, data)
         msg_content = (f"All questions answered! Here is a concise summary:\n\n{summary_text}\n\n"
                        f"Final submission link:\n{current_url}")
@@ -694,6 +739,7 @@ def run_form_step(state: AgentState) -> AgentState:
 
     # Update state dictionary directly
     state["product_data"] = data
+    state["form_mask"] = step.mask
     state["await_key"] = current_await_key
     state["done"] = is_done
     state["url"] = current_url
@@ -705,23 +751,14 @@ def run_form_step(state: AgentState) -> AgentState:
 
 # Helper: summarizer LLM call
 def summarize(intent: str, data: dict) -> str:
-    print(f"--> Generating summary for intent '{intent}'...")
+    logger.debug("Generating summary for intent '%s'...", intent)
     try:
-        if intent == "product":
-            prompt = (
-                "You are a marketplace assistant. Using the details below, "
-                "write a short, compelling product listing (max 60 words).\n"
-                f"Details: {data}"
-            )
-        else: # 'post' intent
-            prompt = (
-                "You are a social‑media assistant. Combine the details below "
-                "into a catchy post caption (max 40 words).\n"
-                f"Details: {data}"
-            )
+        prompt = forms.get(intent).summary_prompt(data)
         summary = llm.invoke(prompt).content.strip()
-        print(f"--> Summary generated.")
+        logger.debug("Summary generated.")
         return summary
+    except ProviderBusy:
+        raise
     except Exception as e:
-        print(f"Error invoking LLM for summary: {e}")
+        logger.error("Error invoking LLM for summary: %s", e)
         return "[Error generating summary]" 
\ No newline at end of file
@@ -0,0 +1,2 @@
+-- CreateIndex
+CREATE INDEX "OrderItem_createdAt_id_idx" ON "OrderItem"("createdAt", "id");